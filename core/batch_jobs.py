@@ -0,0 +1,304 @@
+"""
+Chunked, resumable batch jobs with persisted run records
+
+A BatchJob names a candidate source and a per-candidate handler. Candidates are
+read in key order (keyset pagination on `_id` or another increasing key) in chunks
+of `chunk_size`; up to `concurrency` chunks form a wave that runs on a thread pool.
+
+Every run is a document of the run collection (see modules.batch_job.model). The
+run holds a lease that a heartbeat thread renews, counters that are updated as
+each chunk finishes, and the key of the last candidate of the last completed wave
+(`cursor`). A run whose lease expired (crashed or stalled process) is claimed again
+by the next start() of the same job and continues after its cursor, so at most one
+wave is repeated; handlers must tolerate being called twice for a candidate, as
+the check_and_process_* methods already do.
+
+Runs record counts and a capped sample of errors, never the per-candidate results.
+"""
+
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from .queue_consumer import default_worker_id
+
+logger = logging.getLogger("BatchJobs")
+
+Candidate = Tuple[Any, Any]  # (keyset key, handler argument)
+
+ACTIVE_STATUSES = ('running',)
+PENDING_FIELDS = ('pending_processed', 'pending_failed', 'pending_checked')
+
+
+def query_candidates(document_cls, query: Dict[str, Any], arg_field: str = '_id') -> Callable[[Any, int], List[Candidate]]:
+    """Candidate source over a collection: (_id, str(arg_field)) of matching documents in _id order"""
+    def fetch(after, limit: int) -> List[Candidate]:
+        match = dict(query)
+        if after is not None:
+            match['_id'] = {'$gt': after}
+        rows = document_cls._get_collection().find(match, {arg_field: 1}).sort('_id', 1).limit(limit)
+        return [(row['_id'], str(row.get(arg_field))) for row in rows if row.get(arg_field) is not None]
+    return fetch
+
+
+def list_candidates(values: Iterable[Any]) -> Callable[[Any, int], List[Candidate]]:
+    """Candidate source over a fixed, sortable list of values (each value is its own key)"""
+    ordered = sorted(set(values))
+
+    def fetch(after, limit: int) -> List[Candidate]:
+        return [(value, value) for value in ordered if after is None or value > after][:limit]
+    return fetch
+
+
+class BatchJob:
+    """A named candidate source plus the handler run for every candidate"""
+
+    def __init__(self, name: str, candidates: Callable[[Any, int], List[Candidate]],
+                 handler: Callable[[Any], Dict[str, Any]], *, chunk_size: int = 200, concurrency: int = 4,
+                 interval_seconds: Optional[int] = None, sum_fields: Sequence[str] = (), description: str = ''):
+        self.name = name
+        self.candidates = candidates
+        self.handler = handler
+        self.chunk_size = max(1, chunk_size)
+        self.concurrency = max(1, concurrency)
+        self.interval_seconds = interval_seconds
+        self.sum_fields = tuple(sum_fields)
+        self.description = description
+
+
+def _number(value) -> float:
+    try:
+        return float(Decimal(str(value or 0)))
+    except Exception:
+        return 0.0
+
+
+class BatchJobRunner:
+    """Starts, resumes and executes runs of registered BatchJobs"""
+
+    def __init__(self, run_cls, jobs: Iterable[BatchJob], *, lease_seconds: int = 120,
+                 max_errors: int = 20, worker_id: Optional[str] = None):
+        self.run_cls = run_cls
+        self.jobs = {job.name: job for job in jobs}
+        self.lease_seconds = lease_seconds
+        self.max_errors = max_errors
+        self.worker_id = worker_id or default_worker_id()
+
+    def _collection(self):
+        return self.run_cls._get_collection()
+
+    # --- Starting ---
+
+    def start(self, name: str, trigger: str = 'manual') -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Claim a run of `name`: an abandoned run is resumed, otherwise a new one is created.
+        Returns (lease token, raw run document), or None while a live run of the job exists.
+        """
+        if name not in self.jobs:
+            raise KeyError(f"Unknown batch job: {name}")
+        now = datetime.utcnow()
+        token = f"{self.worker_id}:{uuid.uuid4().hex[:12]}"
+        lease = {'lease_owner': token, 'lease_expires_at': now + timedelta(seconds=self.lease_seconds),
+                 'heartbeat_at': now, 'updated_at': now}
+
+        resumed = self._collection().find_one_and_update(
+            {'job_name': name, 'status': {'$in': list(ACTIVE_STATUSES)}, 'lease_expires_at': {'$lt': now}},
+            {'$set': dict(lease, **{field: 0 for field in PENDING_FIELDS}), '$inc': {'resumed_count': 1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if resumed:
+            logger.warning(f"[{name}] resuming run {resumed['_id']} after cursor {resumed.get('cursor')}")
+            return token, resumed
+
+        doc = dict(
+            lease, job_name=name, active_job=name, status='running', trigger=trigger, cursor=None,
+            chunks_completed=0, processed_count=0, failed_count=0, total_checked=0, totals={}, errors=[],
+            resumed_count=0, started_at=now, created_at=now, **{field: 0 for field in PENDING_FIELDS}
+        )
+        try:
+            doc['_id'] = self._collection().insert_one(doc).inserted_id
+        except DuplicateKeyError:
+            return None
+        return token, doc
+
+    def run(self, name: str, trigger: str = 'manual') -> Dict[str, Any]:
+        """Start (or resume) a run of `name` and execute it to the end; returns its summary"""
+        claimed = self.start(name, trigger)
+        if not claimed:
+            active = self._collection().find_one({'active_job': name})
+            return {"success": False, "error": f"Batch job {name} is already running",
+                    "run": self.summary(active) if active else None}
+        return self.execute(*claimed)
+
+    # --- Executing ---
+
+    def execute(self, token: str, run: Dict[str, Any]) -> Dict[str, Any]:
+        job = self.jobs[run['job_name']]
+        cursor = run.get('cursor')
+        lost = threading.Event()
+        heartbeat_stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(run['_id'], token, heartbeat_stop, lost), daemon=True)
+        heartbeat.start()
+        status, fatal = 'completed', None
+        try:
+            with ThreadPoolExecutor(max_workers=job.concurrency, thread_name_prefix=f"batch-{job.name}") as pool:
+                while not lost.is_set():
+                    chunks = self._next_wave(job, cursor)
+                    if not chunks:
+                        break
+                    futures = [pool.submit(self._run_chunk, job, run['_id'], token, chunk) for chunk in chunks]
+                    counts = [future.result() for future in futures]
+                    cursor = chunks[-1][-1][0]
+                    if not self._commit_wave(run['_id'], token, cursor, counts):
+                        lost.set()
+        except Exception as e:
+            status, fatal = 'failed', str(e)
+            logger.error(f"[{job.name}] run {run['_id']} failed: {e}")
+        finally:
+            heartbeat_stop.set()
+            heartbeat.join()
+
+        if lost.is_set():
+            # Another process re-claimed the run after our lease expired; it finishes the run
+            logger.warning(f"[{job.name}] lease lost for run {run['_id']}")
+            return {"success": False, "error": "Lease lost", "run": self.get(run['_id'])}
+        self._finish(run['_id'], token, status, fatal)
+        summary = self.get(run['_id'])
+        return {"success": status == 'completed', "error": fatal, "run": summary}
+
+    def _next_wave(self, job: BatchJob, cursor) -> List[List[Candidate]]:
+        chunks = []
+        for _ in range(job.concurrency):
+            chunk = job.candidates(cursor, job.chunk_size)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            cursor = chunk[-1][0]
+            if len(chunk) < job.chunk_size:
+                break
+        return chunks
+
+    def _run_chunk(self, job: BatchJob, run_id, token: str, chunk: List[Candidate]) -> Dict[str, Any]:
+        counts = {'processed': 0, 'failed': 0, 'checked': len(chunk), 'totals': {}}
+        errors = []
+        for key, arg in chunk:
+            try:
+                result = job.handler(arg) or {}
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            if result.get("success"):
+                counts['processed'] += 1
+                for field in job.sum_fields:
+                    counts['totals'][field] = counts['totals'].get(field, 0.0) + _number(result.get(field))
+            else:
+                counts['failed'] += 1
+                errors.append({'key': str(arg), 'error': str(result.get("error"))[:200]})
+
+        # Progress becomes visible per chunk; the counters are committed with the wave
+        update = {'$inc': {'pending_processed': counts['processed'], 'pending_failed': counts['failed'],
+                           'pending_checked': counts['checked']},
+                  '$set': {'updated_at': datetime.utcnow()}}
+        if errors:
+            update['$push'] = {'errors': {'$each': errors[:self.max_errors], '$slice': -self.max_errors}}
+        self._collection().update_one({'_id': run_id, 'lease_owner': token}, update)
+        return counts
+
+    def _commit_wave(self, run_id, token: str, cursor, counts: List[Dict[str, Any]]) -> bool:
+        inc = {
+            'processed_count': sum(c['processed'] for c in counts),
+            'failed_count': sum(c['failed'] for c in counts),
+            'total_checked': sum(c['checked'] for c in counts),
+            'chunks_completed': len(counts),
+        }
+        for c in counts:
+            for field, value in c['totals'].items():
+                inc[f'totals.{field}'] = inc.get(f'totals.{field}', 0.0) + value
+        result = self._collection().update_one(
+            {'_id': run_id, 'lease_owner': token},
+            {'$inc': inc, '$set': dict({field: 0 for field in PENDING_FIELDS}, cursor=cursor,
+                                       updated_at=datetime.utcnow())},
+        )
+        return bool(result.matched_count)
+
+    def _finish(self, run_id, token: str, status: str, error: Optional[str]):
+        now = datetime.utcnow()
+        self._collection().update_one(
+            {'_id': run_id, 'lease_owner': token},
+            {'$set': {'status': status, 'error': error, 'finished_at': now, 'updated_at': now,
+                      'lease_owner': None, 'lease_expires_at': None},
+             '$unset': {'active_job': ''}},
+        )
+
+    def _heartbeat(self, run_id, token: str, stop: threading.Event, lost: threading.Event):
+        interval = max(0.05, self.lease_seconds / 3.0)
+        while not stop.wait(interval):
+            try:
+                now = datetime.utcnow()
+                result = self._collection().update_one(
+                    {'_id': run_id, 'lease_owner': token},
+                    {'$set': {'lease_expires_at': now + timedelta(seconds=self.lease_seconds), 'heartbeat_at': now}},
+                )
+                if not result.matched_count:
+                    lost.set()
+                    return
+            except Exception as e:
+                logger.error(f"Batch run {run_id} heartbeat failed: {e}")
+
+    # --- Scheduling ---
+
+    def due(self, now: Optional[datetime] = None) -> List[str]:
+        """Scheduled jobs whose interval elapsed since their last run, plus jobs with an abandoned run"""
+        now = now or datetime.utcnow()
+        names = []
+        for job in self.jobs.values():
+            if job.interval_seconds is None:
+                continue
+            abandoned = self._collection().find_one(
+                {'job_name': job.name, 'status': {'$in': list(ACTIVE_STATUSES)}, 'lease_expires_at': {'$lt': now}},
+                {'_id': 1},
+            )
+            last = self._collection().find_one({'job_name': job.name}, {'created_at': 1, 'status': 1},
+                                               sort=[('created_at', -1)])
+            if abandoned or not last or (
+                last.get('status') not in ACTIVE_STATUSES
+                and last['created_at'] + timedelta(seconds=job.interval_seconds) <= now
+            ):
+                names.append(job.name)
+        return names
+
+    def run_due(self, now: Optional[datetime] = None) -> Dict[str, Dict[str, Any]]:
+        """Run every due job once (one after the other); returns their results by job name"""
+        return {name: self.run(name, trigger='schedule') for name in self.due(now)}
+
+    # --- Status ---
+
+    def get(self, run_id) -> Optional[Dict[str, Any]]:
+        doc = self._collection().find_one({'_id': run_id})
+        return self.summary(doc) if doc else None
+
+    def summary(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Status of a run with live counts (committed waves + chunks finished in the current wave)"""
+        return {
+            "run_id": str(doc['_id']),
+            "job_name": doc.get('job_name'),
+            "status": doc.get('status'),
+            "trigger": doc.get('trigger'),
+            "processed_count": (doc.get('processed_count') or 0) + (doc.get('pending_processed') or 0),
+            "failed_count": (doc.get('failed_count') or 0) + (doc.get('pending_failed') or 0),
+            "total_checked": (doc.get('total_checked') or 0) + (doc.get('pending_checked') or 0),
+            "chunks_completed": doc.get('chunks_completed') or 0,
+            "totals": doc.get('totals') or {},
+            "errors": doc.get('errors') or [],
+            "resumed_count": doc.get('resumed_count') or 0,
+            "error": doc.get('error'),
+            "started_at": doc.get('started_at'),
+            "heartbeat_at": doc.get('heartbeat_at'),
+            "finished_at": doc.get('finished_at'),
+        }
@@ -0,0 +1,248 @@
+"""
+Versioned bootstrap data
+
+The reference data every deployment needs (slot catalog, distribution percentages, bonus fund
+trackers, ranks and program settings singletons) is seeded idempotently on startup. The seed is
+fingerprinted; the fingerprint of the last applied seed is kept in system_config, so a boot with
+unchanged data costs one read, and a changed seed is applied with one bulk_write per collection.
+
+Bump BOOTSTRAP_VERSION when seeding code outside the data below changes (rank definitions in
+RankService.initialize_ranks, settings document defaults) so the next boot applies it.
+"""
+
+import hashlib
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List
+
+from mongoengine.connection import get_db
+from pymongo import UpdateOne
+
+BOOTSTRAP_VERSION = 1
+BOOTSTRAP_MARKER_KEY = 'bootstrap_fingerprint'
+
+SLOT_CURRENCY = {'binary': 'BNB', 'matrix': 'USDT', 'global': 'USD'}
+
+# (slot_no, name, price, level) per PROJECT_DOCUMENTATION.md
+BINARY_SLOTS = [
+    (1,  'Explorer',     '0.0022', 0),
+    (2,  'Contributor',  '0.0044', 1),
+    (3,  'Subscriber',   '0.0088', 2),
+    (4,  'Dreamer',      '0.0176', 3),
+    (5,  'Planner',      '0.0352', 4),
+    (6,  'Challenger',   '0.0704', 5),
+    (7,  'Adventurer',   '0.1408', 6),
+    (8,  'Game-Shifter', '0.2816', 7),
+    (9,  'Organizer',    '0.5632', 8),
+    (10, 'Leader',       '1.1264', 9),
+    (11, 'Vanguard',     '2.2528', 10),
+    (12, 'Center',       '4.5056', 11),
+    (13, 'Climax',       '9.0112', 12),
+    (14, 'Eternity',     '18.0224', 13),
+    (15, 'King',         '36.0448', 14),
+    (16, 'Commander',    '72.0896', 15),
+    (17, 'CEO',          '144.1792', 16),
+]
+
+MATRIX_SLOTS = [
+    (1,  'STARTER',   '11',        1),
+    (2,  'BRONZE',    '33',        2),
+    (3,  'SILVER',    '99',        3),
+    (4,  'GOLD',      '297',       4),
+    (5,  'PLATINUM',  '891',       5),
+    (6,  'DIAMOND',   '2673',      6),
+    (7,  'RUBY',      '8019',      7),
+    (8,  'EMERALD',   '24057',     8),
+    (9,  'SAPPHIRE',  '72171',     9),
+    (10, 'TOPAZ',     '216513',    10),
+    (11, 'PEARL',     '649539',    11),
+    (12, 'AMETHYST',  '1948617',   12),
+    (13, 'OBSIDIAN',  '5845851',   13),
+    (14, 'TITANIUM',  '17537553',  14),
+    (15, 'STAR',      '52612659',  15),
+]
+
+# (slot_no, name, price, level, phase): phases alternate
+GLOBAL_SLOTS = [
+    (1,  'FOUNDATION', '33',    1, 'PHASE-1'),
+    (2,  'APEX',       '36',    2, 'PHASE-2'),
+    (3,  'SUMMIT',     '86',    3, 'PHASE-1'),
+    (4,  'RADIANCE',   '103',   4, 'PHASE-2'),
+    (5,  'HORIZON',    '247',   5, 'PHASE-1'),
+    (6,  'PARADIGM',   '296',   6, 'PHASE-2'),
+    (7,  'CATALYST',   '711',   7, 'PHASE-1'),
+    (8,  'ODYSSEY',    '853',   8, 'PHASE-2'),
+    (9,  'PINNACLE',   '2047',  9, 'PHASE-1'),
+    (10, 'PRIME',      '2457', 10, 'PHASE-2'),
+    (11, 'MOMENTUM',   '5897', 11, 'PHASE-1'),
+    (12, 'CREST',      '7076', 12, 'PHASE-2'),
+    (13, 'VERTEX',     '16984',13, 'PHASE-1'),
+    (14, 'LEGACY',     '20381',14, 'PHASE-2'),
+    (15, 'ASCEND',     '48796',15, 'PHASE-1'),
+    (16, 'EVEREST',    '58555',16, 'PHASE-2'),
+]
+
+# (config_key, config_value, description): distribution percentages per docs
+SYSTEM_CONFIGS = [
+    # Binary distribution
+    ('binary_distribution_spark', '8', 'Binary Spark Bonus percentage'),
+    ('binary_distribution_royal_captain', '4', 'Binary Royal Captain percentage'),
+    ('binary_distribution_president', '3', 'Binary President Reward percentage'),
+    ('binary_distribution_leadership', '5', 'Binary Leadership Stipend percentage'),
+    ('binary_distribution_jackpot', '5', 'Binary Jackpot Entry percentage'),
+    ('binary_distribution_partner', '10', 'Binary Partner Incentive percentage'),
+    ('binary_distribution_level', '60', 'Binary Level Payout percentage'),
+    ('binary_distribution_shareholders', '5', 'Binary Shareholders percentage'),
+    # Matrix distribution
+    ('matrix_distribution_spark', '8', 'Matrix Spark Bonus percentage'),
+    ('matrix_distribution_royal_captain', '4', 'Matrix Royal Captain percentage'),
+    ('matrix_distribution_president', '3', 'Matrix President Reward percentage'),
+    ('matrix_distribution_leadership', '5', 'Matrix Leadership Stipend percentage'),
+    ('matrix_distribution_jackpot', '5', 'Matrix Jackpot Entry percentage'),
+    ('matrix_distribution_partner', '10', 'Matrix Partner Incentive percentage'),
+    ('matrix_distribution_level', '60', 'Matrix Level Payout percentage'),
+    ('matrix_distribution_shareholders', '5', 'Matrix Shareholders percentage'),
+    # Global distribution
+    ('global_distribution_partner', '10', 'Global Partner Incentive percentage'),
+    ('global_distribution_level', '60', 'Global Level Payout percentage'),
+    ('global_distribution_rc', '4', 'Global Royal Captain percentage'),
+    ('global_distribution_president', '3', 'Global President Reward percentage'),
+    ('global_distribution_triple_entry', '5', 'Global Triple Entry Reward percentage'),
+    ('global_distribution_shareholders', '5', 'Global Shareholders percentage'),
+]
+
+BONUS_FUND_TYPES = [
+    'spark_bonus', 'royal_captain', 'president_reward',
+    'leadership_stipend', 'jackpot_entry', 'partner_incentive',
+    'shareholders', 'newcomer_support', 'mentorship_bonus'
+]
+BONUS_FUND_PROGRAMS = ['binary', 'matrix', 'global']
+
+
+def bootstrap_fingerprint() -> str:
+    """sha256 of the seed data and BOOTSTRAP_VERSION"""
+    seed = {
+        'version': BOOTSTRAP_VERSION,
+        'slots': {'binary': BINARY_SLOTS, 'matrix': MATRIX_SLOTS, 'global': GLOBAL_SLOTS},
+        'configs': SYSTEM_CONFIGS,
+        'bonus_funds': [BONUS_FUND_TYPES, BONUS_FUND_PROGRAMS],
+    }
+    return hashlib.sha256(json.dumps(seed, sort_keys=True).encode()).hexdigest()
+
+
+def _upsert(document, keys: List[str], managed: List[str]) -> UpdateOne:
+    """
+    Upsert of an unsaved document on its key fields: managed fields are overwritten,
+    every other field (defaults included) is only written when the document is created
+    """
+    doc = document.to_mongo().to_dict()
+    doc.pop('_id', None)
+    update = {
+        '$set': {name: doc[name] for name in managed if name in doc},
+        '$setOnInsert': {name: value for name, value in doc.items() if name not in keys and name not in managed},
+    }
+    update = {operator: fields for operator, fields in update.items() if fields}
+    return UpdateOne({name: doc[name] for name in keys}, update, upsert=True)
+
+
+def _seed_slot_catalog(now: datetime) -> int:
+    from modules.slot.model import SlotCatalog
+    operations = []
+    for program, slots in (('binary', BINARY_SLOTS), ('matrix', MATRIX_SLOTS), ('global', GLOBAL_SLOTS)):
+        for slot_no, name, price, level, *phase in slots:
+            slot = SlotCatalog(program=program, slot_no=slot_no, name=name, price=Decimal(price),
+                               currency=SLOT_CURRENCY[program], level=level, is_active=True, created_at=now)
+            managed = ['name', 'price', 'currency', 'level', 'is_active']
+            if phase:
+                slot.phase = phase[0]
+                managed.append('phase')
+            operations.append(_upsert(slot, ['program', 'slot_no'], managed))
+    result = SlotCatalog._get_collection().bulk_write(operations, ordered=False)
+    return result.upserted_count + result.modified_count
+
+
+def _seed_system_config(now: datetime) -> int:
+    from modules.blockchain.model import SystemConfig
+    operations = [
+        _upsert(SystemConfig(config_key=key, config_value=value, description=description, is_active=True,
+                             updated_at=now, created_at=now),
+                ['config_key'], ['config_value', 'description', 'is_active', 'updated_at'])
+        for key, value, description in SYSTEM_CONFIGS
+    ]
+    result = SystemConfig._get_collection().bulk_write(operations, ordered=False)
+    return result.upserted_count + result.modified_count
+
+
+def _seed_bonus_funds(now: datetime) -> int:
+    from modules.income.bonus_fund import BonusFund
+    operations = [
+        _upsert(BonusFund(fund_type=fund_type, program=program, status='active', created_at=now, updated_at=now),
+                ['fund_type', 'program'], [])
+        for fund_type in BONUS_FUND_TYPES
+        for program in BONUS_FUND_PROGRAMS
+    ]
+    return BonusFund._get_collection().bulk_write(operations, ordered=False).upserted_count
+
+
+def _seed_settings() -> List[str]:
+    """Ranks and the program settings singletons (created with their defaults when missing)"""
+    from modules.rank.service import RankService
+    from modules.rank.model import RankSettings
+    from modules.phase_system.model import PhaseSystemSettings
+    from modules.newcomer_support.model import NewcomerSupportSettings
+    from modules.dream_matrix.model import DreamMatrixSettings
+    from modules.royal_captain.model import RoyalCaptainSettings
+    from modules.president_reward.model import PresidentRewardSettings
+    from modules.top_leader_gift.model import TopLeaderGiftSettings
+
+    # Initialize ranks (creates missing, updates existing)
+    RankService().initialize_ranks()
+
+    created = []
+    if not RankSettings.objects(is_active=True).first():
+        RankSettings().save()
+        created.append('RankSettings')
+    for settings_cls in (PhaseSystemSettings, NewcomerSupportSettings, DreamMatrixSettings, RoyalCaptainSettings,
+                         PresidentRewardSettings, TopLeaderGiftSettings):
+        if not settings_cls.objects().first():
+            settings_cls().save()
+            created.append(settings_cls.__name__)
+    return created
+
+
+def ensure_bootstrap_data(force: bool = False) -> Dict[str, Any]:
+    """
+    Seed the bootstrap data unless the stored fingerprint matches the current one.
+    Returns {"success", "seeded", "fingerprint", ...counts when seeded}.
+    """
+    try:
+        fingerprint = bootstrap_fingerprint()
+        # Read through the raw collection: an unchanged seed imports no models and creates no indexes
+        system_config = get_db()['system_config']
+        marker = system_config.find_one({'config_key': BOOTSTRAP_MARKER_KEY}, {'config_value': 1})
+        if not force and marker and marker.get('config_value') == fingerprint:
+            return {"success": True, "seeded": False, "fingerprint": fingerprint}
+
+        now = datetime.utcnow()
+        result = {
+            "success": True,
+            "seeded": True,
+            "fingerprint": fingerprint,
+            "slot_catalog": _seed_slot_catalog(now),
+            "system_config": _seed_system_config(now),
+            "bonus_funds": _seed_bonus_funds(now),
+            "settings_created": _seed_settings(),
+        }
+
+        # Recorded last: a seed that failed part-way is applied again on the next boot
+        system_config.update_one(
+            {'config_key': BOOTSTRAP_MARKER_KEY},
+            {'$set': {'config_value': fingerprint, 'updated_at': now},
+             '$setOnInsert': {'description': 'Fingerprint of the applied bootstrap data (core/bootstrap.py)',
+                              'is_active': True, 'created_at': now}},
+            upsert=True,
+        )
+        return result
+    except Exception as e:
+        return {"success": False, "error": str(e)}
@@ -1,5 +1,9 @@
+from contextlib import contextmanager
+
 import mongoengine
+from mongoengine import connection as mongoengine_connection
 from core.config import MONGO_URI
+from core.query_metrics import command_listener
 
 import logging
 
@@ -8,10 +12,50 @@ logging.getLogger("pymongo").setLevel(logging.CRITICAL)
 
 
 def connect_to_db():
+    # Once per process: a default connection that is already registered is kept
+    try:
+        mongoengine.get_connection()
+        return
+    except mongoengine_connection.ConnectionFailure:
+        pass  # no default connection registered yet
     try:
-        mongoengine.connect(db="bitgpt", host=MONGO_URI)
+        # event_listeners feeds per-request command accounting (core/query_metrics.py)
+        mongoengine.connect(db="bitgpt", host=MONGO_URI, event_listeners=[command_listener])
         client = mongoengine.get_connection()
         client.server_info()
         logging.info("Successfully connected to MongoDB!")
     except Exception as e:
-        logging.error(f"Error connecting to MongoDB: {e}")
\ No newline at end of file
+        logging.error(f"Error connecting to MongoDB: {e}")
+
+
+def _rebind_documents():
+    """Drop the per-class collection cache so every Document reads the current default database."""
+    pending = list(mongoengine.Document.__subclasses__())
+    seen = set()
+    while pending:
+        doc_cls = pending.pop()
+        if doc_cls in seen:
+            continue
+        seen.add(doc_cls)
+        if hasattr(doc_cls, '_collection'):
+            doc_cls._collection = None
+        pending.extend(doc_cls.__subclasses__())
+
+
+@contextmanager
+def scratch_database(name: str):
+    """
+    Point the default connection at an empty database on the same client for the block,
+    then drop it and switch back. For offline tools only (not while serving requests).
+    """
+    alias = mongoengine_connection.DEFAULT_CONNECTION_NAME
+    client = mongoengine.get_connection(alias)
+    previous = mongoengine_connection.get_db(alias)
+    mongoengine_connection._dbs[alias] = client[name]
+    _rebind_documents()
+    try:
+        yield client[name]
+    finally:
+        client.drop_database(name)
+        mongoengine_connection._dbs[alias] = previous
+        _rebind_documents()
@@ -0,0 +1,65 @@
+"""
+Lazy router loading
+
+Importing a router module imports its services, and through them most of the models, which
+is the bulk of the app's import time. LazyRouters registers router modules by the path prefix
+they serve and includes each in the app on the first request under that prefix, so a cold
+start only imports what its first requests use. The schema endpoints (/docs, /redoc,
+/openapi.json) load every pending router first.
+"""
+
+import threading
+from importlib import import_module
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+SCHEMA_PATHS = ('/docs', '/redoc', '/openapi.json')
+
+
+class LazyRouters:
+    """Router modules waiting to be included in the app, by the path prefix they serve"""
+
+    def __init__(self, app: FastAPI):
+        self.app = app
+        self._pending: List[Tuple[str, str, str, Dict[str, Any]]] = []
+        self._lock = threading.Lock()
+
+    def add(self, path_prefix: str, module: str, attr: str = 'router', **include_kwargs):
+        """Include `module.attr` (with app.include_router kwargs) once a request under path_prefix arrives"""
+        self._pending.append((path_prefix.rstrip('/'), module, attr, include_kwargs))
+
+    @property
+    def pending(self) -> List[str]:
+        return [module for _, module, _, _ in self._pending]
+
+    def load(self, path: Optional[str] = None) -> int:
+        """Include the pending routers serving `path` (every one when None); returns how many were included"""
+        if not self._pending:
+            return 0
+        with self._lock:
+            entries = [entry for entry in self._pending
+                       if path is None or path == entry[0] or path.startswith(entry[0] + '/')]
+            for entry in entries:
+                _, module, attr, include_kwargs = entry
+                self.app.include_router(getattr(import_module(module), attr), **include_kwargs)
+                self._pending.remove(entry)
+            if entries:
+                # Regenerated with the new routes on the next /openapi.json
+                self.app.openapi_schema = None
+        return len(entries)
+
+
+class LazyRouterMiddleware:
+    """ASGI middleware that includes the routers a request needs before the app routes it"""
+
+    def __init__(self, app: ASGIApp, routers: LazyRouters):
+        self.app = app
+        self.routers = routers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] in ('http', 'websocket') and self.routers.pending:
+            path = scope.get('path', '')
+            self.routers.load(None if path in SCHEMA_PATHS else path)
+        await self.app(scope, receive, send)
@@ -0,0 +1,188 @@
+"""
+Keyset (cursor) pagination for newest-first history lists
+
+`skip((page - 1) * limit)` makes the server walk and discard every earlier row, so
+deep pages of long histories get linearly slower. A keyset page instead continues
+strictly after the last row returned, ordered on (created_at, _id), which is served
+from the (user_id, created_at, _id) style indexes at constant cost per page. The
+position travels as an opaque cursor token; `next_cursor` of one page is the
+`cursor` of the next.
+
+page/limit keeps working for existing clients (one skip, same ordering), and both
+modes read limit + 1 rows so `has_more` needs no count. Exact totals are a
+separate count() whose cost grows with the history: they are optional and served
+from a short-lived per-filter cache (CountCache).
+"""
+
+import base64
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from bson import ObjectId
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 100
+
+
+def encode_cursor(created_at: Optional[datetime], doc_id: Any) -> str:
+    """Opaque token for the (created_at, _id) position of one row"""
+    raw = f"{created_at.isoformat() if created_at else ''}|{doc_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> Tuple[Optional[datetime], ObjectId]:
+    """Inverse of encode_cursor; raises ValueError for anything it did not produce"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        created_at, doc_id = raw.split('|')
+        return (datetime.fromisoformat(created_at) if created_at else None), ObjectId(doc_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def keyset_filter(cursor: str, descending: bool = True, field: str = 'created_at') -> Dict[str, Any]:
+    """
+    Raw filter for the rows after `cursor` in (field, _id) order.
+
+    Rows without a timestamp sort before all others ascending (after them
+    descending), matching MongoDB's ordering of null.
+    """
+    created_at, doc_id = decode_cursor(cursor)
+    id_op = '$lt' if descending else '$gt'
+    if created_at is None:
+        if descending:
+            return {field: None, '_id': {id_op: doc_id}}
+        return {'$or': [{field: None, '_id': {id_op: doc_id}}, {field: {'$ne': None}}]}
+
+    branches = [
+        {field: {id_op: created_at}},
+        {field: created_at, '_id': {id_op: doc_id}},
+    ]
+    if descending:
+        branches.append({field: None})
+    return {'$or': branches}
+
+
+def clamp_limit(limit: Optional[int], default: int = DEFAULT_LIMIT, max_limit: int = MAX_LIMIT) -> int:
+    return max(1, min(max_limit, int(limit or default)))
+
+
+class CountCache:
+    """Exact counts per (collection, filter), reused for `ttl_seconds`"""
+
+    def __init__(self, ttl_seconds: float = 60.0, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(queryset) -> str:
+        return f"{queryset._document._get_collection_name()}:{sorted(queryset._query.items(), key=lambda kv: kv[0])!r}"
+
+    def count(self, queryset) -> int:
+        key = self.key_for(queryset)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry[1] < self.ttl_seconds:
+                return entry[0]
+
+        total = queryset.count()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                expired = [k for k, (_, ts) in self._entries.items() if now - ts >= self.ttl_seconds]
+                for k in expired or list(self._entries)[: self.max_entries // 10 or 1]:
+                    del self._entries[k]
+            self._entries[key] = (total, now)
+        return total
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+count_cache = CountCache()
+
+
+class KeysetPage:
+    """One page of rows plus the pagination block the list endpoints return"""
+
+    def __init__(self, items: List[Any], limit: int, next_cursor: Optional[str] = None,
+                 page: Optional[int] = None, total: Optional[int] = None):
+        self.items = items
+        self.limit = limit
+        self.next_cursor = next_cursor
+        self.page = page
+        self.total = total
+
+    @property
+    def has_more(self) -> bool:
+        return self.next_cursor is not None
+
+    def meta(self) -> Dict[str, Any]:
+        meta = {"limit": self.limit, "next_cursor": self.next_cursor, "has_more": self.has_more}
+        if self.page is not None:
+            meta["page"] = self.page
+        if self.total is not None:
+            meta["total"] = self.total
+            meta["total_pages"] = (self.total + self.limit - 1) // self.limit
+        return meta
+
+
+def paginate(queryset, limit: Optional[int] = None, cursor: Optional[str] = None, page: Optional[int] = None,
+             include_total: bool = False, descending: bool = True, field: str = 'created_at',
+             max_limit: int = MAX_LIMIT, counter: Optional[CountCache] = None) -> KeysetPage:
+    """
+    Page a MongoEngine queryset in (field, _id) order.
+
+    With a cursor the page starts right after it and `page` is ignored; otherwise
+    `page` selects the page by offset (compatibility mode, defaults to 1). Raises
+    ValueError for malformed cursors.
+    """
+    limit = clamp_limit(limit, max_limit=max_limit)
+    total = (counter or count_cache).count(queryset) if include_total else None
+
+    sign = '-' if descending else '+'
+    ordered = queryset.order_by(f'{sign}{field}', f'{sign}id')
+    if cursor:
+        ordered = ordered.filter(__raw__=keyset_filter(cursor, descending, field))
+        page = None
+    else:
+        page = max(1, int(page or 1))
+        if page > 1:
+            ordered = ordered.skip((page - 1) * limit)
+
+    rows = list(ordered.limit(limit + 1))
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, field, None), last.id)
+    return KeysetPage(rows, limit, next_cursor=next_cursor, page=page, total=total)
+
+
+def paginate_ids(ids: Sequence[Any], limit: Optional[int] = None, cursor: Optional[str] = None,
+                 page: Optional[int] = None, max_limit: int = MAX_LIMIT) -> KeysetPage:
+    """
+    Page an ordered in-memory id list (e.g. a BFS over a tree) with the same
+    cursor tokens; the cursor names the last id returned. Totals are always known.
+    """
+    limit = clamp_limit(limit, max_limit=max_limit)
+    start = 0
+    if cursor:
+        _, last_id = decode_cursor(cursor)
+        positions = {str(value): index for index, value in enumerate(ids)}
+        if str(last_id) not in positions:
+            raise ValueError("Cursor does not belong to this list")
+        start = positions[str(last_id)] + 1
+        page = None
+    else:
+        page = max(1, int(page or 1))
+        start = (page - 1) * limit
+
+    items = list(ids[start:start + limit])
+    next_cursor = encode_cursor(None, items[-1]) if items and start + limit < len(ids) else None
+    return KeysetPage(items, limit, next_cursor=next_cursor, page=page, total=len(ids))
@@ -0,0 +1,213 @@
+"""
+MongoDB command accounting
+
+A pymongo CommandListener counts database round trips, documents returned and
+server time, both for the request currently being served (contextvar scoped) and
+aggregated per route/collection for the /metrics endpoint.
+"""
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Optional
+
+from pymongo import monitoring
+from starlette.middleware.base import BaseHTTPMiddleware
+
+# Driver/handshake chatter that is not application traffic
+IGNORED_COMMANDS = {
+    'hello', 'ismaster', 'isMaster', 'ping', 'buildinfo', 'buildInfo',
+    'saslStart', 'saslContinue', 'endSessions', 'getnonce', 'authenticate',
+}
+
+# Commands that modify documents (index builds are schema, not data, and are left out)
+WRITE_COMMANDS = {'insert', 'update', 'delete', 'findAndModify', 'bulkWrite'}
+
+
+def _empty_totals() -> Dict[str, Any]:
+    return {"commands": 0, "documents": 0, "duration_ms": 0.0}
+
+
+class QueryStats:
+    """Command totals for one tracked scope (usually one HTTP request)"""
+
+    def __init__(self, parent: Optional['QueryStats'] = None):
+        self.parent = parent
+        self.commands = 0
+        self.documents = 0
+        self.duration_ms = 0.0
+        self.by_collection: Dict[str, Dict[str, Any]] = {}
+        self.by_command: Dict[str, int] = {}
+        self.writes: Dict[str, int] = {}
+
+    def record(self, collection: str, command_name: Optional[str], duration_ms: float = 0.0, documents: int = 0):
+        """Add one command (or, with command_name=None, only returned documents) to this scope and its parents"""
+        stats = self
+        while stats is not None:
+            coll = stats.by_collection.setdefault(collection or '-', _empty_totals())
+            if command_name:
+                stats.commands += 1
+                coll["commands"] += 1
+                stats.by_command[command_name] = stats.by_command.get(command_name, 0) + 1
+                if command_name in WRITE_COMMANDS:
+                    stats.writes[collection or '-'] = stats.writes.get(collection or '-', 0) + 1
+            stats.documents += documents
+            stats.duration_ms += duration_ms
+            coll["documents"] += documents
+            coll["duration_ms"] += duration_ms
+            stats = stats.parent
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "commands": self.commands,
+            "documents": self.documents,
+            "duration_ms": round(self.duration_ms, 3),
+            "by_collection": {k: dict(v, duration_ms=round(v["duration_ms"], 3)) for k, v in self.by_collection.items()},
+            "by_command": dict(self.by_command),
+        }
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar('query_stats', default=None)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+
+@contextmanager
+def track_queries():
+    """Collect command totals for everything executed inside the block (nests into an outer scope)"""
+    stats = QueryStats(parent=_current_stats.get())
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+class MetricsRegistry:
+    """Process-wide totals per route and per collection"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.routes: Dict[str, Dict[str, Any]] = {}
+            self.collections: Dict[str, Dict[str, Any]] = {}
+            self.untracked = _empty_totals()
+
+    def record_command(self, collection: str, command_name: Optional[str], duration_ms: float, documents: int, tracked: bool):
+        with self._lock:
+            coll = self.collections.setdefault(collection or '-', _empty_totals())
+            targets = [coll] if tracked else [coll, self.untracked]
+            for totals in targets:
+                if command_name:
+                    totals["commands"] += 1
+                totals["documents"] += documents
+                totals["duration_ms"] += duration_ms
+
+    def record_request(self, route: str, stats: QueryStats):
+        with self._lock:
+            totals = self.routes.setdefault(route, dict(_empty_totals(), requests=0, max_commands=0))
+            totals["requests"] += 1
+            totals["commands"] += stats.commands
+            totals["documents"] += stats.documents
+            totals["duration_ms"] += stats.duration_ms
+            totals["max_commands"] = max(totals["max_commands"], stats.commands)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            routes = {}
+            for route, t in self.routes.items():
+                routes[route] = dict(
+                    t,
+                    duration_ms=round(t["duration_ms"], 3),
+                    avg_commands=round(t["commands"] / t["requests"], 2) if t["requests"] else 0,
+                )
+            return {
+                "routes": routes,
+                "collections": {k: dict(v, duration_ms=round(v["duration_ms"], 3)) for k, v in self.collections.items()},
+                "untracked": dict(self.untracked, duration_ms=round(self.untracked["duration_ms"], 3)),
+            }
+
+
+metrics_registry = MetricsRegistry()
+
+
+def record_command(collection: str, command_name: Optional[str], duration_ms: float = 0.0, documents: int = 0):
+    """Entry point for command events: charge the current request scope and the process totals"""
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(collection, command_name, duration_ms, documents)
+    metrics_registry.record_command(collection, command_name, duration_ms, documents, tracked=stats is not None)
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Feeds pymongo command events into record_command()"""
+
+    def __init__(self):
+        self._pending: Dict[Any, str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(event):
+        return (event.connection_id, event.request_id)
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        command = event.command or {}
+        if event.command_name == 'getMore':
+            collection = command.get('collection')
+        else:
+            collection = command.get(event.command_name)
+        with self._lock:
+            self._pending[self._key(event)] = collection if isinstance(collection, str) else '-'
+
+    @staticmethod
+    def _documents_in(reply) -> int:
+        if not reply:
+            return 0
+        cursor = reply.get('cursor')
+        if isinstance(cursor, dict):
+            return len(cursor.get('firstBatch') or cursor.get('nextBatch') or [])
+        if 'value' in reply:
+            return 1 if reply.get('value') else 0
+        return 0
+
+    def _finish(self, event, documents: int):
+        with self._lock:
+            collection = self._pending.pop(self._key(event), None)
+        if collection is None:
+            return
+        record_command(collection, event.command_name, event.duration_micros / 1000.0, documents)
+
+    def succeeded(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        self._finish(event, self._documents_in(event.reply))
+
+    def failed(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        self._finish(event, 0)
+
+
+command_listener = CommandMetricsListener()
+
+
+class QueryMetricsMiddleware(BaseHTTPMiddleware):
+    """Tracks each request's commands and reports them in X-DB-* response headers"""
+
+    async def dispatch(self, request, call_next):
+        with track_queries() as stats:
+            response = await call_next(request)
+        route = request.scope.get('route')
+        route_path = getattr(route, 'path', None) or request.url.path
+        metrics_registry.record_request(f"{request.method} {route_path}", stats)
+        response.headers['X-DB-Commands'] = str(stats.commands)
+        response.headers['X-DB-Documents'] = str(stats.documents)
+        response.headers['X-DB-Time-Ms'] = f"{stats.duration_ms:.3f}"
+        return response
@@ -0,0 +1,306 @@
+"""
+Lease-based queue consumption for Document-backed work queues
+
+Workers claim one item at a time with a single find_one_and_update that flips it
+to the processing status and stamps a lease (owner token + expiry). Items whose
+lease expired (crashed or stalled worker) become claimable again, a heartbeat
+thread renews the leases of in-flight items, failures are retried with
+exponential backoff and items that keep failing are parked in the failed status.
+
+Handlers only compute: they return a result (or raise) and never write the item's
+status themselves. `on_complete(item, result)` then writes the side effects
+(placement rows, logs) while the lease is still held, and only after it returns
+is the item settled with an update conditional on the lease token. Delivery is
+at-least-once: a worker can die between the hook and the settle, or lose its
+lease meanwhile, and the item is processed again, so hooks write idempotently,
+keyed by the item's _id (see record_once). A hook that raises sends the item
+through the same retry / park path as a failing handler.
+
+Queue documents need `lease_owner`, `lease_expires_at` and `next_attempt_at`
+fields next to their own status / attempts / error fields.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple, Union
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger("QueueConsumer")
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def record_once(document, key_field: str = 'queue_id') -> bool:
+    """
+    Insert a side-effect document unless one with the same key_field value exists (the
+    field needs a unique index); returns True, with document.id set, when this call inserted it.
+    """
+    document.validate()
+    doc = document.to_mongo().to_dict()
+    doc.pop('_id', None)
+    try:
+        result = document._get_collection().update_one(
+            {key_field: doc[key_field]}, {'$setOnInsert': doc}, upsert=True
+        )
+    except DuplicateKeyError:
+        # A concurrent writer inserted it between our match and insert
+        return False
+    if result.upserted_id is None:
+        return False
+    document.id = result.upserted_id
+    return True
+
+
+def _empty_metrics() -> Dict[str, Any]:
+    return {"claimed": 0, "completed": 0, "retried": 0, "parked": 0, "lease_lost": 0, "handler_ms": 0.0}
+
+
+class QueueConsumer:
+    """Claims and processes items of one queue collection"""
+
+    def __init__(self, name: str, document_cls, handler: Callable[[Any], Any], *,
+                 ready_status: str = 'queued', processing_status: str = 'processing',
+                 done_status: str = 'completed', failed_status: str = 'failed',
+                 attempts_field: str = 'attempts', error_field: str = 'failure_reason',
+                 done_fields: Sequence[str] = ('processed_at',),
+                 sort: Sequence[Tuple[str, int]] = (('created_at', 1),),
+                 max_attempts: Union[int, Callable[[Any], int]] = 5,
+                 lease_seconds: int = 60, backoff_seconds: float = 5, max_backoff_seconds: float = 600,
+                 concurrency: int = 1, worker_id: Optional[str] = None,
+                 on_failure: Optional[Callable[[Any, Exception, bool], None]] = None,
+                 on_complete: Optional[Callable[[Any, Any], None]] = None):
+        self.name = name
+        self.document_cls = document_cls
+        self.handler = handler
+        self.ready_status = ready_status
+        self.processing_status = processing_status
+        self.done_status = done_status
+        self.failed_status = failed_status
+        self.attempts_field = attempts_field
+        self.error_field = error_field
+        self.done_fields = tuple(done_fields)
+        self.sort = list(sort)
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.concurrency = max(1, concurrency)
+        self.worker_id = worker_id or default_worker_id()
+        self.on_failure = on_failure
+        self.on_complete = on_complete
+
+        self.metrics = _empty_metrics()
+        self._lock = threading.Lock()
+        self._leases: Dict[str, Any] = {}  # lease token -> item _id (in flight)
+
+    # --- Claiming ---
+
+    def _collection(self):
+        return self.document_cls._get_collection()
+
+    def claim(self, item_id=None) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Atomically lease the next ready (or lease-expired) item; returns (token, raw document).
+        With item_id, only that item is leased (for callers processing an item they just queued).
+        """
+        now = datetime.utcnow()
+        token = f"{self.worker_id}:{uuid.uuid4().hex[:12]}"
+        update = {
+            'status': self.processing_status,
+            'lease_owner': token,
+            'lease_expires_at': now + timedelta(seconds=self.lease_seconds),
+        }
+        if 'last_attempt_at' in self.document_cls._fields:
+            update['last_attempt_at'] = now
+        query = {'$or': [
+            {'status': self.ready_status, 'next_attempt_at': {'$not': {'$gt': now}}},
+            {'status': self.processing_status, 'lease_expires_at': {'$lt': now}},
+        ]}
+        if item_id is not None:
+            query['_id'] = item_id
+        doc = self._collection().find_one_and_update(
+            query,
+            {'$set': update, '$inc': {self.attempts_field: 1}},
+            sort=self.sort,
+            return_document=ReturnDocument.AFTER,
+        )
+        if not doc:
+            return None
+        self._count("claimed")
+        return token, doc
+
+    def renew_leases(self) -> int:
+        """Extend the leases of every in-flight item; returns how many are still held"""
+        with self._lock:
+            leases = list(self._leases.items())
+        expires = datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+        held = 0
+        for token, item_id in leases:
+            result = self._collection().update_one(
+                {'_id': item_id, 'lease_owner': token}, {'$set': {'lease_expires_at': expires}}
+            )
+            held += result.matched_count
+        return held
+
+    # --- Processing ---
+
+    def process(self, token: str, doc: Dict[str, Any]) -> str:
+        """Run the handler for a claimed item and settle it; returns the outcome"""
+        item = self.document_cls._from_son(doc)
+        with self._lock:
+            self._leases[token] = doc['_id']
+        started = time.perf_counter()
+        try:
+            result = self.handler(item)
+            if self.on_complete:
+                if not self._holds(token, doc):
+                    return self._lease_lost(doc)
+                self.on_complete(item, result)
+        except Exception as e:
+            return self._fail(token, doc, item, e)
+        finally:
+            with self._lock:
+                self._leases.pop(token, None)
+                self.metrics["handler_ms"] += (time.perf_counter() - started) * 1000.0
+        return self._complete(token, doc)
+
+    def _holds(self, token: str, doc: Dict[str, Any]) -> bool:
+        return self._collection().find_one({'_id': doc['_id'], 'lease_owner': token}, {'_id': 1}) is not None
+
+    def _complete(self, token: str, doc: Dict[str, Any]) -> str:
+        now = datetime.utcnow()
+        update = {'status': self.done_status, 'lease_owner': None, 'lease_expires_at': None, 'next_attempt_at': None}
+        update.update({field: now for field in self.done_fields})
+        settled = self._collection().update_one({'_id': doc['_id'], 'lease_owner': token}, {'$set': update})
+        if not settled.matched_count:
+            return self._lease_lost(doc)
+        self._count("completed")
+        return "completed"
+
+    def _fail(self, token: str, doc: Dict[str, Any], item, error: Exception) -> str:
+        attempts = int(doc.get(self.attempts_field) or 0)
+        limit = self.max_attempts(item) if callable(self.max_attempts) else self.max_attempts
+        parked = attempts >= (limit or 1)
+        update = {self.error_field: str(error), 'lease_owner': None, 'lease_expires_at': None}
+        if parked:
+            update['status'] = self.failed_status
+            update['next_attempt_at'] = None
+        else:
+            delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** (attempts - 1))
+            update['status'] = self.ready_status
+            update['next_attempt_at'] = datetime.utcnow() + timedelta(seconds=delay)
+        result = self._collection().update_one({'_id': doc['_id'], 'lease_owner': token}, {'$set': update})
+        if not result.matched_count:
+            return self._lease_lost(doc)
+
+        outcome = "parked" if parked else "retried"
+        self._count(outcome)
+        logger.warning(f"[{self.name}] item {doc['_id']} attempt {attempts} failed ({outcome}): {error}")
+        if self.on_failure:
+            try:
+                self.on_failure(item, error, parked)
+            except Exception as hook_error:
+                logger.error(f"[{self.name}] on_failure hook failed: {hook_error}")
+        return outcome
+
+    def _lease_lost(self, doc: Dict[str, Any]) -> str:
+        # Another worker re-claimed the item after our lease expired; its result wins
+        self._count("lease_lost")
+        logger.warning(f"[{self.name}] lease lost for item {doc['_id']}")
+        return "lease_lost"
+
+    def _count(self, key: str):
+        with self._lock:
+            self.metrics[key] += 1
+
+    # --- Loops ---
+
+    def _drain(self, budget: Optional[list], stop: Optional[threading.Event]) -> None:
+        while not (stop and stop.is_set()):
+            if budget is not None:
+                with self._lock:
+                    if budget[0] <= 0:
+                        return
+                    budget[0] -= 1
+            claimed = self.claim()
+            if not claimed:
+                return
+            self.process(*claimed)
+
+    def run_once(self, limit: Optional[int] = None, stop: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """Process ready items with `concurrency` threads until the queue is empty (or `limit` claims)"""
+        before = self.snapshot()
+        budget = [limit] if limit is not None else None
+        heartbeat_stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(heartbeat_stop,), daemon=True)
+        heartbeat.start()
+        try:
+            if self.concurrency == 1:
+                self._drain(budget, stop)
+            else:
+                with ThreadPoolExecutor(max_workers=self.concurrency,
+                                        thread_name_prefix=f"queue-{self.name}") as pool:
+                    for future in [pool.submit(self._drain, budget, stop) for _ in range(self.concurrency)]:
+                        future.result()
+        finally:
+            heartbeat_stop.set()
+            heartbeat.join()
+        after = self.snapshot()
+        return {key: after[key] - before[key] for key in ("claimed", "completed", "retried", "parked", "lease_lost")}
+
+    def _heartbeat(self, stop: threading.Event):
+        interval = max(0.05, self.lease_seconds / 3.0)
+        while not stop.wait(interval):
+            try:
+                self.renew_leases()
+            except Exception as e:
+                logger.error(f"[{self.name}] lease renewal failed: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.metrics, in_flight=len(self._leases))
+
+
+class QueueWorker:
+    """Runs several QueueConsumers from one process"""
+
+    def __init__(self, consumers: Iterable[QueueConsumer], poll_interval: float = 2.0):
+        self.consumers = {consumer.name: consumer for consumer in consumers}
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+
+    def run_once(self) -> Dict[str, Dict[str, Any]]:
+        """Drain every queue once, each with its own threads; returns per-queue counts"""
+        with ThreadPoolExecutor(max_workers=max(1, len(self.consumers))) as pool:
+            futures = {name: pool.submit(consumer.run_once, None, self._stop)
+                       for name, consumer in self.consumers.items()}
+            return {name: future.result() for name, future in futures.items()}
+
+    def run_forever(self, report_every: float = 60.0):
+        """Poll all queues until stop() is called, logging per-queue metrics periodically"""
+        last_report = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Queue worker pass failed: {e}")
+            if time.monotonic() - last_report >= report_every:
+                logger.info(f"Queue metrics: {self.metrics()}")
+                last_report = time.monotonic()
+            self._stop.wait(self.poll_interval)
+
+    def stop(self):
+        self._stop.set()
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        return {name: consumer.snapshot() for name, consumer in self.consumers.items()}
@@ -58,6 +58,11 @@ class AutoUpgradeQueue(Document):
     error_message = StringField()
     retry_count = IntField(default=0)
     max_retries = IntField(default=3)
+
+    # Worker lease (core/queue_consumer.py)
+    lease_owner = StringField()
+    lease_expires_at = DateTimeField()
+    next_attempt_at = DateTimeField()
     
     # Timestamps
     queued_at = DateTimeField(default=datetime.utcnow)
@@ -71,7 +76,8 @@ class AutoUpgradeQueue(Document):
             'program',
             'status',
             'priority',
-            'queued_at'
+            'queued_at',
+            ('status', 'lease_expires_at')
         ]
     }
 
@@ -106,6 +112,9 @@ class AutoUpgradeLog(Document):
     tx_hash = StringField()
     blockchain_network = StringField(choices=['BSC', 'ETH', 'TRC20'], default='BSC')
     
+    # AutoUpgradeQueue entry this upgrade settled
+    queue_id = ObjectIdField()
+    
     # Status
     status = StringField(choices=['completed', 'failed', 'refunded'], default='completed')
     completed_at = DateTimeField(default=datetime.utcnow)
@@ -120,7 +129,9 @@ class AutoUpgradeLog(Document):
             'program',
             'trigger_type',
             'status',
-            'completed_at'
+            'completed_at',
+            # One log per queue entry, however often the entry is delivered
+            {'fields': ['queue_id'], 'unique': True, 'sparse': True}
         ]
     }
 
@@ -9,7 +9,8 @@ from .model import (
     MatrixAutoUpgrade, GlobalPhaseProgression, AutoUpgradeSettings,
     AutoUpgradeEarnings, AutoUpgradeTrigger
 )
-from ..wallet.model import ReserveLedger
+from ..wallet.reserve_account_service import ReserveAccountService
+from core.queue_consumer import QueueConsumer, record_once
 
 class AutoUpgradeService:
     """Auto Upgrade System Business Logic Service"""
@@ -23,18 +24,7 @@ class AutoUpgradeService:
             status = GlobalPhaseProgression.objects(user_id=ObjectId(user_id)).first()
             if not status:
                 return {"success": False, "error": "Global status not found"}
-            # Compute balance after is not tracked per-user here; store amount and metadata
-            ReserveLedger(
-                user_id=ObjectId(user_id),
-                program='global',
-                slot_no=slot_no,
-                amount=Decimal(str(amount)),
-                direction='credit',
-                source='income',
-                balance_after=Decimal('0'),
-                tx_hash=tx_hash,
-                created_at=datetime.utcnow()
-            ).save()
+            ReserveAccountService().credit(user_id, 'global', slot_no, amount, 'income', tx_hash=tx_hash)
             return {"success": True}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -91,8 +81,8 @@ class AutoUpgradeService:
             
             queue_entry.save()
             
-            # Process the upgrade
-            result = self._process_upgrade_queue_entry(queue_entry)
+            # Process the upgrade now, settled under a lease like the queue workers
+            self._process_queued_entry(queue_entry)
             
             return {
                 "success": True,
@@ -160,8 +150,8 @@ class AutoUpgradeService:
             
             queue_entry.save()
             
-            # Process the upgrade
-            result = self._process_upgrade_queue_entry(queue_entry)
+            # Process the upgrade now, settled under a lease like the queue workers
+            self._process_queued_entry(queue_entry)
             
             return {
                 "success": True,
@@ -235,32 +225,38 @@ class AutoUpgradeService:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
+    def queue_consumer(self, concurrency: int = 1, **kwargs) -> QueueConsumer:
+        """Lease-based consumer for the auto upgrade queue (safe to run from several workers)"""
+        def handle(entry: AutoUpgradeQueue) -> Dict[str, Any]:
+            result = self._process_upgrade_queue_entry(entry)
+            if not result['success']:
+                raise RuntimeError(result['error'])
+            return result
+
+        return QueueConsumer(
+            'auto_upgrade', AutoUpgradeQueue, handle,
+            ready_status='pending', attempts_field='retry_count', error_field='error_message',
+            done_fields=('completed_at',), sort=(('priority', -1), ('queued_at', 1)),
+            max_attempts=lambda entry: entry.max_retries, concurrency=concurrency,
+            on_complete=self._record_upgrade, **kwargs
+        )
+
+    def _process_queued_entry(self, queue_entry: AutoUpgradeQueue) -> str:
+        """Lease a just-queued entry and process it now; returns the consumer outcome"""
+        consumer = self.queue_consumer()
+        claimed = consumer.claim(queue_entry.id)
+        if not claimed:
+            # A queue worker leased it first and will settle it
+            return "claimed_elsewhere"
+        return consumer.process(*claimed)
+
     def process_auto_upgrade_queue(self, batch_size: int = 10) -> Dict[str, Any]:
         """Process pending auto upgrades in batch"""
         try:
-            # Get pending queue entries
-            pending_entries = AutoUpgradeQueue.objects(status='pending').order_by('-priority', 'queued_at').limit(batch_size)
-            
-            processed_count = 0
-            failed_count = 0
-            
-            for entry in pending_entries:
-                try:
-                    result = self._process_upgrade_queue_entry(entry)
-                    if result['success']:
-                        processed_count += 1
-                    else:
-                        failed_count += 1
-                        entry.status = 'failed'
-                        entry.error_message = result['error']
-                        entry.save()
-                        
-                except Exception as e:
-                    failed_count += 1
-                    entry.status = 'failed'
-                    entry.error_message = str(e)
-                    entry.save()
-            
+            result = self.queue_consumer().run_once(limit=batch_size)
+            processed_count = result['completed']
+            failed_count = result['retried'] + result['parked']
+
             return {
                 "success": True,
                 "processed_count": processed_count,
@@ -460,7 +456,6 @@ class AutoUpgradeService:
         """Process Slot 2+ activation - tree upline reserve logic"""
         try:
             from ..tree.model import TreePlacement
-            from ..wallet.model import ReserveLedger
             from ..slot.model import SlotActivation
             
             print(f"[BINARY_ROUTING] Processing slot {slot_no} for user {user_id}, amount {slot_value}")
@@ -513,17 +508,7 @@ class AutoUpgradeService:
                 # Route 100% to Nth upline reserve for its next slot (slot_no + 1)
                 try:
                     print(f"[BINARY_ROUTING] ✅ Routing {slot_value} BNB to {nth_upline}'s reserve for slot {slot_no + 1}")
-                    reserve_entry = ReserveLedger(
-                        user_id=nth_upline,
-                        program='binary',
-                        slot_no=slot_no + 1,
-                        amount=slot_value,
-                        direction='credit',
-                        source='tree_upline_reserve',
-                        balance_after=Decimal('0'),
-                        created_at=datetime.utcnow()
-                    )
-                    reserve_entry.save()
+                    ReserveAccountService().credit(nth_upline, 'binary', slot_no + 1, slot_value, 'tree_upline_reserve')
                     print(f"[BINARY_ROUTING] ✅ ReserveLedger created: user={nth_upline}, slot={slot_no + 1}, amount={slot_value}")
                 except Exception as e:
                     print(f"[BINARY_ROUTING] Failed to create ReserveLedger: {e}")
@@ -848,24 +833,12 @@ class AutoUpgradeService:
     def _check_binary_auto_upgrade_from_reserve(self, user_id: ObjectId, target_slot_no: int) -> Dict[str, Any]:
         """Check if auto upgrade is possible from reserve funds and trigger it"""
         try:
-            from ..wallet.model import ReserveLedger
             from ..slot.model import SlotActivation
-            
-            # Calculate total reserve for this user and slot (both credits and debits)
-            reserve_entries = list(ReserveLedger.objects(
-                user_id=user_id,
-                program='binary',
-                slot_no=target_slot_no
-            ))
-            
-            # Calculate total reserve (sum credits, subtract debits)
-            total_reserve = Decimal('0')
-            for entry in reserve_entries:
-                if entry.direction == 'credit':
-                    total_reserve += entry.amount
-                elif entry.direction == 'debit':
-                    total_reserve -= entry.amount
-            
+
+            # Running reserve balance for this user and slot
+            reserve_accounts = ReserveAccountService()
+            total_reserve = reserve_accounts.get_balance(user_id, 'binary', target_slot_no)
+
             # Get target slot cost
             target_slot_cost = self._get_binary_slot_cost(target_slot_no)
 
@@ -888,15 +861,33 @@ class AutoUpgradeService:
                 ).first()
                 
                 if existing_activation:
+                    reserve_accounts.mark_upgraded(user_id, 'binary', target_slot_no)
                     return {
                         "auto_upgrade_triggered": False,
                         "total_reserve": float(total_reserve),
                         "target_slot_cost": float(target_slot_cost),
                         "message": "Slot already activated"
                     }
-                
+
+                # Spend the reserve atomically: only one concurrent credit crossing the threshold wins
+                claim_tx = f"auto_reserve_debit_{target_slot_no}_{user_id}_{int(datetime.utcnow().timestamp())}"
+                claim = reserve_accounts.try_claim(user_id, 'binary', target_slot_no, target_slot_cost,
+                                                   source='auto_upgrade', tx_hash=claim_tx)
+                if not claim:
+                    return {
+                        "auto_upgrade_triggered": False,
+                        "total_reserve": float(total_reserve),
+                        "target_slot_cost": float(target_slot_cost),
+                        "message": "Auto upgrade already claimed"
+                    }
+
                 # Auto upgrade is possible - activate the slot directly from reserve
-                return self._auto_upgrade_from_reserve(user_id, target_slot_no, target_slot_cost, total_reserve)
+                result = self._auto_upgrade_from_reserve(user_id, target_slot_no, target_slot_cost,
+                                                         claim["balance_before"], reserve_debited=True)
+                if not result.get("auto_upgrade_triggered"):
+                    reserve_accounts.release_claim(user_id, 'binary', target_slot_no, target_slot_cost,
+                                                   source='auto_upgrade', tx_hash=f"release_{claim_tx}")
+                return result
             else:
                 return {
                     "auto_upgrade_triggered": False,
@@ -914,10 +905,10 @@ class AutoUpgradeService:
                 "error": str(e)
             }
     
-    def _auto_upgrade_from_reserve(self, user_id: ObjectId, slot_no: int, slot_cost: Decimal, total_reserve: Decimal) -> Dict[str, Any]:
-        """Directly activate a slot using reserve funds"""
+    def _auto_upgrade_from_reserve(self, user_id: ObjectId, slot_no: int, slot_cost: Decimal, total_reserve: Decimal,
+                                   reserve_debited: bool = False) -> Dict[str, Any]:
+        """Directly activate a slot using reserve funds (reserve_debited: the caller already claimed the cost)"""
         try:
-            from ..wallet.model import ReserveLedger
             from ..slot.model import SlotActivation
             from ..tree.model import TreePlacement
             
@@ -944,18 +935,12 @@ class AutoUpgradeService:
             #   - If no: Distribute via pools
             
             # Deduct from reserve by creating a debit entry (this happens first)
-            debit_entry = ReserveLedger(
-                user_id=user_id,
-                program='binary',
-                slot_no=slot_no,
-                amount=slot_cost,
-                direction='debit',
-                source='income',  # Using 'income' since reserve funds come from income routing
-                balance_after=total_reserve - slot_cost,
-                tx_hash=f"auto_reserve_debit_{slot_no}_{user_id}_{int(datetime.utcnow().timestamp())}",
-                created_at=datetime.utcnow()
-            )
-            debit_entry.save()
+            if not reserve_debited:
+                ReserveAccountService().debit(
+                    user_id, 'binary', slot_no, slot_cost,
+                    'income',  # Using 'income' since reserve funds come from income routing
+                    tx_hash=f"auto_reserve_debit_{slot_no}_{user_id}_{int(datetime.utcnow().timestamp())}"
+                )
             print(f"[BINARY_ROUTING] ✅ ReserveLedger debit created: user={user_id}, slot={slot_no}, amount={slot_cost}")
             
             # IMPORTANT: When a slot auto-upgrades from reserve, the slot_cost must follow
@@ -1015,17 +1000,10 @@ class AutoUpgradeService:
                         if is_first_second_cost:
                             # Route to Nth upline's reserve for slot N+1 (cascade)
                             try:
-                                cascade_reserve_entry = ReserveLedger(
-                                    user_id=nth_upline_for_cost,
-                                    program='binary',
-                                    slot_no=slot_no + 1,
-                                    amount=slot_cost,
-                                    direction='credit',
-                                    source='tree_upline_reserve',  # Changed from 'tree_upline_reserve_cascade' (not in model choices)
-                                    balance_after=Decimal('0'),
-                                    created_at=datetime.utcnow()
+                                ReserveAccountService().credit(
+                                    nth_upline_for_cost, 'binary', slot_no + 1, slot_cost,
+                                    'tree_upline_reserve'  # Changed from 'tree_upline_reserve_cascade' (not in model choices)
                                 )
-                                cascade_reserve_entry.save()
                                 print(f"[BINARY_ROUTING] ✅ Cascaded slot {slot_no} cost ({slot_cost} BNB) to {nth_upline_for_cost}'s reserve for slot {slot_no + 1}")
                                 
                                 # Check if this triggers another auto-upgrade (CASCADE OF CASCADE)
@@ -1176,20 +1154,19 @@ class AutoUpgradeService:
             Dict with success status and activation details
         """
         try:
-            from ..wallet.model import ReserveLedger, WalletLedger
+            from ..wallet.model import WalletLedger
             from ..slot.model import SlotActivation
             from ..wallet.service import WalletService
-            from ..user.tree_reserve_service import TreeUplineReserveService
             from ..user.model import User
-            
+
             user_oid = ObjectId(user_id)
             slot_cost = self._get_binary_slot_cost(slot_no)
-            
+
             print(f"[MANUAL_UPGRADE] Starting manual upgrade for user {user_id} to slot {slot_no}, cost={slot_cost}")
-            
+
             # Get reserve balance
-            reserve_service = TreeUplineReserveService()
-            reserve_balance = reserve_service.get_reserve_balance(user_id, 'binary', slot_no)
+            reserve_accounts = ReserveAccountService()
+            reserve_balance = reserve_accounts.get_balance(user_id, 'binary', slot_no)
             
             print(f"[MANUAL_UPGRADE] Reserve balance: {reserve_balance}, Slot cost: {slot_cost}")
             
@@ -1212,34 +1189,10 @@ class AutoUpgradeService:
                     }
             
             # Deduct from reserve (if any)
+            reserve_debit_tx = tx_hash or f"manual_reserve_debit_{slot_no}_{user_id}_{int(datetime.utcnow().timestamp())}"
             if reserve_amount > 0:
-                # Calculate new reserve balance after debit
-                reserve_entries = list(ReserveLedger.objects(
-                    user_id=user_oid,
-                    program='binary',
-                    slot_no=slot_no
-                ))
-                current_reserve_total = Decimal('0')
-                for entry in reserve_entries:
-                    if entry.direction == 'credit':
-                        current_reserve_total += entry.amount
-                    elif entry.direction == 'debit':
-                        current_reserve_total -= entry.amount
-                
-                new_reserve_balance = current_reserve_total - reserve_amount
-                
-                reserve_debit = ReserveLedger(
-                    user_id=user_oid,
-                    program='binary',
-                    slot_no=slot_no,
-                    amount=reserve_amount,
-                    direction='debit',
-                    source='manual_upgrade',
-                    balance_after=new_reserve_balance,
-                    tx_hash=tx_hash or f"manual_reserve_debit_{slot_no}_{user_id}_{int(datetime.utcnow().timestamp())}",
-                    created_at=datetime.utcnow()
-                )
-                reserve_debit.save()
+                new_reserve_balance = reserve_accounts.debit(user_oid, 'binary', slot_no, reserve_amount, 'manual',
+                                                             tx_hash=reserve_debit_tx)
                 print(f"[MANUAL_UPGRADE] ✅ Reserve debit: {reserve_amount} BNB, new balance: {new_reserve_balance}")
             
             # Deduct from wallet (if any)
@@ -1257,18 +1210,8 @@ class AutoUpgradeService:
                     # Rollback reserve debit if wallet debit fails
                     if reserve_amount > 0:
                         # Create a credit to reverse the debit
-                        reserve_credit = ReserveLedger(
-                            user_id=user_oid,
-                            program='binary',
-                            slot_no=slot_no,
-                            amount=reserve_amount,
-                            direction='credit',
-                            source='manual_upgrade_rollback',
-                            balance_after=current_reserve_total,  # Restore original balance
-                            tx_hash=f"rollback_{reserve_debit.tx_hash}" if reserve_amount > 0 else None,
-                            created_at=datetime.utcnow()
-                        )
-                        reserve_credit.save()
+                        reserve_accounts.credit(user_oid, 'binary', slot_no, reserve_amount, 'manual',
+                                                tx_hash=f"rollback_{reserve_debit_tx}")
                     
                     return {
                         "success": False,
@@ -1380,7 +1323,6 @@ class AutoUpgradeService:
         - If not active: send that portion to mother wallet (only for level distribution)
         """
         try:
-            from ..wallet.model import ReserveLedger
             from ..slot.model import SlotActivation
             from ..wallet.service import WalletService
             from ..tree.model import TreePlacement
@@ -1446,17 +1388,10 @@ class AutoUpgradeService:
                     if is_first_second:
                         # Route to Nth upline's reserve for slot N+1 (cascade)
                         try:
-                            cascade_reserve_entry = ReserveLedger(
-                                user_id=nth_upline,
-                                program='binary',
-                                slot_no=slot_no + 1,
-                                amount=slot_cost,
-                                direction='credit',
-                                source='tree_upline_reserve',  # Same as auto-upgrade cascade
-                                balance_after=Decimal('0'),
-                                created_at=datetime.utcnow()
+                            ReserveAccountService().credit(
+                                nth_upline, 'binary', slot_no + 1, slot_cost,
+                                'tree_upline_reserve'  # Same as auto-upgrade cascade
                             )
-                            cascade_reserve_entry.save()
                             print(f"[MANUAL_UPGRADE] ✅ Routed slot {slot_no} cost ({slot_cost} BNB) to {nth_upline}'s reserve for slot {slot_no + 1}")
                             
                             # Check if this triggers auto-upgrade (CASCADE)
@@ -1672,18 +1607,16 @@ class AutoUpgradeService:
             return {"success": False, "error": str(e)}
     
     def _process_upgrade_queue_entry(self, queue_entry: AutoUpgradeQueue) -> Dict[str, Any]:
-        """Process a single upgrade queue entry"""
+        """
+        Work out the upgrade for a leased queue entry.
+        Nothing is written here: _record_upgrade saves the log while the queue consumer
+        still holds the entry's lease, and the consumer then settles the entry.
+        """
         try:
-            # Update queue entry status
-            queue_entry.status = 'processing'
-            queue_entry.processed_at = datetime.utcnow()
-            queue_entry.save()
-            
             # Calculate earnings used
             queue_entry.earnings_used = min(queue_entry.earnings_available, queue_entry.upgrade_cost)
-            queue_entry.save()
             
-            # Create upgrade log
+            # Build upgrade log
             upgrade_log = AutoUpgradeLog(
                 user_id=queue_entry.user_id,
                 program=queue_entry.program,
@@ -1697,25 +1630,29 @@ class AutoUpgradeService:
                 profit_gained=queue_entry.earnings_available - queue_entry.upgrade_cost,
                 trigger_type=queue_entry.trigger.trigger_type if queue_entry.trigger else 'manual',
                 contributors=queue_entry.earnings_source,
+                queue_id=queue_entry.id,
                 status='completed',
                 completed_at=datetime.utcnow()
             )
-            upgrade_log.save()
-            
-            # Update queue entry
-            queue_entry.status = 'completed'
-            queue_entry.completed_at = datetime.utcnow()
-            queue_entry.save()
             
             return {
                 "success": True,
-                "upgrade_log_id": str(upgrade_log.id),
+                "upgrade_log": upgrade_log,
+                "earnings_used": queue_entry.earnings_used,
                 "message": "Upgrade processed successfully"
             }
             
         except Exception as e:
             return {"success": False, "error": str(e)}
     
+    def _record_upgrade(self, queue_entry: AutoUpgradeQueue, result: Dict[str, Any]) -> None:
+        """
+        Save the upgrade log of a leased entry before it is settled (QueueConsumer on_complete).
+        Both writes are idempotent for a redelivered entry: a $set, and one log per queue_id.
+        """
+        AutoUpgradeQueue.objects(id=queue_entry.id).update_one(set__earnings_used=result['earnings_used'])
+        record_once(result['upgrade_log'])
+    
     def _move_to_phase_2(self, global_status: GlobalPhaseProgression) -> Dict[str, Any]:
         """Move user from Phase 1 to Phase 2"""
         try:
@@ -1869,10 +1806,142 @@ class AutoUpgradeService:
         return {"success": True, "message": "Global status updated"}
 
     def check_cascade_auto_upgrade_up_to_17_levels(self, new_user_id: str) -> Dict[str, Any]:
+        """
+        Check cascade auto-upgrade for the new user's 17 uplines, evaluating only the
+        (upline, slot) pairs that can actually trigger.
+
+        A pair can only auto-upgrade when its open reserve covers the slot cost and the
+        slot is not active yet, so the upline chain, their reserve accounts and their
+        activations are read once in batches and every other pair is skipped.
+        Triggering goes through _check_binary_auto_upgrade_from_reserve exactly as the
+        brute-force check (_check_cascade_auto_upgrade_brute_force) does.
+
+        Args:
+            new_user_id: The newly created user ID
+
+        Returns:
+            Dict with results of the cascade check, including evaluated vs skipped pairs
+        """
+        try:
+            from ..tree.model import TreePlacement
+            from ..slot.model import SlotActivation
+
+            print(f"[CASCADE_CHECK] Starting targeted cascade auto-upgrade check for user {new_user_id} up to 17 levels")
+
+            max_level = 17
+            slots_to_check = range(1, 17)  # Valid binary slots only (1-16)
+
+            # Walk the upline chain once (one projected read per level)
+            uplines = []
+            current_id = ObjectId(new_user_id)
+            while len(uplines) < max_level:
+                placement = TreePlacement.objects(
+                    user_id=current_id,
+                    program='binary',
+                    slot_no=1,
+                    is_active=True
+                ).only('upline_id', 'parent_id').as_pymongo().first()
+                if not placement:
+                    if not uplines and current_id == ObjectId(new_user_id):
+                        print(f"[CASCADE_CHECK] No placement found for user {new_user_id}")
+                        return {"success": False, "error": "No placement found for new user"}
+                    break
+                current_id = placement.get('upline_id') or placement.get('parent_id')
+                if not current_id or current_id in uplines:
+                    break
+                uplines.append(current_id)
+
+            reserve_accounts = ReserveAccountService()
+
+            def load_candidates():
+                # Open reserves that cover the slot cost, minus slots that are already active
+                balances = reserve_accounts.get_open_balances(uplines, 'binary')
+                activations = SlotActivation.objects(
+                    user_id__in=uplines,
+                    program='binary',
+                    status='completed'
+                ).only('user_id', 'slot_no').as_pymongo()
+                active = {(a['user_id'], a['slot_no']) for a in activations}
+                counts = {}
+                for user_id, _ in active:
+                    counts[user_id] = counts.get(user_id, 0) + 1
+                pairs = {
+                    key for key, balance in balances.items()
+                    if key[1] in slots_to_check and key not in active
+                    and balance >= self._get_binary_slot_cost(key[1])
+                }
+                return pairs, counts
+
+            candidates, activated_counts = load_candidates()
+
+            results = {
+                "levels_checked": [],
+                "auto_upgrades_triggered": [],
+                "total_levels": 0,
+                "total_checks": 0,
+                "pairs_evaluated": 0,
+                "pairs_skipped": 0
+            }
+
+            for level, upline_id in enumerate(uplines, start=1):
+                level_result = {
+                    "level": level,
+                    "upline_id": str(upline_id),
+                    "activated_slots": activated_counts.get(upline_id, 0),
+                    "checks_performed": []
+                }
+
+                for slot_no in slots_to_check:
+                    if (upline_id, slot_no) not in candidates:
+                        results["pairs_skipped"] += 1
+                        continue
+
+                    try:
+                        auto_upgrade_result = self._check_binary_auto_upgrade_from_reserve(upline_id, slot_no)
+                    except Exception as e:
+                        print(f"[CASCADE_CHECK] Error checking slot {slot_no} for upline {upline_id}: {e}")
+                        continue
+
+                    level_result["checks_performed"].append({
+                        "slot_no": slot_no,
+                        "auto_upgrade_triggered": auto_upgrade_result.get("auto_upgrade_triggered", False),
+                        "message": auto_upgrade_result.get("message", "")
+                    })
+                    results["total_checks"] += 1
+                    results["pairs_evaluated"] += 1
+
+                    if auto_upgrade_result.get("auto_upgrade_triggered"):
+                        results["auto_upgrades_triggered"].append({
+                            "level": level,
+                            "upline_id": str(upline_id),
+                            "slot_no": slot_no
+                        })
+                        print(f"[CASCADE_CHECK] ✅ Auto-upgrade triggered for upline {upline_id} at level {level}, slot {slot_no}")
+                        # The upgrade routes its cost into higher uplines' reserves; re-read candidates
+                        candidates, activated_counts = load_candidates()
+
+                results["levels_checked"].append(level_result)
+                results["total_levels"] += 1
+
+            print(f"[CASCADE_CHECK] Completed targeted cascade check: {results['total_levels']} levels, {results['pairs_evaluated']} pairs evaluated, {results['pairs_skipped']} skipped, {len(results['auto_upgrades_triggered'])} auto-upgrades triggered")
+
+            return {
+                "success": True,
+                **results
+            }
+
+        except Exception as e:
+            print(f"[CASCADE_CHECK] Error in check_cascade_auto_upgrade_up_to_17_levels: {e}")
+            import traceback
+            traceback.print_exc()
+            return {"success": False, "error": str(e)}
+
+    def _check_cascade_auto_upgrade_brute_force(self, new_user_id: str) -> Dict[str, Any]:
         """
         Check cascade auto-upgrade for all slots up to 17 levels in the upline.
         For each level N (1-17), if that level has N slots activated, check level N+1.
         Also check auto-upgrade for each slot in each upline.
+        Reference implementation for check_cascade_auto_upgrade_up_to_17_levels.
         
         Args:
             new_user_id: The newly created user ID
@@ -2042,7 +2111,7 @@ class AutoUpgradeService:
             }
             
         except Exception as e:
-            print(f"[CASCADE_CHECK] Error in check_cascade_auto_upgrade_up_to_17_levels: {e}")
+            print(f"[CASCADE_CHECK] Error in _check_cascade_auto_upgrade_brute_force: {e}")
             import traceback
             traceback.print_exc()
             return {"success": False, "error": str(e)}
\ No newline at end of file
@@ -0,0 +1,3 @@
+# Batch Job Module
+# Scheduled, chunked and resumable runs of the batch_process_* operations
+# Run records and progress are exposed through the /jobs status API
@@ -0,0 +1,37 @@
+from mongoengine import Document, StringField, IntField, DateTimeField, DictField, ListField, DynamicField
+from datetime import datetime
+
+class BatchJobRun(Document):
+    """One run of a scheduled batch job (see core.batch_jobs); counts only, no per-user results"""
+    job_name = StringField(required=True)
+    active_job = StringField()  # = job_name while the run is running; unique, so one live run per job
+    status = StringField(choices=['running', 'completed', 'failed'], default='running')
+    trigger = StringField(choices=['schedule', 'api', 'manual', 'cli'], default='manual')
+    cursor = DynamicField()  # keyset key of the last candidate of the last completed wave
+    chunks_completed = IntField(default=0)
+    processed_count = IntField(default=0)
+    failed_count = IntField(default=0)
+    total_checked = IntField(default=0)
+    pending_processed = IntField(default=0)  # chunks finished in the wave in flight
+    pending_failed = IntField(default=0)
+    pending_checked = IntField(default=0)
+    totals = DictField()  # summed result fields, e.g. total_distributed
+    errors = ListField(DictField())  # last failures, capped
+    error = StringField()
+    resumed_count = IntField(default=0)
+    lease_owner = StringField()
+    lease_expires_at = DateTimeField()
+    heartbeat_at = DateTimeField()
+    started_at = DateTimeField(default=datetime.utcnow)
+    finished_at = DateTimeField()
+    created_at = DateTimeField(default=datetime.utcnow)
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'batch_job_run',
+        'indexes': [
+            {'fields': ['active_job'], 'unique': True, 'sparse': True},
+            ('job_name', '-created_at'),
+            ('status', 'lease_expires_at'),
+        ]
+    }
@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, Query
+from typing import Optional
+from auth.service import authentication_service
+from utils.response import success_response, error_response
+from .service import JOB_NAMES, get_run, list_runs, start_job
+
+router = APIRouter(prefix="/jobs", tags=["Batch Jobs"])
+
+
+def _forbidden(current_user: Optional[dict], action: str):
+    """403 response unless the caller is an admin (None when allowed)"""
+    if (current_user or {}).get("role") != "admin":
+        return error_response(f"Only admins can {action}", status_code=403)
+    return None
+
+
+@router.get("/")
+async def get_job_runs(job_name: Optional[str] = Query(None), limit: int = Query(20, ge=1, le=100),
+                       current_user: dict = Depends(authentication_service.verify_authentication)):
+    """Latest batch job runs, newest first (admins only)"""
+    denied = _forbidden(current_user, "view batch jobs")
+    if denied:
+        return denied
+    if job_name and job_name not in JOB_NAMES:
+        return error_response(f"Unknown batch job: {job_name}", status_code=404)
+    return success_response({"runs": list_runs(job_name, limit)}, "Batch job runs retrieved successfully")
+
+
+@router.post("/{job_name}/run")
+async def run_batch_job(job_name: str, current_user: dict = Depends(authentication_service.verify_authentication)):
+    """Start a run in the background (admins only); poll GET /jobs/runs/{run_id} for progress"""
+    denied = _forbidden(current_user, "start batch jobs")
+    if denied:
+        return denied
+    if job_name not in JOB_NAMES:
+        return error_response(f"Unknown batch job: {job_name}", status_code=404)
+    result = start_job(job_name, trigger='api')
+    if not result.get("success"):
+        return error_response(result.get("error"), status_code=409, data=result.get("run"))
+    return success_response(result["run"], "Batch job started", status_code=202)
+
+
+@router.get("/runs/{run_id}")
+async def get_job_run(run_id: str, current_user: dict = Depends(authentication_service.verify_authentication)):
+    """Status and live counts of one run (admins only)"""
+    denied = _forbidden(current_user, "view batch jobs")
+    if denied:
+        return denied
+    run = get_run(run_id)
+    if not run:
+        return error_response("Batch job run not found", status_code=404)
+    return success_response(run, "Batch job run retrieved successfully")
@@ -0,0 +1,198 @@
+"""
+Batch Jobs
+Scheduled, chunked runs of the batch_process_* operations with persisted run records.
+
+Each job reads its candidates in _id order, processes them in chunks on a thread
+pool and records counts on a BatchJobRun document (core.batch_jobs). Runs of a
+crashed process are resumed after the last completed wave by the next start of
+the same job. Jobs that pay out of a single fund document (Royal Captain,
+President Reward, Triple Entry, Spark) run one chunk at a time, since those
+payouts read, deduct and save the fund. slot_roster_rebuild has no interval: it is
+the one-off backfill of the slot rosters, started by hand after deploying them.
+
+Usage:
+    python -m modules.batch_job.service [--jobs global_auto_upgrades ...] [--due]
+"""
+
+import argparse
+import importlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+
+from core.batch_jobs import BatchJob, BatchJobRunner, list_candidates, query_candidates
+from .model import BatchJobRun
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+
+
+def _global_service():
+    return importlib.import_module('modules.global.service').GlobalService()
+
+
+def _newcomer_service():
+    from modules.newcomer_growth_support.service import NewcomerGrowthSupportService
+    return NewcomerGrowthSupportService()
+
+
+def _pending_upline_funds(after, limit: int):
+    """Uplines with matured newcomer growth upline funds, in user_id order"""
+    from modules.income.model import IncomeEvent
+    match = {
+        'income_type': 'newcomer_growth_upline_fund',
+        'status': 'pending_distribution',
+        'distribution_date': {'$lte': datetime.utcnow()},
+    }
+    pipeline = [{'$match': match}, {'$group': {'_id': '$user_id'}}]
+    if after is not None:
+        pipeline.append({'$match': {'_id': {'$gt': after}}})
+    pipeline += [{'$sort': {'_id': 1}}, {'$limit': limit}]
+    return [(row['_id'], str(row['_id'])) for row in IncomeEvent._get_collection().aggregate(pipeline)]
+
+
+def _rebuild_slot_roster(program: str) -> Dict[str, Any]:
+    from modules.slot.roster_service import SlotRosterService
+    return {"success": True, "added": SlotRosterService().rebuild(program)}
+
+
+def build_jobs() -> List[BatchJob]:
+    from modules.auto_upgrade.model import GlobalPhaseProgression
+    from modules.slot.roster_service import PROGRAMS
+    from modules.user.model import User
+
+    return [
+        BatchJob(
+            'global_auto_upgrades',
+            query_candidates(GlobalPhaseProgression, {
+                'auto_progression_enabled': True, 'next_phase_ready': True, 'current_slot_no': {'$lt': 16}
+            }, arg_field='user_id'),
+            lambda user_id: _global_service().check_and_process_auto_upgrade(user_id),
+            interval_seconds=10 * MINUTE, description="Global phase auto-upgrades",
+        ),
+        BatchJob(
+            'global_royal_captain_bonuses',
+            query_candidates(User, {'matrix_joined': True, 'global_joined': True}),
+            lambda user_id: _global_service().check_and_process_royal_captain_bonus(user_id),
+            concurrency=1, interval_seconds=HOUR, description="Royal Captain Bonus",
+        ),
+        BatchJob(
+            'global_president_rewards',
+            query_candidates(User, {'global_joined': True}),
+            lambda user_id: _global_service().check_and_process_president_reward(user_id),
+            concurrency=1, interval_seconds=HOUR, description="President Reward",
+        ),
+        BatchJob(
+            'global_triple_entry_rewards',
+            query_candidates(User, {'binary_joined': True, 'matrix_joined': True, 'global_joined': True}),
+            lambda user_id: _global_service().check_and_process_triple_entry_reward(user_id),
+            concurrency=1, interval_seconds=HOUR, description="Triple Entry Reward",
+        ),
+        BatchJob(
+            'global_spark_bonus_distributions',
+            list_candidates(range(1, 15)),
+            lambda slot_number: _global_service().process_spark_bonus_distribution(slot_number),
+            chunk_size=1, concurrency=1, interval_seconds=24 * HOUR, description="Spark Bonus, Matrix slots 1-14",
+        ),
+        BatchJob(
+            'newcomer_growth_monthly_distribution',
+            _pending_upline_funds,
+            lambda upline_id: _newcomer_service().process_monthly_distribution(upline_id),
+            interval_seconds=24 * HOUR, sum_fields=('total_distributed',),
+            description="Newcomer Growth Support monthly upline distribution",
+        ),
+        BatchJob(
+            'slot_roster_rebuild',
+            list_candidates(PROGRAMS),
+            _rebuild_slot_roster,
+            chunk_size=1, concurrency=1, sum_fields=('added',),
+            description="Slot roster backfill from past activations (marks each program's roster built)",
+        ),
+    ]
+
+
+JOB_NAMES = tuple(job.name for job in build_jobs())
+
+_runner: Optional[BatchJobRunner] = None
+
+
+def get_runner() -> BatchJobRunner:
+    global _runner
+    if _runner is None:
+        _runner = BatchJobRunner(BatchJobRun, build_jobs())
+    return _runner
+
+
+def run_job(name: str, trigger: str = 'manual') -> Dict[str, Any]:
+    """
+    Run a job to the end and return its counts in the shape of the old batch methods
+    ({"success", "processed_count", "failed_count", "total_checked", ...}, no results list)
+    """
+    result = get_runner().run(name, trigger)
+    run = result.get("run") or {}
+    if not result.get("success"):
+        return {"success": False, "error": result.get("error"), "run_id": run.get("run_id")}
+    print(f"[BATCH_JOB] {name} completed: {run['processed_count']} successful, {run['failed_count']} failed")
+    return {
+        "success": True,
+        "run_id": run["run_id"],
+        "processed_count": run["processed_count"],
+        "failed_count": run["failed_count"],
+        "total_checked": run["total_checked"],
+        "totals": run["totals"],
+        "errors": run["errors"],
+    }
+
+
+def start_job(name: str, trigger: str = 'api') -> Dict[str, Any]:
+    """Claim a run and execute it on a background thread; returns the run status right away"""
+    import threading
+
+    runner = get_runner()
+    claimed = runner.start(name, trigger)
+    if not claimed:
+        active = BatchJobRun._get_collection().find_one({'active_job': name})
+        return {"success": False, "error": f"Batch job {name} is already running",
+                "run": runner.summary(active) if active else None}
+    token, run = claimed
+    threading.Thread(target=runner.execute, args=(token, run), name=f"batch-{name}", daemon=True).start()
+    return {"success": True, "run": runner.summary(run)}
+
+
+def get_run(run_id: str) -> Optional[Dict[str, Any]]:
+    if not ObjectId.is_valid(run_id):
+        return None
+    return get_runner().get(ObjectId(run_id))
+
+
+def list_runs(job_name: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+    query = {'job_name': job_name} if job_name else {}
+    rows = BatchJobRun._get_collection().find(query).sort('created_at', -1).limit(limit)
+    return [get_runner().summary(row) for row in rows]
+
+
+def run_due() -> Dict[str, Dict[str, Any]]:
+    """Scheduler tick: run every job whose interval elapsed (or whose last run was abandoned)"""
+    return get_runner().run_due()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run scheduled batch jobs")
+    parser.add_argument('--jobs', nargs='+', choices=JOB_NAMES)
+    parser.add_argument('--due', action='store_true', help="Run only the jobs that are due")
+    args = parser.parse_args(argv)
+
+    from core.db import connect_to_db
+    connect_to_db()
+
+    if args.due:
+        results = run_due()
+    else:
+        results = {name: run_job(name, trigger='cli') for name in (args.jobs or JOB_NAMES)}
+    for name, result in results.items():
+        print(f"[BATCH_JOB] {name}: {result}")
+
+
+if __name__ == '__main__':
+    main()
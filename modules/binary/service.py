@@ -1018,6 +1018,7 @@ class BinaryService:
         """Get team structure for a specific slot"""
         try:
             from ..tree.model import TreePlacement
+            from ..tree.subtree_service import SubtreeService
             
             # Get direct team members under this user
             # Use parent_id for direct referrals count (not tree placement)
@@ -1026,20 +1027,9 @@ class BinaryService:
                 parent_id=user_oid
             ).count()
             
-            # Get total team members (recursive count)
-            def count_total_team(parent_id):
-                total = 0
-                # Use upline_id for tree structure traversal
-                children = TreePlacement.objects(
-                    program='binary',
-                    upline_id=parent_id
-                )
-                for child in children:
-                    total += 1
-                    total += count_total_team(child.user_id)
-                return total
-            
-            total_members = count_total_team(user_oid)
+            # Get total team members (all levels, one query per tree level)
+            # Use upline_id for tree structure traversal
+            total_members = SubtreeService.count_descendants(user_oid, program='binary')
             
             # Calculate tree levels based on team size
             tree_levels = min(6, max(1, direct_members + 1))
@@ -1509,108 +1499,38 @@ class BinaryService:
         Maximum 7 users: 1 (root) + 2 (level 1) + 4 (level 2) = 7
         Returns (root_node, max_depth, total_count).
         Each node has: id, type, userId, level, position, directDownline (array of child nodes).
+
+        Children are read one tree level at a time (SubtreeService), so the whole
+        view costs max_levels - 1 TreePlacement queries plus one User query.
         """
         try:
-            from ..tree.model import TreePlacement
-            from ..user.model import User
-            
+            from ..tree.subtree_service import SubtreeService
+
+            positions = ('left', 'right')
+            # Use upline_id to get actual tree placement children (not direct referrals);
+            # only the first left and first right child are descended into
+            children_map = SubtreeService.fetch_children_map(
+                user_oid,
+                program='binary',
+                max_depth=max_levels - 1,
+                expand=lambda _link, children: SubtreeService.first_by_position(children, positions),
+            )
+            users = SubtreeService.load_users(SubtreeService.collect_user_ids(user_oid, children_map), 'uid')
+
             # Helper to get display id
             def display_id(oid) -> str:
-                try:
-                    u = User.objects(id=oid).only('uid').first()
-                    return str(u.uid) if u and u.uid else str(oid)
-                except Exception:
-                    return str(oid)
-            
-            # Counter for node IDs
-            node_id_counter = [0]
-            total_count = [0]
-            
-            # Helper to build node recursively with level limit
-            def build_node(parent_oid, level: int, position: str) -> Dict[str, Any]:
-                # Stop if we've exceeded max levels (0-indexed, so level 0, 1, 2 for max_levels=3)
-                if level >= max_levels:
-                    return None
-                
-                # Increment total count
-                total_count[0] += 1
-                
-                # Get current node ID and increment counter
-                current_id = node_id_counter[0]
-                node_id_counter[0] += 1
-                
-                # Determine node type
-                node_type = "self" if level == 0 else "downLine"
-                
-                # Create the node
-                node = {
-                    "id": current_id,
-                    "type": node_type,
-                    "userId": display_id(parent_oid),
+                u = users.get(str(oid))
+                return str(u.uid) if u and u.uid else str(oid)
+
+            def make_node(oid, level: int, position: str, _tree_parent_oid) -> Dict[str, Any]:
+                return {
+                    "type": "self" if level == 0 else "downLine",
+                    "userId": display_id(oid),
                     "level": level,
                     "position": position
                 }
-                
-                # Only get children if we're not at the last level
-                if level < max_levels - 1:
-                    # Get direct children from TreePlacement (only take first left and first right)
-                    # This ensures binary tree structure (max 2 children per node)
-                    # Use upline_id to get actual tree placement children (not direct referrals)
-                    left_child = TreePlacement.objects(
-                        program='binary',
-                        upline_id=parent_oid,
-                        position='left'
-                    ).order_by('created_at').first()
-                    
-                    right_child = TreePlacement.objects(
-                        program='binary',
-                        upline_id=parent_oid,
-                        position='right'
-                    ).order_by('created_at').first()
-                    
-                    # Build directDownline array
-                    direct_downline = []
-                    
-                    # Add left child first
-                    if left_child:
-                        left_node = build_node(
-                            left_child.user_id,
-                            level + 1,
-                            'left'
-                        )
-                        if left_node:
-                            direct_downline.append(left_node)
-                    
-                    # Add right child second
-                    if right_child:
-                        right_node = build_node(
-                            right_child.user_id,
-                            level + 1,
-                            'right'
-                        )
-                        if right_node:
-                            direct_downline.append(right_node)
-                    
-                    # Add directDownline array to node if there are children
-                    if direct_downline:
-                        node["directDownline"] = direct_downline
-                
-                return node
-            
-            # Start building from root
-            root_node = build_node(user_oid, 0, "root")
-            
-            # Calculate max depth by traversing the tree
-            def calculate_depth(node: Dict[str, Any]) -> int:
-                if not node:
-                    return 0
-                if "directDownline" not in node or not node["directDownline"]:
-                    return node.get("level", 0)
-                return max(calculate_depth(child) for child in node["directDownline"])
-            
-            max_depth = calculate_depth(root_node) if root_node else 0
-            
-            return root_node, max_depth, total_count[0]
+
+            return SubtreeService.build_nested(user_oid, children_map, max_levels, positions, make_node)
             
         except Exception as e:
             print(f"Error in _build_nested_binary_tree_limited: {e}")
@@ -1,4 +1,4 @@
-from mongoengine import Document, StringField, ObjectIdField, DictField, DateTimeField, BooleanField
+from mongoengine import Document, StringField, ObjectIdField, DictField, DateTimeField, BooleanField, IntField
 from datetime import datetime
 
 class BlockchainEvent(Document):
@@ -7,16 +7,21 @@ class BlockchainEvent(Document):
     event_type = StringField(choices=[
         'join_payment', 'slot_activated', 'income_distributed', 'upgrade_triggered',
         'spillover_occurred', 'jackpot_settled', 'spark_distributed',
-        'matrix_placement', 'matrix_automatic_recycle'
+        'matrix_placement', 'matrix_automatic_recycle', 'contract_event'
     ], required=True)
     event_data = DictField(required=True)
+    # On-chain position, set for contract events written by the indexer
+    # (their tx_hash is "<transaction hash>:<log index>" so each log is stored once)
+    block_number = IntField()
+    block_hash = StringField()
+    log_index = IntField()
     status = StringField(choices=['pending', 'processed', 'failed'], default='pending')
     processed_at = DateTimeField()
     created_at = DateTimeField(default=datetime.utcnow)
     
     meta = {
         'collection': 'blockchain_event',
-        'indexes': ['tx_hash', ('status', 'created_at')]
+        'indexes': ['tx_hash', ('status', 'created_at'), 'block_number']
     }
 
 class SystemConfig(Document):
@@ -0,0 +1,3 @@
+# Bulk Import Module
+# Builds whole networks from a sponsor-ordered CSV / NDJSON file of user joins
+# Placements are computed in memory with the join rules and written with batched inserts
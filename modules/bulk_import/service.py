@@ -0,0 +1,939 @@
+"""
+Bulk Network Import
+Builds a network from a sponsor-ordered CSV / NDJSON file of joins without calling the
+per-user join services one row at a time.
+
+Each row is a user-create payload (wallet_address, refered_by, name, optional email, uid,
+refer_code, password / password_hash, matrix_payment_tx, global_payment_tx). refered_by is
+the sponsor's refer_code or wallet_address; a sponsor is either already in the database or
+an earlier row of the file.
+
+NetworkPlanner replays the join placements in memory with the rules of the services:
+- Binary slots 1 and 2: TreeService.place_user_in_tree (level-wise BFS from the sponsor,
+  after the referrer root placement the user-create path ensures)
+- Matrix slot 1: MatrixService.join_matrix (own MatrixTree, sweepover placement in the first
+  eligible upline tree with escalation, Level-2 mirror into the sponsor's upline tree and the
+  _ensure_tp TreePlacement)
+Everything it produces (users, placements, activations, max-slot rows, partner graphs, matrix
+trees and counters) is then written in file order, batch_size rows at a time: the matrix tree
+nodes of the rows first (version-guarded), then ordered insert_many of their documents, then
+the sponsors' partner counters.
+
+Not planned in memory; these joins go through the per-user services after the bulk write,
+in file order:
+- Matrix joins from the first placement that completes a tree onwards: the 39th member
+  triggers a recycle (snapshot, reset, re-placement of the owner) that changes every later
+  placement
+- Global joins: Phase-1 is one serial queue across the whole network (GlobalService.join_global)
+Both include their own fund distributions.
+
+Fund distributions of the bulk-written joins are skipped unless replayed (--replay-funds):
+binary slot routing through AutoUpgradeService.process_binary_slot_activation and the matrix
+join split through MatrixService._distribute_join_funds, in file order after the write.
+Rank recomputation, earning history and blockchain audit events are not written.
+
+--verify N plans the first N rows and replays them through the per-user placement services
+in a scratch database, and aborts the import when the two disagree. The import assumes joins
+are paused while it runs. Before anything is written, every existing matrix tree the plan
+adds nodes to is checked against the version it was read at, and the import aborts when one
+changed. A write that fails later (a tree changing mid-import, an insert error) stops after
+the last fully written batch and reports it (through_row) with the rows of the failing batch
+(failed_rows), which may be partly written.
+
+Usage:
+    python -m modules.bulk_import.service network.ndjson [--format csv|ndjson] [--batch-size 1000]
+        [--verify 200] [--replay-funds] [--dry-run]
+"""
+
+import argparse
+import csv
+import importlib
+import json
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from auth.service import authentication_service
+from core.config import MATRIX_MAX_ESCALATION_DEPTH, MATRIX_MOTHER_ID
+from core.db import scratch_database
+from modules.auto_upgrade.model import MatrixAutoUpgrade
+from modules.matrix import geometry as matrix_geometry
+from modules.matrix.model import MatrixTree, MatrixNode, MatrixActivation
+from modules.slot.model import SlotActivation, SlotRoster, UserMaxSlot
+from modules.tree.model import TreePlacement
+from modules.user.model import User, PartnerGraph
+
+# Slots the user-create path activates, with AutoUpgradeService names and the slot costs
+BINARY_JOIN_SLOTS = ((1, 'Explorer', Decimal('0.0022')), (2, 'Contributor', Decimal('0.0044')))
+# MatrixService.MATRIX_SLOTS[1]
+MATRIX_JOIN_SLOT = (1, 'STARTER', Decimal('11'))
+MATRIX_NEXT_SLOT_COST = Decimal('33')
+# TreeService.place_user_in_tree seat order per program
+TREE_POSITIONS = {'binary': ('left', 'right'), 'matrix': ('left', 'middle', 'right')}
+# MatrixRecycleService.max_matrix_members
+MATRIX_RECYCLE_MEMBERS = 39
+REQUIRED_FIELDS = ('wallet_address', 'refered_by', 'name')
+PREFETCH_ROWS = 5000
+QUERY_CHUNK = 5000
+MAX_REPORTED_MISMATCHES = 20
+# Planned per-row document lists, in the order write() inserts them
+ROW_DOCUMENTS = ('users', 'placements', 'slot_activations', 'matrix_activations', 'max_slots',
+                 'matrix_auto_upgrades')
+TREE_COUNTERS = ('total_members', 'level_1_members', 'level_2_members', 'level_3_members')
+
+_MISSING = object()
+
+
+def read_rows(path: str, fmt: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Rows of a CSV (with a header line) or NDJSON file, in file order"""
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+    with open(path, newline='', encoding='utf-8') as handle:
+        if fmt == 'csv':
+            for row in csv.DictReader(handle):
+                yield {key.strip(): value.strip() for key, value in row.items() if key and value and value.strip()}
+        else:
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _doc(document) -> Dict[str, Any]:
+    """Mongo document of an unsaved model instance, defaults included, with a fresh _id"""
+    doc = document.to_mongo().to_dict()
+    doc.setdefault('_id', ObjectId())
+    return doc
+
+
+class _Deferred(Exception):
+    """A join whose placement the in-memory plan does not model"""
+
+
+class _SeatCursor:
+    """Resume point of a level-wise BFS under one referrer (seats only ever fill during a plan)"""
+    __slots__ = ('nodes', 'level', 'index')
+
+    def __init__(self, referrer: ObjectId, level: int):
+        self.nodes = [referrer]
+        self.level = level
+        self.index = 0
+
+
+class NetworkPlanner:
+    """
+    In-memory replay of the join placements on top of the network in the database.
+
+    The existing network is read lazily, the way the services read it (one query per BFS
+    level, per matrix tree, per referral-chain step), and every planned document is kept
+    in memory until BulkImportService writes it.
+    """
+
+    def __init__(self, replay_funds: bool = False, now: Optional[datetime] = None):
+        self.replay_funds = replay_funds
+        self.now = now or datetime.utcnow()
+        self._stamp = int(self.now.timestamp() * 1000)
+        self.rows = 0
+        self.entries: List[Dict[str, Any]] = []
+        self.rejected: List[Dict[str, Any]] = []
+        self.users: List[Dict[str, Any]] = []
+        self.placements: List[Dict[str, Any]] = []
+        self.slot_activations: List[Dict[str, Any]] = []
+        self.matrix_activations: List[Dict[str, Any]] = []
+        self.matrix_auto_upgrades: List[Dict[str, Any]] = []
+        self.max_slots: List[Dict[str, Any]] = []
+        self.partner_graphs: Dict[ObjectId, Dict[str, Any]] = {}
+        # Per accepted row (parallel to entries): document counts after the row, node counts of the trees it touched
+        self.marks: List[Dict[str, Any]] = []
+        self.matrix_cutover_row: Optional[int] = None
+        self._users_by_id: Dict[ObjectId, Dict[str, Any]] = {}
+        self._new_users = set()
+        self._codes: Dict[str, ObjectId] = {}
+        self._taken = set()
+        self._referrers: Dict[ObjectId, Any] = {}
+        self._levels: Dict[Tuple[str, int, ObjectId], Optional[int]] = {}
+        self._seats: Dict[Tuple[str, int], Dict[ObjectId, Dict[str, ObjectId]]] = {}
+        self._loaded_seats = set()
+        self._cursors: Dict[Tuple[str, int, ObjectId], _SeatCursor] = {}
+        self._trees: Dict[ObjectId, Optional[Dict[str, Any]]] = {}
+        self._tree_base: Dict[ObjectId, Dict[str, Any]] = {}
+        self._touched_trees = set()
+
+    # ------------------------------------------------------------------ rows
+
+    def add_rows(self, rows: Iterable[Dict[str, Any]]) -> 'NetworkPlanner':
+        for chunk in _chunks(rows, PREFETCH_ROWS):
+            self._prefetch(chunk)
+            for row in chunk:
+                self.rows += 1
+                self._touched_trees = set()
+                error = self._add_row(self.rows, row)
+                if error:
+                    self.rejected.append({'row': self.rows, 'error': error})
+                else:
+                    self.marks.append(self._mark())
+        return self
+
+    def _mark(self) -> Dict[str, Any]:
+        mark = {name: len(getattr(self, name)) for name in ROW_DOCUMENTS}
+        mark['trees'] = {owner: len(self._trees[owner]['nodes']) for owner in self._touched_trees}
+        return mark
+
+    def _prefetch(self, rows: List[Dict[str, Any]]):
+        """Existing users a chunk refers to (sponsors) or collides with, and matrix tx hashes already used"""
+        keys = {str(row[field]) for row in rows for field in ('refered_by', 'wallet_address', 'uid', 'refer_code')
+                if row.get(field)}
+        keys.difference_update(self._codes)
+        keys = list(keys)
+        for part in _chunks(keys, QUERY_CHUNK):
+            for doc in User._get_collection().find(
+                {'$or': [{'refer_code': {'$in': part}}, {'wallet_address': {'$in': part}}, {'uid': {'$in': part}}]},
+                {'uid': 1, 'refer_code': 1, 'wallet_address': 1, 'refered_by': 1},
+            ):
+                self._register_user(doc)
+        tx_hashes = [str(row['matrix_payment_tx']) for row in rows if row.get('matrix_payment_tx')]
+        for part in _chunks(tx_hashes, QUERY_CHUNK):
+            for doc in SlotActivation._get_collection().find({'tx_hash': {'$in': part}}, {'tx_hash': 1}):
+                self._taken.add(('tx_hash', doc['tx_hash']))
+
+    def _register_user(self, doc: Dict[str, Any]):
+        self._codes.setdefault(doc.get('refer_code'), doc['_id'])
+        self._codes.setdefault(doc.get('wallet_address'), doc['_id'])
+        for field in ('uid', 'refer_code', 'wallet_address'):
+            self._taken.add((field, doc.get(field)))
+        self._referrers[doc['_id']] = doc.get('refered_by')
+
+    def _add_row(self, row_no: int, row: Dict[str, Any]) -> Optional[str]:
+        missing = [field for field in REQUIRED_FIELDS if not row.get(field)]
+        if missing:
+            return f"Missing required fields: {', '.join(missing)}"
+        wallet_address, sponsor_key = str(row['wallet_address']), str(row['refered_by'])
+        if ('wallet_address', wallet_address) in self._taken:
+            return "User with this wallet_address already exists"
+        sponsor = self._codes.get(sponsor_key)
+        if sponsor is None:
+            return f"Referral code '{sponsor_key}' not found (sponsors must come before their referrals)"
+        uid = str(row.get('uid') or f"user{self._stamp}{row_no:07d}")
+        refer_code = str(row.get('refer_code') or f"RC{self._stamp}{row_no:07d}")
+        if ('uid', uid) in self._taken or ('refer_code', refer_code) in self._taken:
+            return "User with this uid or refer_code already exists"
+        matrix_tx, global_tx = row.get('matrix_payment_tx'), row.get('global_payment_tx')
+        if matrix_tx and ('tx_hash', str(matrix_tx)) in self._taken:
+            return f"matrix_payment_tx '{matrix_tx}' already used"
+
+        user_id = ObjectId()
+        password = row.get('password_hash')
+        if not password and row.get('password'):
+            password = authentication_service.get_password_hash(row['password'])
+        user = _doc(User(
+            id=user_id, uid=uid, refer_code=refer_code, refered_by=sponsor, wallet_address=wallet_address,
+            name=row['name'], role='user', email=row.get('email'), password=password,
+            binary_joined=True, binary_joined_at=self.now,
+            matrix_joined=bool(matrix_tx), matrix_joined_at=self.now if matrix_tx else None,
+        ))
+        self.users.append(user)
+        self._users_by_id[user_id] = user
+        self._new_users.add(user_id)
+        self._register_user(user)
+        if matrix_tx:
+            self._taken.add(('tx_hash', str(matrix_tx)))
+        self.partner_graphs[user_id] = _doc(PartnerGraph(user_id=user_id, last_updated=self.now, created_at=self.now))
+
+        entry = {'row': row_no, 'user_id': user_id, 'sponsor': sponsor, 'matrix': None,
+                 'matrix_tx': str(matrix_tx) if matrix_tx else None, 'global': bool(global_tx)}
+        self.entries.append(entry)
+        self._plan_binary_join(user_id, sponsor)
+        if matrix_tx:
+            entry['matrix'] = self._plan_matrix_join(user_id, sponsor, entry['matrix_tx'], row_no)
+        return None
+
+    # ------------------------------------------------------------------ binary
+
+    def _plan_binary_join(self, user_id: ObjectId, sponsor: ObjectId):
+        self._ensure_root(sponsor, 'binary')
+        for slot_no, slot_name, slot_value in BINARY_JOIN_SLOTS:
+            if not self._place_in_tree(user_id, sponsor, 'binary', slot_no):
+                continue
+            if self.replay_funds:
+                # process_binary_slot_activation records the activation while it routes the fee
+                continue
+            self.slot_activations.append(_doc(SlotActivation(
+                user_id=user_id, program='binary', slot_no=slot_no, slot_name=slot_name, amount_paid=slot_value,
+                currency='BNB', status='completed', activation_type='auto', upgrade_source='auto',
+                tx_hash=f"auto_slot_{slot_no}_{user_id}_{int(self.now.timestamp())}",
+                activated_at=self.now, completed_at=self.now, created_at=self.now,
+            )))
+        if not self.replay_funds and self._levels.get(('binary', 1, user_id)) is not None:
+            slot_no, slot_name, _ = BINARY_JOIN_SLOTS[-1] if self._levels.get(('binary', 2, user_id)) is not None \
+                else BINARY_JOIN_SLOTS[0]
+            self.max_slots.append(_doc(UserMaxSlot(user_id=user_id, program='binary', max_slot=slot_no,
+                                                   slot_name=slot_name, activated_at=self.now, updated_at=self.now)))
+
+    # ------------------------------------------------------------------ TreePlacement seats
+
+    def _ensure_root(self, user_id: ObjectId, program: str):
+        """TreeService.ensure_root_placement"""
+        if self._placement_level(program, 1, user_id) is None:
+            self._add_placement(_doc(TreePlacement(
+                user_id=user_id, program=program, parent_id=user_id, upline_id=user_id, position='root',
+                level=0, slot_no=1, is_active=True, created_at=self.now,
+            )))
+
+    def _place_in_tree(self, user_id: ObjectId, referrer: ObjectId, program: str, slot_no: int) -> bool:
+        """TreeService.place_user_in_tree"""
+        if self._placement_level(program, slot_no, user_id) is not None:
+            return True
+        referrer_level = self._placement_level(program, slot_no, referrer)
+        if referrer_level is None:
+            if not (program == 'binary' and slot_no > 1):
+                return False
+            referrer_level = self._placement_level(program, 1, referrer)
+            if referrer_level is None:
+                referrer_level = 1
+        seat = self._next_free_seat(program, slot_no, referrer, referrer_level or 1)
+        if not seat:
+            return False
+        upline, position, level = seat
+        is_spillover = upline != referrer
+        self._add_placement(_doc(TreePlacement(
+            user_id=user_id, program=program, parent_id=referrer, upline_id=upline, position=position,
+            level=level, slot_no=slot_no, is_spillover=is_spillover, spillover_from=referrer if is_spillover else None,
+            is_upline_reserve=(program == 'matrix' and level == 2 and position == 'middle'),
+            is_active=True, claims_position=True, created_at=self.now,
+        )))
+        return True
+
+    def _next_free_seat(self, program: str, slot_no: int, referrer: ObjectId, referrer_level: int):
+        """
+        First free (upline, position) of the level-wise BFS under the referrer: every node's
+        left seat of a level, then every node's next seat, then the level below. Seats never
+        free up during a plan, so each referrer's search resumes where it last stopped.
+        """
+        key = (program, slot_no, referrer)
+        cursor = self._cursors.get(key)
+        if cursor is None:
+            cursor = self._cursors[key] = _SeatCursor(referrer, referrer_level)
+        positions = TREE_POSITIONS[program]
+        seats = self._seats.setdefault((program, slot_no), {})
+        while cursor.nodes:
+            self._load_seats(program, slot_no, cursor.nodes)
+            width = len(cursor.nodes)
+            while cursor.index < width * len(positions):
+                position_index, node_index = divmod(cursor.index, width)
+                upline, position = cursor.nodes[node_index], positions[position_index]
+                if position not in seats.get(upline, ()):
+                    return upline, position, cursor.level + 1
+                cursor.index += 1
+            cursor.nodes = [seats[upline][position] for upline in cursor.nodes for position in positions]
+            cursor.level += 1
+            cursor.index = 0
+        return None
+
+    def _load_seats(self, program: str, slot_no: int, uplines: List[ObjectId]):
+        """Active placements under the uplines, from the database (one query per BFS level)"""
+        missing = [upline for upline in uplines
+                   if (program, slot_no, upline) not in self._loaded_seats and upline not in self._new_users]
+        seats = self._seats.setdefault((program, slot_no), {})
+        for part in _chunks(missing, QUERY_CHUNK):
+            for doc in TreePlacement._get_collection().find(
+                {'program': program, 'slot_no': slot_no, 'upline_id': {'$in': part}, 'is_active': True},
+                {'user_id': 1, 'upline_id': 1, 'position': 1},
+            ):
+                seats.setdefault(doc['upline_id'], {}).setdefault(doc['position'], doc['user_id'])
+        self._loaded_seats.update((program, slot_no, upline) for upline in uplines)
+
+    def _placement_level(self, program: str, slot_no: int, user_id: ObjectId) -> Optional[int]:
+        """Level of the user's active placement in the program slot, None without one"""
+        key = (program, slot_no, user_id)
+        if key not in self._levels:
+            self._load_levels(program, slot_no, [user_id])
+        return self._levels[key]
+
+    def _load_levels(self, program: str, slot_no: int, user_ids: List[ObjectId]):
+        missing = [user_id for user_id in user_ids if (program, slot_no, user_id) not in self._levels]
+        for user_id in missing:
+            self._levels[(program, slot_no, user_id)] = None
+        missing = [user_id for user_id in missing if user_id not in self._new_users]
+        for part in _chunks(missing, QUERY_CHUNK):
+            found = {}
+            for doc in TreePlacement._get_collection().find(
+                {'program': program, 'slot_no': slot_no, 'user_id': {'$in': part}, 'is_active': True},
+                {'user_id': 1, 'level': 1},
+            ):
+                found.setdefault(doc['user_id'], doc.get('level'))
+            for user_id, level in found.items():
+                self._levels[(program, slot_no, user_id)] = level
+
+    def _add_placement(self, doc: Dict[str, Any]):
+        program, slot_no = doc['program'], doc['slot_no']
+        upline = doc.get('upline_id')
+        if upline is not None:
+            # Earlier placements under an existing upline keep their seats, as in the database
+            self._load_seats(program, slot_no, [upline])
+            self._seats[(program, slot_no)].setdefault(upline, {}).setdefault(doc['position'], doc['user_id'])
+        if self._levels.get((program, slot_no, doc['user_id'])) is None:
+            self._levels[(program, slot_no, doc['user_id'])] = doc['level']
+        self.placements.append(doc)
+
+    # ------------------------------------------------------------------ matrix
+
+    def _plan_matrix_join(self, user_id: ObjectId, sponsor: ObjectId, tx_hash: str, row_no: int) -> str:
+        """MatrixService.join_matrix placement for slot 1; 'placed' or 'deferred'"""
+        if self.matrix_cutover_row is not None:
+            return 'deferred'
+        self._ensure_root(sponsor, 'matrix')
+        target, free = self._matrix_target(sponsor)
+        if target is not None and (target.get('total_members') or 0) + 1 >= MATRIX_RECYCLE_MEMBERS:
+            # The placement completes the tree and its recycle reshapes every later placement
+            self.matrix_cutover_row = row_no
+            return 'deferred'
+
+        self._trees[user_id] = _doc(MatrixTree(
+            user_id=user_id, current_slot=1, current_level=1, total_members=0, level_1_members=0,
+            level_2_members=0, level_3_members=0, is_complete=False, nodes=[], slots=[],
+            created_at=self.now, updated_at=self.now,
+        ))
+        self._touched_trees.add(user_id)
+        slot_no, slot_name, amount = MATRIX_JOIN_SLOT
+        self.matrix_activations.append(_doc(MatrixActivation(
+            user_id=user_id, slot_no=slot_no, slot_name=slot_name, activation_type='initial', upgrade_source='auto',
+            amount_paid=amount, currency='USDT', tx_hash=tx_hash, is_auto_upgrade=True, status='completed',
+            activated_at=self.now, completed_at=self.now,
+        )))
+        self.slot_activations.append(_doc(SlotActivation(
+            user_id=user_id, program='matrix', slot_no=slot_no, slot_name=slot_name, activation_type='initial',
+            upgrade_source='auto', status='completed', amount_paid=amount, currency='USDT', tx_hash=tx_hash,
+            activated_at=self.now, completed_at=self.now, created_at=self.now,
+        )))
+        self.max_slots.append(_doc(UserMaxSlot(user_id=user_id, program='matrix', max_slot=slot_no,
+                                               slot_name=slot_name, activated_at=self.now, updated_at=self.now)))
+        self.matrix_auto_upgrades.append(_doc(MatrixAutoUpgrade(
+            user_id=user_id, current_slot_no=1, current_level=1, middle_three_required=3, middle_three_available=0,
+            is_eligible=False, next_upgrade_cost=MATRIX_NEXT_SLOT_COST, can_upgrade=False,
+        )))
+
+        if target is not None:
+            level, position = free
+            self._claim(target, level, position, user_id)
+            if level == 1:
+                self._mirror_into_upline_tree(target['user_id'], position, user_id)
+            self._add_matrix_placement(target, level, position, user_id)
+        else:
+            # No eligible tree: the TreeService placement join_matrix runs afterwards
+            self._place_in_tree(user_id, sponsor, 'matrix', 1)
+        return 'placed'
+
+    def _matrix_target(self, referrer: ObjectId):
+        """
+        Tree and free (level, position) of the placement: _resolve_target_parent_tree_for_slot,
+        then _resolve_next_eligible_ancestor when that tree is full. (None, None) when none has space.
+        """
+        target = self._resolve_target_tree(referrer)
+        if target is None:
+            return None, None
+        free = self._free_position(target)
+        if free is None:
+            target = self._next_eligible_tree(target['user_id'])
+            free = self._free_position(target) if target is not None else None
+            if free is None:
+                return None, None
+        return target, free
+
+    def _resolve_target_tree(self, referrer: ObjectId) -> Optional[Dict[str, Any]]:
+        visited, current = 0, referrer
+        while current and visited <= MATRIX_MAX_ESCALATION_DEPTH:
+            tree = self._tree(current)
+            if tree is not None and (tree.get('current_slot') or 1) >= 1:
+                return tree
+            referred_by = self._referrer_of(current)
+            current = None if referred_by is _MISSING else referred_by
+            visited += 1
+        return self._tree(ObjectId(MATRIX_MOTHER_ID)) if MATRIX_MOTHER_ID else None
+
+    def _next_eligible_tree(self, owner: ObjectId) -> Optional[Dict[str, Any]]:
+        current = self._referrer_of(owner)
+        if current is _MISSING:
+            return None
+        visited = 0
+        while current and visited <= MATRIX_MAX_ESCALATION_DEPTH:
+            tree = self._tree(current)
+            if tree is not None and (tree.get('current_slot') or 1) >= 1 and self._free_position(tree) is not None:
+                return tree
+            referred_by = self._referrer_of(current)
+            current = None if referred_by is _MISSING else referred_by
+            visited += 1
+        if MATRIX_MOTHER_ID:
+            mother = self._tree(ObjectId(MATRIX_MOTHER_ID))
+            if mother is not None and self._free_position(mother) is not None:
+                return mother
+        return None
+
+    def _free_position(self, tree: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+        """MatrixService._find_bfs_placement_position for slot 1"""
+        nodes = tree.get('nodes') or []
+        legacy = [node['user_id'] for node in nodes if node.get('slot_no') is None and node.get('user_id') is not None]
+        self._load_levels('matrix', 1, legacy)
+        slot_nodes = [node for node in nodes
+                      if node.get('slot_no') == 1
+                      or (node.get('slot_no') is None and self._levels.get(('matrix', 1, node.get('user_id'))) is not None)]
+        return matrix_geometry.next_free_position(matrix_geometry.occupancy_mask(slot_nodes))
+
+    def _claim(self, tree: Dict[str, Any], level: int, position: int, user_id: ObjectId):
+        """MatrixService._claim_matrix_position"""
+        tree.setdefault('nodes', []).append(self._node(level, position, user_id))
+        self._count_node(tree, level)
+        self._touched_trees.add(tree['user_id'])
+
+    def _node(self, level: int, position: int, user_id: ObjectId) -> Dict[str, Any]:
+        return MatrixNode(level=level, position=position, user_id=user_id, slot_no=1, placed_at=self.now,
+                          is_active=True).to_mongo().to_dict()
+
+    def _count_node(self, tree: Dict[str, Any], level: int):
+        for field in (f'level_{level}_members', 'total_members', 'version'):
+            tree[field] = (tree.get(field) or 0) + 1
+        tree['updated_at'] = self.now
+
+    def _mirror_into_upline_tree(self, owner: ObjectId, position: int, user_id: ObjectId):
+        """Level-2 mirror of a Level-1 placement into the tree of the owner's referrer"""
+        parent_user = self._referrer_of(owner)
+        if parent_user is _MISSING or not parent_user:
+            return
+        parent_tree = self._tree(parent_user)
+        if parent_tree is None:
+            return
+        parent_node = next((node for node in parent_tree.get('nodes') or []
+                            if node.get('level') == 1 and node.get('user_id') == owner), None)
+        if parent_node is None or parent_node.get('position') is None:
+            return
+        mapped = matrix_geometry.child(parent_node['position'], position)
+        if any(node.get('level') == 2 and node.get('position') == mapped and node.get('user_id') == user_id
+               for node in parent_tree.get('nodes') or []):
+            return
+        parent_tree['nodes'].append(self._node(2, mapped, user_id))
+        self._count_node(parent_tree, 2)
+        self._touched_trees.add(parent_user)
+
+    def _add_matrix_placement(self, tree: Dict[str, Any], level: int, position: int, user_id: ObjectId):
+        """The TreePlacement MatrixService._ensure_tp records for a placed node"""
+        immediate_parent = tree['user_id']
+        if level > 1:
+            parent_user = matrix_geometry.occupancy_index(tree['nodes']).get(matrix_geometry.parent(level, position))
+            if parent_user:
+                immediate_parent = ObjectId(parent_user)
+        self._add_placement(_doc(TreePlacement(
+            user_id=user_id, program='matrix', parent_id=immediate_parent, upline_id=immediate_parent,
+            position=matrix_geometry.side(position), level=level, slot_no=1, is_active=True,
+            is_upline_reserve=matrix_geometry.is_middle(position), created_at=self.now,
+        )))
+
+    def _tree(self, owner: ObjectId) -> Optional[Dict[str, Any]]:
+        if owner not in self._trees:
+            tree = None if owner in self._new_users else MatrixTree._get_collection().find_one({'user_id': owner})
+            self._trees[owner] = tree
+            if tree is not None:
+                self._tree_base[owner] = {
+                    'version': tree.get('version') or 0, 'nodes': len(tree.get('nodes') or []),
+                    **{field: tree.get(field) or 0 for field in ('total_members', 'level_1_members',
+                                                                  'level_2_members', 'level_3_members')},
+                }
+        return self._trees[owner]
+
+    def _referrer_of(self, user_id: ObjectId):
+        """refered_by of a user, _MISSING when there is no such user"""
+        if user_id not in self._referrers:
+            doc = User._get_collection().find_one({'_id': user_id}, {'refered_by': 1})
+            self._referrers[user_id] = doc.get('refered_by') if doc else _MISSING
+        return self._referrers[user_id]
+
+    # ------------------------------------------------------------------ results
+
+    def new_trees(self) -> List[Dict[str, Any]]:
+        return [tree for owner, tree in self._trees.items() if tree is not None and owner not in self._tree_base]
+
+    def stale_trees(self) -> List[ObjectId]:
+        """Existing trees the plan adds nodes to whose version changed since they were read"""
+        grown = [self._trees[owner]['_id'] for owner, base in self._tree_base.items()
+                 if len(self._trees[owner].get('nodes') or []) > base['nodes']]
+        stale = []
+        for part in _chunks(grown, QUERY_CHUNK):
+            for doc in MatrixTree._get_collection().find({'_id': {'$in': part}}, {'user_id': 1, 'version': 1}):
+                if (doc.get('version') or 0) != self._tree_base[doc['user_id']]['version']:
+                    stale.append(doc['user_id'])
+        return stale
+
+    def roster_rows(self, slot_activations: Optional[List[Dict[str, Any]]] = None,
+                    matrix_activations: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """SlotRoster rows of planned activations (the hook in their save() does not run on insert_many)"""
+        slot_activations = self.slot_activations if slot_activations is None else slot_activations
+        matrix_activations = self.matrix_activations if matrix_activations is None else matrix_activations
+        rows = {}
+        for program, activations in ((None, slot_activations), ('matrix', matrix_activations)):
+            for activation in activations:
+                key = (program or activation['program'], activation['slot_no'], activation['user_id'])
+                rows.setdefault(key, _doc(SlotRoster(
+                    user_id=key[2], program=key[0], slot_no=key[1], joined_at=activation['activated_at'],
+                    joined_day=SlotRoster.day_of(activation['activated_at']), updated_at=self.now,
+                )))
+        return list(rows.values())
+
+    def summary(self) -> Dict[str, Any]:
+        matrix = [entry['matrix'] for entry in self.entries]
+        return {
+            "rows": self.rows,
+            "users": len(self.users),
+            "placements": len(self.placements),
+            "matrix_placed": matrix.count('placed'),
+            "matrix_deferred": matrix.count('deferred'),
+            "matrix_cutover_row": self.matrix_cutover_row,
+            "global_joins": sum(1 for entry in self.entries if entry['global']),
+            "rejected": len(self.rejected),
+        }
+
+
+class BulkImportService:
+    """Plans, verifies and writes bulk network imports"""
+
+    def __init__(self, batch_size: int = 1000, replay_funds: bool = False):
+        self.batch_size = batch_size
+        self.replay_funds = replay_funds
+
+    def plan(self, rows: Iterable[Dict[str, Any]]) -> NetworkPlanner:
+        return NetworkPlanner(replay_funds=self.replay_funds).add_rows(rows)
+
+    def import_rows(self, rows: Iterable[Dict[str, Any]], verify_sample: int = 0, dry_run: bool = False) -> Dict[str, Any]:
+        try:
+            rows = list(rows)
+            verification = None
+            if verify_sample:
+                verification = self.verify(rows[:verify_sample])
+                if not verification["success"]:
+                    return {"success": False, "error": "Bulk plan differs from the per-user placement path",
+                            "verification": verification}
+            plan = self.plan(rows)
+            result = {"success": True, "plan": plan.summary(), "rejected": plan.rejected[:MAX_REPORTED_MISMATCHES],
+                      "verification": verification}
+            if dry_run:
+                return result
+            result["written"] = self.write(plan)
+            if result["written"].get("error"):
+                result.update(success=False, error=result["written"]["error"])
+                return result
+            result["deferred"] = self.run_deferred_joins(plan)
+            if self.replay_funds:
+                result["replayed"] = self.replay_fund_distributions(plan)
+            return result
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    # ------------------------------------------------------------------ writes
+
+    def _insert(self, document_cls, docs: List[Dict[str, Any]]) -> int:
+        # Ordered: a failing batch stops at the failing document
+        collection = document_cls._get_collection()
+        for batch in _chunks(docs, self.batch_size):
+            collection.insert_many(batch, ordered=True)
+        return len(docs)
+
+    def _bulk_write(self, document_cls, operations: List) -> int:
+        collection = document_cls._get_collection()
+        matched = 0
+        for batch in _chunks(operations, self.batch_size):
+            matched += collection.bulk_write(batch, ordered=False).matched_count
+        return matched
+
+    def write(self, plan: NetworkPlanner) -> Dict[str, Any]:
+        """
+        Write a plan in file order, batch_size rows at a time. Returns the document counts,
+        the rows written and the last of them (through_row); on failure also "error", and
+        nothing after through_row is left written except the documents of the failing batch
+        ("failed_rows") that its inserts got through before the error.
+        """
+        written = {name: 0 for name in ('users', 'partner_graphs', 'placements', 'slot_activations',
+                                        'matrix_activations', 'max_slots', 'slot_rosters', 'matrix_auto_upgrades',
+                                        'matrix_trees', 'matrix_trees_updated', 'sponsors')}
+        written.update(rows=0, through_row=None)
+        stale = plan.stale_trees()
+        if stale:
+            written["error"] = f"{len(stale)} matrix trees changed since the import read them; nothing was written"
+            written["stale_trees"] = [str(owner) for owner in stale[:MAX_REPORTED_MISMATCHES]]
+            return written
+
+        # Node counts / counters of every tree as it stands in the database
+        trees = {owner: dict(base) for owner, base in plan._tree_base.items()}
+        previous = {name: 0 for name in ROW_DOCUMENTS}
+        for chunk in _chunks(list(zip(plan.entries, plan.marks)), self.batch_size):
+            rows = [chunk[0][0]['row'], chunk[-1][0]['row']]
+            try:
+                self._write_rows(plan, previous, chunk, trees, written)
+            except Exception as e:
+                written.update(error=f"Rows {rows[0]}-{rows[1]} failed: {e}", failed_rows=rows)
+                print(f"[BULK_IMPORT] {written['error']} (written through row {written['through_row']})")
+                return written
+            written["rows"] += len(chunk)
+            written["through_row"] = rows[1]
+            previous = chunk[-1][1]
+        return written
+
+    def _write_rows(self, plan: NetworkPlanner, previous: Dict[str, Any], chunk: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+                    trees: Dict[ObjectId, Dict[str, Any]], written: Dict[str, Any]):
+        """One batch of rows: their tree nodes, their documents, then their sponsors' counters"""
+        entries, mark = [entry for entry, _ in chunk], chunk[-1][1]
+        touched = {}
+        for _, row_mark in chunk:
+            touched.update(row_mark['trees'])
+        new_trees, updates = [], []
+        for owner, count in touched.items():
+            tree, state = plan._trees[owner], trees.get(owner)
+            if state is None:
+                # Created by a row of this batch: insert it with the nodes placed so far
+                nodes = tree['nodes'][:count]
+                new_trees.append(dict(tree, nodes=nodes, version=count, updated_at=plan.now,
+                                      **self._node_counts(nodes)))
+            elif count > state['nodes']:
+                updates.append((tree, state, tree['nodes'][state['nodes']:count]))
+        self._update_trees(updates, plan.now)
+        for tree, state, nodes in updates:
+            state['nodes'] += len(nodes)
+            state['version'] += len(nodes)
+        written["matrix_trees_updated"] += len(updates)
+
+        part = {name: getattr(plan, name)[previous[name]:mark[name]] for name in ROW_DOCUMENTS}
+        written["users"] += self._insert(User, part['users'])
+        written["partner_graphs"] += self._insert(PartnerGraph, [plan.partner_graphs[e['user_id']] for e in entries])
+        written["placements"] += self._insert(TreePlacement, part['placements'])
+        written["slot_activations"] += self._insert(SlotActivation, part['slot_activations'])
+        written["matrix_activations"] += self._insert(MatrixActivation, part['matrix_activations'])
+        written["max_slots"] += self._insert(UserMaxSlot, part['max_slots'])
+        written["slot_rosters"] += self._insert(SlotRoster, plan.roster_rows(part['slot_activations'],
+                                                                             part['matrix_activations']))
+        written["matrix_auto_upgrades"] += self._insert(MatrixAutoUpgrade, part['matrix_auto_upgrades'])
+        written["matrix_trees"] += self._insert(MatrixTree, new_trees)
+        for tree in new_trees:
+            trees[tree['user_id']] = {'nodes': len(tree['nodes']), 'version': tree['version']}
+
+        # PartnerGraph directs and partners_count of the sponsors (user-create path)
+        directs = {}
+        for entry in entries:
+            update = directs.setdefault(entry['sponsor'], {'directs': [], 'binary': 0, 'matrix': 0, 'global': 0})
+            update['directs'].append(entry['user_id'])
+            update['binary'] += 1
+            update['matrix'] += int(bool(entry['matrix_tx']))
+            update['global'] += int(entry['global'])
+        sponsor_users, sponsor_graphs = [], []
+        for sponsor, update in directs.items():
+            sponsor_users.append(UpdateOne({'_id': sponsor}, {
+                '$inc': {'partners_count': len(update['directs'])}, '$set': {'updated_at': plan.now},
+            }))
+            sponsor_graphs.append(UpdateOne({'user_id': sponsor}, {
+                '$push': {'directs': {'$each': update['directs']}},
+                '$inc': {f'directs_count_by_program.{program}': update[program] for program in ('binary', 'matrix', 'global')},
+                '$set': {'last_updated': plan.now},
+                '$setOnInsert': {'total_team': 0, 'created_at': plan.now},
+            }, upsert=True))
+        written["sponsors"] += self._bulk_write(User, sponsor_users)
+        self._bulk_write(PartnerGraph, sponsor_graphs)
+
+    def _update_trees(self, updates: List[Tuple[Dict[str, Any], Dict[str, Any], List[Dict[str, Any]]]], now: datetime):
+        """
+        Append nodes to trees already in the database, each guarded by the version last written;
+        when any tree changed meanwhile, the batch's other appends are undone and ValueError raised.
+        """
+        if not updates:
+            return
+        collection = MatrixTree._get_collection()
+        applied, conflicts = [], []
+        for tree, state, nodes in updates:
+            result = collection.update_one(
+                {'_id': tree['_id'], 'version': state['version'] if state['version'] else {'$in': [0, None]}},
+                {'$push': {'nodes': {'$each': nodes}},
+                 '$inc': dict(self._node_counts(nodes), version=len(nodes)),
+                 '$set': {'updated_at': now}},
+            )
+            (applied if result.matched_count else conflicts).append((tree, state, nodes))
+        if not conflicts:
+            return
+        for tree, state, nodes in applied:
+            collection.update_one(
+                {'_id': tree['_id'], 'version': state['version'] + len(nodes)},
+                {'$set': {'nodes': tree['nodes'][:state['nodes']]},
+                 '$inc': dict({field: -value for field, value in self._node_counts(nodes).items()},
+                              version=-len(nodes))},
+            )
+        raise ValueError(f"{len(conflicts)} matrix trees changed during the import "
+                         f"({', '.join(str(tree['user_id']) for tree, _, _ in conflicts[:MAX_REPORTED_MISMATCHES])})")
+
+    @staticmethod
+    def _node_counts(nodes: List[Dict[str, Any]]) -> Dict[str, int]:
+        counts = {field: 0 for field in TREE_COUNTERS}
+        counts['total_members'] = len(nodes)
+        for node in nodes:
+            counts[f"level_{node['level']}_members"] += 1
+        return counts
+
+    # ------------------------------------------------------------------ per-user parts
+
+    def run_deferred_joins(self, plan: NetworkPlanner) -> Dict[str, Any]:
+        """Matrix joins after the recycle cut-over and all Global joins, through the join services in file order"""
+        from modules.matrix.service import MatrixService
+        from modules.slot.model import SlotCatalog
+        matrix_service = MatrixService()
+        global_service = importlib.import_module('modules.global.service').GlobalService()
+        catalog = SlotCatalog.objects(program='global', slot_no=1, is_active=True).first()
+        global_amount = catalog.price if catalog and catalog.price else Decimal('0')
+        counts = {"matrix": 0, "global": 0, "failed": []}
+        for entry in plan.entries:
+            user_id, sponsor = str(entry['user_id']), str(entry['sponsor'])
+            if entry['matrix'] == 'deferred':
+                result = matrix_service.join_matrix(user_id, sponsor, entry['matrix_tx'], MATRIX_JOIN_SLOT[2])
+                self._count(counts, "matrix", entry, result)
+            if entry['global']:
+                result = global_service.join_global(user_id, f"bulk_global_{user_id}", global_amount)
+                self._count(counts, "global", entry, result)
+        return counts
+
+    def replay_fund_distributions(self, plan: NetworkPlanner) -> Dict[str, Any]:
+        """Fund distributions of the bulk-written joins, in file order"""
+        from modules.auto_upgrade.service import AutoUpgradeService
+        from modules.matrix.service import MatrixService
+        from utils import ensure_currency_for_program
+        auto_upgrade_service, matrix_service = AutoUpgradeService(), MatrixService()
+        currency = ensure_currency_for_program('matrix', 'USDT')
+        counts = {"binary": 0, "matrix": 0, "failed": []}
+        for entry in plan.entries:
+            user_id, sponsor = str(entry['user_id']), str(entry['sponsor'])
+            for slot_no, _, slot_value in BINARY_JOIN_SLOTS:
+                result = auto_upgrade_service.process_binary_slot_activation(user_id, slot_no, slot_value)
+                self._count(counts, "binary", entry, result)
+            if entry['matrix'] == 'placed':
+                distribution, _ = matrix_service._distribute_join_funds(
+                    user_id, sponsor, MATRIX_JOIN_SLOT[2], currency, entry['matrix_tx'])
+                self._count(counts, "matrix", entry, distribution)
+        return counts
+
+    @staticmethod
+    def _count(counts: Dict[str, Any], key: str, entry: Dict[str, Any], result: Dict[str, Any]):
+        if result and result.get("success"):
+            counts[key] += 1
+        elif len(counts["failed"]) < MAX_REPORTED_MISMATCHES:
+            counts["failed"].append({"row": entry['row'], "program": key,
+                                     "error": (result or {}).get("error", "Unknown error")})
+
+    # ------------------------------------------------------------------ verification
+
+    def verify(self, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Plan the rows and replay them through the per-user placement services in a scratch
+        database that holds only their outside sponsors; compare placements and matrix nodes.
+        """
+        sponsors = self._outside_sponsors(rows)
+        with scratch_database(f"{User._get_db().name}_bulk_verify_{ObjectId()}"):
+            if sponsors:
+                User._get_collection().insert_many(sponsors)
+            plan = NetworkPlanner().add_rows(rows)
+            self._replay_placements(plan)
+
+            stored_placements = {
+                (doc['program'], doc['slot_no'], doc['user_id']): doc
+                for doc in TreePlacement._get_collection().find({'is_active': True})
+            }
+            stored_trees = {doc['user_id']: doc for doc in MatrixTree._get_collection().find({})}
+
+        mismatches = []
+        planned_placements = {(doc['program'], doc['slot_no'], doc['user_id']): doc for doc in plan.placements}
+        for key in sorted(set(planned_placements) | set(stored_placements), key=str):
+            planned, stored = (self._placement_key(docs.get(key)) for docs in (planned_placements, stored_placements))
+            if planned != stored:
+                mismatches.append({"placement": [str(part) for part in key], "planned": planned, "per_user": stored})
+        planned_trees = {tree['user_id']: tree for tree in plan.new_trees()}
+        for owner in set(planned_trees) | set(stored_trees):
+            planned, stored = (self._node_keys(trees.get(owner)) for trees in (planned_trees, stored_trees))
+            if planned != stored:
+                mismatches.append({"matrix_tree": str(owner), "planned": planned, "per_user": stored})
+        return {
+            "success": not mismatches and not plan.rejected,
+            "sample": len(rows),
+            "compared": len(planned_placements) + len(planned_trees),
+            "rejected": plan.rejected[:MAX_REPORTED_MISMATCHES],
+            "mismatches": mismatches[:MAX_REPORTED_MISMATCHES],
+        }
+
+    @staticmethod
+    def _outside_sponsors(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Database users the rows are sponsored by, as bare top-level users"""
+        defined, keys = set(), set()
+        for row in rows:
+            if row.get('refered_by') and str(row['refered_by']) not in defined:
+                keys.add(str(row['refered_by']))
+            defined.update(str(row[field]) for field in ('wallet_address', 'refer_code') if row.get(field))
+        if not keys:
+            return []
+        keys = list(keys)
+        return [
+            {**doc, 'refered_by': None}
+            for doc in User._get_collection().find(
+                {'$or': [{'refer_code': {'$in': keys}}, {'wallet_address': {'$in': keys}}]},
+                {'uid': 1, 'refer_code': 1, 'wallet_address': 1, 'name': 1},
+            )
+        ]
+
+    @staticmethod
+    def _replay_placements(plan: NetworkPlanner):
+        """The placement calls of the user-create and join_matrix paths, one user at a time"""
+        from modules.matrix.service import MatrixService
+        from modules.tree.service import TreeService
+        tree_service, matrix_service = TreeService(), MatrixService()
+        User._get_collection().insert_many([dict(user) for user in plan.users])
+        for entry in plan.entries:
+            user_id, sponsor = entry['user_id'], entry['sponsor']
+            tree_service.ensure_root_placement(sponsor, 'binary')
+            for slot_no, _, _ in BINARY_JOIN_SLOTS:
+                tree_service.place_user_in_tree(user_id, sponsor, 'binary', slot_no)
+            if entry['matrix'] == 'placed':
+                matrix_service._create_matrix_tree(str(user_id))
+                tree_service.ensure_root_placement(sponsor, 'matrix')
+                matrix_service._ensure_tp(str(user_id), str(sponsor), 1)
+                tree_service.place_user_in_tree(user_id, sponsor, 'matrix', 1)
+
+    @staticmethod
+    def _placement_key(doc: Optional[Dict[str, Any]]):
+        if doc is None:
+            return None
+        return [str(doc.get('upline_id')), doc.get('position'), doc.get('level'), str(doc.get('parent_id'))]
+
+    @staticmethod
+    def _node_keys(tree: Optional[Dict[str, Any]]):
+        if tree is None:
+            return None
+        return sorted((node['level'], node['position'], str(node['user_id'])) for node in tree.get('nodes') or [])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import a sponsor-ordered network of joins")
+    parser.add_argument('path', help="CSV (header line) or NDJSON file of user-create payloads")
+    parser.add_argument('--format', choices=('csv', 'ndjson'))
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--verify', type=int, default=0, metavar='N',
+                        help="Compare the first N rows against the per-user placement path before writing")
+    parser.add_argument('--replay-funds', action='store_true', help="Run the join fund distributions after the write")
+    parser.add_argument('--dry-run', action='store_true', help="Plan (and verify) without writing")
+    args = parser.parse_args(argv)
+
+    from core.db import connect_to_db
+    connect_to_db()
+
+    service = BulkImportService(batch_size=args.batch_size, replay_funds=args.replay_funds)
+    result = service.import_rows(read_rows(args.path, args.format), verify_sample=args.verify, dry_run=args.dry_run)
+    for key, value in result.items():
+        print(f"[BULK_IMPORT] {key}: {value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -404,6 +404,8 @@ class MatrixRecycleInstance(Document):
     level_1_members = IntField(default=0)
     level_2_members = IntField(default=0)
     level_3_members = IntField(default=0)
+    occupants = ListField()  # Compact snapshot (see modules/matrix/model.py)
+    occupants_placed_at = ListField()
     created_at = DateTimeField(default=datetime.utcnow)
     completed_at = DateTimeField()
     
@@ -413,6 +415,7 @@ class MatrixRecycleInstance(Document):
             'user_id',
             'slot_number',
             'recycle_no',
-            'is_complete'
+            'is_complete',
+            {'fields': ['user_id', 'slot_number', '-recycle_no'], 'unique': True}
         ]
     }
\ No newline at end of file
@@ -242,75 +242,56 @@ class DreamMatrixService:
         Returns (root_node, max_depth, total_count).
         Each node has: id, type, userId, level, position, directDownline (array of child nodes).
         If slot_no is provided, only shows members from that specific slot.
+
+        Placements are read one tree level at a time (SubtreeService) and users/inviters
+        in two batched queries, instead of several queries per rendered node.
         """
+        from ..tree.subtree_service import SubtreeService
+
+        users: Dict[str, Any] = {}
+        inviters: Dict[str, Any] = {}
+
+        # Helper to get user basic display info + refer codes
+        def get_user_info(oid) -> dict:
+            u = users.get(str(oid))
+            inviter = inviters.get(str(u.refered_by)) if u and getattr(u, 'refered_by', None) else None
+            return {
+                "uid": str(u.uid) if u and getattr(u, 'uid', None) else str(oid),
+                "object_id": str(oid),
+                "refer_code": getattr(u, 'refer_code', None) if u else None,
+                "referrer_refer_code": getattr(inviter, 'refer_code', None) if inviter else None,
+                "referrer_uid": str(getattr(inviter, 'uid')) if inviter and getattr(inviter, 'uid', None) else None
+            }
+
         try:
-            from ..tree.model import TreePlacement
-            from ..user.model import User
-            
-            # Helper to get user basic display info + refer codes
-            def get_user_info(oid) -> dict:
-                try:
-                    u = User.objects(id=oid).only('uid', 'refer_code', 'refered_by').first()
-                    uid_val = str(u.uid) if u and getattr(u, 'uid', None) else str(oid)
-                    refer_code_val = getattr(u, 'refer_code', None) if u else None
-                    referrer_code_val = None
-                    referrer_uid_val = None
-                    try:
-                        if u and getattr(u, 'refered_by', None):
-                            inviter = User.objects(id=u.refered_by).only('refer_code', 'uid').first()
-                            referrer_code_val = getattr(inviter, 'refer_code', None) if inviter else None
-                            referrer_uid_val = str(getattr(inviter, 'uid')) if inviter and getattr(inviter, 'uid', None) else None
-                    except Exception:
-                        referrer_code_val = None
-                        referrer_uid_val = None
-                    return {
-                        "uid": uid_val,
-                        "object_id": str(oid),
-                        "refer_code": refer_code_val,
-                        "referrer_refer_code": referrer_code_val,
-                        "referrer_uid": referrer_uid_val
-                    }
-                except Exception:
-                    return {
-                        "uid": str(oid),
-                        "object_id": str(oid),
-                        "refer_code": None,
-                        "referrer_refer_code": None,
-                        "referrer_uid": None
-                    }
-            
-            # Counter for node IDs
-            node_id_counter = [0]
-            total_count = [0]
-            
-            # Helper to build node recursively with level limit
-            def build_node(current_oid, level: int, position: str, tree_parent_oid=None) -> Dict[str, Any]:
-                """
-                Build a node recursively.
-                current_oid: The user whose node we're building
-                tree_parent_oid: The actual tree parent (for parent_id display)
-                """
-                # Stop if we've exceeded max levels
-                if level >= max_levels:
-                    return None
-                
-                # Increment total count
-                total_count[0] += 1
-                
-                # Get current node ID and increment counter
-                current_id = node_id_counter[0]
-                node_id_counter[0] += 1
-                
-                # Determine node type
-                node_type = "self" if level == 0 else "downLine"
-                
-                # Get user info
+            positions = ('left', 'middle', 'right')
+            filters = {}
+            # Add slot filter if slot_no is provided
+            if slot_no is not None:
+                filters = {"slot_no": slot_no, "is_active": True}
+
+            # Children keyed by upline_id, excluding self-placements; only the first
+            # placement per position is shown and descended into (left→middle→right)
+            children_map = SubtreeService.fetch_children_map(
+                user_oid,
+                program='matrix',
+                max_depth=max_levels - 1,
+                filters=filters,
+                expand=lambda _link, children: SubtreeService.first_by_position(children, positions),
+                fields=('user_id', 'upline_id', 'position', 'created_at'),
+                exclude_self=True,
+            )
+            users.update(SubtreeService.load_users(
+                SubtreeService.collect_user_ids(user_oid, children_map), 'uid', 'refer_code', 'refered_by'
+            ))
+            inviters.update(SubtreeService.load_users(
+                [u.refered_by for u in users.values() if getattr(u, 'refered_by', None)], 'refer_code', 'uid'
+            ))
+
+            def make_node(current_oid, level: int, position: str, tree_parent_oid) -> Dict[str, Any]:
                 user_info = get_user_info(current_oid)
-                
-                # Create the node
                 node = {
-                    "id": current_id,
-                    "type": node_type,
+                    "type": "self" if level == 0 else "downLine",
                     "userId": user_info["uid"],
                     "objectId": user_info["object_id"],
                     "refer_code": user_info.get("refer_code"),
@@ -319,66 +300,12 @@ class DreamMatrixService:
                     "level": level,
                     "position": position
                 }
-                
                 # Add parent_id for non-root nodes (the actual tree parent)
                 if level > 0 and tree_parent_oid:
                     node["parent_id"] = str(tree_parent_oid)
-                
-                # Only get children if we're not at the last level
-                if level < max_levels - 1:
-                    # Build query filter for TreePlacement
-                    query_filter = {
-                        "program": 'matrix',
-                        "upline_id": current_oid,  # Changed from parent_oid to current_oid
-                        "user_id__ne": current_oid  # Exclude self
-                    }
-                    
-                    # Add slot filter if slot_no is provided
-                    if slot_no is not None:
-                        query_filter["slot_no"] = slot_no
-                        query_filter["is_active"] = True
-                    
-                    # Fetch children and map by saved position to enforce left→middle→right ordering
-                    children = TreePlacement.objects(**query_filter).only('user_id', 'position', 'created_at').order_by('created_at')
-                    children_by_position = { 'left': None, 'middle': None, 'right': None }
-                    for ch in children:
-                        pos_key = getattr(ch, 'position', None)
-                        if pos_key in children_by_position and children_by_position[pos_key] is None:
-                            children_by_position[pos_key] = ch
-
-                    # Build directDownline in fixed order
-                    direct_downline = []
-                    for pos_key in ['left', 'middle', 'right']:
-                        ch = children_by_position[pos_key]
-                        if not ch:
-                            continue
-                        child_node = build_node(
-                            ch.user_id,
-                            level + 1,
-                            pos_key,
-                            tree_parent_oid=current_oid
-                        )
-                        if child_node:
-                            direct_downline.append(child_node)
-                    
-                    # Add directDownline array to node if there are children
-                    if direct_downline:
-                        node["directDownline"] = direct_downline
-                
                 return node
-            
-            # Start building from root
-            root_node = build_node(user_oid, 0, "root")
-            
-            # Calculate max depth by traversing the tree
-            def calculate_depth(node: Dict[str, Any]) -> int:
-                if not node or "directDownline" not in node or not node["directDownline"]:
-                    return node.get("level", 0) if node else 0
-                return max(calculate_depth(child) for child in node["directDownline"])
-            
-            max_depth = calculate_depth(root_node) if root_node else 0
-            
-            return root_node, max_depth, total_count[0]
+
+            return SubtreeService.build_nested(user_oid, children_map, max_levels, positions, make_node)
             
         except Exception as e:
             print(f"❌ Error building nested matrix tree: {e}")
@@ -561,11 +488,10 @@ class DreamMatrixService:
     def _get_recycle_count(self, user_oid, slot_no: int) -> int:
         """Get recycle count for a user's slot"""
         try:
-            recycle_instances = MatrixRecycleInstance.objects(
+            return MatrixRecycleInstance.objects(
                 user_id=user_oid,
                 slot_number=slot_no
-            )
-            return len(recycle_instances)
+            ).count()
         except Exception as e:
             return 0
 
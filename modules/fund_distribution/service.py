@@ -1233,35 +1233,14 @@ class FundDistributionService:
                         if not fund_updated:
                             print(f"❌ Failed to update Spark Bonus fund via service: {spark_result.get('error')}")
                         else:
-                            print(f"✅ Updated spark_bonus_{program}: +${spark_result.get('spark_contribution_8_percent')} → ${spark_result.get('new_balance')}")
+                            print(f"✅ Updated spark_bonus_{program}: +${spark_result.get('spark_contribution_8_percent')}")
                     else:
-                        from modules.income.bonus_fund import BonusFund
+                        from modules.income.bonus_fund_counter import bonus_fund_counter
                         
-                        # Get or create BonusFund
-                        bonus_fund = BonusFund.objects(
-                            fund_type=fund_type,
-                            program=program,
-                            status='active'
-                        ).first()
-                        
-                        if not bonus_fund:
-                            print(f"Creating new BonusFund: {fund_type}_{program}")
-                            bonus_fund = BonusFund(
-                                fund_type=fund_type,
-                                program=program,
-                                total_collected=Decimal('0'),
-                                total_distributed=Decimal('0'),
-                                current_balance=Decimal('0'),
-                                status='active'
-                            )
-                        
-                        # Update fund balances
-                        bonus_fund.total_collected += amount
-                        bonus_fund.current_balance += amount
-                        bonus_fund.updated_at = datetime.utcnow()
-                        bonus_fund.save()
+                        # $inc on a random shard: concurrent activations never serialize on the fund document
+                        bonus_fund_counter.add(fund_type, program, collected=amount, balance=amount)
                         fund_updated = True
-                        print(f"✅ Updated {fund_type}_{program}: +${amount} → ${bonus_fund.current_balance}")
+                        print(f"✅ Updated {fund_type}_{program}: +${amount}")
                     
                 except Exception as e:
                     print(f"❌ Failed to update BonusFund for {income_type} → {fund_type}: {e}")
@@ -140,6 +140,20 @@ class GlobalTreeStructure(Document):
         ]
     }
 
+    @classmethod
+    def refresh_counts(cls, user_id, phase: str) -> int:
+        """
+        Recompute children_count / is_complete of one user's phase tree from its active
+        GlobalTeamMember rows. Called from the placement write paths so tree reads never write.
+        """
+        children = GlobalTeamMember.objects(parent_user_id=user_id, phase=phase, is_active=True).count()
+        expected = 4 if phase == 'PHASE-1' else 8
+        cls._get_collection().update_one(
+            {'user_id': user_id, 'phase': phase},
+            {'$set': {'children_count': children, 'is_complete': children >= expected, 'updated_at': datetime.utcnow()}}
+        )
+        return children
+
 class GlobalPhaseSeat(Document):
     """Track available seats in Global program phases"""
     user_id = ObjectIdField(required=True)
@@ -207,6 +207,7 @@ class GlobalSerialPlacementService:
                 phase_2_contributions=0
             )
             team_member.save()
+            GlobalTreeStructure.refresh_counts(ObjectId(first_user_id), current_phase)
             
             # Process fund distribution
             distribution_result = self._process_fund_distribution(user_id, amount, "serial_placement")
@@ -13,6 +13,7 @@ from modules.president_reward.model import PresidentRewardFund
 from modules.royal_captain.service import RoyalCaptainService
 from modules.president_reward.service import PresidentRewardService
 from modules.income.bonus_fund import BonusFund
+from modules.income.bonus_fund_counter import bonus_fund_counter
 from modules.tree.model import TreePlacement
 from modules.wallet.company_service import CompanyWalletService
 from modules.spark.model import TripleEntryReward, SparkBonusDistribution
@@ -340,6 +341,8 @@ class GlobalService:
                 )
                 team_member.save()
                 print(f"Created GlobalTeamMember record for user {user_id} with parent {parent_id}")
+                if parent_id:
+                    GlobalTreeStructure.refresh_counts(parent_id, 'PHASE-1')
             except Exception as e:
                 print(f"Failed to create GlobalTeamMember record: {str(e)}")
             
@@ -1490,6 +1493,7 @@ class GlobalService:
                 status='active'
             )
             team_member.save()
+            GlobalTreeStructure.refresh_counts(ObjectId(user_id), team_member.phase)
 
             # Update parent's GlobalPhaseProgression
             members = parent_status.global_team_members or []
@@ -1772,13 +1776,7 @@ class GlobalService:
 
             # Shareholders → BonusFund and CompanyWallet
             try:
-                bf_sh = BonusFund.objects(fund_type='shareholders', program='global').first()
-                if not bf_sh:
-                    bf_sh = BonusFund(fund_type='shareholders', program='global', status='active')
-                bf_sh.total_amount = float(getattr(bf_sh, 'total_amount', 0.0) + float(shareholders_portion))
-                bf_sh.available_amount = float(getattr(bf_sh, 'available_amount', 0.0) + float(shareholders_portion))
-                bf_sh.updated_at = datetime.utcnow()
-                bf_sh.save()
+                bonus_fund_counter.add('shareholders', 'global', collected=shareholders_portion, balance=shareholders_portion)
                 # Company wallet credit
                 self.company_wallet.credit(shareholders_portion, currency, 'global_shareholders_topup', f'GLB-SHAREHOLDERS-{user_id}-{datetime.utcnow().timestamp()}')
             except Exception:
@@ -1916,13 +1914,7 @@ class GlobalService:
             
             # Shareholders (5%)
             try:
-                bf_sh = BonusFund.objects(fund_type='shareholders', program='global').first()
-                if not bf_sh:
-                    bf_sh = BonusFund(fund_type='shareholders', program='global', status='active')
-                bf_sh.total_amount = float(getattr(bf_sh, 'total_amount', 0.0) + float(shareholders))
-                bf_sh.available_amount = float(getattr(bf_sh, 'available_amount', 0.0) + float(shareholders))
-                bf_sh.updated_at = datetime.utcnow()
-                bf_sh.save()
+                bonus_fund_counter.add('shareholders', 'global', collected=shareholders, balance=shareholders)
                 # Company wallet credit
                 self.company_wallet.credit(shareholders, 'USDT', 'global_phase_2_completion_shareholders', f'GLB-P2-SH-{user_id}-{int(datetime.utcnow().timestamp())}')
             except Exception as e:
@@ -2031,35 +2023,19 @@ class GlobalService:
             if phase not in ['phase-1', 'phase-2']:
                 return {"success": False, "error": "phase must be 'phase-1' or 'phase-2'"}
             phase_key = 'PHASE-1' if phase == 'phase-1' else 'PHASE-2'
-            
-            # Get GlobalTreeStructure record
-            tree_record = GlobalTreeStructure.objects(user_id=ObjectId(user_id), phase=phase_key).first()
-            if not tree_record:
-                # Create new tree structure
-                expected = 4 if phase_key == 'PHASE-1' else 8
-                tree_record = GlobalTreeStructure(
-                    user_id=ObjectId(user_id),
-                    parent_user_id=None,  # Root user
-                    phase=phase_key,
-                    slot_number=1,
-                    level=0,
-                    position=0,
-                    left_child_id=None,
-                    right_child_id=None,
-                    children_count=0,
-                    phase_1_members=[],
-                    phase_2_members=[],
-                    is_active=True,
-                    is_complete=False
-                )
-                tree_record.save()
+
+            # Read-only: children_count / is_complete are kept current by the placement write
+            # paths (GlobalTreeStructure.refresh_counts), so this view only reads
+            tree_record = GlobalTreeStructure.objects(user_id=ObjectId(user_id), phase=phase_key).only(
+                'level', 'position', 'is_active'
+            ).first()
 
             # Get team members for this phase
-            team_members = GlobalTeamMember.objects(
+            team_members = list(GlobalTeamMember.objects(
                 parent_user_id=ObjectId(user_id), 
                 phase=phase_key, 
                 is_active=True
-            ).only('user_id', 'position_in_phase')
+            ).only('user_id', 'position_in_phase'))
 
             # Build position mapping
             expected = 4 if phase_key == 'PHASE-1' else 8
@@ -2078,26 +2054,21 @@ class GlobalService:
                     "userId": occupant
                 })
 
-            # Update tree record
-            tree_record.children_count = len(team_members)
-            tree_record.is_complete = len(team_members) >= expected
-            tree_record.updated_at = datetime.utcnow()
-            tree_record.save()
-
+            children_count = len(team_members)
             return {
                 "success": True,
                 "user_id": user_id,
                 "phase": phase,
                 "phase_key": phase_key,
                 "expected_members": expected,
-                "current_members": len(team_members),
-                "is_complete": tree_record.is_complete,
+                "current_members": children_count,
+                "is_complete": children_count >= expected,
                 "usersData": users_data,
                 "tree_structure": {
-                    "level": tree_record.level,
-                    "position": tree_record.position,
-                    "children_count": tree_record.children_count,
-                    "is_active": tree_record.is_active
+                    "level": tree_record.level if tree_record else 0,
+                    "position": tree_record.position if tree_record else 0,
+                    "children_count": children_count,
+                    "is_active": tree_record.is_active if tree_record else True
                 }
             }
         except Exception as e:
@@ -2671,51 +2642,10 @@ class GlobalService:
         """
         Process auto-upgrades for all eligible users
         This method can be called by a scheduled task
+        Runs as the chunked, resumable batch job 'global_auto_upgrades'; returns counts only
         """
-        try:
-            # Find all users eligible for auto-upgrade
-            eligible_users = GlobalPhaseProgression.objects(
-                auto_progression_enabled=True,
-                next_phase_ready=True,
-                current_slot_no__lt=16
-            ).only('user_id')
-
-            processed_count = 0
-            failed_count = 0
-            results = []
-
-            for progression in eligible_users:
-                user_id = str(progression.user_id)
-                result = self.check_and_process_auto_upgrade(user_id)
-                
-                if result.get("success"):
-                    processed_count += 1
-                    results.append({
-                        "user_id": user_id,
-                        "status": "success",
-                        "upgraded_slot_no": result.get("upgraded_slot_no"),
-                        "slot_name": result.get("slot_name")
-                    })
-                else:
-                    failed_count += 1
-                    results.append({
-                        "user_id": user_id,
-                        "status": "failed",
-                        "error": result.get("error")
-                    })
-
-            print(f"Batch auto-upgrade processing completed: {processed_count} successful, {failed_count} failed")
-
-            return {
-                "success": True,
-                "processed_count": processed_count,
-                "failed_count": failed_count,
-                "total_checked": len(eligible_users),
-                "results": results
-            }
-
-        except Exception as e:
-            return {"success": False, "error": str(e)}
+        from modules.batch_job.service import run_job
+        return run_job('global_auto_upgrades')
 
     def process_global_incentive_distribution(self, from_user_id: str, slot_value: Decimal, transaction_type: str = 'joining') -> Dict[str, Any]:
         """
@@ -3079,51 +3009,10 @@ class GlobalService:
     def batch_process_royal_captain_bonuses(self) -> Dict[str, Any]:
         """
         Process Royal Captain Bonuses for all eligible users
+        Runs as the chunked, resumable batch job 'global_royal_captain_bonuses'; returns counts only
         """
-        try:
-            # Find all users with both Matrix and Global programs
-            eligible_users = User.objects(
-                matrix_joined=True,
-                global_joined=True
-            ).only('id')
-
-            processed_count = 0
-            failed_count = 0
-            results = []
-
-            for user in eligible_users:
-                user_id = str(user.id)
-                result = self.check_and_process_royal_captain_bonus(user_id)
-                
-                if result.get("success"):
-                    processed_count += 1
-                    results.append({
-                        "user_id": user_id,
-                        "status": "success",
-                        "bonus_amount": result.get("bonus_amount"),
-                        "direct_partners_count": result.get("direct_partners_count"),
-                        "global_team_size": result.get("global_team_size")
-                    })
-                else:
-                    failed_count += 1
-                    results.append({
-                        "user_id": user_id,
-                        "status": "failed",
-                        "error": result.get("error")
-                    })
-
-            print(f"Batch Royal Captain Bonus processing completed: {processed_count} successful, {failed_count} failed")
-
-            return {
-                "success": True,
-                "processed_count": processed_count,
-                "failed_count": failed_count,
-                "total_checked": len(eligible_users),
-                "results": results
-            }
-
-        except Exception as e:
-            return {"success": False, "error": str(e)}
+        from modules.batch_job.service import run_job
+        return run_job('global_royal_captain_bonuses')
 
     def process_president_reward(self, user_id: str) -> Dict[str, Any]:
         """
@@ -3330,50 +3219,10 @@ class GlobalService:
     def batch_process_president_rewards(self) -> Dict[str, Any]:
         """
         Process President Rewards for all eligible users
+        Runs as the chunked, resumable batch job 'global_president_rewards'; returns counts only
         """
-        try:
-            # Find all users with Global program
-            eligible_users = User.objects(
-                global_joined=True
-            ).only('id')
-
-            processed_count = 0
-            failed_count = 0
-            results = []
-
-            for user in eligible_users:
-                user_id = str(user.id)
-                result = self.check_and_process_president_reward(user_id)
-                
-                if result.get("success"):
-                    processed_count += 1
-                    results.append({
-                        "user_id": user_id,
-                        "status": "success",
-                        "reward_amount": result.get("reward_amount"),
-                        "direct_partners_count": result.get("direct_partners_count"),
-                        "global_team_size": result.get("global_team_size")
-                    })
-                else:
-                    failed_count += 1
-                    results.append({
-                        "user_id": user_id,
-                        "status": "failed",
-                        "error": result.get("error")
-                    })
-
-            print(f"Batch President Reward processing completed: {processed_count} successful, {failed_count} failed")
-
-            return {
-                "success": True,
-                "processed_count": processed_count,
-                "failed_count": failed_count,
-                "total_checked": len(eligible_users),
-                "results": results
-            }
-
-        except Exception as e:
-            return {"success": False, "error": str(e)}
+        from modules.batch_job.service import run_job
+        return run_job('global_president_rewards')
 
     def process_triple_entry_reward(self, user_id: str) -> Dict[str, Any]:
         """
@@ -3535,54 +3384,10 @@ class GlobalService:
     def batch_process_triple_entry_rewards(self) -> Dict[str, Any]:
         """
         Process Triple Entry Rewards for all eligible users
+        Runs as the chunked, resumable batch job 'global_triple_entry_rewards'; returns counts only
         """
-        try:
-            # Find all users with all three programs
-            eligible_users = User.objects(
-                binary_joined=True,
-                matrix_joined=True,
-                global_joined=True
-            ).only('id')
-
-            processed_count = 0
-            failed_count = 0
-            results = []
-
-            for user in eligible_users:
-                user_id = str(user.id)
-                result = self.check_and_process_triple_entry_reward(user_id)
-                
-                if result.get("success"):
-                    processed_count += 1
-                    results.append({
-                        "user_id": user_id,
-                        "status": "success",
-                        "programs": result.get("programs"),
-                        "eligible_date": result.get("eligible_date"),
-                        "cycle_no": result.get("cycle_no"),
-                        "global_income": result.get("global_income"),
-                        "triple_entry_contribution": result.get("triple_entry_contribution")
-                    })
-                else:
-                    failed_count += 1
-                    results.append({
-                        "user_id": user_id,
-                        "status": "failed",
-                        "error": result.get("error")
-                    })
-
-            print(f"Batch Triple Entry Reward processing completed: {processed_count} successful, {failed_count} failed")
-
-            return {
-                "success": True,
-                "processed_count": processed_count,
-                "failed_count": failed_count,
-                "total_checked": len(eligible_users),
-                "results": results
-            }
-
-        except Exception as e:
-            return {"success": False, "error": str(e)}
+        from modules.batch_job.service import run_job
+        return run_job('global_triple_entry_rewards')
 
     def distribute_triple_entry_rewards(self) -> Dict[str, Any]:
         """
@@ -4014,36 +3819,10 @@ class GlobalService:
     def batch_process_spark_bonus_distributions(self) -> Dict[str, Any]:
         """
         Process Spark Bonus Distributions for all completed Matrix slots
+        Runs as the chunked, resumable batch job 'global_spark_bonus_distributions'; returns counts only
         """
-        try:
-            # Find all Matrix slots that need distribution
-            completed_slots = []
-            for slot_number in range(1, 15):  # Slots 1-14
-                result = self.process_spark_bonus_distribution(slot_number)
-                if result.get("success"):
-                    completed_slots.append({
-                        "slot_number": slot_number,
-                        "status": "success",
-                        "processed_count": result.get("processed_count"),
-                        "failed_count": result.get("failed_count")
-                    })
-                else:
-                    completed_slots.append({
-                        "slot_number": slot_number,
-                        "status": "failed",
-                        "error": result.get("error")
-                    })
-
-            print(f"Batch Spark Bonus Distribution processing completed for {len(completed_slots)} slots")
-
-            return {
-                "success": True,
-                "total_slots": len(completed_slots),
-                "completed_slots": completed_slots
-            }
-
-        except Exception as e:
-            return {"success": False, "error": str(e)}
+        from modules.batch_job.service import run_job
+        return run_job('global_spark_bonus_distributions')
 
     def process_shareholders_fund_distribution(self, transaction_amount: Decimal, transaction_type: str = 'global_transaction') -> Dict[str, Any]:
         """
@@ -1,3 +1,3 @@
 from .model import IncomeEvent, SpilloverEvent
 from modules.leadership_stipend.model import LeadershipStipend
-from .bonus_fund import BonusFund, FundDistribution
+from .bonus_fund import BonusFund, BonusFundShard, FundDistribution
@@ -1,4 +1,4 @@
-from mongoengine import Document, StringField, DecimalField, DateTimeField, IntField
+from mongoengine import Document, StringField, DecimalField, DateTimeField, IntField, DictField
 from datetime import datetime
 from decimal import Decimal
 
@@ -14,6 +14,8 @@ class BonusFund(Document):
     total_distributed = DecimalField(default=Decimal('0.00'), precision=8)
     current_balance = DecimalField(default=Decimal('0.00'), precision=8)
     status = StringField(choices=['active', 'paused'], default='active')
+    shard_count = IntField()  # Increment shards (BonusFundShard); unset = bonus_fund_counter.DEFAULT_SHARDS
+    folds = DictField()  # shard number -> id of the last fold credited from it (bonus_fund_counter.fold)
     last_distribution = DateTimeField()
     created_at = DateTimeField(default=datetime.utcnow)
     updated_at = DateTimeField(default=datetime.utcnow)
@@ -23,6 +25,22 @@ class BonusFund(Document):
         'indexes': [('fund_type', 'program'), 'status']
     }
 
+class BonusFundShard(Document):
+    """Increment shard of a BonusFund; balance = BonusFund document + sum of its shards"""
+    fund_type = StringField(required=True)
+    program = StringField(required=True)
+    shard = IntField(required=True)
+    total_collected = DecimalField(default=Decimal('0.00'), precision=8)
+    total_distributed = DecimalField(default=Decimal('0.00'), precision=8)
+    current_balance = DecimalField(default=Decimal('0.00'), precision=8)
+    pending_fold = DictField()  # {'id', 'amounts'} taken off the shard and not yet confirmed on the fund
+    updated_at = DateTimeField(default=datetime.utcnow)
+    
+    meta = {
+        'collection': 'bonus_fund_shard',
+        'indexes': [{'fields': ['fund_type', 'program', 'shard'], 'unique': True}]
+    }
+
 class FundDistribution(Document):
     """Track when and how funds are distributed - Distribution Control"""
     fund_type = StringField(required=True)
@@ -0,0 +1,229 @@
+"""
+Sharded BonusFund balances
+
+There is one BonusFund document per (fund_type, program), so when every activation
+read it, added to it and saved it, concurrent activations serialized on that one
+document and lost updates. Increments now `$inc` one of N BonusFundShard documents
+picked at random: writers spread over N documents and never read first.
+
+A fund's balance is its BonusFund document plus the sum of its shards. fold()
+moves shard amounts into the BonusFund document (run periodically, see main()),
+so the sum stays over a handful of small documents. The shard count is set per
+fund on BonusFund.shard_count; shards above a lowered count are still read and
+folded, so changing it never strands money.
+
+A fold first takes the amounts off the shard and parks them on it as a pending
+fold with its own id, then credits the fund only if that id is not already
+recorded there. A fold cut short at any point is finished by the next fold()
+without counting anything twice; until then the parked amounts are missing from
+totals() (an under-read, never an over-read).
+
+Payouts go through reserve(): it folds the fund and debits the BonusFund document
+with an update that only matches while the balance still covers the debit, so
+concurrent payouts cannot overdraw the fund. Only funds with status 'active' pay
+out or report a balance; a paused fund keeps collecting (add() does not check the
+status) and its balance shows again once it is reactivated.
+"""
+
+import argparse
+import random
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal, ROUND_DOWN
+from typing import Dict, Iterable, Optional, Tuple
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from .bonus_fund import BonusFund, BonusFundShard
+
+DEFAULT_SHARDS = 8
+RESERVE_ATTEMPTS = 5  # Guarded debits retried while concurrent payouts move the balance
+AMOUNT_FIELDS = ('total_collected', 'total_distributed', 'current_balance')
+_QUANT = Decimal('0.00000001')
+
+
+def _decimal(value) -> Decimal:
+    return Decimal(str(value or 0)).quantize(_QUANT)
+
+
+class BonusFundCounter:
+    """Contention-free increments and summed reads of BonusFund balances"""
+
+    def __init__(self, shard_count_ttl: float = 60.0):
+        self.shard_count_ttl = shard_count_ttl
+        self._shard_counts: Dict[Tuple[str, str], Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def shard_count(self, fund_type: str, program: str) -> int:
+        """Configured shards for a fund (cached for shard_count_ttl seconds)"""
+        key = (fund_type, program)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._shard_counts.get(key)
+            if cached and now - cached[1] < self.shard_count_ttl:
+                return cached[0]
+        row = BonusFund._get_collection().find_one({'fund_type': fund_type, 'program': program}, {'shard_count': 1})
+        count = max(1, int((row or {}).get('shard_count') or DEFAULT_SHARDS))
+        with self._lock:
+            self._shard_counts[key] = (count, now)
+        return count
+
+    def set_shard_count(self, fund_type: str, program: str, shard_count: int) -> None:
+        BonusFund._get_collection().update_one(
+            {'fund_type': fund_type, 'program': program},
+            {'$set': {'shard_count': max(1, int(shard_count))},
+             '$setOnInsert': {'status': 'active', 'created_at': datetime.utcnow()}},
+            upsert=True,
+        )
+        with self._lock:
+            self._shard_counts.pop((fund_type, program), None)
+
+    def add(self, fund_type: str, program: str, collected=0, balance=0, distributed=0,
+            distributed_at: Optional[datetime] = None) -> None:
+        """
+        Atomically add to a fund's totals on a random shard (payouts that must not overdraw
+        use reserve()). Payouts pass distributed_at to stamp BonusFund.last_distribution.
+        """
+        inc = {
+            field: float(_decimal(value))
+            for field, value in zip(AMOUNT_FIELDS, (collected, distributed, balance)) if value
+        }
+        if not inc:
+            return
+        shard = random.randrange(self.shard_count(fund_type, program))
+        key = {'fund_type': fund_type, 'program': program, 'shard': shard}
+        update = {'$inc': inc, '$set': {'updated_at': datetime.utcnow()}}
+        collection = BonusFundShard._get_collection()
+        try:
+            collection.update_one(key, update, upsert=True)
+        except DuplicateKeyError:
+            # Another writer created the shard between our match and insert; it exists now
+            collection.update_one(key, update)
+        if distributed_at:
+            BonusFund._get_collection().update_one(
+                {'fund_type': fund_type, 'program': program}, {'$set': {'last_distribution': distributed_at}}
+            )
+
+    def totals(self, fund_type: str, program: str) -> Dict[str, Decimal]:
+        """total_collected / total_distributed / current_balance including unfolded shards (zero when paused)"""
+        base = BonusFund._get_collection().find_one(
+            {'fund_type': fund_type, 'program': program}, dict({field: 1 for field in AMOUNT_FIELDS}, status=1)
+        ) or {}
+        if base.get('status', 'active') != 'active':
+            return {field: Decimal('0') for field in AMOUNT_FIELDS}
+        totals = {field: _decimal(base.get(field)) for field in AMOUNT_FIELDS}
+        for row in BonusFundShard._get_collection().aggregate([
+            {'$match': {'fund_type': fund_type, 'program': program}},
+            {'$group': {'_id': None, **{field: {'$sum': f'${field}'} for field in AMOUNT_FIELDS}}},
+        ]):
+            for field in AMOUNT_FIELDS:
+                totals[field] += _decimal(row.get(field))
+        return totals
+
+    def balance(self, fund_type: str, program: str) -> Decimal:
+        return self.totals(fund_type, program)['current_balance']
+
+    def reserve(self, fund_type: str, program: str, amount, distributed_at: Optional[datetime] = None) -> Decimal:
+        """
+        Atomically take up to amount from an active fund for a payout; returns what was taken.
+
+        The fund is folded first so its balance sits on the BonusFund document; the debit
+        then matches only while that balance covers it. Increments landing on shards
+        meanwhile wait for the next fold (a payout may take less, never more than is there).
+        """
+        amount = _decimal(amount)
+        if amount <= 0:
+            return Decimal('0')
+        self.fold(fund_type, program)
+        funds = BonusFund._get_collection()
+        key = {'fund_type': fund_type, 'program': program, 'status': 'active'}
+        for _ in range(RESERVE_ATTEMPTS):
+            row = funds.find_one(key, {'current_balance': 1}) or {}
+            # Rounded down: the guard compares against the stored float
+            available = Decimal(str(row.get('current_balance') or 0)).quantize(_QUANT, rounding=ROUND_DOWN)
+            debit = min(amount, available)
+            if debit <= 0:
+                return Decimal('0')
+            now = datetime.utcnow()
+            taken = funds.update_one(
+                dict(key, current_balance={'$gte': float(debit)}),
+                {'$inc': {'current_balance': -float(debit), 'total_distributed': float(debit)},
+                 '$set': {'last_distribution': distributed_at or now, 'updated_at': now}},
+            )
+            if taken.modified_count:
+                return debit
+        return Decimal('0')
+
+    def fold(self, fund_type: Optional[str] = None, program: Optional[str] = None) -> int:
+        """
+        Move shard amounts into their BonusFund documents; returns the number of shards folded.
+
+        Each shard is decremented by what was read and the amounts are parked on it
+        (pending_fold) in the same update; increments landing meanwhile stay on the
+        shard for the next fold. Pending folds left by an interrupted run are
+        finished first.
+        """
+        scope = {}
+        if fund_type:
+            scope['fund_type'] = fund_type
+        if program:
+            scope['program'] = program
+
+        shards = BonusFundShard._get_collection()
+        for row in shards.find(dict(scope, pending_fold={'$ne': None})):
+            self._credit_fold(row)
+
+        folded = 0
+        match = dict(scope, pending_fold=None)
+        match['$or'] = [{field: {'$ne': 0}} for field in AMOUNT_FIELDS]
+        for row in shards.find(match):
+            amounts = {field: row.get(field) or 0 for field in AMOUNT_FIELDS if row.get(field)}
+            if not amounts:
+                continue
+            pending = {'id': ObjectId(), 'amounts': amounts}
+            taken = shards.update_one(
+                {'_id': row['_id'], 'pending_fold': None},
+                {'$inc': {field: -value for field, value in amounts.items()}, '$set': {'pending_fold': pending}},
+            )
+            if not taken.modified_count:
+                continue  # another fold took this shard
+            self._credit_fold(dict(row, pending_fold=pending))
+            folded += 1
+        return folded
+
+    def _credit_fold(self, shard_row) -> None:
+        """Credit a shard's pending fold to its fund once (keyed by fold id), then clear it"""
+        pending = shard_row['pending_fold']
+        key = {'fund_type': shard_row['fund_type'], 'program': shard_row['program']}
+        folds_field = f"folds.{shard_row['shard']}"
+        funds = BonusFund._get_collection()
+        now = datetime.utcnow()
+        funds.update_one(key, {'$setOnInsert': {'status': 'active', 'created_at': now}}, upsert=True)
+        funds.update_one(
+            dict(key, **{folds_field: {'$ne': pending['id']}}),
+            {'$inc': pending['amounts'], '$set': {folds_field: pending['id'], 'updated_at': now}},
+        )
+        BonusFundShard._get_collection().update_one(
+            {'_id': shard_row['_id'], 'pending_fold.id': pending['id']}, {'$unset': {'pending_fold': ''}}
+        )
+
+
+bonus_fund_counter = BonusFundCounter()
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Fold BonusFund increment shards into the fund documents")
+    parser.add_argument('--fund-type')
+    parser.add_argument('--program', choices=['binary', 'matrix', 'global'])
+    args = parser.parse_args(argv)
+
+    from core.db import connect_to_db
+    connect_to_db()
+
+    print(f"[BONUS_FUND_FOLD] folded {bonus_fund_counter.fold(args.fund_type, args.program)} shards")
+
+
+if __name__ == '__main__':
+    main()
@@ -28,7 +28,9 @@ class IncomeEvent(Document):
     
     meta = {
         'collection': 'income_event',
-        'indexes': [('user_id', 'created_at'), 'tx_hash', ('program', 'slot_no')]
+        'indexes': [('user_id', 'created_at'), 'tx_hash', ('program', 'slot_no'),
+                    # Keyset order of the streaming exports (wallet/export_service.py)
+                    ('user_id', 'created_at', '_id'), ('created_at', '_id')]
     }
 
 class SpilloverEvent(Document):
@@ -1,4 +1,5 @@
 from web3 import Web3
+from eth_abi import decode
 
 # Event signatures from Binary.sol
 EVENT_SIGNATURES = {
@@ -11,9 +12,9 @@ EVENT_SIGNATURES = {
     'PoolFunded': 'PoolFunded(address,uint8,string,uint256,address)'
 }
 
-# Pre-compute topics
+# Pre-compute topics (bare lowercase hex: HexBytes.hex() adds '0x' in some web3 releases)
 EVENT_TOPICS = {
-    name: Web3.keccak(text=sig).hex()
+    name: Web3.to_hex(Web3.keccak(text=sig))[2:]
     for name, sig in EVENT_SIGNATURES.items()
 }
 
@@ -22,3 +23,94 @@ TOPIC_TO_EVENT_NAME = {
     topic: name
     for name, topic in EVENT_TOPICS.items()
 }
+
+# topic0 filter for eth_getLogs, 0x-prefixed
+EVENT_TOPIC_FILTER = [Web3.to_hex(hexstr=topic) for topic in TOPIC_TO_EVENT_NAME]
+
+# Argument types per event, in declaration order
+EVENT_ARG_TYPES = {
+    name: sig[sig.index('(') + 1:-1].split(',')
+    for name, sig in EVENT_SIGNATURES.items()
+}
+
+# Argument names per event (the first one is the wallet whose state the event changes)
+EVENT_ARG_NAMES = {
+    'Registered': ('user', 'referrer', 'code'),
+    'Placed': ('user', 'slot', 'upline', 'is_left'),
+    'SlotPurchased': ('user', 'slot', 'amount'),
+    'AutoUpgraded': ('user', 'slot', 'amount', 'reserve_used'),
+    'LevelPayout': ('user', 'from', 'level', 'slot', 'amount'),
+    'PartnerIncentive': ('user', 'from', 'slot', 'amount'),
+    'PoolFunded': ('user', 'slot', 'pool', 'amount', 'token'),
+}
+
+
+def topic_key(topic) -> str:
+    """Normalize a topic (HexBytes, bytes or 0x-string) to the TOPIC_TO_EVENT_NAME key format"""
+    if isinstance(topic, (bytes, bytearray)):
+        return bytes(topic).hex()
+    topic = str(topic).lower()
+    return topic[2:] if topic.startswith('0x') else topic
+
+
+def _to_bytes(value) -> bytes:
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    return bytes.fromhex(topic_key(value))
+
+
+def _to_hex(value) -> str:
+    return '0x' + topic_key(value)
+
+
+def _json_safe(arg_type: str, value):
+    if isinstance(value, (bytes, bytearray)):
+        return '0x' + bytes(value).hex()
+    if isinstance(value, str) and arg_type == 'address':
+        return value.lower()
+    if isinstance(value, int) and not isinstance(value, bool) and arg_type != 'uint8':
+        # uint256 amounts do not fit BSON int64
+        return str(value)
+    return value
+
+
+def decode_logs(logs) -> list:
+    """
+    Decode a batch of raw logs into event dicts.
+
+    Indexed arguments are read from topics[1:] and assumed to be the leading
+    parameters of the signature (as emitted by Binary.sol); the rest come from data.
+    Logs with unknown topics are skipped. Arguments are keyed by EVENT_ARG_NAMES;
+    `user` is the wallet the event belongs to (used to partition replays).
+    """
+    decoded = []
+    for log in logs:
+        topics = log.get('topics') or []
+        if not topics:
+            continue
+        name = TOPIC_TO_EVENT_NAME.get(topic_key(topics[0]))
+        if not name:
+            continue
+        arg_types = EVENT_ARG_TYPES[name]
+        indexed_types = arg_types[:len(topics) - 1]
+        values = [decode([t], _to_bytes(topic))[0] for t, topic in zip(indexed_types, topics[1:])]
+        data = _to_bytes(log.get('data') or b'')
+        if len(arg_types) > len(indexed_types):
+            values.extend(decode(arg_types[len(indexed_types):], data))
+        args = {
+            arg_name: _json_safe(t, v)
+            for arg_name, t, v in zip(EVENT_ARG_NAMES[name], arg_types, values)
+        }
+        user = args.get('user')
+        block_number = log.get('blockNumber')
+        log_index = log.get('logIndex')
+        decoded.append({
+            'event': name,
+            'args': args,
+            'user': user,
+            'transaction_hash': _to_hex(log.get('transactionHash')),
+            'log_index': int(log_index, 16) if isinstance(log_index, str) else int(log_index or 0),
+            'block_number': int(block_number, 16) if isinstance(block_number, str) else int(block_number or 0),
+            'block_hash': _to_hex(log.get('blockHash') or b''),
+        })
+    return decoded
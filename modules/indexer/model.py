@@ -0,0 +1,19 @@
+from mongoengine import Document, StringField, IntField, ListField, DictField, DateTimeField
+from datetime import datetime
+
+class IndexerCheckpoint(Document):
+    """Indexer progress plus a rolling window of recent block hashes for reorg detection"""
+    indexer_key = StringField(required=True, unique=True)
+    last_block = IntField(default=0)
+    # [{'number': int, 'hash': '0x..'}], oldest first, at most REORG_WINDOW entries
+    recent_blocks = ListField(DictField())
+    reorg_count = IntField(default=0)
+    last_reorg_at = DateTimeField()
+    last_reorg = DictField()
+    updated_at = DateTimeField(default=datetime.utcnow)
+    created_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'indexer_checkpoint',
+        'indexes': ['indexer_key']
+    }
@@ -0,0 +1,404 @@
+"""
+Event Replay Service
+Re-applies stored contract events (BlockchainEvent, event_type='contract_event')
+to rebuild tree placements, slot activations and income/wallet ledgers.
+
+Events are read in chain order (block_number, log_index) a page at a time and
+partitioned by user wallet: each worker owns a fixed set of users and applies their
+events in order, so independent users replay in parallel while every user's own
+history is applied sequentially. All writes are keyed upserts, so replaying a range
+twice leaves the same state; revert_events() undoes events dropped by a reorg.
+
+Usage:
+    python -m modules.indexer.replay_service --from-block 1000 --workers 8
+"""
+
+import argparse
+import contextvars
+import time
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Any, List, Optional, Iterable
+
+from bson import ObjectId
+from pymongo import UpdateOne, DeleteOne, DeleteMany
+from web3 import Web3
+
+from modules.blockchain.model import BlockchainEvent
+from modules.income.model import IncomeEvent
+from modules.slot.max_slot_service import MaxSlotService
+from modules.slot.model import SlotActivation, SlotCatalog, SlotRoster, UserMaxSlot
+from modules.slot.roster_service import SlotRosterService
+from modules.tree.model import TreePlacement
+from modules.user.model import User
+from modules.wallet.model import WalletLedger
+
+REPLAY_WORKERS = 8
+REPLAY_PAGE_SIZE = 5000
+WEI = Decimal(10) ** 18
+PAYOUT_INCOME_TYPES = {'LevelPayout': 'level_payout', 'PartnerIncentive': 'partner_incentive'}
+
+
+def event_key(event: Dict[str, Any]) -> str:
+    """Idempotency key of a stored contract event ('<tx hash>:<log index>')"""
+    return event['tx_hash']
+
+
+class _PartitionContext:
+    """Per-partition lookups: wallet -> user, slot names, running ledger balances"""
+
+    def __init__(self, users: Dict[str, User], slot_names: Dict[int, str], balances: Dict[ObjectId, Decimal]):
+        self.users = users
+        self.slot_names = slot_names
+        self.balances = balances
+
+    def user(self, wallet: Optional[str]) -> Optional[User]:
+        return self.users.get((wallet or '').lower())
+
+    def credit(self, user_id: ObjectId, amount: Decimal) -> Decimal:
+        self.balances[user_id] = self.balances.get(user_id, Decimal('0')) + amount
+        return self.balances[user_id]
+
+
+class EventReplayService:
+    """Partitioned, order-preserving replay of stored contract events"""
+
+    def __init__(self, workers: int = REPLAY_WORKERS, page_size: int = REPLAY_PAGE_SIZE):
+        self.workers = max(1, workers)
+        self.page_size = page_size
+        self._slot_names: Optional[Dict[int, str]] = None
+
+    def replay(self, from_block: Optional[int] = None, to_block: Optional[int] = None,
+               wallets: Optional[Iterable[str]] = None, only_pending: bool = False) -> Dict[str, Any]:
+        """Replay contract events in [from_block, to_block] (optionally only some wallets / pending ones)"""
+        try:
+            started = time.perf_counter()
+            query: Dict[str, Any] = {'event_type': 'contract_event'}
+            if from_block is not None or to_block is not None:
+                query['block_number'] = {}
+                if from_block is not None:
+                    query['block_number']['$gte'] = from_block
+                if to_block is not None:
+                    query['block_number']['$lte'] = to_block
+            if wallets is not None:
+                query['event_data.user'] = {'$in': [w.lower() for w in wallets]}
+            if only_pending:
+                query['status'] = 'pending'
+
+            summary = {"events": 0, "applied": 0, "skipped": 0, "pages": 0, "users": 0}
+            cursor = BlockchainEvent._get_collection().find(query).sort(
+                [('block_number', 1), ('log_index', 1)]
+            ).batch_size(self.page_size)
+
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                page: List[Dict[str, Any]] = []
+                for event in cursor:
+                    page.append(event)
+                    if len(page) >= self.page_size:
+                        self._replay_page(page, executor, summary)
+                        page = []
+                if page:
+                    self._replay_page(page, executor, summary)
+
+            return {
+                "success": True,
+                **summary,
+                "workers": self.workers,
+                "duration_ms": round((time.perf_counter() - started) * 1000.0, 2),
+            }
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def _replay_page(self, page: List[Dict[str, Any]], executor: ThreadPoolExecutor, summary: Dict[str, Any]):
+        """Split one page into per-worker partitions (stable by wallet) and wait for all of them"""
+        partitions: List[List[Dict[str, Any]]] = [[] for _ in range(self.workers)]
+        users = set()
+        for event in page:
+            wallet = (event.get('event_data') or {}).get('user') or ''
+            users.add(wallet)
+            partitions[zlib.crc32(wallet.encode()) % self.workers].append(event)
+
+        # A page must finish before the next starts, otherwise a user's later events could overtake.
+        # Each task runs in a copy of the caller's context so query accounting follows it.
+        futures = [
+            executor.submit(contextvars.copy_context().run, self._apply_partition, p)
+            for p in partitions if p
+        ]
+        for future in futures:
+            result = future.result()
+            summary["applied"] += result["applied"]
+            summary["skipped"] += result["skipped"]
+        summary["events"] += len(page)
+        summary["pages"] += 1
+        summary["users"] += len(users)
+
+    # ------------------------------------------------------------------ partition work
+    def _context_for(self, events: List[Dict[str, Any]]) -> _PartitionContext:
+        wallets = set()
+        for event in events:
+            args = (event.get('event_data') or {}).get('args') or {}
+            for name in ('user', 'referrer', 'upline', 'from'):
+                if isinstance(args.get(name), str):
+                    wallets.add(args[name].lower())
+        users = self._load_users(wallets)
+
+        # Ledger balances continue from each receiver's latest row outside this partition
+        receivers = [
+            users[w].id for w in {
+                ((e.get('event_data') or {}).get('user') or '').lower()
+                for e in events if (e.get('event_data') or {}).get('event') in PAYOUT_INCOME_TYPES
+            } if w in users
+        ]
+        balances: Dict[ObjectId, Decimal] = {}
+        if receivers:
+            keys = [event_key(e) for e in events]
+            pipeline = [
+                {'$match': {'user_id': {'$in': receivers}, 'tx_hash': {'$nin': keys}}},
+                {'$sort': {'created_at': -1}},
+                {'$group': {'_id': '$user_id', 'balance': {'$first': '$balance_after'}}},
+            ]
+            for row in WalletLedger._get_collection().aggregate(pipeline):
+                balances[row['_id']] = Decimal(str(row.get('balance') or 0))
+        return _PartitionContext(users, self._get_slot_names(), balances)
+
+    @staticmethod
+    def _load_users(wallets: Iterable[str]) -> Dict[str, User]:
+        """One query for all wallets, matching lowercase and checksummed spellings"""
+        candidates = set()
+        for wallet in wallets:
+            candidates.add(wallet)
+            try:
+                candidates.add(Web3.to_checksum_address(wallet))
+            except Exception:
+                pass
+        if not candidates:
+            return {}
+        users = User.objects(wallet_address__in=list(candidates)).only('id', 'wallet_address', 'refered_by')
+        return {u.wallet_address.lower(): u for u in users}
+
+    def _get_slot_names(self) -> Dict[int, str]:
+        if self._slot_names is None:
+            self._slot_names = {
+                c.slot_no: c.name for c in SlotCatalog.objects(program='binary').only('slot_no', 'name')
+            }
+        return self._slot_names
+
+    def _apply_partition(self, events: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Apply one partition's events in order; one ordered bulk_write per target collection"""
+        ctx = self._context_for(events)
+        operations = defaultdict(list)
+        applied_ids = []
+        skipped = 0
+        for event in events:
+            name = (event.get('event_data') or {}).get('event')
+            handler = self.APPLY_HANDLERS.get(name)
+            ops = handler(self, event, ctx) if handler else []
+            if ops is None:
+                skipped += 1
+                continue
+            for document_cls, op in ops:
+                operations[document_cls].append(op)
+            applied_ids.append(event['_id'])
+
+        for document_cls, ops in operations.items():
+            document_cls._get_collection().bulk_write(ops, ordered=True)
+        if applied_ids:
+            BlockchainEvent._get_collection().update_many(
+                {'_id': {'$in': applied_ids}},
+                {'$set': {'status': 'processed', 'processed_at': datetime.utcnow()}},
+            )
+        return {"applied": len(applied_ids), "skipped": skipped}
+
+    # ------------------------------------------------------------------ handlers
+    # Each returns [(Document class, pymongo write op)], [] for "nothing to do",
+    # or None when the event cannot be applied (unknown wallet) and stays pending.
+
+    def _apply_registered(self, event, ctx):
+        args = event['event_data']['args']
+        user, referrer = ctx.user(args.get('user')), ctx.user(args.get('referrer'))
+        if not user:
+            return None
+        if not referrer or user.refered_by:
+            return []
+        return [(User, UpdateOne({'_id': user.id, 'refered_by': None}, {'$set': {'refered_by': referrer.id}}))]
+
+    def _apply_placed(self, event, ctx):
+        args = event['event_data']['args']
+        user, upline = ctx.user(args.get('user')), ctx.user(args.get('upline'))
+        if not user or not upline:
+            return None
+        slot_no = int(args.get('slot') or 1)
+        now = event.get('created_at') or datetime.utcnow()
+        return [(TreePlacement, UpdateOne(
+            {'user_id': user.id, 'program': 'binary', 'slot_no': slot_no},
+            {
+                '$set': {
+                    'upline_id': upline.id,
+                    'position': 'left' if args.get('is_left') else 'right',
+                    'updated_at': now,
+                },
+                '$setOnInsert': {
+                    'parent_id': user.refered_by,
+                    # Depth is not part of the log; tree readers derive it from upline links
+                    'level': 1,
+                    'is_active': True,
+                    'is_activated': True,
+                    'activation_date': now,
+                    'created_at': now,
+                },
+            },
+            upsert=True,
+        ))]
+
+    def _apply_activation(self, event, ctx):
+        data = event['event_data']
+        args = data['args']
+        user = ctx.user(args.get('user'))
+        if not user:
+            return None
+        slot_no = int(args.get('slot') or 0)
+        is_auto = data['event'] == 'AutoUpgraded'
+        now = event.get('created_at') or datetime.utcnow()
+        slot_name = ctx.slot_names.get(slot_no, f"Slot {slot_no}")
+        # The SlotActivation.save() hooks do not run for bulk writes: raise the max slot
+        # and add the user to the slot's roster here
+        hooks = [(UserMaxSlot, op) for op in UserMaxSlot.record_operations(user.id, 'binary', slot_no, slot_name, now)]
+        hooks.append((SlotRoster, SlotRoster.record_operation(user.id, 'binary', slot_no, now)))
+        return [(SlotActivation, UpdateOne(
+            {'tx_hash': event_key(event)},
+            {'$setOnInsert': {
+                'user_id': user.id,
+                'program': 'binary',
+                'slot_no': slot_no,
+                'slot_name': slot_name,
+                'activation_type': 'auto' if is_auto else ('initial' if slot_no <= 2 else 'upgrade'),
+                'upgrade_source': 'auto' if is_auto else 'wallet',
+                'amount_paid': float(Decimal(int(args.get('amount') or 0)) / WEI),
+                'currency': 'BNB',
+                'blockchain_network': 'BSC',
+                'is_auto_upgrade': is_auto,
+                'status': 'completed',
+                'activated_at': now,
+                'completed_at': now,
+                'created_at': now,
+                'metadata': {'block_number': event.get('block_number'), 'source': 'replay'},
+            }},
+            upsert=True,
+        ))] + hooks
+
+    def _apply_payout(self, event, ctx):
+        data = event['event_data']
+        args = data['args']
+        receiver, source = ctx.user(args.get('user')), ctx.user(args.get('from'))
+        if not receiver or not source:
+            return None
+        amount = Decimal(int(args.get('amount') or 0)) / WEI
+        slot_no = int(args.get('slot') or 0)
+        income_type = PAYOUT_INCOME_TYPES[data['event']]
+        key = event_key(event)
+        now = event.get('created_at') or datetime.utcnow()
+        # Raw writes store decimals as floats, the way DecimalField saves them
+        return [
+            (IncomeEvent, UpdateOne(
+                {'tx_hash': key},
+                {'$setOnInsert': {
+                    'user_id': receiver.id, 'source_user_id': source.id, 'program': 'binary',
+                    'slot_no': slot_no, 'income_type': income_type, 'amount': float(amount),
+                    'percentage': 0.0, 'status': 'completed', 'created_at': now,
+                }},
+                upsert=True,
+            )),
+            (WalletLedger, UpdateOne(
+                {'tx_hash': key},
+                {'$setOnInsert': {
+                    'user_id': receiver.id, 'amount': float(amount), 'currency': 'BNB', 'type': 'credit',
+                    'reason': f"binary_{income_type}", 'balance_after': float(ctx.credit(receiver.id, amount)),
+                    'created_at': now,
+                }},
+                upsert=True,
+            )),
+        ]
+
+    APPLY_HANDLERS = {
+        'Registered': _apply_registered,
+        'Placed': _apply_placed,
+        'SlotPurchased': _apply_activation,
+        'AutoUpgraded': _apply_activation,
+        'LevelPayout': _apply_payout,
+        'PartnerIncentive': _apply_payout,
+        'PoolFunded': lambda self, event, ctx: [],
+    }
+
+    # ------------------------------------------------------------------ revert
+    def revert_events(self, events: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Undo the derived writes of already-applied events (newest first), e.g. after a reorg"""
+        try:
+            operations = defaultdict(list)
+            involved = [e for e in events if (e.get('event_data') or {}).get('event') in
+                        ('Registered', 'Placed', 'SlotPurchased', 'AutoUpgraded')]
+            users = self._load_users(
+                w.lower() for e in involved for w in (e['event_data']['args'].get('user'),
+                                                       e['event_data']['args'].get('upline'),
+                                                       e['event_data']['args'].get('referrer')) if w
+            )
+            activated = set()
+            for event in reversed(events):
+                name = (event.get('event_data') or {}).get('event')
+                key = event_key(event)
+                if name in ('SlotPurchased', 'AutoUpgraded'):
+                    operations[SlotActivation].append(DeleteOne({'tx_hash': key}))
+                    user = users.get((event['event_data']['args'].get('user') or '').lower())
+                    if user:
+                        activated.add(user.id)
+                elif name in PAYOUT_INCOME_TYPES:
+                    operations[IncomeEvent].append(DeleteMany({'tx_hash': key}))
+                    operations[WalletLedger].append(DeleteMany({'tx_hash': key}))
+                elif name == 'Placed':
+                    args = event['event_data']['args']
+                    user, upline = users.get((args.get('user') or '').lower()), users.get((args.get('upline') or '').lower())
+                    if user and upline:
+                        operations[TreePlacement].append(DeleteOne({
+                            'user_id': user.id, 'program': 'binary',
+                            'slot_no': int(args.get('slot') or 1), 'upline_id': upline.id,
+                        }))
+                elif name == 'Registered':
+                    args = event['event_data']['args']
+                    user, referrer = users.get((args.get('user') or '').lower()), users.get((args.get('referrer') or '').lower())
+                    if user and referrer:
+                        # Only the referrer this event set: a referrer assigned elsewhere is kept
+                        operations[User].append(UpdateOne({'_id': user.id, 'refered_by': referrer.id},
+                                                          {'$set': {'refered_by': None}}))
+            for document_cls, ops in operations.items():
+                document_cls._get_collection().bulk_write(ops, ordered=True)
+            if activated:
+                # Max slots only ever rise and roster joins only move earlier: drop the reverted
+                # users' rows and recompute them from the activations that remain
+                user_ids = list(activated)
+                UserMaxSlot._get_collection().delete_many({'program': 'binary', 'user_id': {'$in': user_ids}})
+                MaxSlotService().rebuild('binary', user_ids)
+                SlotRosterService().recompute('binary', user_ids)
+            return {"success": True, "reverted": len(events)}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay stored contract events into derived collections")
+    parser.add_argument('--from-block', type=int)
+    parser.add_argument('--to-block', type=int)
+    parser.add_argument('--workers', type=int, default=REPLAY_WORKERS)
+    parser.add_argument('--only-pending', action='store_true')
+    args = parser.parse_args()
+
+    from core.db import connect_to_db
+    connect_to_db()
+    result = EventReplayService(workers=args.workers).replay(args.from_block, args.to_block,
+                                                             only_pending=args.only_pending)
+    print(f"[REPLAY] {result}")
+
+
+if __name__ == '__main__':
+    main()
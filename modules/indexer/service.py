@@ -1,9 +1,11 @@
 import asyncio
 import logging
-from web3 import Web3
-from eth_abi import decode
-from modules.blockchain.model import SystemConfig
-from modules.indexer.events import TOPIC_TO_EVENT_NAME
+from collections import deque
+from web3 import AsyncWeb3, AsyncHTTPProvider, Web3
+from pymongo import UpdateOne
+from modules.blockchain.model import SystemConfig, BlockchainEvent
+from modules.indexer.events import EVENT_TOPIC_FILTER, decode_logs
+from modules.indexer.model import IndexerCheckpoint
 from datetime import datetime
 
 # Configure logging
@@ -14,14 +16,46 @@ logger = logging.getLogger("BlockchainIndexer")
 RPC_URL = "https://opbnb-mainnet-rpc.bnbchain.org"  # opBNB Mainnet
 CONTRACT_ADDRESS = "0xYOUR_CONTRACT_ADDRESS_HERE"  # TODO: Update with deployed address
 POLL_INTERVAL = 5  # Seconds
-CHUNK_SIZE = 2000
+CHUNK_SIZE = 2000  # Largest eth_getLogs range requested
+MIN_CHUNK_SIZE = 10  # Never split a range below this many blocks
+MAX_IN_FLIGHT = 4  # Concurrent eth_getLogs requests
 SAFETY_LAG = 5  # Blocks to stay behind head to avoid reorgs
+REORG_WINDOW = 128  # Recent (block, hash) pairs kept in the checkpoint
+CHECKPOINT_KEY = 'binary_contract'
+
+# Provider error fragments meaning "block range/result set too large, ask for less"
+RANGE_LIMIT_ERRORS = (
+    'block range', 'range too large', 'range is too large', 'too many blocks',
+    'returned more than', 'response size', 'too many results',
+)
+# Provider error fragments meaning "slow down": the same range is retried after a backoff
+RATE_LIMIT_ERRORS = ('rate limit', 'rate-limit', 'too many requests', 'request count exceeded')
+RATE_LIMIT_RETRIES = 5
+RATE_LIMIT_BACKOFF = 0.5  # Seconds before the first retry, doubled on each retry
+
+
+def _is_rate_limit_error(error: Exception) -> bool:
+    # HTTP 429 surfaces as aiohttp's .status or requests' .response.status_code
+    status = getattr(error, 'status', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    message = str(error).lower()
+    return status == 429 or any(fragment in message for fragment in RATE_LIMIT_ERRORS)
+
+
+def _is_range_limit_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return not _is_rate_limit_error(error) and any(fragment in message for fragment in RANGE_LIMIT_ERRORS)
+
 
 class BlockchainIndexer:
-    def __init__(self):
-        self.w3 = Web3(Web3.HTTPProvider(RPC_URL))
-        self.contract_address = Web3.to_checksum_address(CONTRACT_ADDRESS)
+    def __init__(self, rpc_url: str = RPC_URL, contract_address: str = CONTRACT_ADDRESS,
+                 chunk_size: int = CHUNK_SIZE, max_in_flight: int = MAX_IN_FLIGHT):
+        self.w3 = AsyncWeb3(AsyncHTTPProvider(rpc_url))
+        self.contract_address = Web3.to_checksum_address(contract_address)
+        self.max_chunk_size = chunk_size
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight
         self.is_running = False
+        self.stats = {"requests": 0, "splits": 0, "rate_limited": 0, "events": 0, "chunks": 0, "reorgs": 0}
 
     async def start_worker(self):
         """Starts the background indexing loop."""
@@ -33,116 +67,241 @@ class BlockchainIndexer:
                 await self.process_blocks()
             except Exception as e:
                 logger.error(f"❌ Error in indexer loop: {e}")
-            
+
             await asyncio.sleep(POLL_INTERVAL)
 
-    async def process_blocks(self):
-        """Fetches and processes logs from the last processed block to the current safety block."""
-        
+    async def process_blocks(self) -> int:
+        """
+        Fetches and stores logs from the last processed block to the current safety block.
+
+        Up to max_in_flight eth_getLogs ranges are fetched concurrently; chunks are
+        written strictly in block order (one bulk_write + checkpoint each), so a failure
+        leaves the checkpoint at the last fully stored chunk. Returns the events stored.
+        """
         # 1. Get current chain head
-        current_opbnb_block = self.w3.eth.block_number
+        current_opbnb_block = await self.w3.eth.block_number
         target_block = current_opbnb_block - SAFETY_LAG
 
-        # 2. Get last processed block from DB
-        last_block = self._get_last_processed_block()
-        
+        # 2. Roll back anything a reorg replaced, then get last processed block from DB
+        await self.check_reorg()
+        last_block = await asyncio.to_thread(self._get_last_processed_block)
+
         # If fresh start (or DB empty), start from current - 100 or specific block
         if last_block == 0:
-             last_block = target_block - 100 
-             logger.info(f"⚠️ No last block found, starting from {last_block}")
+            last_block = target_block - 100
+            logger.info(f"⚠️ No last block found, starting from {last_block}")
 
         if last_block >= target_block:
-            return  # Already up to date
-
-        # 3. Process in chunks
-        start_block = last_block + 1
-        
-        while start_block <= target_block:
-            end_block = min(start_block + CHUNK_SIZE - 1, target_block)
-            
-            logger.info(f"🔍 Scanning blocks {start_block} to {end_block}...")
-            
-            try:
-                logs = self.w3.eth.get_logs({
-                    'fromBlock': start_block,
-                    'toBlock': end_block,
-                    'address': self.contract_address
-                })
-                
-                for log in logs:
-                    self._handle_log(log)
-                
-                # Update checkpoint
-                self._update_last_processed_block(end_block)
-                start_block = end_block + 1
-                
-            except Exception as e:
-                logger.error(f"⚠️ Failed to fetch logs ({start_block}-{end_block}): {e}")
-                # Don't advance start_block so it retries
-                await asyncio.sleep(5)
-                break
+            return 0  # Already up to date
+
+        # 3. Fetch ranges concurrently, store them in order
+        next_block = last_block + 1
+        pending = deque()
+        stored = 0
+
+        def schedule():
+            nonlocal next_block
+            while len(pending) < self.max_in_flight and next_block <= target_block:
+                end_block = min(next_block + self.chunk_size - 1, target_block)
+                pending.append((end_block, asyncio.create_task(self._fetch_chunk(next_block, end_block))))
+                next_block = end_block + 1
+
+        schedule()
+        try:
+            while pending:
+                end_block, task = pending.popleft()
+                logs, end_hash = await task
+                events = decode_logs(logs)
+                await asyncio.to_thread(self._store_chunk, events, end_block, end_hash)
+                stored += len(events)
+                self.stats["chunks"] += 1
+                schedule()
+        except Exception as e:
+            logger.error(f"⚠️ Failed to index up to block {target_block}: {e}")
+            raise
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+        self.stats["events"] += stored
+        return stored
+
+    async def check_reorg(self):
+        """
+        Compare the newest checkpointed block hash with the chain. On mismatch, binary
+        search the window for the newest block still on the canonical chain and roll
+        back everything after it. Returns the rollback summary, or None if no reorg.
+        """
+        window = await asyncio.to_thread(self._get_recent_blocks)
+        if not window or await self._block_hash(window[-1]['number']) == window[-1]['hash']:
+            return None
+
+        # Entries match up to the fork point and mismatch after it
+        low, high, ancestor = 0, len(window) - 1, None
+        while low < high:
+            middle = (low + high) // 2
+            if await self._block_hash(window[middle]['number']) == window[middle]['hash']:
+                ancestor = window[middle]['number']
+                low = middle + 1
+            else:
+                high = middle
+        if ancestor is None:
+            ancestor = window[0]['number'] - 1
+            logger.error(f"❌ Reorg deeper than the {len(window)}-entry window; rolling back to {ancestor}")
+
+        result = await asyncio.to_thread(self._rollback_to, ancestor)
+        self.stats["reorgs"] += 1
+        logger.warning(f"⚠️ Reorg detected: rolled back to block {ancestor} ({result['events_removed']} events)")
+        return result
 
-    def _handle_log(self, log):
-        """Decodes and routes the log to the correct handler."""
-        topic0 = log['topics'][0].hex()
-        event_name = TOPIC_TO_EVENT_NAME.get(topic0)
+    async def _fetch_chunk(self, from_block: int, to_block: int):
+        """Logs for a chunk plus the hash of its last block (recorded in the checkpoint)"""
+        return await asyncio.gather(self._fetch_range(from_block, to_block), self._block_hash(to_block))
 
-        if not event_name:
-            return
+    async def _block_hash(self, block_number: int) -> str:
+        async with self._semaphore():
+            block = await self.w3.eth.get_block(block_number)
+        return Web3.to_hex(block['hash'])
 
+    async def _fetch_range(self, from_block: int, to_block: int) -> list:
+        """eth_getLogs for one range, halving it while the provider rejects the size."""
         try:
-            # Decode logic (simplified for demonstration)
-            # In a real app, you'd use contract.events[Name]().process_log(log) 
-            # or manual eth_abi.decode based on the event signature.
-            
-            logger.info(f"✅ Event Detected: {event_name} - Tx: {log['transactionHash'].hex()}")
-            
-            # --- Handler Routing ---
-            if event_name == 'Registered':
-                self._handle_registered(log)
-            elif event_name == 'SlotPurchased':
-                self._handle_slot_purchased(log)
-            elif event_name == 'Placed':
-                self._handle_placed(log)
-            elif event_name == 'LevelPayout':
-                self._handle_income(log, "Level Income")
-            
+            logs = await self._get_logs_with_backoff(from_block, to_block)
         except Exception as e:
-            logger.error(f"Error processing log {log['transactionHash'].hex()}: {e}")
+            if not _is_range_limit_error(e) or to_block - from_block + 1 <= MIN_CHUNK_SIZE:
+                raise
+            self.stats["splits"] += 1
+            size = to_block - from_block + 1
+            # Later ranges start at the size that was just rejected, halved
+            self.chunk_size = max(MIN_CHUNK_SIZE, min(self.chunk_size, size // 2))
+            middle = from_block + size // 2 - 1
+            left, right = await asyncio.gather(
+                self._fetch_range(from_block, middle),
+                self._fetch_range(middle + 1, to_block),
+            )
+            return left + right
+
+        if self.chunk_size < self.max_chunk_size and to_block - from_block + 1 >= self.chunk_size:
+            # Grow back slowly once full-size ranges succeed again
+            self.chunk_size = min(self.max_chunk_size, self.chunk_size * 5 // 4 + 1)
+        return logs
+
+    async def _get_logs_with_backoff(self, from_block: int, to_block: int) -> list:
+        """_get_logs, retrying the same range after a growing pause while the provider rate-limits"""
+        for retry in range(RATE_LIMIT_RETRIES):
+            try:
+                return await self._get_logs(from_block, to_block)
+            except Exception as e:
+                if not _is_rate_limit_error(e):
+                    raise
+                self.stats["rate_limited"] += 1
+                await asyncio.sleep(RATE_LIMIT_BACKOFF * 2 ** retry)
+        return await self._get_logs(from_block, to_block)
+
+    async def _get_logs(self, from_block: int, to_block: int) -> list:
+        async with self._semaphore():
+            self.stats["requests"] += 1
+            return await self.w3.eth.get_logs({
+                'fromBlock': from_block,
+                'toBlock': to_block,
+                'address': self.contract_address,
+                'topics': [EVENT_TOPIC_FILTER],
+            })
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # Created lazily (and per loop) so it binds to the loop that runs the indexer
+        loop = asyncio.get_running_loop()
+        if getattr(self, '_in_flight_loop', None) is not loop:
+            self._in_flight_loop = loop
+            self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        return self._in_flight
 
     # --- DB Helpers ---
-    
-    def _get_last_processed_block(self):
-        """Fetches the last processed block number from SystemConfig."""
-        config = SystemConfig.objects(config_key='indexer_last_block').first()
-        if config:
-            return int(config.config_value)
-        return 0
 
-    def _update_last_processed_block(self, block_num):
-        """Updates the checkpoint in DB."""
-        SystemConfig.objects(config_key='indexer_last_block').update_one(
-            upsert=True,
-            set__config_value=str(block_num),
-            set__description="Last processed block by Blockchain Indexer",
-            set__updated_at=datetime.utcnow()
-        )
+    def _store_chunk(self, events: list, end_block: int, end_hash: str = None):
+        """Writes one chunk's events with a single bulk_write, then advances the checkpoint."""
+        if events:
+            now = datetime.utcnow()
+            operations = [
+                UpdateOne(
+                    {'tx_hash': f"{event['transaction_hash']}:{event['log_index']}"},
+                    {'$setOnInsert': {
+                        'event_type': 'contract_event',
+                        'event_data': {
+                            'event': event['event'],
+                            'args': event['args'],
+                            'user': event['user'],
+                            'transaction_hash': event['transaction_hash'],
+                        },
+                        'block_number': event['block_number'],
+                        'block_hash': event['block_hash'],
+                        'log_index': event['log_index'],
+                        'status': 'pending',
+                        'created_at': now,
+                    }},
+                    upsert=True,
+                )
+                for event in events
+            ]
+            BlockchainEvent._get_collection().bulk_write(operations, ordered=False)
+        self._update_last_processed_block(end_block, end_hash)
 
-    # --- Event Handlers (Placeholders for now) ---
+    def _rollback_to(self, ancestor: int) -> dict:
+        """Drops events above the common ancestor (reverting applied ones) and rewinds the checkpoint."""
+        from modules.indexer.replay_service import EventReplayService
 
-    def _handle_registered(self, log):
-        # Decode data (user, referrer, code)
-        # Update User collection in Mongo
-        pass
+        collection = BlockchainEvent._get_collection()
+        query = {'event_type': 'contract_event', 'block_number': {'$gt': ancestor}}
+        events = list(collection.find(query).sort([('block_number', 1), ('log_index', 1)]))
+        applied = [e for e in events if e.get('status') == 'processed']
+        if applied:
+            EventReplayService().revert_events(applied)
+        if events:
+            collection.delete_many(query)
 
-    def _handle_slot_purchased(self, log):
-        # Update SlotActivation
-        pass
+        result = {
+            'ancestor': ancestor,
+            'events_removed': len(events),
+            'events_reverted': len(applied),
+            'wallets': sorted({(e.get('event_data') or {}).get('user') or '' for e in events} - {''}),
+        }
+        IndexerCheckpoint._get_collection().update_one(
+            {'indexer_key': CHECKPOINT_KEY},
+            {
+                '$set': {
+                    'last_block': ancestor,
+                    'last_reorg_at': datetime.utcnow(),
+                    'last_reorg': {k: v for k, v in result.items() if k != 'wallets'},
+                    'updated_at': datetime.utcnow(),
+                },
+                '$pull': {'recent_blocks': {'number': {'$gt': ancestor}}},
+                '$inc': {'reorg_count': 1},
+            },
+        )
+        return result
 
-    def _handle_placed(self, log):
-        # Update TreePlacement
-        pass
+    def _get_recent_blocks(self) -> list:
+        checkpoint = IndexerCheckpoint._get_collection().find_one({'indexer_key': CHECKPOINT_KEY}, {'recent_blocks': 1})
+        return (checkpoint or {}).get('recent_blocks') or []
+
+    def _get_last_processed_block(self):
+        """Fetches the last processed block number (falls back to the legacy SystemConfig checkpoint)."""
+        checkpoint = IndexerCheckpoint._get_collection().find_one({'indexer_key': CHECKPOINT_KEY}, {'last_block': 1})
+        if checkpoint:
+            return int(checkpoint.get('last_block') or 0)
+        config = SystemConfig.objects(config_key='indexer_last_block').first()
+        if config:
+            return int(config.config_value)
+        return 0
 
-    def _handle_income(self, log, reason):
-        # Update WalletLedger
-        pass
+    def _update_last_processed_block(self, block_num, block_hash=None):
+        """Advances the checkpoint and appends (block, hash) to the rolling reorg window."""
+        now = datetime.utcnow()
+        update = {
+            '$set': {'last_block': block_num, 'updated_at': now},
+            '$setOnInsert': {'created_at': now, 'reorg_count': 0},
+        }
+        if block_hash:
+            update['$push'] = {'recent_blocks': {'$each': [{'number': block_num, 'hash': block_hash}],
+                                                 '$slice': -REORG_WINDOW}}
+        IndexerCheckpoint._get_collection().update_one({'indexer_key': CHECKPOINT_KEY}, update, upsert=True)
@@ -48,7 +48,7 @@ class JackpotDistribution(Document):
     
     meta = {
         'collection': 'jackpot_distributions',
-        'indexes': [('week_start_date', 'week_end_date'), 'distribution_id']
+        'indexes': [('week_start_date', 'week_end_date'), 'distribution_id', ('winners.user_id', 'created_at', '_id')]
     }
 
 class JackpotUserEntry(Document):
@@ -80,7 +80,7 @@ class JackpotUserEntry(Document):
     
     meta = {
         'collection': 'jackpot_user_entries',
-        'indexes': [('user_id', 'week_start_date'), ('week_start_date', 'week_end_date')]
+        'indexes': [('user_id', 'week_start_date'), ('week_start_date', 'week_end_date'), ('user_id', 'created_at', '_id')]
     }
 
 class JackpotFreeCoupon(Document):
@@ -200,16 +200,17 @@ async def get_current_jackpot_stats(
 async def get_user_jackpot_history(
     user_id: str, 
     history_type: str = Query(..., regex="^(entry|claim)$"),
-    limit: int = Query(20, ge=1, le=100)
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page")
 ):
     """Get user's jackpot history - entry or claim based on query parameter"""
     try:
         jackpot_service = JackpotService()
         
         if history_type == "entry":
-            result = jackpot_service.get_user_entry_history(user_id, limit)
+            result = jackpot_service.get_user_entry_history(user_id, limit, cursor=cursor)
         elif history_type == "claim":
-            result = jackpot_service.get_user_claim_history(user_id, limit)
+            result = jackpot_service.get_user_claim_history(user_id, limit, cursor=cursor)
         else:
             raise HTTPException(status_code=400, detail="Invalid history_type. Must be 'entry' or 'claim'")
         
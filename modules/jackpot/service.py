@@ -5,6 +5,7 @@ import random
 import uuid
 from typing import Dict, List, Any, Optional
 
+from core.pagination import paginate
 from modules.user.model import User
 from modules.income.model import IncomeEvent
 from modules.wallet.model import UserWallet
@@ -759,16 +760,12 @@ class JackpotService:
             total_global_usdt = 0.0
             total_global_bnb = 0.0
             try:
-                from modules.income.bonus_fund import BonusFund
+                from modules.income.bonus_fund_counter import bonus_fund_counter
                 # Get USDT fund (from matrix program)
-                usdt_fund = BonusFund.objects(fund_type='jackpot_entry', program='matrix').first()
-                if usdt_fund:
-                    total_global_usdt = float(usdt_fund.current_balance or 0.0)
+                total_global_usdt = float(bonus_fund_counter.balance('jackpot_entry', 'matrix'))
                 
                 # Get BNB fund (from binary program)
-                bnb_fund = BonusFund.objects(fund_type='jackpot_entry', program='binary').first()
-                if bnb_fund:
-                    total_global_bnb = float(bnb_fund.current_balance or 0.0)
+                total_global_bnb = float(bonus_fund_counter.balance('jackpot_entry', 'binary'))
             except Exception as e:
                 print(f"Error fetching jackpot global funds: {e}")
             
@@ -853,13 +850,12 @@ class JackpotService:
                 "error": f"Failed to get current jackpot stats: {str(e)}"
             }
     
-    def get_user_entry_history(self, user_id: str, limit: int = 20) -> Dict[str, Any]:
-        """Get user's jackpot entry history"""
+    def get_user_entry_history(self, user_id: str, limit: int = 20, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Get user's jackpot entry history (one page of weekly entry records, newest first)"""
         try:
             # Get user's entries from all weeks, ordered by creation date
-            user_entries = JackpotUserEntry.objects(
-                user_id=ObjectId(user_id)
-            ).order_by('-created_at').limit(limit)
+            result_page = paginate(JackpotUserEntry.objects(user_id=ObjectId(user_id)), limit, cursor=cursor)
+            user_entries = result_page.items
             
             entry_history = []
             entry_counter = 1
@@ -880,7 +876,9 @@ class JackpotService:
             return {
                 "success": True,
                 "entry_history": entry_history,
-                "total_entries": len(entry_history)
+                "total_entries": len(entry_history),
+                "next_cursor": result_page.next_cursor,
+                "has_more": result_page.has_more
             }
             
         except Exception as e:
@@ -889,13 +887,12 @@ class JackpotService:
                 "error": f"Failed to get user entry history: {str(e)}"
             }
     
-    def get_user_claim_history(self, user_id: str, limit: int = 20) -> Dict[str, Any]:
-        """Get user's jackpot claim/winning history"""
+    def get_user_claim_history(self, user_id: str, limit: int = 20, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Get user's jackpot claim/winning history (one page of distributions, newest first)"""
         try:
             # Get jackpot distributions where user was a winner
-            distributions = JackpotDistribution.objects(
-                winners__user_id=ObjectId(user_id)
-            ).order_by('-created_at').limit(limit)
+            result_page = paginate(JackpotDistribution.objects(winners__user_id=ObjectId(user_id)), limit, cursor=cursor)
+            distributions = result_page.items
             
             claim_history = []
             
@@ -929,7 +926,9 @@ class JackpotService:
             return {
                 "success": True,
                 "claim_history": claim_history,
-                "total_claims": len(claim_history)
+                "total_claims": len(claim_history),
+                "next_cursor": result_page.next_cursor,
+                "has_more": result_page.has_more
             }
             
         except Exception as e:
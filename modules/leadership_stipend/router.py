@@ -453,7 +453,7 @@ async def create_leadership_stipend_claim(
             raise HTTPException(status_code=400, detail="No eligible users for this slot")
 
         # Slot allocation based on global pool
-        from modules.income.bonus_fund import BonusFund
+        from modules.income.bonus_fund_counter import bonus_fund_counter
 
         distribution_percentages = {
             10: 0.30,
@@ -469,8 +469,7 @@ async def create_leadership_stipend_claim(
         tier = _get_tier_info(slot_number)
         tier_percentage = distribution_percentages.get(slot_number, 0.0)
 
-        bnb_fund = BonusFund.objects(fund_type='leadership_stipend', program='binary').first()
-        total_global_bnb = float(bnb_fund.current_balance or 0.0) if bnb_fund else 0.0
+        total_global_bnb = float(bonus_fund_counter.balance('leadership_stipend', 'binary'))
         if total_global_bnb <= 0:
             raise HTTPException(status_code=400, detail="Leadership Stipend pool empty")
 
@@ -697,9 +696,8 @@ async def get_leadership_stipend_fund():
     try:
         fund = LeadershipStipendFund.objects(is_active=True).first()
         if not fund:
-            # Create default fund
+            # Defaults only; the record is created by the matching POST, never by a GET
             fund = LeadershipStipendFund()
-            fund.save()
         
         return success_response(
             data={
@@ -768,9 +766,8 @@ async def get_leadership_stipend_settings():
     try:
         settings = LeadershipStipendSettings.objects(is_active=True).first()
         if not settings:
-            # Create default settings
+            # Defaults only; the record is created by the matching POST, never by a GET
             settings = LeadershipStipendSettings()
-            settings.save()
         
         return success_response(
             data={
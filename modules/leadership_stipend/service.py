@@ -469,8 +469,8 @@ class LeadershipStipendService:
             LeadershipStipendTier(slot_number=17, tier_name="CEO", slot_value=144.1792, daily_return=288.3584),
         ]
     
-    def _ensure_all_tiers(self, leadership_stipend: LeadershipStipend) -> LeadershipStipend:
-        """Ensure stipend record contains all tiers with up-to-date metadata."""
+    def _ensure_all_tiers(self, leadership_stipend: LeadershipStipend, persist: bool = True) -> LeadershipStipend:
+        """Ensure stipend record contains all tiers with up-to-date metadata (in memory only unless persist)."""
         required_tiers = {tier.slot_number: tier for tier in self._initialize_leadership_stipend_tiers()}
         existing_tiers = {tier.slot_number: tier for tier in (leadership_stipend.tiers or [])}
         updated = False
@@ -498,7 +498,7 @@ class LeadershipStipendService:
                 )
                 updated = True
         
-        if updated:
+        if updated and persist:
             leadership_stipend.save()
             leadership_stipend.reload()
         return leadership_stipend
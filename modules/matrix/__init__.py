@@ -11,7 +11,8 @@ from .model import (
     MatrixCommission,
     MatrixRecycleInstance,
     MatrixRecycleNode,
-    MatrixSlotInfo
+    MatrixSlotInfo,
+    MatrixMiddleThree
 )
 
 __all__ = [
@@ -25,5 +26,6 @@ __all__ = [
     'MatrixCommission',
     'MatrixRecycleInstance',
     'MatrixRecycleNode',
-    'MatrixSlotInfo'
+    'MatrixSlotInfo',
+    'MatrixMiddleThree'
 ]
\ No newline at end of file
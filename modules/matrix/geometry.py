@@ -0,0 +1,178 @@
+"""
+Matrix tree geometry
+
+A Matrix tree is a fixed 3-ary tree of three levels under its owner: 3 + 9 + 27 = 39
+positions. Positions are 0-based within a level, so the parent of (level, p) is
+(level - 1, p // 3), its children are (level + 1, 3p .. 3p + 2) and the middle child
+of every parent sits at p % 3 == 1. The owner is (0, 0).
+
+Everything here is index arithmetic. Lookups by user go through an occupancy index
+((level, position) -> user id) built once from a tree's nodes, so resolving the
+uplines of a placement never scans the nodes. Free-position searches use an
+occupancy bitmap: a 39-bit integer whose bit i is set when the i-th position of
+the fill order is taken, so the next free position is the lowest clear bit. The
+fill order is the sweepover wave order, or plain level order (level_order=True)
+for the callers that have always filled each level left to right.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+BRANCHING = 3
+MAX_LEVEL = 3
+OWNER = (0, 0)
+# level -> (offset, width) of the level in BFS order (L1 0-2, L2 3-11, L3 12-38)
+LEVELS = {1: (0, 3), 2: (3, 9), 3: (12, 27)}
+TREE_SIZE = 39
+SIDES = ('left', 'middle', 'right')
+# TreePlacement / recycle spellings of a child index
+SIDE_INDEX = {'left': 0, 'middle': 1, 'center': 1, 'right': 2}
+
+Position = Tuple[int, int]
+
+
+def level_capacity(level: int) -> int:
+    return BRANCHING ** level if 1 <= level <= MAX_LEVEL else 0
+
+
+def is_valid(level: int, position: int) -> bool:
+    return 0 <= position < level_capacity(level)
+
+
+def flat_index(level: int, position: int) -> int:
+    """BFS index 0..38 of a position (the layout of MatrixRecycleInstance.occupants)"""
+    if not is_valid(level, position):
+        raise ValueError(f"Invalid matrix position: level {level}, position {position}")
+    return LEVELS[level][0] + position
+
+
+def from_flat_index(index: int) -> Position:
+    for level, (offset, width) in LEVELS.items():
+        if offset <= index < offset + width:
+            return level, index - offset
+    raise ValueError(f"Invalid matrix index: {index}")
+
+
+def parent(level: int, position: int) -> Optional[Position]:
+    """Parent position; the owner (0, 0) for level 1, None for the owner itself"""
+    if level <= 0:
+        return None
+    return level - 1, position // BRANCHING
+
+
+def ancestors(level: int, position: int) -> List[Position]:
+    """Parent, grandparent, ... up to and including the owner"""
+    chain = []
+    current = parent(level, position)
+    while current is not None:
+        chain.append(current)
+        current = parent(*current)
+    return chain
+
+
+def child(position: int, child_index: int) -> int:
+    """Position on the next level of the child_index-th (0..2) child of `position`"""
+    return position * BRANCHING + child_index
+
+
+def children(level: int, position: int) -> List[Position]:
+    if level >= MAX_LEVEL:
+        return []
+    return [(level + 1, child(position, index)) for index in range(BRANCHING)]
+
+
+def child_index(position: int) -> int:
+    """0 / 1 / 2 = left / middle / right under the parent"""
+    return position % BRANCHING
+
+
+def side(position: int) -> str:
+    return SIDES[child_index(position)]
+
+
+def is_middle(position: int) -> bool:
+    return child_index(position) == 1
+
+
+def middle_child(position: int) -> int:
+    """Position on the next level of the middle child of `position`"""
+    return child(position, 1)
+
+
+def middle_positions(level: int) -> List[int]:
+    return [position for position in range(level_capacity(level)) if is_middle(position)]
+
+
+def wave_order(level: int) -> List[int]:
+    """
+    Sweepover fill order of a level: the first child of every parent, then every
+    second child, then every third (L2: 0, 3, 6, 1, 4, 7, 2, 5, 8). Level 1 is 0, 1, 2.
+    """
+    parents = level_capacity(level - 1) if level > 1 else 1
+    return [child(p, index) for index in range(BRANCHING) for p in range(parents)]
+
+
+# All 39 positions in the order placements fill them
+WAVE_ORDER: Tuple[Position, ...] = tuple(
+    (level, position) for level in range(1, MAX_LEVEL + 1) for position in wave_order(level)
+)
+
+
+# Bit of each position in an occupancy bitmap (its rank in WAVE_ORDER)
+WAVE_RANK: Dict[Position, int] = {position: rank for rank, position in enumerate(WAVE_ORDER)}
+# Plain level order (L1 0-2, L2 0-8, L3 0-26); a position's bit in a level-order bitmap is its flat_index
+LEVEL_ORDER: Tuple[Position, ...] = tuple(from_flat_index(index) for index in range(TREE_SIZE))
+FULL_MASK = (1 << TREE_SIZE) - 1
+
+
+def _placed_nodes(nodes: Iterable):
+    """(level, position, user_id) of the nodes (model objects or dicts) that sit on a valid position"""
+    for node in nodes or []:
+        if isinstance(node, dict):
+            level, position, user_id = node.get('level'), node.get('position'), node.get('user_id')
+        else:
+            level, position, user_id = getattr(node, 'level', None), getattr(node, 'position', None), getattr(node, 'user_id', None)
+        if user_id is not None and level is not None and position is not None and is_valid(level, position):
+            yield level, position, user_id
+
+
+def occupancy_index(nodes: Iterable) -> Dict[Position, str]:
+    """(level, position) -> user id (str) of a tree's nodes (model objects or dicts)"""
+    return {(level, position): str(user_id) for level, position, user_id in _placed_nodes(nodes)}
+
+
+def position_bit(level: int, position: int, level_order: bool = False) -> int:
+    if level_order:
+        return 1 << (LEVELS[level][0] + position)
+    return 1 << WAVE_RANK[(level, position)]
+
+
+def occupancy_mask(nodes: Iterable, user_ids=None, level_order: bool = False) -> int:
+    """
+    Occupancy bitmap of a tree's nodes. With user_ids, only nodes of those users count
+    (the nodes of one slot, when the tree's nodes span several slots).
+    """
+    mask = 0
+    for level, position, user_id in _placed_nodes(nodes):
+        if user_ids is None or user_id in user_ids:
+            mask |= position_bit(level, position, level_order)
+    return mask
+
+
+def next_free_position(mask: int, max_level: int = MAX_LEVEL, level_order: bool = False) -> Optional[Position]:
+    """First free position of the bitmap's order, or None when levels 1..max_level are full"""
+    rank = (~mask & (mask + 1)).bit_length() - 1
+    offset, width = LEVELS[max_level]
+    if rank >= offset + width:
+        return None
+    return (LEVEL_ORDER if level_order else WAVE_ORDER)[rank]
+
+
+def tree_uplines(owner_id, occupancy: Dict[Position, str], level: int, position: int) -> List[Optional[str]]:
+    """
+    Uplines of a placement inside the tree, nearest first and ending with the owner
+    (None where an ancestor position is empty). Level 1 -> [owner],
+    level 2 -> [L1 parent, owner], level 3 -> [L2 parent, L1 grandparent, owner].
+    """
+    if not is_valid(level, position):
+        return []
+    return [str(owner_id) if ancestor == OWNER else occupancy.get(ancestor) for ancestor in ancestors(level, position)]
@@ -8,14 +8,21 @@ from typing import Dict, Any, Optional, List, Tuple
 from decimal import Decimal
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 from ..user.model import User
-from ..wallet.model import UserWallet, ReserveLedger
+from ..wallet.model import UserWallet
+from ..wallet.reserve_account_service import ReserveAccountService, to_units
 from ..slot.model import SlotCatalog, SlotActivation
 from ..tree.model import TreePlacement
 from ..blockchain.model import BlockchainEvent
 from ..income.model import IncomeEvent
-from .model import MatrixTree, MatrixNode, MatrixActivation
+from .model import MatrixTree, MatrixNode, MatrixActivation, MatrixMiddleThree
+from . import geometry as matrix_geometry
+
+# Placements kept on a middle-three counter (members, placement_keys); at least one full cycle
+MIDDLE_THREE_HISTORY = 30
 
 
 class MatrixMiddle3Service:
@@ -29,22 +36,29 @@ class MatrixMiddle3Service:
         Identify the middle 3 users in Level 2 of the Matrix tree.
         Middle 3 users are positions 4, 5, 6 in Level 2 (one under each Level 1 member).
         """
+        try:
+            # Members recorded at placement time (no tree scan)
+            recorded = self.get_middle_three(user_id, slot_no)
+            if recorded is not None:
+                return [dict(m, is_active=True) for m in recorded["members"]]
+            return self._scan_middle_3_users(user_id)
+
+        except Exception as e:
+            print(f"Error identifying middle 3 users: {e}")
+            return []
+
+    def _scan_middle_3_users(self, user_id: str) -> List[Dict[str, Any]]:
+        """Derive the middle members from the stored tree nodes (trees placed before the counter existed)"""
         try:
             # Get user's matrix tree
             matrix_tree = MatrixTree.objects(user_id=ObjectId(user_id)).first()
             if not matrix_tree:
                 return []
             
-            # Find Level 2 nodes (positions 4, 5, 6 are middle 3)
+            # Middle children (index 1 under their parent) from Level 2 down: L2 positions 1, 4, 7
             level_2_nodes = []
             for node in matrix_tree.nodes:
-                # Generalized logic for infinite levels:
-                # Middle child is always the 2nd child (index 1) of any parent.
-                # In 0-based indexing with 3 children per node:
-                # Level 1: 0, 1(M), 2
-                # Level 2: 0,1,2 | 3,4(M),5 | 6,7,8 -> Middle are 1, 4, 7
-                # Formula: position % 3 == 1
-                if node.level >= 2 and (node.position % 3 == 1):
+                if node.level >= 2 and matrix_geometry.is_middle(node.position):
                     level_2_nodes.append({
                         "user_id": str(node.user_id),
                         "level": node.level,
@@ -61,70 +75,129 @@ class MatrixMiddle3Service:
     
     def collect_middle_3_earnings(self, main_user_id: str, slot_no: int, 
                                  earning_amount: Decimal, source_user_id: str, 
-                                 tx_hash: str, skip_validation: bool = False) -> Tuple[bool, str]:
+                                 tx_hash: str, skip_validation: bool = False,
+                                 position: Optional[int] = None) -> Tuple[bool, str]:
         """
         Collect 100% earnings from middle 3 users for next slot upgrade.
         This is triggered when a middle 3 user activates a slot or joins.
         
         Args:
             skip_validation: If True, skip middle-3 validation (caller verified from placement_ctx)
+            position: Level-2 position of the member in the main user's tree, when known
         """
         try:
             if not skip_validation:
                 # Check if the earning user is one of the middle 3 users
-                middle_3_users = self.identify_middle_3_users(main_user_id, slot_no)
+                middle_3_users = self._scan_middle_3_users(main_user_id)
                 
                 earning_user_in_middle_3 = False
                 for middle_user in middle_3_users:
                     if middle_user["user_id"] == source_user_id:
                         earning_user_in_middle_3 = True
+                        position = middle_user["position"] if position is None else position
                         break
                 
                 if not earning_user_in_middle_3:
                     return False, "User is not in middle 3 position"
             
+            # Count each placement once; a replayed placement must not credit the reserve twice,
+            # while a recycled member placed again (a new tx) is a new middle member
+            counter = self._record_middle_member(main_user_id, slot_no, source_user_id, position, earning_amount, tx_hash)
+            if counter is None:
+                return False, "Middle 3 earnings already collected for this placement"
+
             # Add 100% of earnings to main user's reserve fund
-            success, message = self._add_to_reserve_fund(
-                main_user_id,
-                'matrix',
-                slot_no,
-                earning_amount,
-                source_user_id,
-                tx_hash
-            )
-            
-            if success:
-                # Check if reserve is sufficient for next slot upgrade
-                print(f"[MIDDLE3_DEBUG] Checking auto-upgrade for user {main_user_id} after collecting {earning_amount}")
-                upgrade_result = self._check_next_slot_upgrade(main_user_id, slot_no)
+            try:
+                new_balance = ReserveAccountService().credit(main_user_id, 'matrix', slot_no, earning_amount,
+                                                             'middle_3_earnings', tx_hash=tx_hash)
+            except Exception as e:
+                self._discard_middle_member(main_user_id, slot_no, source_user_id, earning_amount, tx_hash)
+                return False, f"Error adding to reserve fund: {str(e)}"
+            self._update_reserve_wallet(main_user_id, 'matrix', new_balance)
+
+            # The upgrade is due exactly when a middle three completes
+            if counter["members_count"] % 3 == 0:
+                print(f"[MIDDLE3_DEBUG] Middle three complete for user {main_user_id}; reserve {new_balance}")
+                upgrade_result = self._check_next_slot_upgrade(main_user_id, slot_no, reserve_balance=new_balance)
                 print(f"[MIDDLE3_DEBUG] Auto-upgrade check returned: {upgrade_result}")
-                return True, f"Collected {earning_amount} from middle 3 user for next slot upgrade"
-            else:
-                return False, message
+            return True, f"Collected {earning_amount} from middle 3 user for next slot upgrade"
                 
         except Exception as e:
             return False, f"Error collecting middle 3 earnings: {str(e)}"
     
-    def _add_to_reserve_fund(self, user_id: str, program: str, slot_no: int, 
+    @staticmethod
+    def _placement_key(member_id: str, tx_hash: str) -> str:
+        return f"{member_id}:{tx_hash}"
+
+    def _record_middle_member(self, main_user_id: str, slot_no: int, member_id: str,
+                              position: Optional[int], amount: Decimal, tx_hash: str) -> Optional[Dict[str, Any]]:
+        """Atomically add a member's placement to the main user's middle-three counter.
+        Returns the updated counter, or None when the placement was already counted
+        (among the last MIDDLE_THREE_HISTORY placements)."""
+        placement = self._placement_key(ObjectId(str(member_id)), tx_hash)
+        now = datetime.utcnow()
+        collection = MatrixMiddleThree._get_collection()
+        key = {'user_id': ObjectId(str(main_user_id)), 'slot_no': int(slot_no)}
+        entry = {'user_id': str(ObjectId(str(member_id))), 'level': 2, 'position': position, 'placed_at': now,
+                 'amount_units': to_units(amount), 'tx_hash': tx_hash}
+        for _ in range(2):
+            try:
+                return collection.find_one_and_update(
+                    dict(key, placement_keys={'$ne': placement}),
+                    {
+                        '$push': {
+                            'placement_keys': {'$each': [placement], '$slice': -MIDDLE_THREE_HISTORY},
+                            'members': {'$each': [entry], '$slice': -MIDDLE_THREE_HISTORY},
+                        },
+                        '$inc': {'members_count': 1, 'earnings_units': to_units(amount)},
+                        '$set': {'last_member_at': now, 'updated_at': now},
+                        '$setOnInsert': {'created_at': now},
+                    },
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+            except DuplicateKeyError:
+                # Either the placement is already counted or a concurrent first insert won; retry once
+                if collection.count_documents(dict(key, placement_keys=placement)):
+                    return None
+        return None
+
+    def _discard_middle_member(self, main_user_id: str, slot_no: int, member_id: str, amount: Decimal, tx_hash: str):
+        """Undo _record_middle_member when the reserve credit failed"""
+        member = ObjectId(str(member_id))
+        placement = self._placement_key(member, tx_hash)
+        MatrixMiddleThree._get_collection().update_one(
+            {'user_id': ObjectId(str(main_user_id)), 'slot_no': int(slot_no), 'placement_keys': placement},
+            {
+                '$pull': {'placement_keys': placement, 'members': {'user_id': str(member), 'tx_hash': tx_hash}},
+                '$inc': {'members_count': -1, 'earnings_units': -to_units(amount)},
+            },
+        )
+
+    def get_middle_three(self, user_id: str, slot_no: int) -> Optional[Dict[str, Any]]:
+        """Middle-three members recorded at placement time for the current cycle
+        (None when nothing was recorded for this slot yet)"""
+        counter = MatrixMiddleThree.objects(user_id=ObjectId(str(user_id)), slot_no=int(slot_no)).only(
+            'members_count', 'members', 'earnings_units').as_pymongo().first()
+        if not counter:
+            return None
+        count = int(counter.get('members_count') or 0)
+        members = counter.get('members') or []
+        # Recycled trees start a new middle three every 3 members
+        current = members[len(members) - (count % 3 or 3):] if count else []
+        # earnings_units totals every cycle; a later cycle is the part its own members paid in
+        earnings_units = int(counter.get('earnings_units') or 0)
+        if count > 3:
+            earnings_units = sum(int(m.get('amount_units') or 0) for m in current)
+        return {"members_count": count, "members": current, "is_complete": len(current) == 3,
+                "earnings_units": earnings_units}
+
+    def _add_to_reserve_fund(self, user_id: str, program: str, slot_no: int,
                            amount: Decimal, source_user_id: str, tx_hash: str) -> Tuple[bool, str]:
         """Add funds to user's reserve for next slot upgrade"""
         try:
-            # Get current reserve balance
-            current_balance = self._get_reserve_balance(user_id, program, slot_no)
-            new_balance = current_balance + amount
-            
-            # Create reserve ledger entry
-            reserve_entry = ReserveLedger(
-                user_id=ObjectId(user_id),
-                program=program,
-                slot_no=slot_no,
-                amount=amount,
-                direction='credit',
-                source='middle_3_earnings',
-                balance_after=new_balance,
-                tx_hash=tx_hash
-            )
-            reserve_entry.save()
+            # Credit the reserve account and append the ledger entry
+            new_balance = ReserveAccountService().credit(user_id, program, slot_no, amount, 'middle_3_earnings', tx_hash=tx_hash)
             
             # Update reserve wallet
             self._update_reserve_wallet(user_id, program, new_balance)
@@ -137,17 +210,7 @@ class MatrixMiddle3Service:
     def _get_reserve_balance(self, user_id: str, program: str, slot_no: int) -> Decimal:
         """Get current reserve balance for a user's next slot"""
         try:
-            # Get the most recent balance from reserve ledger
-            latest_entry = ReserveLedger.objects(
-                user_id=ObjectId(user_id),
-                program=program,
-                slot_no=slot_no
-            ).order_by('-created_at').first()
-            
-            if latest_entry:
-                return latest_entry.balance_after
-            
-            return Decimal('0')
+            return ReserveAccountService().get_balance(user_id, program, slot_no)
             
         except Exception as e:
             print(f"Error getting reserve balance: {e}")
@@ -179,8 +242,9 @@ class MatrixMiddle3Service:
         except Exception as e:
             print(f"Error updating reserve wallet: {e}")
     
-    def _check_next_slot_upgrade(self, user_id: str, current_slot: int):
-        """Check if reserve balance is sufficient for next slot upgrade"""
+    def _check_next_slot_upgrade(self, user_id: str, current_slot: int, reserve_balance: Optional[Decimal] = None):
+        """Check if reserve balance is sufficient for next slot upgrade
+        (reserve_balance: the balance the caller just credited, to skip re-reading it)"""
         try:
             print(f"[MIDDLE3_DEBUG] _check_next_slot_upgrade called: user={user_id}, current_slot={current_slot}")
             # Get next slot information
@@ -196,7 +260,8 @@ class MatrixMiddle3Service:
                 return False
             
             next_slot_cost = next_slot_catalog.price
-            reserve_balance = self._get_reserve_balance(user_id, 'matrix', current_slot)
+            if reserve_balance is None:
+                reserve_balance = self._get_reserve_balance(user_id, 'matrix', current_slot)
             
             print(f"[MIDDLE3_DEBUG] Reserve check: balance={reserve_balance}, cost={next_slot_cost}, sufficient={reserve_balance >= next_slot_cost}")
             
@@ -240,7 +305,15 @@ class MatrixMiddle3Service:
             if not catalog:
                 print(f"[MIDDLE3_DEBUG] No catalog found for slot {slot_no}")
                 return False
-            
+
+            # Claim the reserve atomically so concurrent credits upgrade the slot only once
+            reserve_accounts = ReserveAccountService()
+            claim = reserve_accounts.try_claim(user_id, 'matrix', slot_no - 1, slot_cost,
+                                               source='auto_upgrade', tx_hash=f"MIDDLE3-AUTO-{user_id}-S{slot_no}")
+            if not claim:
+                print(f"[MIDDLE3_DEBUG] Reserve for slot {slot_no} already claimed or insufficient")
+                return False
+
             # Create slot activation
             activation = SlotActivation(
                 user_id=ObjectId(user_id),
@@ -255,7 +328,12 @@ class MatrixMiddle3Service:
                 is_auto_upgrade=True,
                 status='completed'
             )
-            activation.save()
+            try:
+                activation.save()
+            except Exception:
+                reserve_accounts.release_claim(user_id, 'matrix', slot_no - 1, slot_cost,
+                                               source='auto_upgrade', tx_hash=f"MIDDLE3-AUTO-{user_id}-S{slot_no}-RELEASE")
+                raise
             
             # Create MatrixActivation (Required for MatrixService checks)
             try:
@@ -278,10 +356,9 @@ class MatrixMiddle3Service:
                 print(f"Error creating MatrixActivation: {e}")
 
             
-            # Deduct from reserve fund
-            remaining_reserve = available_reserve - slot_cost
-            self._deduct_reserve_fund(user_id, 'matrix', slot_no - 1, slot_cost, 
-                                    f"MIDDLE3-AUTO-{user_id}-S{slot_no}")
+            # Reserve fund was deducted by the claim
+            remaining_reserve = claim["balance_after"]
+            self._update_reserve_wallet(user_id, 'matrix', remaining_reserve)
             
             # Update user's slot information
             self._update_user_matrix_slot(user_id, catalog, slot_cost)
@@ -411,7 +488,7 @@ class MatrixMiddle3Service:
                             # Matrix fill order: usually fill bucket 1, then bucket 2...
                             # We just append to queue.
                              # Ordered children: Left, Middle, Right
-                            sorted_children = sorted(children, key=lambda x: {"left":0, "middle":1, "right":2}.get(x.position, 99))
+                            sorted_children = sorted(children, key=lambda x: matrix_geometry.SIDE_INDEX.get(x.position, 99))
                             for child in sorted_children:
                                 q.append((str(child.user_id), curr_level + 1))
                     
@@ -448,12 +525,16 @@ class MatrixMiddle3Service:
                         new_node = MatrixNode(
                             user_id=ObjectId(user_id),
                             level=0, # Relative level
-                            position=0 if position=="left" else 1 if position=="middle" else 2,
+                            position=matrix_geometry.SIDE_INDEX.get(position, 2),
+                            slot_no=slot_no,
                             placed_at=datetime.utcnow(),
                             is_active=True
                         )
-                        upline_tree.nodes.append(new_node)
-                        upline_tree.save()
+                        # Not a counted position, but it changes the nodes: bump the version
+                        # so concurrent compare-and-swap claims (MatrixTree.claim_node) re-read
+                        MatrixTree.objects(id=upline_tree.id).update_one(
+                            push__nodes=new_node, inc__version=1, set__updated_at=new_node.placed_at
+                        )
 
             except Exception as e:
                 print(f"Error placing user in tree (middle3 fix): {e}")
@@ -508,8 +589,7 @@ class MatrixMiddle3Service:
                 dist_referrer_id = str(user.refered_by) if user and user.refered_by else None
                 
                 # Map position string to integer for service compatibility
-                pos_map = {"left": 0, "middle": 1, "right": 2}
-                pos_int = pos_map.get(position, 0) # Fallback to 0 if unknown
+                pos_int = matrix_geometry.SIDE_INDEX.get(position, 0) # Fallback to 0 if unknown
                 
                 # Construct Placement Context
                 dist_placement_context = {
@@ -594,21 +674,7 @@ class MatrixMiddle3Service:
     def _deduct_reserve_fund(self, user_id: str, program: str, slot_no: int, amount: Decimal, tx_hash: str):
         """Deduct amount from reserve fund"""
         try:
-            current_balance = self._get_reserve_balance(user_id, program, slot_no)
-            new_balance = current_balance - amount
-            
-            # Create reserve ledger entry for deduction
-            reserve_entry = ReserveLedger(
-                user_id=ObjectId(user_id),
-                program=program,
-                slot_no=slot_no,
-                amount=amount,
-                direction='debit',
-                source='auto_upgrade',
-                balance_after=new_balance,
-                tx_hash=tx_hash
-            )
-            reserve_entry.save()
+            new_balance = ReserveAccountService().debit(user_id, program, slot_no, amount, 'auto_upgrade', tx_hash=tx_hash)
             
             # Update reserve wallet
             self._update_reserve_wallet(user_id, program, new_balance)
@@ -1,12 +1,15 @@
-from mongoengine import Document, ObjectIdField, StringField, IntField, FloatField, BooleanField, DateTimeField, ListField, DictField, EmbeddedDocument, EmbeddedDocumentField, DecimalField
+from mongoengine import Document, ObjectIdField, StringField, IntField, LongField, FloatField, BooleanField, DateTimeField, ListField, DictField, EmbeddedDocument, EmbeddedDocumentField, DecimalField
 from datetime import datetime
 from decimal import Decimal
+from pymongo import ReturnDocument
+from ..slot.model import SlotRoster, UserMaxSlot
 
 class MatrixNode(EmbeddedDocument):
     """Individual matrix node in the 3x structure"""
     level = IntField(required=True)  # 1, 2, or 3
     position = IntField(required=True)  # 0-based position within level
     user_id = ObjectIdField(required=True)  # User occupying this position
+    slot_no = IntField()  # Slot of the placement (older nodes: resolved through TreePlacement)
     placed_at = DateTimeField(default=datetime.utcnow)
     is_active = BooleanField(default=True)
     
@@ -44,6 +47,7 @@ class MatrixTree(Document):
     nodes = ListField(EmbeddedDocumentField(MatrixNode))  # All nodes in tree
     slots = ListField(EmbeddedDocumentField(MatrixSlotInfo))  # User's slot info
     reserve_fund = FloatField(default=0.0)  # Reserve fund for auto-upgrade
+    version = IntField(default=0)  # Bumped by every node placement (compare-and-swap guard)
     created_at = DateTimeField(default=datetime.utcnow)
     updated_at = DateTimeField(default=datetime.utcnow)
     
@@ -57,6 +61,38 @@ class MatrixTree(Document):
         ]
     }
 
+    def claim_node(self, node: MatrixNode) -> bool:
+        """Append a placed node unless the tree changed since it was read.
+
+        Compare-and-swap on version: the update matches only the version that was read and
+        bumps it, so two writers that picked the same free position cannot both land.
+        On success the in-memory tree is refreshed with the stored counts.
+        """
+        level_field = f"level_{node.level}_members"
+        push = {'$each': [node.to_mongo()]}
+        if len(self.nodes) > 10000:
+            # Memory guard for performance tests: keep the last 5000 nodes
+            push['$slice'] = -5001
+        version = self.version or 0
+        stored = self._get_collection().find_one_and_update(
+            {'_id': self.id, 'version': version if version else {'$in': [0, None]}},
+            {
+                '$push': {'nodes': push},
+                '$inc': {'version': 1, level_field: 1, 'total_members': 1},
+                '$set': {'updated_at': node.placed_at},
+            },
+            projection={'nodes': 0},
+            return_document=ReturnDocument.AFTER,
+        )
+        if stored is None:
+            return False
+        self.nodes = self.nodes[-5000:] if len(self.nodes) > 10000 else self.nodes
+        self.nodes.append(node)
+        for field in ('version', level_field, 'total_members', 'updated_at'):
+            setattr(self, field, stored.get(field))
+        self._clear_changed_fields()
+        return True
+
 class MatrixActivation(Document):
     """Matrix slot activation records"""
     user_id = ObjectIdField(required=True)
@@ -83,6 +119,14 @@ class MatrixActivation(Document):
         ]
     }
 
+    def save(self, *args, **kwargs):
+        result = super().save(*args, **kwargs)
+        if self.status == 'completed':
+            UserMaxSlot.record(self.user_id, 'matrix', self.slot_no, self.slot_name,
+                               self.activated_at or self.completed_at)
+            SlotRoster.record(self.user_id, 'matrix', self.slot_no, self.activated_at or self.completed_at)
+        return result
+
 class MatrixUpgradeLog(Document):
     """Log of matrix slot upgrades"""
     user_id = ObjectIdField(required=True)
@@ -172,6 +216,9 @@ class MatrixRecycleInstance(Document):
     level_1_members = IntField(default=0)
     level_2_members = IntField(default=0)
     level_3_members = IntField(default=0)
+    # Compact snapshot: 39 occupant user ids in BFS order (L1 0-2, L2 3-11, L3 12-38), None where empty
+    occupants = ListField()
+    occupants_placed_at = ListField()  # placed_at per occupant, same layout as occupants
     created_at = DateTimeField(default=datetime.utcnow)
     completed_at = DateTimeField()
     
@@ -182,12 +229,14 @@ class MatrixRecycleInstance(Document):
             'slot_number',
             'recycle_no',
             'is_complete',
-            'created_at'
+            'created_at',
+            # One recycle per number: concurrent recycles of the same user + slot retry with the next one
+            {'fields': ['user_id', 'slot_number', '-recycle_no'], 'unique': True}
         ]
     }
 
 class MatrixRecycleNode(Document):
-    """Immutable snapshot of matrix recycle nodes"""
+    """Immutable snapshot of matrix recycle nodes (recycles before MatrixRecycleInstance.occupants)"""
     instance_id = ObjectIdField(required=True)  # Reference to MatrixRecycleInstance
     user_id = ObjectIdField(required=True)  # User who owns this recycle
     slot_number = IntField(required=True)
@@ -207,4 +256,24 @@ class MatrixRecycleNode(Document):
             'level',
             'position'
         ]
-    }
\ No newline at end of file
+    }
+
+class MatrixMiddleThree(Document):
+    """Middle-three members of a user's matrix slot, recorded when each member is placed"""
+    user_id = ObjectIdField(required=True)  # Tree owner (2nd upline of the middle members)
+    slot_no = IntField(required=True)
+    members_count = IntField(default=0)  # Every 3rd member completes a middle three
+    # Latest placements only (MIDDLE_THREE_HISTORY); the current middle three is the tail
+    placement_keys = ListField(StringField())  # '<member id>:<placement tx>', counted once each
+    members = ListField(DictField())  # {user_id, level, position, placed_at, amount_units, tx_hash}
+    earnings_units = LongField(default=0)  # Middle-three earnings credited to reserve, in 1e-8 units
+    last_member_at = DateTimeField()
+    created_at = DateTimeField(default=datetime.utcnow)
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'matrix_middle_three',
+        'indexes': [
+            {'fields': ['user_id', 'slot_no'], 'unique': True},
+        ]
+    }
\ No newline at end of file
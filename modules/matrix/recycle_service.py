@@ -8,6 +8,7 @@ from typing import Dict, Any, Optional, List, Tuple
 from decimal import Decimal
 from datetime import datetime
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 
 from ..user.model import User
 from ..wallet.model import UserWallet, ReserveLedger
@@ -16,6 +17,44 @@ from ..tree.model import TreePlacement
 from ..blockchain.model import BlockchainEvent
 from ..income.model import IncomeEvent
 from .model import MatrixTree, MatrixNode, MatrixActivation, MatrixRecycleInstance, MatrixRecycleNode
+from . import geometry as matrix_geometry
+from core.config import PLACEMENT_MAX_ATTEMPTS
+
+# Fixed-width recycle snapshot layout: level -> (offset, width) in MatrixRecycleInstance.occupants
+RECYCLE_LEVELS = matrix_geometry.LEVELS
+RECYCLE_TREE_SIZE = matrix_geometry.TREE_SIZE
+
+# Attempts at the next recycle number when concurrent recycles of a user + slot collide
+RECYCLE_NO_ATTEMPTS = 5
+
+# Summary fields returned by the recycle history (snapshot occupants only for a specific tree)
+RECYCLE_SUMMARY_FIELDS = ('recycle_no', 'is_complete', 'total_members', 'level_1_members',
+                          'level_2_members', 'level_3_members', 'created_at', 'completed_at')
+
+
+def pack_recycle_nodes(nodes) -> Tuple[List[Optional[ObjectId]], List[Optional[datetime]]]:
+    """Tree nodes -> 39 occupant ids and their placed_at in BFS order (None for empty positions)"""
+    occupants = [None] * RECYCLE_TREE_SIZE
+    placed_at = [None] * RECYCLE_TREE_SIZE
+    for node in nodes or []:
+        level, position = getattr(node, 'level', 0), getattr(node, 'position', -1)
+        if matrix_geometry.is_valid(level, position):
+            index = matrix_geometry.flat_index(level, position)
+            occupants[index] = node.user_id
+            placed_at[index] = getattr(node, 'placed_at', None)
+    return occupants, placed_at
+
+
+def unpack_recycle_occupants(occupants, placed_at=None) -> List[Dict[str, Any]]:
+    """39 occupant ids (and placed_at, when stored) -> node dicts ordered by level, position"""
+    placed_at = placed_at or [None] * RECYCLE_TREE_SIZE
+    nodes = []
+    for level, (offset, width) in RECYCLE_LEVELS.items():
+        for position, occupant in enumerate((occupants or [])[offset:offset + width]):
+            if occupant:
+                nodes.append({"level": level, "position": position, "occupant_user_id": str(occupant),
+                              "placed_at": placed_at[offset + position]})
+    return nodes
 
 
 class MatrixRecycleService:
@@ -109,43 +148,48 @@ class MatrixRecycleService:
         Create an immutable snapshot of the completed matrix tree.
         """
         try:
-            # Get next recycle number
-            recycle_no = self._get_next_recycle_number(user_id, slot_no)
-            
-            # Create recycle instance
-            recycle_instance = MatrixRecycleInstance(
-                user_id=ObjectId(user_id),
-                slot_number=slot_no,
-                recycle_no=recycle_no,
-                is_complete=True,
-                total_members=matrix_tree.total_members,
-                level_1_members=matrix_tree.level_1_members,
-                level_2_members=matrix_tree.level_2_members,
-                level_3_members=matrix_tree.level_3_members,
-                created_at=matrix_tree.created_at,
-                completed_at=datetime.utcnow()
-            )
-            recycle_instance.save()
-            
-            # Create recycle nodes (immutable snapshots)
-            for node in matrix_tree.nodes:
-                recycle_node = MatrixRecycleNode(
-                    instance_id=recycle_instance.id,
-                    user_id=ObjectId(user_id),
-                    slot_number=slot_no,
-                    recycle_no=recycle_no,
-                    level=node.level,
-                    position=node.position,
-                    occupant_user_id=node.user_id,
-                    placed_at=node.placed_at
-                )
-                recycle_node.save()
-            
-            print(f"Created recycle snapshot: User {user_id}, Slot {slot_no}, Recycle #{recycle_no}")
+            recycle_instance = self.save_recycle_snapshot(user_id, slot_no, matrix_tree.nodes,
+                                                          created_at=matrix_tree.created_at)
+            print(f"Created recycle snapshot: User {user_id}, Slot {slot_no}, Recycle #{recycle_instance.recycle_no}")
             return recycle_instance
             
         except Exception as e:
             raise Exception(f"Failed to create recycle snapshot: {str(e)}")
+
+    def save_recycle_snapshot(self, user_id: str, slot_no: int, nodes,
+                              created_at: Optional[datetime] = None) -> MatrixRecycleInstance:
+        """
+        Store a recycle as one compact record: summary counts plus the 39 occupant ids.
+        """
+        occupants, placed_at = pack_recycle_nodes(nodes)
+        level_counts = {
+            level: sum(1 for occupant in occupants[offset:offset + width] if occupant)
+            for level, (offset, width) in RECYCLE_LEVELS.items()
+        }
+        now = datetime.utcnow()
+        doc = {
+            'user_id': ObjectId(user_id),
+            'slot_number': slot_no,
+            'recycle_no': None,
+            'is_complete': True,
+            'total_members': sum(level_counts.values()),
+            'level_1_members': level_counts[1],
+            'level_2_members': level_counts[2],
+            'level_3_members': level_counts[3],
+            'occupants': occupants,
+            'occupants_placed_at': placed_at,
+            'created_at': created_at or now,
+            'completed_at': now,
+        }
+        for _ in range(RECYCLE_NO_ATTEMPTS):
+            doc['recycle_no'] = self._get_next_recycle_number(user_id, slot_no)
+            try:
+                MatrixRecycleInstance._get_collection().insert_one(doc)
+                return MatrixRecycleInstance._from_son(doc)
+            except DuplicateKeyError:
+                # A concurrent recycle of this user + slot took the number; read the next one
+                continue
+        raise RuntimeError(f"No free recycle number for user {user_id}, slot {slot_no}")
     
     def _create_new_tree_for_recycle(self, user_id: str, slot_no: int, existing_tree: MatrixTree | None = None) -> MatrixTree:
         """
@@ -263,35 +307,36 @@ class MatrixRecycleService:
         Place user in upline's matrix tree using BFS placement algorithm.
         """
         try:
-            # Find available position using BFS
-            placement_position = self._find_bfs_placement_position(upline_tree)
-            if not placement_position:
-                return {"success": False, "error": "No available position in upline's tree"}
-            
-            # Create matrix node for the recycled user
-            matrix_node = MatrixNode(
-                level=placement_position["level"],
-                position=placement_position["position"],
-                user_id=ObjectId(user_id),
-                placed_at=datetime.utcnow(),
-                is_active=True
-            )
-            
-            # Add node to upline's tree
-            upline_tree.nodes.append(matrix_node)
-            
-            # Update tree statistics
-            self._update_tree_statistics(upline_tree, placement_position["level"])
+            # Find available position using BFS and claim it; the claim is a compare-and-swap
+            # on the tree version, so re-read and search again when it loses
+            for attempt in range(PLACEMENT_MAX_ATTEMPTS):
+                if attempt:
+                    upline_tree = MatrixTree.objects(id=upline_tree.id).first()
+                placement_position = self._find_bfs_placement_position(upline_tree)
+                if not placement_position:
+                    return {"success": False, "error": "No available position in upline's tree"}
+                
+                # Create matrix node for the recycled user
+                matrix_node = MatrixNode(
+                    level=placement_position["level"],
+                    position=placement_position["position"],
+                    user_id=ObjectId(user_id),
+                    slot_no=slot_no,
+                    placed_at=datetime.utcnow(),
+                    is_active=True
+                )
+                if upline_tree.claim_node(matrix_node):
+                    break
+            else:
+                return {"success": False, "error": f"Recycle placement lost {PLACEMENT_MAX_ATTEMPTS} concurrent claims"}
             
             # Check if this placement completes the upline's tree
             if upline_tree.total_members >= self.max_matrix_members:
                 upline_tree.is_complete = True
+                upline_tree.save()
                 # Trigger cascade recycle for upline
                 self._trigger_cascade_recycle(str(upline_tree.user_id), slot_no)
             
-            upline_tree.updated_at = datetime.utcnow()
-            upline_tree.save()
-            
             return {
                 "success": True,
                 "placement_level": placement_position["level"],
@@ -320,55 +365,16 @@ class MatrixRecycleService:
         matching the documentation diagrams.
         """
         try:
-            # Level 1: positions 0, 1, 2 (left, middle, right) – sequential
-            for pos in range(3):
-                if not self._position_occupied(matrix_tree, 1, pos):
-                    return {"level": 1, "position": pos}
-            
-            # Level 2: positions 0–8 using SWEEPOVER (wave across L1 parents)
-            # Wave 1: first child of each L1 parent (positions 0, 3, 6)
-            # Wave 2: second child of each L1 parent (positions 1, 4, 7)
-            # Wave 3: third child of each L1 parent (positions 2, 5, 8)
-            for child_index in range(3):  # 0, 1, 2 (first, second, third child)
-                for parent_index in range(3):  # 0, 1, 2 (L1 positions)
-                    pos = parent_index * 3 + child_index
-                    if not self._position_occupied(matrix_tree, 2, pos):
-                        return {"level": 2, "position": pos}
-            
-            # Level 3: positions 0–26 using SWEEPOVER (wave across L2 parents)
-            # Wave 1: first child of each L2 parent
-            # Wave 2: second child of each L2 parent
-            # Wave 3: third child of each L2 parent
-            for child_index in range(3):  # 0, 1, 2 (first, second, third child)
-                for parent_index in range(9):  # 0–8 (L2 positions)
-                    pos = parent_index * 3 + child_index
-                    if not self._position_occupied(matrix_tree, 3, pos):
-                        return {"level": 3, "position": pos}
-            
-            return None  # No available position
+            # Level 1 left → middle → right, then Levels 2 and 3 in sweepover waves
+            free = matrix_geometry.next_free_position(matrix_geometry.occupancy_mask(matrix_tree.nodes))
+            if free is None:
+                return None  # No available position
+            return {"level": free[0], "position": free[1]}
             
         except Exception as e:
             print(f"Error finding BFS placement: {e}")
             return None
     
-    def _position_occupied(self, matrix_tree: MatrixTree, level: int, position: int) -> bool:
-        """Check if a specific position in the matrix tree is occupied."""
-        for node in matrix_tree.nodes:
-            if node.level == level and node.position == position:
-                return True
-        return False
-    
-    def _update_tree_statistics(self, matrix_tree: MatrixTree, level: int):
-        """Update matrix tree statistics after adding a new member."""
-        matrix_tree.total_members += 1
-        
-        if level == 1:
-            matrix_tree.level_1_members += 1
-        elif level == 2:
-            matrix_tree.level_2_members += 1
-        elif level == 3:
-            matrix_tree.level_3_members += 1
-    
     def _create_matrix_tree_for_upline(self, upline_id: str, slot_no: int) -> MatrixTree:
         """Create a new matrix tree for an upline."""
         matrix_tree = MatrixTree(
@@ -393,7 +399,7 @@ class MatrixRecycleService:
         last_recycle = MatrixRecycleInstance.objects(
             user_id=ObjectId(user_id),
             slot_number=slot_no
-        ).order_by('-recycle_no').first()
+        ).order_by('-recycle_no').only('recycle_no').first()
         
         return (last_recycle.recycle_no + 1) if last_recycle else 1
     
@@ -439,53 +445,29 @@ class MatrixRecycleService:
         except Exception as e:
             return {"success": False, "error": f"New tree check failed: {str(e)}"}
     
-    def get_recycle_history(self, user_id: str, slot_no: int) -> Dict[str, Any]:
+    def get_recycle_history(self, user_id: str, slot_no: int, page: int = 1, limit: int = 50) -> Dict[str, Any]:
         """
-        Get the complete recycle history for a user and slot.
+        Get one page of the recycle history for a user and slot (latest first, summaries only).
+        Use get_recycle_tree() for the members of a specific recycle.
         """
         try:
-            # Get all recycle instances for the user and slot
-            recycle_instances = MatrixRecycleInstance.objects(
-                user_id=ObjectId(user_id),
-                slot_number=slot_no
-            ).order_by('recycle_no')
+            page, limit = max(1, page), max(1, limit)
+            query = MatrixRecycleInstance.objects(user_id=ObjectId(user_id), slot_number=slot_no)
+            recycle_instances = query.order_by('-recycle_no').only(*RECYCLE_SUMMARY_FIELDS).skip(
+                (page - 1) * limit).limit(limit).as_pymongo()
             
             history = {
                 "user_id": user_id,
                 "slot_no": slot_no,
-                "total_recycles": len(recycle_instances),
-                "recycles": []
+                "total_recycles": query.count(),
+                "page": page,
+                "limit": limit,
+                "recycles": [
+                    {field: instance.get(field) for field in RECYCLE_SUMMARY_FIELDS}
+                    for instance in recycle_instances
+                ]
             }
             
-            for instance in recycle_instances:
-                # Get recycle nodes for this instance
-                recycle_nodes = MatrixRecycleNode.objects(
-                    instance_id=instance.id
-                ).order_by('level', 'position')
-                
-                recycle_info = {
-                    "recycle_no": instance.recycle_no,
-                    "is_complete": instance.is_complete,
-                    "total_members": instance.total_members,
-                    "level_1_members": instance.level_1_members,
-                    "level_2_members": instance.level_2_members,
-                    "level_3_members": instance.level_3_members,
-                    "created_at": instance.created_at,
-                    "completed_at": instance.completed_at,
-                    "nodes": []
-                }
-                
-                for node in recycle_nodes:
-                    node_info = {
-                        "level": node.level,
-                        "position": node.position,
-                        "occupant_user_id": str(node.occupant_user_id),
-                        "placed_at": node.placed_at
-                    }
-                    recycle_info["nodes"].append(node_info)
-                
-                history["recycles"].append(recycle_info)
-            
             return {"success": True, "data": history}
             
         except Exception as e:
@@ -505,12 +487,7 @@ class MatrixRecycleService:
             
             if not recycle_instance:
                 return {"success": False, "error": "Recycle instance not found"}
-            
-            # Get recycle nodes
-            recycle_nodes = MatrixRecycleNode.objects(
-                instance_id=recycle_instance.id
-            ).order_by('level', 'position')
-            
+
             tree_data = {
                 "user_id": user_id,
                 "slot_no": slot_no,
@@ -519,23 +496,31 @@ class MatrixRecycleService:
                 "total_members": recycle_instance.total_members,
                 "created_at": recycle_instance.created_at,
                 "completed_at": recycle_instance.completed_at,
-                "nodes": []
+                "nodes": self.get_recycle_nodes(recycle_instance)
             }
             
-            for node in recycle_nodes:
-                node_info = {
-                    "level": node.level,
-                    "position": node.position,
-                    "occupant_user_id": str(node.occupant_user_id),
-                    "placed_at": node.placed_at
-                }
-                tree_data["nodes"].append(node_info)
-            
             return {"success": True, "data": tree_data}
             
         except Exception as e:
             return {"success": False, "error": f"Failed to get recycle tree: {str(e)}"}
     
+    def get_recycle_nodes(self, recycle_instance: MatrixRecycleInstance) -> List[Dict[str, Any]]:
+        """Members of a recycle snapshot: compact occupants, or MatrixRecycleNode rows for older recycles"""
+        if recycle_instance.occupants:
+            return unpack_recycle_occupants(recycle_instance.occupants, recycle_instance.occupants_placed_at)
+        recycle_nodes = MatrixRecycleNode.objects(
+            instance_id=recycle_instance.id
+        ).order_by('level', 'position')
+        return [
+            {
+                "level": node.level,
+                "position": node.position,
+                "occupant_user_id": str(node.occupant_user_id),
+                "placed_at": node.placed_at
+            }
+            for node in recycle_nodes
+        ]
+
     def process_manual_recycle_trigger(self, user_id: str, slot_no: int) -> Dict[str, Any]:
         """
         Manually trigger recycle process (for testing purposes).
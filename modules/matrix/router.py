@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Request
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Request, Query
 from pydantic import BaseModel
 from decimal import Decimal
 from typing import Optional
@@ -418,9 +418,12 @@ async def get_recycle_tree_path_endpoint(
 async def get_recycle_history_endpoint(
     user_id: str,
     slot: int,
+    page: int = Query(1, ge=1),
+    limit: int = Query(50, ge=1, le=100),
     current_user: dict = Depends(_auth_dependency)
 ):
-    """Get recycle history for user+slot.
+    """Get recycle history for user+slot (summaries, latest first, paginated).
+    Fetch a single recycle's members with '/matrix/recycle-tree/{user_id}/{slot}?recycle_no=N'.
 
     Note: Avoid spaces in query string: '?user_id=...&slot=1'.
     Alternatively, use '/matrix/recycles/{user_id}/{slot}'.
@@ -447,7 +450,7 @@ async def get_recycle_history_endpoint(
             else:
                 payload = res or []
         else:
-            payload = service.get_recycle_history(user_id, slot) or []
+            payload = service.get_recycle_history(user_id, slot, page=page, limit=limit) or []
 
         return success_response(payload, "Recycle history fetched successfully")
     except HTTPException as e:
@@ -459,10 +462,13 @@ async def get_recycle_history_endpoint(
 async def get_recycle_history_path_endpoint(
     user_id: str,
     slot: int,
+    page: int = Query(1, ge=1),
+    limit: int = Query(50, ge=1, le=100),
     current_user: dict = Depends(_auth_dependency)
 ):
     """Path-based variant to fetch recycle history."""
-    return await get_recycle_history_endpoint(user_id=user_id, slot=slot, current_user=current_user)
+    return await get_recycle_history_endpoint(user_id=user_id, slot=slot, page=page, limit=limit,
+                                              current_user=current_user)
 
 @router.post("/process-recycle")
 async def process_recycle_completion_endpoint(
@@ -1022,9 +1028,11 @@ async def get_recycle_status_endpoint(
 async def get_recycle_history_endpoint(
     user_id: str,
     slot_no: int,
+    page: int = Query(1, ge=1),
+    limit: int = Query(50, ge=1, le=100),
     current_user: dict = Depends(_auth_dependency)
 ):
-    """Get complete recycle history for a user and slot."""
+    """Get recycle history for a user and slot (summaries, latest first, paginated)."""
     try:
         if str(current_user["user_id"]) != user_id:
             raise HTTPException(status_code=403, detail="Unauthorized to view this user's recycle history")
@@ -1033,7 +1041,7 @@ async def get_recycle_history_endpoint(
             raise HTTPException(status_code=400, detail="Slot number must be between 1 and 15")
         
         service = MatrixService()
-        result = service.recycle_service.get_recycle_history(user_id, slot_no)
+        result = service.recycle_service.get_recycle_history(user_id, slot_no, page=page, limit=limit)
         
         if result.get("success"):
             return success_response(result, "Recycle history fetched successfully")
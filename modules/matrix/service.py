@@ -1,3 +1,5 @@
+import random
+import time
 from typing import Dict, Any, Optional, List
 from bson import ObjectId
 from decimal import Decimal
@@ -16,7 +18,9 @@ from ..dream_matrix.service import DreamMatrixService
 from ..blockchain.model import BlockchainEvent
 from .sweepover_service import SweepoverService
 from .middle_3_service import MatrixMiddle3Service
+from ..wallet.reserve_account_service import from_units
 from .recycle_service import MatrixRecycleService
+from . import geometry as matrix_geometry
 from ..missed_profit.service import MissedProfitService
 from .model import (
     MatrixTree, MatrixNode, MatrixActivation, MatrixUpgradeLog,
@@ -24,7 +28,7 @@ from .model import (
 )
 from ..tree.model import TreePlacement
 from utils import ensure_currency_for_program
-from core.config import MATRIX_MAX_ESCALATION_DEPTH, MATRIX_MOTHER_ID
+from core.config import MATRIX_MAX_ESCALATION_DEPTH, MATRIX_MOTHER_ID, PLACEMENT_MAX_ATTEMPTS, PLACEMENT_RETRY_DELAY
 
 
 class MatrixService:
@@ -150,29 +154,10 @@ class MatrixService:
             self._initialize_matrix_auto_upgrade(user_id)
             
             try:
-                from modules.tree.model import TreePlacement as _TPInit
-                from datetime import datetime as _DTInit
+                from modules.tree.service import TreeService as _TreeService
 
                 # Ensure referrer has a root placement for Matrix slot 1
-                _ref_pl = _TPInit.objects(
-                    user_id=ObjectId(referrer_id),
-                    program="matrix",
-                    slot_no=1,
-                    is_active=True,
-                ).first()
-                if not _ref_pl:
-                    _ref_pl = _TPInit(
-                        user_id=ObjectId(referrer_id),
-                        program="matrix",
-                        parent_id=ObjectId(referrer_id),
-                        upline_id=ObjectId(referrer_id),
-                        position="root",
-                        level=0,
-                        slot_no=1,
-                        is_active=True,
-                        created_at=_DTInit.utcnow(),
-                    )
-                    _ref_pl.save()
+                _TreeService.ensure_root_placement(ObjectId(referrer_id), "matrix")
 
                 # Place user and create TreePlacement using helper
                 ensure_result = self._ensure_tp(user_id, direct_referrer_id, 1)
@@ -189,101 +174,9 @@ class MatrixService:
                 placement_result = None
             
             # 5. Distribute funds and commissions AFTER TreePlacement so placement_context is accurate
-            distribution_result = {"success": False, "error": "skipped"}
-            commission_results = {}
-            
-            # 5c. After TreePlacement, compute accurate placement_context and run distributions
-            try:
-                print(f"[MATRIX_SERVICE] Starting distribution block for {user_id}", flush=True)
-                from modules.tree.model import TreePlacement as _TP
-                from modules.fund_distribution.service import FundDistributionService
-                print(f"[MATRIX_SERVICE] Imported FundDistributionService", flush=True)
-                fund_service = FundDistributionService()
-                tp = _TP.objects(user_id=ObjectId(user_id), program='matrix', slot_no=1, is_active=True).first()
-                placement_ctx = None
-                if tp:
-                    # Map matrix position: left/middle/center/right → 0/1/2
-                    pos_map = {'left': 0, 'middle': 1, 'center': 1, 'right': 2}
-                    pos_idx = pos_map.get(getattr(tp, 'position', ''), None)
-                    parent_id = str(getattr(tp, 'upline_id', None) or getattr(tp, 'parent_id', None) or '')
-                    placement_ctx = {
-                        'placed_under_user_id': parent_id,
-                        'level': int(getattr(tp, 'level', 0)),
-                        'position': pos_idx
-                    }
-                
-                # --- MIDDLE 3 LOGIC START ---
-                # Direct check using placement_ctx (bypasses MatrixTree.nodes dependency)
-                # Middle earnings: user in middle position → earnings go to 2nd upline's reserve
-                skip_distribution = False
-                if placement_ctx and placement_ctx.get('placed_under_user_id'):
-                    try:
-                        position = placement_ctx.get('position', -1)
-                        
-                        # Check if in middle position (index 1 in ternary tree)
-                        if position == 1:
-                            print(f"[MIDDLE3] User {user_id} in middle position (index {position})", flush=True)
-                            
-                            # Get parent (1st upline)
-                            parent_id = placement_ctx.get('placed_under_user_id')
-                            
-                            if parent_id:
-                                # Query parent's TreePlacement to find 2nd upline (grandparent)
-                                from modules.tree.model import TreePlacement
-                                parent_tp = TreePlacement.objects(
-                                    user_id=ObjectId(parent_id),
-                                    program='matrix',
-                                    slot_no=1
-                                ).first()
-                                
-                                if parent_tp and parent_tp.upline_id:
-                                    grandparent_id = str(parent_tp.upline_id)
-                                    print(f"[MIDDLE3] Found 2nd upline: {grandparent_id}", flush=True)
-                                    
-                                    # Collect middle-3 earnings (skip validation - already verified position)
-                                    success, msg = self.middle_3_service.collect_middle_3_earnings(
-                                        grandparent_id, 1, amount, user_id, tx_hash, skip_validation=True
-                                    )
-                                    
-                                    if success:
-                                        print(f"[MIDDLE3] Earnings collected for {grandparent_id}", flush=True)
-                                        skip_distribution = True
-                                    else:
-                                        print(f"[MIDDLE3] Collection failed: {msg}", flush=True)
-                                else:
-                                    print(f"[MIDDLE3] Parent {parent_id} has no upline", flush=True)
-                    except Exception as e:
-                        print(f"[MIDDLE3] Error: {e}", flush=True)
-                        import traceback
-                        traceback.print_exc()
-                # --- MIDDLE 3 LOGIC END ---
-
-                if not skip_distribution:
-                    print(f"[MATRIX_SERVICE] Calling distribute_matrix_funds for {user_id}", flush=True)
-                    distribution_result = fund_service.distribute_matrix_funds(
-                        user_id=user_id,
-                        amount=amount,
-                        slot_no=1,
-                        referrer_id=direct_referrer_id,
-                        tx_hash=tx_hash,
-                        placement_context=placement_ctx
-                    )
-                    print(f"[MATRIX_SERVICE] distribute_matrix_funds returned: {distribution_result.get('success')}", flush=True)
-                    print(f"[MATRIX_SERVICE] Calling _process_matrix_commissions", flush=True)
-                    commission_results = self._process_matrix_commissions(
-                        user_id,
-                        direct_referrer_id,
-                        amount,
-                        currency,
-                        placement_context=placement_ctx,
-                        slot_no=1
-                    )
-                    print(f"[MATRIX_SERVICE] _process_matrix_commissions returned", flush=True)
-            except Exception as e:
-                print(f" Matrix post-placement distribution error: {e}", flush=True)
-                import traceback
-                traceback.print_exc()
-                pass
+            distribution_result, commission_results = self._distribute_join_funds(
+                user_id, direct_referrer_id, amount, currency, tx_hash
+            )
 
             # 6. Process special program integrations
             special_programs_results = self._process_special_programs(user_id, referrer_id, amount, currency)
@@ -411,6 +304,112 @@ class MatrixService:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
+    def _distribute_join_funds(self, user_id: str, direct_referrer_id: str, amount: Decimal, currency: str, tx_hash: str):
+        """Distribute a Matrix slot-1 join after its TreePlacement exists (middle-3 reserve or the regular split).
+
+        Returns (distribution_result, commission_results). Also replayed by the bulk importer.
+        """
+        distribution_result = {"success": False, "error": "skipped"}
+        commission_results = {}
+        
+        # 5c. After TreePlacement, compute accurate placement_context and run distributions
+        try:
+            print(f"[MATRIX_SERVICE] Starting distribution block for {user_id}", flush=True)
+            from modules.tree.model import TreePlacement as _TP
+            from modules.fund_distribution.service import FundDistributionService
+            print(f"[MATRIX_SERVICE] Imported FundDistributionService", flush=True)
+            fund_service = FundDistributionService()
+            tp = _TP.objects(user_id=ObjectId(user_id), program='matrix', slot_no=1, is_active=True).first()
+            placement_ctx = None
+            if tp:
+                # Map matrix position: left/middle/center/right → 0/1/2
+                pos_map = matrix_geometry.SIDE_INDEX
+                pos_idx = pos_map.get(getattr(tp, 'position', ''), None)
+                parent_id = str(getattr(tp, 'upline_id', None) or getattr(tp, 'parent_id', None) or '')
+                placement_ctx = {
+                    'placed_under_user_id': parent_id,
+                    'level': int(getattr(tp, 'level', 0)),
+                    'position': pos_idx
+                }
+            
+            # --- MIDDLE 3 LOGIC START ---
+            # Direct check using placement_ctx (bypasses MatrixTree.nodes dependency)
+            # Middle earnings: user in middle position → earnings go to 2nd upline's reserve
+            skip_distribution = False
+            if placement_ctx and placement_ctx.get('placed_under_user_id'):
+                try:
+                    position = placement_ctx.get('position', -1)
+                    
+                    # Check if in middle position (index 1 in ternary tree)
+                    if position == 1:
+                        print(f"[MIDDLE3] User {user_id} in middle position (index {position})", flush=True)
+                        
+                        # Get parent (1st upline)
+                        parent_id = placement_ctx.get('placed_under_user_id')
+                        
+                        if parent_id:
+                            # Query parent's TreePlacement to find 2nd upline (grandparent)
+                            from modules.tree.model import TreePlacement
+                            parent_tp = TreePlacement.objects(
+                                user_id=ObjectId(parent_id),
+                                program='matrix',
+                                slot_no=1
+                            ).first()
+                            
+                            if parent_tp and parent_tp.upline_id:
+                                grandparent_id = str(parent_tp.upline_id)
+                                print(f"[MIDDLE3] Found 2nd upline: {grandparent_id}", flush=True)
+                                # Level-2 position under the 2nd upline: middle child of the parent's L1 position
+                                parent_pos = pos_map.get(getattr(parent_tp, 'position', ''), 0)
+                                
+                                # Collect middle-3 earnings (skip validation - already verified position)
+                                success, msg = self.middle_3_service.collect_middle_3_earnings(
+                                    grandparent_id, 1, amount, user_id, tx_hash, skip_validation=True,
+                                    position=matrix_geometry.middle_child(parent_pos)
+                                )
+                                
+                                if success:
+                                    print(f"[MIDDLE3] Earnings collected for {grandparent_id}", flush=True)
+                                    skip_distribution = True
+                                else:
+                                    print(f"[MIDDLE3] Collection failed: {msg}", flush=True)
+                            else:
+                                print(f"[MIDDLE3] Parent {parent_id} has no upline", flush=True)
+                except Exception as e:
+                    print(f"[MIDDLE3] Error: {e}", flush=True)
+                    import traceback
+                    traceback.print_exc()
+            # --- MIDDLE 3 LOGIC END ---
+
+            if not skip_distribution:
+                print(f"[MATRIX_SERVICE] Calling distribute_matrix_funds for {user_id}", flush=True)
+                distribution_result = fund_service.distribute_matrix_funds(
+                    user_id=user_id,
+                    amount=amount,
+                    slot_no=1,
+                    referrer_id=direct_referrer_id,
+                    tx_hash=tx_hash,
+                    placement_context=placement_ctx
+                )
+                print(f"[MATRIX_SERVICE] distribute_matrix_funds returned: {distribution_result.get('success')}", flush=True)
+                print(f"[MATRIX_SERVICE] Calling _process_matrix_commissions", flush=True)
+                commission_results = self._process_matrix_commissions(
+                    user_id,
+                    direct_referrer_id,
+                    amount,
+                    currency,
+                    placement_context=placement_ctx,
+                    slot_no=1
+                )
+                print(f"[MATRIX_SERVICE] _process_matrix_commissions returned", flush=True)
+        except Exception as e:
+            print(f" Matrix post-placement distribution error: {e}", flush=True)
+            import traceback
+            traceback.print_exc()
+            pass
+        return distribution_result, commission_results
+
+
     def _ensure_tp(self, user_id: str, referrer_id: str, slot_no: int) -> Dict[str, Any]:
         try:
             from modules.tree.model import TreePlacement
@@ -438,8 +437,7 @@ class MatrixService:
             if placement_result and placement_result.get("success"):
                 # Map integer position to string position
                 pos_int = placement_result.get("position", 0)
-                pos_str_map = {0: "left", 1: "middle", 2: "right"}
-                pos_str = pos_str_map.get(pos_int % 3, "left")
+                pos_str = matrix_geometry.side(pos_int)
                 
                 # Determine parent from placement result
                 placed_under_id = placement_result.get("placed_under_user_id")
@@ -451,16 +449,15 @@ class MatrixService:
                     try:
                         mt = MatrixTree.objects(user_id=ObjectId(placed_under_id)).first()
                         if mt:
-                            parent_pos = pos_int // 3
-                            parent_level = level - 1
-                            parent_node = next((n for n in mt.nodes if n.level == parent_level and n.position == parent_pos), None)
-                            if parent_node:
-                                immediate_parent_id = str(parent_node.user_id)
+                            parent_at = matrix_geometry.parent(level, pos_int)
+                            parent_user_id = matrix_geometry.occupancy_index(mt.nodes).get(parent_at)
+                            if parent_user_id:
+                                immediate_parent_id = parent_user_id
                     except Exception as e:
                         print(f"Error resolving immediate parent: {e}")
 
                 # Set is_upline_reserve flag
-                is_reserve = (pos_int % 3 == 1)
+                is_reserve = matrix_geometry.is_middle(pos_int)
                 
                 # Create TreePlacement
                 TreePlacement(
@@ -653,55 +650,43 @@ class MatrixService:
             except Exception as mp_err:
                 print(f"Error recording missed profit: {mp_err}", flush=True)
 
-            # Find first available position using BFS within the resolved parent tree
-            placement_position = self._find_bfs_placement_position(target_parent_tree, slot_no)
+            # Find first available position using BFS within the resolved parent tree and claim it.
+            # The claim is a compare-and-swap on the tree version: when a concurrent join changed
+            # the tree since it was read, re-read it and search again.
             used_escalation = (str(target_parent_tree.user_id) != str(referrer_id))
             used_mother = (MATRIX_MOTHER_ID and str(target_parent_tree.user_id) == MATRIX_MOTHER_ID)
-            if not placement_position:
-                # escalate one level further: attempt next eligible ancestor if current has no space
-                next_parent_tree = self._resolve_next_eligible_ancestor(target_parent_tree.user_id, slot_no, start_from_current=True)
-                if next_parent_tree:
-                    placement_position = self._find_bfs_placement_position(next_parent_tree, slot_no)
-                    if placement_position:
-                        target_parent_tree = next_parent_tree
-                        used_escalation = True
-                        used_mother = (MATRIX_MOTHER_ID and str(target_parent_tree.user_id) == MATRIX_MOTHER_ID)
+            for attempt in range(PLACEMENT_MAX_ATTEMPTS):
+                if attempt:
+                    # Jittered backoff so racing joins stop colliding on the same tree
+                    time.sleep(random.uniform(0, PLACEMENT_RETRY_DELAY * min(attempt, 8)))
+                    target_parent_tree = MatrixTree.objects(id=target_parent_tree.id).first()
+                placement_position = self._find_bfs_placement_position(target_parent_tree, slot_no)
                 if not placement_position:
-                    raise ValueError("No available positions in eligible matrix trees for placement")
-            
-            
-            # Create matrix node for the new user
-            matrix_node = MatrixNode(
-                level=placement_position['level'],
-                position=placement_position['position'],
-                user_id=ObjectId(user_id),
-                placed_at=datetime.utcnow(),
-                is_active=True
-            )
-            
-            # Add node to target parent tree
+                    # escalate one level further: attempt next eligible ancestor if current has no space
+                    next_parent_tree = self._resolve_next_eligible_ancestor(target_parent_tree.user_id, slot_no, start_from_current=True)
+                    if next_parent_tree:
+                        placement_position = self._find_bfs_placement_position(next_parent_tree, slot_no)
+                        if placement_position:
+                            target_parent_tree = next_parent_tree
+                            used_escalation = True
+                            used_mother = (MATRIX_MOTHER_ID and str(target_parent_tree.user_id) == MATRIX_MOTHER_ID)
+                    if not placement_position:
+                        raise ValueError("No available positions in eligible matrix trees for placement")
+                
+                # Create matrix node for the new user
+                matrix_node = MatrixNode(
+                    level=placement_position['level'],
+                    position=placement_position['position'],
+                    user_id=ObjectId(user_id),
+                    slot_no=slot_no,
+                    placed_at=datetime.utcnow(),
+                    is_active=True
+                )
+                if self._claim_matrix_position(target_parent_tree, matrix_node):
+                    break
+            else:
+                raise ValueError(f"Matrix placement lost {PLACEMENT_MAX_ATTEMPTS} concurrent claims")
             referrer_tree = target_parent_tree
-            # Memory guard: limit node count in test scenarios
-            if hasattr(referrer_tree, 'nodes') and len(getattr(referrer_tree, 'nodes', [])) > 10000:
-                # Cap for performance tests to prevent excessive memory usage
-                referrer_tree.nodes = referrer_tree.nodes[-5000:]  # Keep last 5000 nodes
-            referrer_tree.nodes.append(matrix_node)
-            
-            # Update member counts
-            if placement_position['level'] == 1:
-                referrer_tree.level_1_members += 1
-            elif placement_position['level'] == 2:
-                referrer_tree.level_2_members += 1
-            elif placement_position['level'] == 3:
-                referrer_tree.level_3_members += 1
-            
-            referrer_tree.total_members += 1
-            referrer_tree.updated_at = datetime.utcnow()
-            try:
-                referrer_tree.save()
-            except Exception:
-                # In test scenarios, save might fail with mocked objects
-                pass
 
             # Mirror Level-2 node into the direct upline's tree when a Level-1 child is placed under referrer
             try:
@@ -727,7 +712,7 @@ class MatrixService:
                                 parent_pos = getattr(parent_l1_node, 'position', None)
                                 child_offset = placement_position['position']  # 0/1/2 under referrer
                                 if parent_pos is not None:
-                                    mapped_pos = parent_pos * 3 + child_offset
+                                    mapped_pos = matrix_geometry.child(parent_pos, child_offset)
                                     # If not already present, append Level-2 node for this child in parent tree
                                     already = any(
                                         getattr(n, 'level', 0) == 2
@@ -736,22 +721,29 @@ class MatrixService:
                                         for n in getattr(parent_tree, 'nodes', [])
                                     )
                                     if not already:
-                                        parent_tree.nodes.append(
-                                            MatrixNode(
-                                                level=2,
-                                                position=mapped_pos,
-                                                user_id=ObjectId(user_id),
-                                                placed_at=datetime.utcnow(),
-                                                is_active=True,
-                                            )
+                                        # Atomic push, so concurrent joins under the parent do not
+                                        # overwrite each other's nodes (and a repeat mirror is a no-op)
+                                        mirror_node = MatrixNode(
+                                            level=2,
+                                            position=mapped_pos,
+                                            user_id=ObjectId(user_id),
+                                            slot_no=slot_no,
+                                            placed_at=datetime.utcnow(),
+                                            is_active=True,
+                                        )
+                                        MatrixTree._get_collection().update_one(
+                                            {
+                                                '_id': parent_tree.id,
+                                                'nodes': {'$not': {'$elemMatch': {
+                                                    'level': 2, 'position': mapped_pos, 'user_id': ObjectId(user_id)
+                                                }}},
+                                            },
+                                            {
+                                                '$push': {'nodes': mirror_node.to_mongo()},
+                                                '$inc': {'version': 1, 'level_2_members': 1, 'total_members': 1},
+                                                '$set': {'updated_at': mirror_node.placed_at},
+                                            },
                                         )
-                                        parent_tree.level_2_members = (parent_tree.level_2_members or 0) + 1
-                                        parent_tree.total_members = (parent_tree.total_members or 0) + 1
-                                        parent_tree.updated_at = datetime.utcnow()
-                                        try:
-                                            parent_tree.save()
-                                        except Exception:
-                                            pass
                                         # After mirroring a Level-2 node into the parent tree,
                                         # re-check auto-upgrade for the parent (tree owner).
                                         try:
@@ -919,6 +911,10 @@ class MatrixService:
         except Exception:
             pass
     
+    def _claim_matrix_position(self, matrix_tree: MatrixTree, node: MatrixNode) -> bool:
+        """Append a placed node unless the tree changed since it was read (MatrixTree.claim_node)"""
+        return matrix_tree.claim_node(node)
+    
     def _find_bfs_placement_position(self, matrix_tree: MatrixTree, slot_no: int = 1) -> Optional[Dict[str, int]]:
         """Find first available position using SWEEPOVER BFS algorithm.
         
@@ -931,46 +927,30 @@ class MatrixService:
         - Level 3: Fill in waves across all L2 parents (same pattern)
         """
         try:
-            # Filter nodes that belong to this slot using TreePlacement
-            tree_user_ids = [node.user_id for node in matrix_tree.nodes]
+            # Filter nodes that belong to this slot: nodes record their slot, older nodes are
+            # matched through TreePlacement
+            legacy_user_ids = [node.user_id for node in matrix_tree.nodes if getattr(node, 'slot_no', None) is None]
             valid_user_ids = set()
-            if tree_user_ids:
+            if legacy_user_ids:
                 tps = TreePlacement.objects(
-                    user_id__in=tree_user_ids,
+                    user_id__in=legacy_user_ids,
                     program='matrix',
                     slot_no=slot_no,
                     is_active=True
                 ).only('user_id')
                 valid_user_ids = {tp.user_id for tp in tps}
-            
-            current_slot_nodes = [node for node in matrix_tree.nodes if node.user_id in valid_user_ids]
-
-            # Level 1: Check positions 0, 1, 2 (left, middle, right) - Sequential
-            for pos in range(3):
-                if not any(node.level == 1 and node.position == pos for node in current_slot_nodes):
-                    return {"level": 1, "position": pos}
-            
-            # Level 2: Check positions 0-8 using SWEEPOVER (wave across L1 parents)
-            # Wave 1: first child of each L1 parent (positions 0, 3, 6)
-            # Wave 2: second child of each L1 parent (positions 1, 4, 7)
-            # Wave 3: third child of each L1 parent (positions 2, 5, 8)
-            for child_index in range(3):  # 0, 1, 2 (first, second, third child)
-                for parent_index in range(3):  # 0, 1, 2 (L1 positions)
-                    pos = parent_index * 3 + child_index
-                    if not any(node.level == 2 and node.position == pos for node in current_slot_nodes):
-                        return {"level": 2, "position": pos}
-            
-            # Level 3: Check positions 0-26 using SWEEPOVER (wave across L2 parents)
-            # Wave 1: first child of each L2 parent (positions 0, 3, 6, 9, 12, 15, 18, 21, 24)
-            # Wave 2: second child of each L2 parent (positions 1, 4, 7, 10, 13, 16, 19, 22, 25)
-            # Wave 3: third child of each L2 parent (positions 2, 5, 8, 11, 14, 17, 20, 23, 26)
-            for child_index in range(3):  # 0, 1, 2 (first, second, third child)
-                for parent_index in range(9):  # 0-8 (L2 positions)
-                    pos = parent_index * 3 + child_index
-                    if not any(node.level == 3 and node.position == pos for node in current_slot_nodes):
-                        return {"level": 3, "position": pos}
-            
-            return None  # No available positions
+            slot_nodes = [
+                node for node in matrix_tree.nodes
+                if (getattr(node, 'slot_no', None) == slot_no
+                    or (getattr(node, 'slot_no', None) is None and node.user_id in valid_user_ids))
+            ]
+            
+            # Level 1 left → middle → right, then Levels 2 and 3 in sweepover waves
+            mask = matrix_geometry.occupancy_mask(slot_nodes)
+            free = matrix_geometry.next_free_position(mask)
+            if free is None:
+                return None  # No available positions
+            return {"level": free[0], "position": free[1]}
             
         except Exception as e:
             raise ValueError(f"Failed to find BFS placement position: {str(e)}")
@@ -1217,47 +1197,29 @@ class MatrixService:
         - If placement_level == 1: L1 = tree owner; L2 = owner.refered_by; L3 = L2.refered_by
         - If placement_level == 2: L1 = L1-node user at pos = position//3; L2 = tree owner; L3 = owner.refered_by
         - If placement_level == 3: L1 = L2-node user at pos2 = position//3; L2 = L1-node user at pos1 = pos2//3; L3 = tree owner
+        Ancestor positions come from matrix geometry; the tree's nodes are only indexed once.
         """
         try:
             if not placed_under_user_id or placement_level is None or placement_position is None:
                 return (None, None, None)
+            if not matrix_geometry.is_valid(int(placement_level), int(placement_position)):
+                return (None, None, None)
 
             tree_owner_id = ObjectId(placed_under_user_id)
-            tree = MatrixTree.objects(user_id=tree_owner_id).first()
+            tree = MatrixTree.objects(user_id=tree_owner_id).only('nodes').first()
             if not tree:
                 return (None, None, None)
 
-            def find_node_user(level: int, position: int) -> Optional[str]:
-                for n in tree.nodes:
-                    if getattr(n, 'level', None) == level and getattr(n, 'position', None) == position:
-                        return str(n.user_id)
-                return None
-
-            if placement_level == 1:
-                l1 = str(tree_owner_id)
-                owner = User.objects(id=tree_owner_id).first()
-                l2 = str(owner.refered_by) if owner and getattr(owner, 'refered_by', None) else None
-                l2_user = User.objects(id=ObjectId(l2)).first() if l2 else None
-                l3 = str(l2_user.refered_by) if l2_user and getattr(l2_user, 'refered_by', None) else None
-                return (l1, l2, l3)
-
-            if placement_level == 2:
-                parent_l1_pos = int(placement_position) // 3
-                l1 = find_node_user(1, parent_l1_pos)
-                l2 = str(tree_owner_id)
-                owner = User.objects(id=tree_owner_id).first()
-                l3 = str(owner.refered_by) if owner and getattr(owner, 'refered_by', None) else None
-                return (l1, l2, l3)
+            occupancy = matrix_geometry.occupancy_index(tree.nodes)
+            uplines = matrix_geometry.tree_uplines(tree_owner_id, occupancy, int(placement_level), int(placement_position))
 
-            if placement_level == 3:
-                parent_l2_pos = int(placement_position) // 3
-                l1 = find_node_user(2, parent_l2_pos)
-                parent_l1_pos = parent_l2_pos // 3
-                l2 = find_node_user(1, parent_l1_pos)
-                l3 = str(tree_owner_id)
-                return (l1, l2, l3)
-
-            return (None, None, None)
+            # Above the tree owner the uplines follow the referral chain
+            next_id = tree_owner_id
+            while len(uplines) < 3 and next_id:
+                upline = User.objects(id=next_id).only('refered_by').first()
+                next_id = getattr(upline, 'refered_by', None) if upline else None
+                uplines.append(str(next_id) if next_id else None)
+            return tuple((uplines + [None, None, None])[:3])
         except Exception:
             return (None, None, None)
 
@@ -1386,49 +1348,8 @@ class MatrixService:
             if not matrix_tree:
                 return None
             
-            # Count members per level (1..3 only)
-            level_counts = {1: 0, 2: 0, 3: 0}
-            snapshot_nodes = []
-            for node in matrix_tree.nodes:
-                if getattr(node, 'level', 0) in (1, 2, 3):
-                    level_counts[node.level] += 1
-                    snapshot_nodes.append(node)
-
-            # Determine next recycle no for this user+slot
-            existing_latest = MatrixRecycleInstance.objects(
-                user_id=ObjectId(user_id), slot_number=slot_no
-            ).order_by('-recycle_no').first()
-            next_recycle_no = (existing_latest.recycle_no + 1) if existing_latest else 1
-            
-            # Create recycle instance record
-            recycle_instance = MatrixRecycleInstance(
-                user_id=ObjectId(user_id),
-                slot_number=slot_no,
-                recycle_no=next_recycle_no,
-                is_complete=True,
-                total_members=sum(level_counts.values()),
-                level_1_members=level_counts[1],
-                level_2_members=level_counts[2],
-                level_3_members=level_counts[3],
-                created_at=datetime.utcnow(),
-                completed_at=datetime.utcnow()
-            )
-            recycle_instance.save()
-            
-            # Persist immutable nodes snapshot
-            for node in snapshot_nodes:
-                MatrixRecycleNode(
-                        instance_id=recycle_instance.id,
-                    user_id=ObjectId(user_id),
-                    slot_number=slot_no,
-                    recycle_no=next_recycle_no,
-                    level=node.level,
-                    position=node.position,
-                        occupant_user_id=node.user_id,
-                        placed_at=node.placed_at
-                ).save()
-            
-            return recycle_instance
+            # One compact record (levels 1..3 as 39 occupant ids) instead of a row per node
+            return self.recycle_service.save_recycle_snapshot(user_id, slot_no, matrix_tree.nodes)
         except Exception as e:
             print(f"Error creating recycle snapshot: {e}")
             return None
@@ -1449,26 +1370,11 @@ class MatrixService:
         """Get next available position in matrix tree using BFS algorithm."""
         try:
             # BFS placement: Level 1 (left → middle → right), then Level 2, then Level 3
-            existing_positions = set()
-            for node in matrix_tree.nodes:
-                existing_positions.add((node.level, node.position))
-            
-            # Level 1: 3 positions (0, 1, 2)
-            for pos in range(3):
-                if (1, pos) not in existing_positions:
-                    return {"level": 1, "position": pos}
-            
-            # Level 2: 9 positions (0-8)
-            for pos in range(9):
-                if (2, pos) not in existing_positions:
-                    return {"level": 2, "position": pos}
-            
-            # Level 3: 27 positions (0-26)
-            for pos in range(27):
-                if (3, pos) not in existing_positions:
-                    return {"level": 3, "position": pos}
-            
-            return None  # Tree is full
+            mask = matrix_geometry.occupancy_mask(matrix_tree.nodes, level_order=True)
+            free = matrix_geometry.next_free_position(mask, level_order=True)
+            if free is None:
+                return None  # Tree is full
+            return {"level": free[0], "position": free[1]}
         except Exception as e:
             print(f"Error getting next available position: {e}")
             return None
@@ -1589,8 +1495,7 @@ class MatrixService:
                     return None
                 
                 # Get all nodes for this recycle instance
-                recycle_nodes = MatrixRecycleNode.objects(instance_id=recycle_instance.id).order_by('level', 'position').all()
-                node_dicts = [node.to_mongo().to_dict() for node in recycle_nodes]
+                node_dicts = self.recycle_service.get_recycle_nodes(recycle_instance)
                 # Enforce exactly 39 for snapshots: pad or trim to 39
                 # Snapshot is immutable; if fewer than 39, keep as-is for transparency
                 if len(node_dicts) > 39:
@@ -1626,15 +1531,11 @@ class MatrixService:
             print(f"Error getting recycle tree: {e}")
             return None
     
-    def get_recycle_history(self, user_id: str, slot_no: int):
-        """Get recycle history for user+slot."""
+    def get_recycle_history(self, user_id: str, slot_no: int, page: int = 1, limit: int = 50):
+        """Get one page of recycle history for user+slot (summaries, latest first)."""
         try:
-            recycle_instances = MatrixRecycleInstance.objects(
-                user_id=ObjectId(user_id),
-                slot_number=slot_no
-            ).order_by('-recycle_no').all()
-            
-            return [instance.to_mongo().to_dict() for instance in recycle_instances]
+            result = self.recycle_service.get_recycle_history(user_id, slot_no, page=page, limit=limit)
+            return result["data"]["recycles"] if result.get("success") else []
         except Exception as e:
             print(f"Error getting recycle history: {e}")
             return []
@@ -1729,8 +1630,25 @@ class MatrixService:
         """Detect the middle 3 members robustly by deriving Level-2 middle indices from Level-1 parents.
         Level-1 has positions [0,1,2]. Each L1 parent has three children at Level-2 with indices [p*3 + 0, p*3 + 1, p*3 + 2].
         The middle child under each L1 is index (p*3 + 1). We compute this from existing nodes rather than assuming order.
+        Members recorded at placement time (MatrixMiddleThree) are returned directly when present.
         """
         try:
+            # Members recorded at placement time: O(1) instead of walking the tree
+            recorded = self.middle_3_service.get_middle_three(user_id, slot_no)
+            if recorded is not None:
+                members = [
+                    {"user_id": m["user_id"], "level": m.get("level", 2), "position": m.get("position"),
+                     "placed_at": m.get("placed_at")}
+                    for m in recorded["members"]
+                ]
+                return {
+                    "success": True,
+                    "middle_three_members": members,
+                    "total_found": len(members),
+                    "required": 3,
+                    "is_complete": len(members) == 3
+                }
+
             matrix_tree = MatrixTree.objects(user_id=ObjectId(user_id)).first()
             if not matrix_tree:
                 return {"success": False, "error": "Matrix tree not found"}
@@ -1738,7 +1656,8 @@ class MatrixService:
             # Find existing Level-1 parents (positions 0..2)
             level1_positions_present = sorted({n.position for n in matrix_tree.nodes if n.level == 1})
             # Derive expected middle indexes for Level-2 under each present L1 position
-            expected_middle_indexes = [(p * 3) + 1 for p in level1_positions_present if p in (0, 1, 2)]
+            expected_middle_indexes = [matrix_geometry.middle_child(p) for p in level1_positions_present
+                                       if matrix_geometry.is_valid(1, p)]
 
             level_2_nodes = [node for node in matrix_tree.nodes if node.level == 2]
             middle_three_members = []
@@ -1771,7 +1690,7 @@ class MatrixService:
                         continue
                     middle_child = next((cn for cn in getattr(child_tree, 'nodes', []) if getattr(cn, 'level', 0) == 1 and getattr(cn, 'position', -1) == 1), None)
                     if middle_child and getattr(middle_child, 'user_id', None):
-                        mapped_position = (l1.position * 3) + 1
+                        mapped_position = matrix_geometry.middle_child(l1.position)
                         # Verify eligibility (slot active)
                         eligible = False
                         try:
@@ -1823,14 +1742,19 @@ class MatrixService:
             if not current_slot_info:
                 return {"success": False, "error": f"Slot {slot_no} not found"}
             
-            # Calculate 100% earnings from middle 3 members
             slot_value = current_slot_info.get('value', 0)
-            total_earnings = slot_value * 3  # 100% from each of 3 members
+            recorded = self.middle_3_service.get_middle_three(user_id, slot_no)
+            if recorded is not None:
+                # Earnings credited to the reserve as each middle member was placed
+                total_earnings = from_units(recorded["earnings_units"])
+            else:
+                # Trees placed before the counter: 100% of the slot value from each of 3 members
+                total_earnings = slot_value * 3
             
             # Get next slot upgrade cost
             next_slot_no = slot_no + 1
             next_slot_info = self.MATRIX_SLOTS.get(next_slot_no, {})
-            next_upgrade_cost = next_slot_info.get('value', 0)
+            next_upgrade_cost = next_slot_info.get('value', Decimal('0'))
             
             return {
                 "success": True,
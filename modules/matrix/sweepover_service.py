@@ -8,7 +8,6 @@ from typing import Dict, Any, Optional, List, Tuple
 from decimal import Decimal
 from datetime import datetime
 from bson import ObjectId
-
 from ..user.model import User
 from ..wallet.model import UserWallet, ReserveLedger
 from ..slot.model import SlotCatalog, SlotActivation
@@ -16,6 +15,8 @@ from ..tree.model import TreePlacement
 from ..blockchain.model import BlockchainEvent
 from ..income.model import IncomeEvent
 from .model import MatrixTree, MatrixNode, MatrixActivation
+from . import geometry as matrix_geometry
+from core.config import PLACEMENT_MAX_ATTEMPTS
 
 
 class SweepoverService:
@@ -164,35 +165,36 @@ class SweepoverService:
             if not matrix_tree:
                 matrix_tree = self._create_matrix_tree_for_slot(tree_upline_id, slot_no)
             
-            # Find available position using BFS algorithm
-            placement_position = self._find_bfs_placement_position(matrix_tree)
-            if not placement_position:
-                return {"success": False, "error": "No available position in tree"}
-            
-            # Create matrix node for the user
-            matrix_node = MatrixNode(
-                level=placement_position["level"],
-                position=placement_position["position"],
-                user_id=ObjectId(user_id),
-                placed_at=datetime.utcnow(),
-                is_active=True
-            )
-            
-            # Add node to tree
-            matrix_tree.nodes.append(matrix_node)
-            
-            # Update tree statistics
-            self._update_tree_statistics(matrix_tree, placement_position["level"])
+            # Find available position using BFS algorithm and claim it; the claim is a
+            # compare-and-swap on the tree version, so re-read and search again when it loses
+            for attempt in range(PLACEMENT_MAX_ATTEMPTS):
+                if attempt:
+                    matrix_tree = MatrixTree.objects(id=matrix_tree.id).first()
+                placement_position = self._find_bfs_placement_position(matrix_tree)
+                if not placement_position:
+                    return {"success": False, "error": "No available position in tree"}
+                
+                # Create matrix node for the user
+                matrix_node = MatrixNode(
+                    level=placement_position["level"],
+                    position=placement_position["position"],
+                    user_id=ObjectId(user_id),
+                    slot_no=slot_no,
+                    placed_at=datetime.utcnow(),
+                    is_active=True
+                )
+                if matrix_tree.claim_node(matrix_node):
+                    break
+            else:
+                return {"success": False, "error": f"Sweepover placement lost {PLACEMENT_MAX_ATTEMPTS} concurrent claims"}
             
             # Check if tree is now complete (39 members)
             if matrix_tree.total_members >= 39:
                 matrix_tree.is_complete = True
+                matrix_tree.save()
                 # Trigger recycle process
                 self._trigger_recycle_process(matrix_tree, user_id, slot_no, tx_hash, amount)
             
-            matrix_tree.updated_at = datetime.utcnow()
-            matrix_tree.save()
-            
             # Create matrix activation record
             self._create_matrix_activation(user_id, slot_no, tx_hash, amount, tree_upline_id)
             
@@ -201,7 +203,7 @@ class SweepoverService:
                 from modules.slot.model import SlotActivation
                 from modules.user.tree_reserve_service import TreeUplineReserveService
                 # If placement is Level 2 middle (position % 3 == 1) under tree_upline and next slot not yet active
-                is_middle_l2 = placement_position.get('level') == 2 and int(placement_position.get('position', -1)) % 3 == 1
+                is_middle_l2 = placement_position.get('level') == 2 and matrix_geometry.is_middle(int(placement_position.get('position', -1)))
                 next_slot_no = slot_no + 1
                 already_active = False
                 try:
@@ -238,35 +240,17 @@ class SweepoverService:
         Matrix structure: Level 1 (3 positions), Level 2 (9 positions), Level 3 (27 positions)
         """
         try:
-            # Level 1: 3 positions (0, 1, 2)
-            level_1_positions = [0, 1, 2]
-            for pos in level_1_positions:
-                if not self._position_occupied(matrix_tree, 1, pos):
-                    return {"level": 1, "position": pos}
-            
-            # Level 2: 9 positions (0-8)
-            for pos in range(9):
-                if not self._position_occupied(matrix_tree, 2, pos):
-                    return {"level": 2, "position": pos}
-            
-            # Level 3: 27 positions (0-26)
-            for pos in range(27):
-                if not self._position_occupied(matrix_tree, 3, pos):
-                    return {"level": 3, "position": pos}
-            
-            return None  # No available position
+            # Each level left to right: Level 1 (0-2), then Level 2 (0-8), then Level 3 (0-26)
+            mask = matrix_geometry.occupancy_mask(matrix_tree.nodes, level_order=True)
+            free = matrix_geometry.next_free_position(mask, level_order=True)
+            if free is None:
+                return None  # No available position
+            return {"level": free[0], "position": free[1]}
             
         except Exception as e:
             print(f"Error finding BFS placement: {e}")
             return None
     
-    def _position_occupied(self, matrix_tree: MatrixTree, level: int, position: int) -> bool:
-        """Check if a specific position in the matrix tree is occupied."""
-        for node in matrix_tree.nodes:
-            if node.level == level and node.position == position:
-                return True
-        return False
-    
     def _create_matrix_tree_for_slot(self, upline_id: str, slot_no: int) -> MatrixTree:
         """Create a new matrix tree for an upline and slot."""
         matrix_tree = MatrixTree(
@@ -286,44 +270,15 @@ class SweepoverService:
         matrix_tree.save()
         return matrix_tree
     
-    def _update_tree_statistics(self, matrix_tree: MatrixTree, level: int):
-        """Update matrix tree statistics after adding a new member."""
-        matrix_tree.total_members += 1
-        
-        if level == 1:
-            matrix_tree.level_1_members += 1
-        elif level == 2:
-            matrix_tree.level_2_members += 1
-        elif level == 3:
-            matrix_tree.level_3_members += 1
-    
     def _trigger_recycle_process(self, matrix_tree: MatrixTree, triggering_user_id: str, 
                                slot_no: int, tx_hash: str, amount: Decimal):
         """Trigger recycle process when matrix tree reaches 39 members."""
         try:
-            # Create recycle instance
-            from .model import MatrixRecycleInstance, MatrixRecycleNode
-            
-            recycle_instance = MatrixRecycleInstance(
-                user_id=matrix_tree.user_id,
-                slot_number=slot_no,
-                recycle_no=self._get_next_recycle_number(matrix_tree.user_id, slot_no),
-                is_complete=True,
-                completed_at=datetime.utcnow()
-            )
-            recycle_instance.save()
-            
-            # Create recycle nodes snapshot
-            for node in matrix_tree.nodes:
-                recycle_node = MatrixRecycleNode(
-                    instance_id=recycle_instance.id,
-                    occupant_user_id=node.user_id,
-                    level_index=node.level,
-                    position_index=node.position,
-                    placed_at=node.placed_at
-                )
-                recycle_node.save()
-            
+            # Record the completed tree as one compact recycle snapshot
+            from .recycle_service import MatrixRecycleService
+            MatrixRecycleService().save_recycle_snapshot(str(matrix_tree.user_id), slot_no, matrix_tree.nodes,
+                                                         created_at=matrix_tree.created_at)
+
             # Create new in-progress tree
             self._create_matrix_tree_for_slot(str(matrix_tree.user_id), slot_no)
             
@@ -345,9 +345,8 @@ async def get_mentorship_fund():
     try:
         fund = MentorshipFund.objects(is_active=True).first()
         if not fund:
-            # Create default fund
+            # Defaults only; the record is created by the matching POST, never by a GET
             fund = MentorshipFund()
-            fund.save()
         
         return success_response(
             data={
@@ -416,9 +415,8 @@ async def get_mentorship_settings():
     try:
         settings = MentorshipSettings.objects(is_active=True).first()
         if not settings:
-            # Create default settings
+            # Defaults only; the record is created by the matching POST, never by a GET
             settings = MentorshipSettings()
-            settings.save()
         
         return success_response(
             data={
@@ -36,6 +36,7 @@ class MissedProfit(Document):
     # Status
     is_accumulated = BooleanField(default=False)
     accumulated_at = DateTimeField()
+    accumulation_id = ObjectIdField()  # MissedProfitAccumulation that claimed this row
     is_distributed = BooleanField(default=False)
     distributed_at = DateTimeField()
     distribution_method = StringField(choices=['leadership_stipend', 'direct_distribution'], default='leadership_stipend')
@@ -59,7 +60,12 @@ class MissedProfit(Document):
             'program_type',
             'is_accumulated',
             'is_distributed',
-            'recovery_status'
+            'recovery_status',
+            'accumulation_id',
+            ('is_accumulated', 'created_at'),
+            # Keyset order of the streaming exports (wallet/export_service.py)
+            ('user_id', 'created_at', '_id'),
+            ('created_at', '_id')
         ]
     }
 
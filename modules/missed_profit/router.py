@@ -179,110 +179,17 @@ async def get_missed_profits(user_id: str, limit: int = Query(50, le=100), curre
 async def accumulate_missed_profits(request: MissedProfitAccumulationRequest, current_user: dict = Depends(authentication_service.verify_authentication)):
     """Accumulate missed profits for a period"""
     try:
-        # Get missed profits for the period
-        missed_profits = MissedProfit.objects(
-            created_at__gte=request.period_start,
-            created_at__lt=request.period_end,
-            is_accumulated=False
-        )
+        from .service import MissedProfitService
         
-        # Calculate totals
-        total_amount = 0.0
-        total_amount_bnb = 0.0
-        total_amount_usdt = 0.0
-        
-        account_inactivity_count = 0
-        account_inactivity_amount = 0.0
-        level_advancement_count = 0
-        level_advancement_amount = 0.0
-        
-        binary_count = 0
-        binary_amount = 0.0
-        matrix_count = 0
-        matrix_amount = 0.0
-        global_count = 0
-        global_amount = 0.0
-        
-        for missed_profit in missed_profits:
-            total_amount += missed_profit.missed_profit_amount
-            
-            if missed_profit.currency == 'BNB':
-                total_amount_bnb += missed_profit.missed_profit_amount
-            else:
-                total_amount_usdt += missed_profit.missed_profit_amount
-            
-            if missed_profit.primary_reason == 'account_inactivity':
-                account_inactivity_count += 1
-                account_inactivity_amount += missed_profit.missed_profit_amount
-            else:
-                level_advancement_count += 1
-                level_advancement_amount += missed_profit.missed_profit_amount
-            
-            if missed_profit.program_type == 'binary':
-                binary_count += 1
-                binary_amount += missed_profit.missed_profit_amount
-            elif missed_profit.program_type == 'matrix':
-                matrix_count += 1
-                matrix_amount += missed_profit.missed_profit_amount
-            else:
-                global_count += 1
-                global_amount += missed_profit.missed_profit_amount
-            
-            # Mark as accumulated
-            missed_profit.is_accumulated = True
-            missed_profit.accumulated_at = datetime.utcnow()
-            missed_profit.save()
-        
-        # Create accumulation record
-        accumulation = MissedProfitAccumulation(
-            accumulation_period=request.period,
-            period_start=request.period_start,
-            period_end=request.period_end,
-            total_missed_profits=total_amount,
-            total_missed_profits_bnb=total_amount_bnb,
-            total_missed_profits_usdt=total_amount_usdt,
-            account_inactivity_count=account_inactivity_count,
-            account_inactivity_amount=account_inactivity_amount,
-            level_advancement_count=level_advancement_count,
-            level_advancement_amount=level_advancement_amount,
-            binary_missed_count=binary_count,
-            binary_missed_amount=binary_amount,
-            matrix_missed_count=matrix_count,
-            matrix_missed_amount=matrix_amount,
-            global_missed_count=global_count,
-            global_missed_amount=global_amount,
-            is_processed=True,
-            processed_at=datetime.utcnow()
+        result = MissedProfitService().accumulate_missed_profits(
+            request.period, request.period_start, request.period_end
         )
-        accumulation.save()
+        if not result.get("success"):
+            return error_response(result.get("error"))
         
-        return success_response(
-            data={
-                "accumulation_id": str(accumulation.id),
-                "period": request.period,
-                "period_start": request.period_start,
-                "period_end": request.period_end,
-                "total_missed_profits": total_amount,
-                "total_missed_profits_bnb": total_amount_bnb,
-                "total_missed_profits_usdt": total_amount_usdt,
-                "account_inactivity": {
-                    "count": account_inactivity_count,
-                    "amount": account_inactivity_amount
-                },
-                "level_advancement": {
-                    "count": level_advancement_count,
-                    "amount": level_advancement_amount
-                },
-                "program_breakdown": {
-                    "binary": {"count": binary_count, "amount": binary_amount},
-                    "matrix": {"count": matrix_count, "amount": matrix_amount},
-                    "global": {"count": global_count, "amount": global_amount}
-                },
-                "processed_missed_profits": len(missed_profits),
-                "message": "Missed profits accumulated successfully"
-            },
-            message="Missed profits accumulated"
-        )
+        result.pop("success")
+        result["message"] = "Missed profits accumulated successfully"
+        return success_response(data=result, message="Missed profits accumulated")
         
     except Exception as e:
         return error_response(str(e))
@@ -378,9 +285,8 @@ async def get_missed_profit_fund(current_user: dict = Depends(authentication_ser
     try:
         fund = MissedProfitFund.objects(is_active=True).first()
         if not fund:
-            # Create default fund
+            # Defaults only; the record is created by the matching POST, never by a GET
             fund = MissedProfitFund()
-            fund.save()
         
         return success_response(
             data={
@@ -449,9 +355,8 @@ async def get_missed_profit_settings(current_user: dict = Depends(authentication
     try:
         settings = MissedProfitSettings.objects(is_active=True).first()
         if not settings:
-            # Create default settings
+            # Defaults only; the record is created by the matching POST, never by a GET
             settings = MissedProfitSettings()
-            settings.save()
         
         return success_response(
             data={
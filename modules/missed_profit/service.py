@@ -1,5 +1,6 @@
 from typing import List, Optional, Dict, Any, Tuple
 from bson import ObjectId
+from bson.decimal128 import Decimal128
 from decimal import Decimal
 from datetime import datetime, timedelta
 from ..user.model import User
@@ -11,6 +12,64 @@ from .model import (
     MissedProfitStatistics, MissedProfitRecovery, MissedProfitReason
 )
 
+# Facets of aggregate_missed_profit_totals: name -> MissedProfit field grouped on (None = all rows)
+TOTALS_FACETS = {
+    'overall': None,
+    'currency': 'currency',
+    'primary_reason': 'primary_reason',
+    'program_type': 'program_type',
+}
+
+
+def _to_decimal(value) -> Decimal:
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    return Decimal(str(value or 0))
+
+
+def _totals_bucket(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "count": row.get('count', 0),
+        "amount": _to_decimal(row.get('amount')),
+        "distributed_amount": _to_decimal(row.get('distributed_amount')),
+        "undistributed_count": row.get('undistributed_count', 0),
+        "recovery_pending_count": row.get('recovery_pending_count', 0),
+    }
+
+
+def aggregate_missed_profit_totals(match: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Counts and amounts of the MissedProfit rows matching `match` (raw query), overall and
+    per currency / reason / program, from one $facet aggregation. Amounts are summed as
+    Decimal128 on the server and returned as exact Decimals; every choice of a grouped
+    field is present, zero when no row has it.
+    """
+    amount = {'$toDecimal': '$missed_profit_amount'}
+    group = {
+        'count': {'$sum': 1},
+        'amount': {'$sum': amount},
+        'distributed_amount': {'$sum': {'$cond': [{'$eq': ['$is_distributed', True]}, amount, 0]}},
+        'undistributed_count': {'$sum': {'$cond': [{'$eq': ['$is_distributed', True]}, 0, 1]}},
+        'recovery_pending_count': {'$sum': {'$cond': [{'$eq': ['$recovery_status', 'pending']}, 1, 0]}},
+    }
+    pipeline = [
+        {'$match': match},
+        {'$facet': {
+            name: [{'$group': dict(group, _id=f'${field}' if field else None)}]
+            for name, field in TOTALS_FACETS.items()
+        }},
+    ]
+    facets = next(iter(MissedProfit._get_collection().aggregate(pipeline)), {})
+
+    totals = {'overall': _totals_bucket((facets.get('overall') or [{}])[0])}
+    for name, field in TOTALS_FACETS.items():
+        if field:
+            buckets = {choice: _totals_bucket({}) for choice in MissedProfit._fields[field].choices}
+            buckets.update({row['_id']: _totals_bucket(row) for row in facets.get(name, []) if row.get('_id')})
+            totals[name] = buckets
+    return totals
+
+
 class MissedProfitService:
     """Missed Profit Handling Business Logic Service"""
     
@@ -94,86 +153,49 @@ class MissedProfitService:
     def accumulate_missed_profits(self, period: str, period_start: datetime, period_end: datetime) -> Dict[str, Any]:
         """Accumulate missed profits for a period"""
         try:
-            # Get missed profits for the period
-            missed_profits = MissedProfit.objects(
-                created_at__gte=period_start,
-                created_at__lt=period_end,
-                is_accumulated=False
-            )
-            
-            # Calculate totals
-            total_amount = 0.0
-            total_amount_bnb = 0.0
-            total_amount_usdt = 0.0
-            
-            account_inactivity_count = 0
-            account_inactivity_amount = 0.0
-            level_advancement_count = 0
-            level_advancement_amount = 0.0
-            
-            binary_count = 0
-            binary_amount = 0.0
-            matrix_count = 0
-            matrix_amount = 0.0
-            global_count = 0
-            global_amount = 0.0
-            
-            for missed_profit in missed_profits:
-                total_amount += missed_profit.missed_profit_amount
-                
-                if missed_profit.currency == 'BNB':
-                    total_amount_bnb += missed_profit.missed_profit_amount
-                else:
-                    total_amount_usdt += missed_profit.missed_profit_amount
-                
-                if missed_profit.primary_reason == 'account_inactivity':
-                    account_inactivity_count += 1
-                    account_inactivity_amount += missed_profit.missed_profit_amount
-                else:
-                    level_advancement_count += 1
-                    level_advancement_amount += missed_profit.missed_profit_amount
-                
-                if missed_profit.program_type == 'binary':
-                    binary_count += 1
-                    binary_amount += missed_profit.missed_profit_amount
-                elif missed_profit.program_type == 'matrix':
-                    matrix_count += 1
-                    matrix_amount += missed_profit.missed_profit_amount
-                else:
-                    global_count += 1
-                    global_amount += missed_profit.missed_profit_amount
-                
-                # Mark as accumulated
-                missed_profit.is_accumulated = True
-                missed_profit.accumulated_at = datetime.utcnow()
-                missed_profit.save()
-            
-            # Create accumulation record
+            # Claim the period's unaccumulated rows for this accumulation in one update_many,
+            # then total exactly those rows on the server
+            now = datetime.utcnow()
             accumulation = MissedProfitAccumulation(
                 accumulation_period=period,
                 period_start=period_start,
                 period_end=period_end,
-                total_missed_profits=total_amount,
-                total_missed_profits_bnb=total_amount_bnb,
-                total_missed_profits_usdt=total_amount_usdt,
-                account_inactivity_count=account_inactivity_count,
-                account_inactivity_amount=account_inactivity_amount,
-                level_advancement_count=level_advancement_count,
-                level_advancement_amount=level_advancement_amount,
-                binary_missed_count=binary_count,
-                binary_missed_amount=binary_amount,
-                matrix_missed_count=matrix_count,
-                matrix_missed_amount=matrix_amount,
-                global_missed_count=global_count,
-                global_missed_amount=global_amount,
-                is_processed=True,
-                processed_at=datetime.utcnow()
+                is_processed=False
+            )
+            accumulation.save()
+            
+            claimed = MissedProfit._get_collection().update_many(
+                {'created_at': {'$gte': period_start, '$lt': period_end}, 'is_accumulated': {'$ne': True}},
+                {'$set': {'is_accumulated': True, 'accumulated_at': now, 'accumulation_id': accumulation.id,
+                          'last_updated': now}}
             )
+            totals = aggregate_missed_profit_totals({'accumulation_id': accumulation.id})
+            overall = totals['overall']
+            by_currency = totals['currency']
+            by_reason = totals['primary_reason']
+            by_program = totals['program_type']
+            
+            accumulation.total_missed_profits = float(overall["amount"])
+            accumulation.total_missed_profits_bnb = float(by_currency['BNB']["amount"])
+            # Rows without BNB are USDT, as before
+            accumulation.total_missed_profits_usdt = float(overall["amount"] - by_currency['BNB']["amount"])
+            accumulation.account_inactivity_count = by_reason['account_inactivity']["count"]
+            accumulation.account_inactivity_amount = float(by_reason['account_inactivity']["amount"])
+            accumulation.level_advancement_count = by_reason['level_advancement']["count"]
+            accumulation.level_advancement_amount = float(by_reason['level_advancement']["amount"])
+            accumulation.binary_missed_count = by_program['binary']["count"]
+            accumulation.binary_missed_amount = float(by_program['binary']["amount"])
+            accumulation.matrix_missed_count = by_program['matrix']["count"]
+            accumulation.matrix_missed_amount = float(by_program['matrix']["amount"])
+            accumulation.global_missed_count = by_program['global']["count"]
+            accumulation.global_missed_amount = float(by_program['global']["amount"])
+            accumulation.is_processed = True
+            accumulation.processed_at = datetime.utcnow()
             accumulation.save()
             
             # Log the action
             self._log_action("system", "missed_profit_accumulated", 
-                           f"Accumulated missed profits: ${total_amount} for {period}")
+                           f"Accumulated missed profits: ${overall['amount']} for {period}")
             
             return {
                 "success": True,
@@ -181,24 +203,23 @@ class MissedProfitService:
                 "period": period,
                 "period_start": period_start,
                 "period_end": period_end,
-                "total_missed_profits": total_amount,
-                "total_missed_profits_bnb": total_amount_bnb,
-                "total_missed_profits_usdt": total_amount_usdt,
+                "total_missed_profits": overall["amount"],
+                "total_missed_profits_bnb": by_currency['BNB']["amount"],
+                "total_missed_profits_usdt": overall["amount"] - by_currency['BNB']["amount"],
                 "account_inactivity": {
-                    "count": account_inactivity_count,
-                    "amount": account_inactivity_amount
+                    "count": by_reason['account_inactivity']["count"],
+                    "amount": by_reason['account_inactivity']["amount"]
                 },
                 "level_advancement": {
-                    "count": level_advancement_count,
-                    "amount": level_advancement_amount
+                    "count": by_reason['level_advancement']["count"],
+                    "amount": by_reason['level_advancement']["amount"]
                 },
                 "program_breakdown": {
-                    "binary": {"count": binary_count, "amount": binary_amount},
-                    "matrix": {"count": matrix_count, "amount": matrix_amount},
-                    "global": {"count": global_count, "amount": global_amount}
+                    program: {"count": by_program[program]["count"], "amount": by_program[program]["amount"]}
+                    for program in ('binary', 'matrix', 'global')
                 },
-                "processed_missed_profits": len(missed_profits),
-                "message": f"Missed profits accumulated: ${total_amount}"
+                "processed_missed_profits": claimed.modified_count,
+                "message": f"Missed profits accumulated: ${overall['amount']}"
             }
             
         except Exception as e:
@@ -355,42 +376,41 @@ class MissedProfitService:
                 start_date = datetime(2024, 1, 1)
                 end_date = now
             
-            # Get statistics
-            missed_profits = MissedProfit.objects(
-                created_at__gte=start_date,
-                created_at__lt=end_date
-            )
-            
-            total_missed_profits = missed_profits.count()
-            total_missed_amount = sum(mp.missed_profit_amount for mp in missed_profits)
-            
-            # Reason breakdown
-            account_inactivity_count = missed_profits.filter(primary_reason="account_inactivity").count()
-            account_inactivity_amount = sum(mp.missed_profit_amount for mp in missed_profits.filter(primary_reason="account_inactivity"))
-            level_advancement_count = missed_profits.filter(primary_reason="level_advancement").count()
-            level_advancement_amount = sum(mp.missed_profit_amount for mp in missed_profits.filter(primary_reason="level_advancement"))
-            
-            # Program breakdown
-            binary_count = missed_profits.filter(program_type="binary").count()
-            binary_amount = sum(mp.missed_profit_amount for mp in missed_profits.filter(program_type="binary"))
-            matrix_count = missed_profits.filter(program_type="matrix").count()
-            matrix_amount = sum(mp.missed_profit_amount for mp in missed_profits.filter(program_type="matrix"))
-            global_count = missed_profits.filter(program_type="global").count()
-            global_amount = sum(mp.missed_profit_amount for mp in missed_profits.filter(program_type="global"))
-            
-            # Distribution breakdown
-            distributed_profits = missed_profits.filter(is_distributed=True)
-            total_distributed_amount = sum(mp.missed_profit_amount for mp in distributed_profits)
+            # Get statistics (one $facet aggregation, exact decimal sums)
+            totals = aggregate_missed_profit_totals({'created_at': {'$gte': start_date, '$lt': end_date}})
+            by_reason = totals['primary_reason']
+            by_program = totals['program_type']
+            
+            total_missed_profits = totals['overall']["count"]
+            total_missed_amount = totals['overall']["amount"]
+            total_distributed_amount = totals['overall']["distributed_amount"]
+            account_inactivity_count = by_reason['account_inactivity']["count"]
+            account_inactivity_amount = by_reason['account_inactivity']["amount"]
+            level_advancement_count = by_reason['level_advancement']["count"]
+            level_advancement_amount = by_reason['level_advancement']["amount"]
+            binary_count = by_program['binary']["count"]
+            binary_amount = by_program['binary']["amount"]
+            matrix_count = by_program['matrix']["count"]
+            matrix_amount = by_program['matrix']["amount"]
+            global_count = by_program['global']["count"]
+            global_amount = by_program['global']["amount"]
             
             # Recovery statistics
-            recovery_attempts = MissedProfitRecovery.objects(
-                created_at__gte=start_date,
-                created_at__lt=end_date
-            )
-            total_recovery_attempts = recovery_attempts.count()
-            successful_recoveries = recovery_attempts.filter(recovery_status="completed").count()
-            failed_recoveries = recovery_attempts.filter(recovery_status="failed").count()
-            recovery_amount = sum(r.recovery_amount for r in recovery_attempts.filter(recovery_status="completed"))
+            recovery = next(iter(MissedProfitRecovery._get_collection().aggregate([
+                {'$match': {'created_at': {'$gte': start_date, '$lt': end_date}}},
+                {'$group': {
+                    '_id': None,
+                    'total': {'$sum': 1},
+                    'completed': {'$sum': {'$cond': [{'$eq': ['$recovery_status', 'completed']}, 1, 0]}},
+                    'failed': {'$sum': {'$cond': [{'$eq': ['$recovery_status', 'failed']}, 1, 0]}},
+                    'amount': {'$sum': {'$cond': [{'$eq': ['$recovery_status', 'completed']},
+                                                  {'$toDecimal': '$recovery_amount'}, 0]}},
+                }}
+            ])), {})
+            total_recovery_attempts = recovery.get('total', 0)
+            successful_recoveries = recovery.get('completed', 0)
+            failed_recoveries = recovery.get('failed', 0)
+            recovery_amount = _to_decimal(recovery.get('amount'))
             
             # Create or update statistics record
             statistics = MissedProfitStatistics.objects(period=period).first()
@@ -400,22 +420,22 @@ class MissedProfitService:
             statistics.period_start = start_date
             statistics.period_end = end_date
             statistics.total_missed_profits = total_missed_profits
-            statistics.total_missed_amount = total_missed_amount
-            statistics.total_distributed_amount = total_distributed_amount
+            statistics.total_missed_amount = float(total_missed_amount)
+            statistics.total_distributed_amount = float(total_distributed_amount)
             statistics.account_inactivity_count = account_inactivity_count
-            statistics.account_inactivity_amount = account_inactivity_amount
+            statistics.account_inactivity_amount = float(account_inactivity_amount)
             statistics.level_advancement_count = level_advancement_count
-            statistics.level_advancement_amount = level_advancement_amount
+            statistics.level_advancement_amount = float(level_advancement_amount)
             statistics.binary_missed_count = binary_count
-            statistics.binary_missed_amount = binary_amount
+            statistics.binary_missed_amount = float(binary_amount)
             statistics.matrix_missed_count = matrix_count
-            statistics.matrix_missed_amount = matrix_amount
+            statistics.matrix_missed_amount = float(matrix_amount)
             statistics.global_missed_count = global_count
-            statistics.global_missed_amount = global_amount
+            statistics.global_missed_amount = float(global_amount)
             statistics.total_recovery_attempts = total_recovery_attempts
             statistics.successful_recoveries = successful_recoveries
             statistics.failed_recoveries = failed_recoveries
-            statistics.recovery_amount = recovery_amount
+            statistics.recovery_amount = float(recovery_amount)
             statistics.last_updated = datetime.utcnow()
             statistics.save()
             
@@ -361,44 +361,22 @@ class NewcomerGrowthSupportService:
             return {"success": False, "error": f"Failed to get direct referrals: {str(e)}"}
     
     def trigger_monthly_distribution_for_all(self) -> Dict[str, Any]:
-        """Trigger monthly distribution for all users with pending funds"""
-        try:
-            # Get all users with pending upline funds
-            pending_funds = IncomeEvent.objects(
-                income_type='newcomer_growth_upline_fund',
-                status='pending_distribution',
-                distribution_date__lte=datetime.utcnow()
-            )
-            
-            if not pending_funds:
-                return {"success": True, "message": "No pending funds for distribution"}
-            
-            # Group by upline
-            upline_funds = {}
-            for fund in pending_funds:
-                upline_id = str(fund.user_id)
-                if upline_id not in upline_funds:
-                    upline_funds[upline_id] = []
-                upline_funds[upline_id].append(fund)
-            
-            total_distributed = Decimal('0.0')
-            processed_uplines = 0
-            
-            for upline_id, funds in upline_funds.items():
-                result = self.process_monthly_distribution(upline_id)
-                if result.get("success"):
-                    total_distributed += result.get("total_distributed", 0)
-                    processed_uplines += 1
-            
-            return {
-                "success": True,
-                "total_distributed": total_distributed,
-                "processed_uplines": processed_uplines,
-                "total_uplines_with_pending_funds": len(upline_funds)
-            }
-            
-        except Exception as e:
-            return {"success": False, "error": f"Failed to trigger monthly distribution: {str(e)}"}
+        """Trigger monthly distribution for all users with pending funds (batch job, counts only)"""
+        from modules.batch_job.service import run_job
+        result = run_job('newcomer_growth_monthly_distribution')
+        if not result.get("success"):
+            return {"success": False, "error": f"Failed to trigger monthly distribution: {result.get('error')}"}
+        if not result["total_checked"]:
+            return {"success": True, "message": "No pending funds for distribution", "run_id": result["run_id"]}
+        
+        return {
+            "success": True,
+            "run_id": result["run_id"],
+            "total_distributed": Decimal(str(result["totals"].get("total_distributed", 0))),
+            "processed_uplines": result["processed_count"],
+            "failed_uplines": result["failed_count"],
+            "total_uplines_with_pending_funds": result["total_checked"]
+        }
     
     def validate_newcomer_growth_support(self, total_amount: Decimal) -> Dict[str, Any]:
         """Validate newcomer growth support percentages"""
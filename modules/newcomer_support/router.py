@@ -687,9 +687,8 @@ async def get_newcomer_support_fund():
     try:
         fund = NewcomerSupportFund.objects(is_active=True).first()
         if not fund:
-            # Create default fund
+            # Defaults only; the record is created by the matching POST, never by a GET
             fund = NewcomerSupportFund()
-            fund.save()
         
         return success_response(
             data={
@@ -758,9 +757,8 @@ async def get_newcomer_support_settings():
     try:
         settings = NewcomerSupportSettings.objects(is_active=True).first()
         if not settings:
-            # Create default settings
+            # Defaults only; the record is created by the matching POST, never by a GET
             settings = NewcomerSupportSettings()
-            settings.save()
         
         return success_response(
             data={
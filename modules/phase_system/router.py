@@ -444,9 +444,8 @@ async def get_phase_system_fund(current_user: dict = Depends(authentication_serv
     try:
         fund = PhaseSystemFund.objects(is_active=True).first()
         if not fund:
-            # Create default fund
+            # Defaults only; the record is created by the matching POST, never by a GET
             fund = PhaseSystemFund()
-            fund.save()
         
         return success_response(
             data={
@@ -515,9 +514,8 @@ async def get_phase_system_settings(current_user: dict = Depends(authentication_
     try:
         settings = PhaseSystemSettings.objects(is_active=True).first()
         if not settings:
-            # Create default settings
+            # Defaults only; the record is created by the matching POST, never by a GET
             settings = PhaseSystemSettings()
-            settings.save()
         
         return success_response(
             data={
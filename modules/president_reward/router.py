@@ -328,9 +328,8 @@ async def get_president_reward_fund():
     try:
         fund = PresidentRewardFund.objects(is_active=True).first()
         if not fund:
-            # Create default fund
+            # Defaults only; the record is created by the matching POST, never by a GET
             fund = PresidentRewardFund()
-            fund.save()
         
         return success_response(
             data={
@@ -399,9 +398,8 @@ async def get_president_reward_settings():
     try:
         settings = PresidentRewardSettings.objects(is_active=True).first()
         if not settings:
-            # Create default settings
+            # Defaults only; the record is created by the matching POST, never by a GET
             settings = PresidentRewardSettings()
-            settings.save()
         
         return success_response(
             data={
@@ -786,16 +784,12 @@ async def get_president_reward_claim_history(
         total_global_usdt = 0.0
         total_global_bnb = 0.0
         try:
-            from modules.income.bonus_fund import BonusFund
+            from modules.income.bonus_fund_counter import bonus_fund_counter
             # Get USDT fund (from matrix program)
-            usdt_fund = BonusFund.objects(fund_type='president_reward', program='matrix').first()
-            if usdt_fund:
-                total_global_usdt = float(usdt_fund.current_balance or 0.0)
+            total_global_usdt = float(bonus_fund_counter.balance('president_reward', 'matrix'))
             
             # Get BNB fund (from binary program)
-            bnb_fund = BonusFund.objects(fund_type='president_reward', program='binary').first()
-            if bnb_fund:
-                total_global_bnb = float(bnb_fund.current_balance or 0.0)
+            total_global_bnb = float(bonus_fund_counter.balance('president_reward', 'binary'))
         except Exception as e:
             print(f"Error fetching president reward global funds: {e}")
         
@@ -0,0 +1,70 @@
+"""
+Queue Worker
+Runs the auto upgrade, spillover and recycle queues from one process.
+
+Every queue is consumed through core.queue_consumer, so any number of these
+workers can run side by side: items are leased atomically, abandoned leases are
+picked up again and failing items are retried with backoff, then parked.
+
+Usage:
+    python -m modules.queue_worker.service [--concurrency 4] [--queues auto_upgrade spillover] [--once]
+"""
+
+import argparse
+import logging
+from typing import Dict, List, Optional
+
+from core.queue_consumer import QueueConsumer, QueueWorker
+
+QUEUE_NAMES = ('auto_upgrade', 'spillover', 'recycle')
+
+logger = logging.getLogger("QueueWorker")
+
+
+def build_consumers(queues: Optional[List[str]] = None, concurrency: int = 1, **kwargs) -> List[QueueConsumer]:
+    """Consumers for the selected queues (all by default), each with `concurrency` threads"""
+    from modules.auto_upgrade.service import AutoUpgradeService
+    from modules.spillover.service import SpilloverService
+    from modules.recycle.service import RecycleService
+
+    factories = {
+        'auto_upgrade': AutoUpgradeService().queue_consumer,
+        'spillover': SpilloverService().queue_consumer,
+        'recycle': RecycleService().queue_consumer,
+    }
+    return [factories[name](concurrency=concurrency, **kwargs) for name in (queues or QUEUE_NAMES)]
+
+
+def run_once(queues: Optional[List[str]] = None, concurrency: int = 1, **kwargs) -> Dict[str, Dict[str, int]]:
+    """Drain the selected queues once; returns per-queue counts"""
+    return QueueWorker(build_consumers(queues, concurrency, **kwargs)).run_once()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process the auto upgrade, spillover and recycle queues")
+    parser.add_argument('--queues', nargs='+', choices=QUEUE_NAMES, default=list(QUEUE_NAMES))
+    parser.add_argument('--concurrency', type=int, default=2, help="Worker threads per queue")
+    parser.add_argument('--lease-seconds', type=int, default=60)
+    parser.add_argument('--poll-interval', type=float, default=2.0)
+    parser.add_argument('--once', action='store_true', help="Drain the queues once and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from core.db import connect_to_db
+    connect_to_db()
+
+    worker = QueueWorker(build_consumers(args.queues, args.concurrency, lease_seconds=args.lease_seconds),
+                         poll_interval=args.poll_interval)
+    if args.once:
+        print(f"[QUEUE_WORKER] {worker.run_once()}")
+        return
+    logger.info(f"Queue worker started for {', '.join(args.queues)} ({args.concurrency} threads each)")
+    try:
+        worker.run_forever()
+    except KeyboardInterrupt:
+        worker.stop()
+    print(f"[QUEUE_WORKER] {worker.metrics()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -462,9 +462,8 @@ async def get_rank_settings():
     try:
         settings = RankSettings.objects(is_active=True).first()
         if not settings:
-            # Create default settings if none exist
+            # Defaults only; the record is created by the matching POST, never by a GET
             settings = RankSettings()
-            settings.save()
         
         return success_response(
             data={
@@ -254,8 +254,10 @@ class RankService:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def get_rank_leaderboard(self, period: str = "all_time") -> Dict[str, Any]:
-        """Get rank leaderboard for specified period"""
+    LEADERBOARD_PERIODS = ("daily", "weekly", "monthly", "all_time")
+
+    def get_rank_leaderboard(self, period: str = "all_time", limit: Optional[int] = 100) -> Dict[str, Any]:
+        """Get rank leaderboard for specified period (computed, read-only; limit=None for every entry)"""
         try:
             # Calculate period dates
             now = datetime.utcnow()
@@ -298,34 +300,45 @@ class RankService:
             # Sort by score (descending)
             leaderboard_data.sort(key=lambda x: x["score"], reverse=True)
             
-            # Create or update leaderboard
-            leaderboard = RankLeaderboard.objects(period=period).first()
-            if not leaderboard:
-                leaderboard = RankLeaderboard(period=period)
-            
-            leaderboard.period_start = start_date
-            leaderboard.period_end = end_date
-            leaderboard.leaderboard_data = leaderboard_data
-            leaderboard.total_participants = len(leaderboard_data)
-            leaderboard.top_rank_achieved = leaderboard_data[0]["rank_number"] if leaderboard_data else 1
-            leaderboard.average_rank = sum(item["rank_number"] for item in leaderboard_data) / len(leaderboard_data) if leaderboard_data else 1
-            leaderboard.last_updated = datetime.utcnow()
-            leaderboard.save()
-            
             return {
                 "success": True,
                 "period": period,
                 "period_start": start_date,
                 "period_end": end_date,
-                "leaderboard_data": leaderboard_data[:100],  # Top 100
-                "total_participants": leaderboard.total_participants,
-                "top_rank_achieved": leaderboard.top_rank_achieved,
-                "average_rank": leaderboard.average_rank,
-                "last_updated": leaderboard.last_updated
+                "leaderboard_data": leaderboard_data[:limit] if limit else leaderboard_data,
+                "total_participants": len(leaderboard_data),
+                "top_rank_achieved": leaderboard_data[0]["rank_number"] if leaderboard_data else 1,
+                "average_rank": sum(item["rank_number"] for item in leaderboard_data) / len(leaderboard_data) if leaderboard_data else 1,
+                "last_updated": now
             }
             
         except Exception as e:
             return {"success": False, "error": str(e)}
+
+    def refresh_rank_leaderboard(self, period: str = "all_time") -> Dict[str, Any]:
+        """
+        Store the computed leaderboard as the RankLeaderboard document served by
+        GET /rank/leaderboard. Run from the scheduled job, not from request handlers.
+        """
+        result = self.get_rank_leaderboard(period, limit=None)
+        if not result.get("success"):
+            return result
+        try:
+            leaderboard = RankLeaderboard.objects(period=period).first()
+            if not leaderboard:
+                leaderboard = RankLeaderboard(period=period)
+            
+            leaderboard.period_start = result["period_start"]
+            leaderboard.period_end = result["period_end"]
+            leaderboard.leaderboard_data = result["leaderboard_data"]
+            leaderboard.total_participants = result["total_participants"]
+            leaderboard.top_rank_achieved = result["top_rank_achieved"]
+            leaderboard.average_rank = result["average_rank"]
+            leaderboard.last_updated = result["last_updated"]
+            leaderboard.save()
+            return result
+        except Exception as e:
+            return {"success": False, "error": str(e)}
     
     def _add_rank_requirements(self, rank: Rank):
         """Add requirements for a rank"""
@@ -446,46 +459,18 @@ class RankService:
     def _get_user_achievements(self, user_id: str) -> Dict[str, Any]:
         """Get user's current achievements"""
         try:
-            # Get slot activations
-            binary_activations = SlotActivation.objects(
-                user_id=ObjectId(user_id),
-                program="binary",
-                status="completed"
-            ).count()
-            
-            # Get matrix activations from both SlotActivation and MatrixActivation
-            matrix_slot_activations = SlotActivation.objects(
-                user_id=ObjectId(user_id),
-                program="matrix",
-                status="completed"
-            ).count()
-            
-            # Also check MatrixActivation table
-            from ..matrix.model import MatrixActivation, MatrixTree
-            matrix_activations = MatrixActivation.objects(
-                user_id=ObjectId(user_id),
-                status="completed"
-            ).count()
-            
-            print(f"🔍 DEBUG: MatrixActivation count for user {user_id}: {matrix_activations}")
-            
+            # Highest completed slot per program (UserMaxSlot covers SlotActivation and MatrixActivation)
+            from ..slot.max_slot_service import MaxSlotService
+            max_slots = MaxSlotService().get_max_slots(user_id)
+            binary_activations = max_slots['binary']
+            matrix_activations = max_slots['matrix']
+            global_activations = max_slots['global']
+
             # Also check MatrixTree.current_slot as fallback
-            matrix_tree = MatrixTree.objects(user_id=ObjectId(user_id)).first()
+            from ..matrix.model import MatrixTree
+            matrix_tree = MatrixTree.objects(user_id=ObjectId(user_id)).only('current_slot').first()
             if matrix_tree and matrix_tree.current_slot:
-                print(f"🔍 DEBUG: MatrixTree current_slot for user {user_id}: {matrix_tree.current_slot}")
                 matrix_activations = max(matrix_activations, matrix_tree.current_slot)
-            else:
-                print(f"🔍 DEBUG: No MatrixTree found for user {user_id}")
-            
-            # Use the higher count (in case both tables have records)
-            matrix_activations = max(matrix_slot_activations, matrix_activations)
-            print(f"🔍 DEBUG: Final matrix_activations count: {matrix_activations}")
-            
-            global_activations = SlotActivation.objects(
-                user_id=ObjectId(user_id),
-                program="global",
-                status="completed"
-            ).count()
             
             # Get team statistics
             team_size = TreePlacement.objects(
@@ -31,11 +31,16 @@ class RecycleQueue(Document):
     processed_at = DateTimeField()
     failure_reason = StringField()
 
+    # Worker lease (core/queue_consumer.py)
+    lease_owner = StringField()
+    lease_expires_at = DateTimeField()
+    next_attempt_at = DateTimeField()
+
     created_at = DateTimeField(default=datetime.utcnow)
 
     meta = {
         'collection': 'recycle_queue',
-        'indexes': ['user_id', 'parent_id', 'status', 'slot_no', 'matrix_level']
+        'indexes': ['user_id', 'parent_id', 'status', 'slot_no', 'matrix_level', ('status', 'lease_expires_at')]
     }
 
 
@@ -61,7 +66,11 @@ class RecyclePlacement(Document):
 
     meta = {
         'collection': 'recycle_placement',
-        'indexes': ['user_id', 'new_parent_id', 'slot_no', 'matrix_level', 'processed_at']
+        'indexes': [
+            'user_id', 'new_parent_id', 'slot_no', 'matrix_level', 'processed_at',
+            # One placement per queue item, however often the item is delivered
+            {'fields': ['queue_id'], 'unique': True, 'sparse': True},
+        ]
     }
 
 
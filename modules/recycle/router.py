@@ -114,8 +114,8 @@ async def get_settings(current_user: dict = Depends(authentication_service.verif
     try:
         settings = RecycleSettings.objects().first()
         if not settings:
+            # Defaults only; the record is created by the matching POST, never by a GET
             settings = RecycleSettings()
-            settings.save()
         return success_response({
             "enabled": settings.enabled,
             "auto_recycle_enabled": settings.auto_recycle_enabled,
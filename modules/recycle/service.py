@@ -2,9 +2,14 @@ from typing import Dict, Any, List, Optional
 from bson import ObjectId
 from datetime import datetime, timedelta
 
+from core.queue_consumer import QueueConsumer, record_once
 from .model import RecycleQueue, RecyclePlacement, RecycleSettings, RecycleLog
+from ..matrix import geometry as matrix_geometry
 from ..matrix.model import MatrixTree
 
+# Recycle positions are the parent tree's level-1 positions
+RECYCLE_SIDES = ('left', 'center', 'right')
+
 
 class RecycleService:
     """Matrix Recycle business logic"""
@@ -28,28 +33,24 @@ class RecycleService:
         self._log(item.user_id, 'queued', 'Recycle queued', related_queue_id=item.id)
         return {"queue_id": str(item.id), "status": item.status}
 
+    def queue_consumer(self, concurrency: int = 1, **kwargs) -> QueueConsumer:
+        """Lease-based consumer for the recycle queue (safe to run from several workers)"""
+        settings = RecycleSettings.objects().first() or RecycleSettings()
+        return QueueConsumer(
+            'recycle', RecycleQueue, self._attempt_place,
+            max_attempts=settings.max_queue_attempts, concurrency=concurrency,
+            on_failure=lambda item, e, parked: self._log(item.user_id, 'failed', f'Recycle placement failed: {e}', related_queue_id=item.id),
+            on_complete=self._record_placement,
+            **kwargs
+        )
+
     def process_queue_batch(self, batch_size: int = 100) -> Dict[str, Any]:
-        pending = RecycleQueue.objects(status='queued').order_by('created_at').limit(batch_size)
-        processed, failed = 0, 0
-        for item in pending:
-            try:
-                self._attempt_place(item)
-                processed += 1
-            except Exception as e:
-                failed += 1
-                item.status = 'failed'
-                item.failure_reason = str(e)
-                item.last_attempt_at = datetime.utcnow()
-                item.attempts += 1
-                item.save()
-                self._log(item.user_id, 'failed', f'Recycle placement failed: {e}', related_queue_id=item.id)
-        return {"processed": processed, "failed": failed}
-
-    def _attempt_place(self, item: RecycleQueue) -> None:
-        item.status = 'processing'
-        item.last_attempt_at = datetime.utcnow()
-        item.attempts += 1
-        item.save()
+        result = self.queue_consumer().run_once(limit=batch_size)
+        return {"processed": result["completed"], "failed": result["retried"] + result["parked"]}
+
+    def _attempt_place(self, item: RecycleQueue) -> tuple:
+        # Status, attempts and lease are managed by the queue consumer; the placement
+        # is recorded by _record_placement before this worker's lease settles the item
 
         # Find a new parent in matrix tree (simple strategy: keep same parent if space, else parent's parent)
         parent_tree = MatrixTree.objects(user_id=item.parent_id).first()
@@ -69,6 +70,10 @@ class RecycleService:
             new_parent_id = grand_parent_tree.user_id
         else:
             new_parent_id = parent_tree.user_id
+        return new_parent_id, target_position
+
+    def _record_placement(self, item: RecycleQueue, target: tuple) -> None:
+        new_parent_id, target_position = target
 
         # Record placement (actual MatrixTree modification would be handled elsewhere/integration)
         placement = RecyclePlacement(
@@ -83,20 +88,18 @@ class RecycleService:
             trigger='auto',
             processed_at=datetime.utcnow()
         )
-        placement.save()
-
-        item.status = 'completed'
-        item.processed_at = datetime.utcnow()
-        item.save()
-        self._log(item.user_id, 'placed', 'Recycle placed', related_queue_id=item.id, related_placement_id=placement.id)
+        # Keyed by the queue item: a redelivered item does not place the user twice
+        if record_once(placement):
+            self._log(item.user_id, 'placed', 'Recycle placed', related_queue_id=item.id, related_placement_id=placement.id)
 
     def _find_available_position(self, tree: MatrixTree, preferred: str = 'center') -> Optional[str]:
-        occupied = {p.position for p in (tree.positions or []) if p.is_active}
-        order = [preferred, 'left', 'center', 'right']
-        for pos in order:
-            if pos in {'left', 'center', 'right'} and pos not in occupied:
-                return pos
-        return None
+        # Preferred side first, then left → center → right
+        mask = matrix_geometry.occupancy_mask([node for node in (tree.nodes or []) if node.is_active])
+        preferred_index = matrix_geometry.SIDE_INDEX.get(preferred)
+        if preferred_index is not None and not mask & matrix_geometry.position_bit(1, preferred_index):
+            return RECYCLE_SIDES[preferred_index]
+        free = matrix_geometry.next_free_position(mask, max_level=1)
+        return RECYCLE_SIDES[free[1]] if free else None
 
     def _log(self, user_id: ObjectId, action: str, desc: str, **kwargs) -> None:
         RecycleLog(user_id=user_id, action_type=action, description=desc, **kwargs).save()
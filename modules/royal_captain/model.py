@@ -149,7 +149,8 @@ class RoyalCaptainBonusPayment(Document):
             'royal_captain_id',
             'bonus_tier',
             'payment_status',
-            'created_at'
+            'created_at',
+            ('user_id', 'created_at', '_id')
         ]
     }
 
@@ -11,6 +11,7 @@ from .model import (
     RoyalCaptainRequirement, RoyalCaptainBonus
 )
 from utils.response import success_response, error_response
+from core.pagination import paginate
 
 router = APIRouter(prefix="/royal-captain", tags=["Royal Captain Bonus"])
 
@@ -362,9 +363,8 @@ async def get_royal_captain_fund():
     try:
         fund = RoyalCaptainFund.objects(is_active=True).first()
         if not fund:
-            # Create default fund
+            # Defaults only; the record is created by the matching POST, never by a GET
             fund = RoyalCaptainFund()
-            fund.save()
         
         return success_response(
             data={
@@ -433,9 +433,8 @@ async def get_royal_captain_settings():
     try:
         settings = RoyalCaptainSettings.objects(is_active=True).first()
         if not settings:
-            # Create default settings
+            # Defaults only; the record is created by the matching POST, never by a GET
             settings = RoyalCaptainSettings()
-            settings.save()
         
         return success_response(
             data={
@@ -641,18 +640,19 @@ async def get_royal_captain_claim_history(
     user_id: str = Query(...),
     currency: str | None = Query(None),
     page: int = Query(1, ge=1),
-    limit: int = Query(50, ge=1, le=100)
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    include_total: bool = Query(True, description="Include the (cached) total count")
 ):
     """Get Royal Captain bonus claim history for a user with claimable amounts."""
     try:
-        # Get claim history
+        # Get claim history (newest first, keyset-paged on created_at/_id)
         q = RoyalCaptainBonusPayment.objects(user_id=ObjectId(user_id))
         if currency:
             q = q.filter(currency=currency.upper())
-        total = q.count()
-        items = q.order_by('-created_at').skip((page - 1) * limit).limit(limit)
+        result_page = paginate(q, limit, cursor=cursor, page=page, include_total=include_total)
         data = []
-        for it in items:
+        for it in result_page.items:
             data.append({
                 "id": str(it.id),
                 "tier": it.bonus_tier,
@@ -672,16 +672,12 @@ async def get_royal_captain_claim_history(
         total_global_usdt = 0.0
         total_global_bnb = 0.0
         try:
-            from modules.income.bonus_fund import BonusFund
+            from modules.income.bonus_fund_counter import bonus_fund_counter
             # Get USDT fund (from matrix program)
-            usdt_fund = BonusFund.objects(fund_type='royal_captain', program='matrix').first()
-            if usdt_fund:
-                total_global_usdt = float(usdt_fund.current_balance or 0.0)
+            total_global_usdt = float(bonus_fund_counter.balance('royal_captain', 'matrix'))
             
             # Get BNB fund (from binary program)
-            bnb_fund = BonusFund.objects(fund_type='royal_captain', program='binary').first()
-            if bnb_fund:
-                total_global_bnb = float(bnb_fund.current_balance or 0.0)
+            total_global_bnb = float(bonus_fund_counter.balance('royal_captain', 'binary'))
         except Exception as e:
             print(f"Error fetching royal captain global funds: {e}")
         
@@ -694,12 +690,7 @@ async def get_royal_captain_claim_history(
                 "eligible_tier": claimable_info.get("eligible_tier"),
                 "message": claimable_info.get("message", "")
             },
-            "pagination": {
-                "page": page,
-                "limit": limit,
-                "total": total,
-                "total_pages": (total + limit - 1) // limit,
-            },
+            "pagination": result_page.meta(),
             "total_global_usdt": total_global_usdt,  # Total Royal Captain fund in USDT
             "total_global_bnb": total_global_bnb,    # Total Royal Captain fund in BNB
         }, "Royal Captain claim history fetched")
@@ -1,2 +1,2 @@
-from .model import SlotCatalog, SlotActivation
+from .model import SlotCatalog, SlotActivation, UserMaxSlot, SlotRoster, SlotRosterState
 
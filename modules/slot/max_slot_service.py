@@ -0,0 +1,139 @@
+"""
+Highest active slot per (user, program)
+
+UserMaxSlot holds the highest completed slot of every user in every program. It is
+raised by SlotActivation.save / MatrixActivation.save whenever an activation is
+completed, so readers get the answer from one indexed document instead of sorting
+a user's activations (and, for matrix, consulting both activation collections).
+
+Users whose activations predate the counter are backfilled on first read, or all at
+once with rebuild().
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+
+from .model import SlotActivation, UserMaxSlot
+
+PROGRAMS = ('binary', 'matrix', 'global')
+
+
+def _oid(value) -> ObjectId:
+    return value if isinstance(value, ObjectId) else ObjectId(str(value))
+
+
+class MaxSlotService:
+    """Reads and maintenance of the denormalized highest slot (UserMaxSlot)"""
+
+    def get_max_slot(self, user_id, program: str) -> Dict[str, Any]:
+        """{"slot_no", "slot_name", "activated_at"} of the highest completed slot, or {} if none"""
+        user_oid = _oid(user_id)
+        row = UserMaxSlot._get_collection().find_one({'user_id': user_oid, 'program': program})
+        if row is None:
+            scanned = self._backfill([user_oid], program).get(str(user_oid))
+            row = {'max_slot': scanned[0], 'slot_name': scanned[1], 'activated_at': scanned[2]} if scanned else None
+        if not row or not row.get('max_slot'):
+            return {}
+        return {"slot_no": row['max_slot'], "slot_name": row.get('slot_name'), "activated_at": row.get('activated_at')}
+
+    def get_max_slots(self, user_id) -> Dict[str, int]:
+        """Highest slot in every program for one user (0 where not activated)"""
+        user_oid = _oid(user_id)
+        slots = {program: 0 for program in PROGRAMS}
+        seen = set()
+        for row in UserMaxSlot._get_collection().find({'user_id': user_oid}, {'program': 1, 'max_slot': 1}):
+            slots[row['program']] = row.get('max_slot') or 0
+            seen.add(row['program'])
+        for program in PROGRAMS:
+            if program not in seen:
+                scanned = self._backfill([user_oid], program).get(str(user_oid))
+                slots[program] = scanned[0] if scanned else 0
+        return slots
+
+    def get_many(self, user_ids: Iterable, program: str) -> Dict[str, int]:
+        """Highest slot in one program for many users, keyed by str(user_id)"""
+        oids = [_oid(u) for u in user_ids]
+        if not oids:
+            return {}
+        slots = {
+            str(row['user_id']): row.get('max_slot') or 0
+            for row in UserMaxSlot._get_collection().find(
+                {'user_id': {'$in': oids}, 'program': program}, {'user_id': 1, 'max_slot': 1}
+            )
+        }
+        missing = [u for u in oids if str(u) not in slots]
+        if missing:
+            scanned = self._backfill(missing, program)
+            for user_oid in missing:
+                slots[str(user_oid)] = scanned[str(user_oid)][0] if str(user_oid) in scanned else 0
+        return slots
+
+    def users_at_slot(self, user_ids: Iterable, program: str, slot_no: int) -> List[Any]:
+        """The given users whose highest slot in `program` is exactly slot_no, in input order"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return []
+        oids = [_oid(u) for u in user_ids]
+        collection = UserMaxSlot._get_collection()
+        matched = {
+            str(row['user_id']) for row in collection.find(
+                {'program': program, 'max_slot': slot_no, 'user_id': {'$in': oids}}, {'user_id': 1}
+            )
+        }
+        known = {
+            str(row['user_id']) for row in collection.find(
+                {'program': program, 'user_id': {'$in': oids}}, {'user_id': 1}
+            )
+        } if len(matched) < len(oids) else matched
+        missing = [u for u in oids if str(u) not in known]
+        if missing:
+            for key, (max_slot, _, _) in self._backfill(missing, program).items():
+                if max_slot == slot_no:
+                    matched.add(key)
+        return [u for u in user_ids if str(u) in matched]
+
+    def rebuild(self, program: Optional[str] = None, user_ids: Optional[Iterable] = None) -> int:
+        """Recompute UserMaxSlot from the activation collections; returns the number of rows raised"""
+        oids = [_oid(u) for u in user_ids] if user_ids is not None else None
+        raised = 0
+        for prog in ([program] if program else PROGRAMS):
+            for key, (max_slot, slot_name, activated_at) in self._scan(oids, prog).items():
+                raised += UserMaxSlot.record(ObjectId(key), prog, max_slot, slot_name, activated_at)
+        return raised
+
+    def _backfill(self, user_oids: List[ObjectId], program: str) -> Dict[str, tuple]:
+        """Scan activations for users without a UserMaxSlot row and store the result (0 = none yet)"""
+        scanned = self._scan(user_oids, program)
+        for user_oid in user_oids:
+            max_slot, slot_name, activated_at = scanned.get(str(user_oid), (0, None, None))
+            UserMaxSlot.record(user_oid, program, max_slot, slot_name, activated_at)
+        return scanned
+
+    def _scan(self, user_oids: Optional[List[ObjectId]], program: str) -> Dict[str, tuple]:
+        """Highest completed activation per user from SlotActivation (and MatrixActivation for matrix)"""
+        sources = [(SlotActivation, {'program': program}, '$created_at')]
+        if program == 'matrix':
+            from ..matrix.model import MatrixActivation
+            sources.append((MatrixActivation, {}, '$completed_at'))
+
+        best: Dict[str, tuple] = {}
+        for document_cls, extra, fallback_time in sources:
+            match = dict(extra, status='completed')
+            if user_oids is not None:
+                match['user_id'] = {'$in': user_oids}
+            pipeline = [
+                {'$match': match},
+                {'$sort': {'slot_no': -1}},
+                {'$group': {
+                    '_id': '$user_id',
+                    'slot_no': {'$first': '$slot_no'},
+                    'slot_name': {'$first': '$slot_name'},
+                    'activated_at': {'$first': {'$ifNull': ['$activated_at', fallback_time]}},
+                }},
+            ]
+            for row in document_cls._get_collection().aggregate(pipeline):
+                key = str(row['_id'])
+                if key not in best or row['slot_no'] > best[key][0]:
+                    best[key] = (row['slot_no'], row.get('slot_name'), row.get('activated_at'))
+        return best
@@ -1,6 +1,9 @@
 from mongoengine import Document, StringField, IntField, DecimalField, BooleanField, DateTimeField, ObjectIdField, FloatField, DictField, ListField
 from datetime import datetime
 from decimal import Decimal
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
 from utils import ensure_currency_for_program
 
 class SlotCatalog(Document):
@@ -89,6 +92,143 @@ class SlotActivation(Document):
         # Ensure currency matches program default if not provided or mismatched
         self.currency = ensure_currency_for_program(self.program, self.currency)
 
+    def save(self, *args, **kwargs):
+        result = super().save(*args, **kwargs)
+        if self.status == 'completed':
+            UserMaxSlot.record(self.user_id, self.program, self.slot_no, self.slot_name,
+                               self.activated_at or self.created_at)
+            SlotRoster.record(self.user_id, self.program, self.slot_no, self.activated_at or self.created_at)
+        return result
+
+class UserMaxSlot(Document):
+    """Highest completed slot per (user, program), kept current on every completed activation"""
+    user_id = ObjectIdField(required=True)
+    program = StringField(choices=['binary', 'matrix', 'global'], required=True)
+    max_slot = IntField(required=True, default=0)
+    slot_name = StringField()
+    activated_at = DateTimeField()
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'user_max_slot',
+        'indexes': [
+            {'fields': ['user_id', 'program'], 'unique': True},
+            # "users (of a downline) whose highest slot in a program is N"
+            ('program', 'max_slot', 'user_id')
+        ]
+    }
+
+    @classmethod
+    def record(cls, user_id, program: str, slot_no: int, slot_name: str = None, activated_at: datetime = None) -> bool:
+        """
+        Raise the stored max slot to slot_no if it is higher ($max semantics).
+
+        The max_slot guard makes the write a no-op for equal or lower slots, so
+        slot_name/activated_at always describe the stored slot. Returns True if
+        the stored value changed. Never raises: the activation itself is already
+        saved, and MaxSlotService.rebuild() repairs a missed update.
+        """
+        try:
+            result = cls._get_collection().update_one(
+                {'user_id': ObjectId(str(user_id)), 'program': program, 'max_slot': {'$lt': slot_no}},
+                {'$set': {'max_slot': slot_no, 'slot_name': slot_name, 'activated_at': activated_at,
+                          'updated_at': datetime.utcnow()}},
+                upsert=True,
+            )
+            return bool(result.modified_count or result.upserted_id)
+        except DuplicateKeyError:
+            # A row with an equal or higher max slot already exists
+            return False
+        except Exception as e:
+            print(f"Error recording max slot for {user_id}/{program}: {e}")
+            return False
+
+    @staticmethod
+    def record_operations(user_id: ObjectId, program: str, slot_no: int, slot_name: str = None,
+                          activated_at: datetime = None) -> list:
+        """
+        record() as bulk_write operations, for writers that skip save() (event replay).
+        The row is created without the guard first, so the guarded raise never upserts
+        into a duplicate key and stops an ordered bulk.
+        """
+        key = {'user_id': user_id, 'program': program}
+        return [
+            UpdateOne(key, {'$setOnInsert': {'max_slot': 0, 'updated_at': datetime.utcnow()}}, upsert=True),
+            UpdateOne(dict(key, max_slot={'$lt': slot_no}),
+                      {'$set': {'max_slot': slot_no, 'slot_name': slot_name, 'activated_at': activated_at,
+                                'updated_at': datetime.utcnow()}}),
+        ]
+
+class SlotRoster(Document):
+    """Members of every (program, slot): one row per user who completed the slot, kept current on every completed activation"""
+    user_id = ObjectIdField(required=True)
+    program = StringField(choices=['binary', 'matrix', 'global'], required=True)
+    slot_no = IntField(required=True)
+    joined_at = DateTimeField(required=True)
+    joined_day = IntField(required=True)  # joined_at as YYYYMMDD (UTC)
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'slot_roster',
+        'indexes': [
+            # Counts and user_id-ordered iteration of one slot's members
+            {'fields': ['program', 'slot_no', 'user_id'], 'unique': True},
+            # "members of a slot who joined on day D" (Triple Entry eligibility)
+            ('program', 'slot_no', 'joined_day', 'user_id')
+        ]
+    }
+
+    @staticmethod
+    def day_of(moment: datetime) -> int:
+        return moment.year * 10000 + moment.month * 100 + moment.day
+
+    @classmethod
+    def record(cls, user_id, program: str, slot_no: int, joined_at: datetime = None) -> bool:
+        """
+        Add the user to the slot's roster, keeping the earliest join time ($min semantics).
+
+        Returns True if a row was created or moved to an earlier joined_at. Never raises:
+        the activation itself is already saved, and SlotRosterService.rebuild() repairs a
+        missed update.
+        """
+        joined_at = joined_at or datetime.utcnow()
+        try:
+            result = cls._get_collection().update_one(
+                {'program': program, 'slot_no': slot_no, 'user_id': ObjectId(str(user_id)),
+                 'joined_at': {'$gt': joined_at}},
+                {'$set': {'joined_at': joined_at, 'joined_day': cls.day_of(joined_at),
+                          'updated_at': datetime.utcnow()}},
+                upsert=True,
+            )
+            return bool(result.modified_count or result.upserted_id)
+        except DuplicateKeyError:
+            # The user is already on the roster with an equal or earlier join time
+            return False
+        except Exception as e:
+            print(f"Error recording slot roster for {user_id}/{program}/{slot_no}: {e}")
+            return False
+
+    @classmethod
+    def record_operation(cls, user_id: ObjectId, program: str, slot_no: int, joined_at: datetime) -> UpdateOne:
+        """record() as a bulk_write operation, for writers that skip save() (event replay)"""
+        # joined_day grows with joined_at, so $min keeps the two consistent
+        return UpdateOne(
+            {'program': program, 'slot_no': slot_no, 'user_id': user_id},
+            {'$min': {'joined_at': joined_at, 'joined_day': cls.day_of(joined_at)},
+             '$set': {'updated_at': datetime.utcnow()}},
+            upsert=True,
+        )
+
+class SlotRosterState(Document):
+    """Roster build marker: SlotRoster of `program` holds every completed activation once built_at is set"""
+    program = StringField(choices=['binary', 'matrix', 'global'], required=True, unique=True)
+    built_at = DateTimeField()
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'slot_roster_state'
+    }
+
 class SlotUpgradeQueue(Document):
     """Queue for managing slot upgrades"""
     user_id = ObjectIdField(required=True)
@@ -0,0 +1,149 @@
+"""
+Slot member rosters per (program, slot)
+
+SlotRoster holds one row per user who completed a slot, with the day they first joined it.
+Rows are added by SlotActivation.save / MatrixActivation.save whenever an activation is
+completed, so eligibility for slot-wide payouts (Spark Bonus per matrix slot, Triple Entry
+per join day) is an indexed range over the roster instead of a scan of the activation
+history: counts are one count on the unique index, members stream in user_id order in
+keyset batches, and "joined on day D" is an equality on (program, slot_no, joined_day).
+
+Activations that predate the roster are added with rebuild(), run once per deployment
+(the slot_roster_rebuild batch job or `python -m modules.slot.roster_service`). It marks
+each program's roster as built (SlotRosterState); until then is_built() is False and
+readers keep using the activation queries, since a partial roster would undercount.
+"""
+
+import argparse
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
+
+from bson import ObjectId
+
+from .model import SlotActivation, SlotRoster, SlotRosterState
+
+PROGRAMS = ('binary', 'matrix', 'global')
+# Members read per query while streaming a roster
+ROSTER_BATCH_SIZE = 1000
+
+
+def _oid(value) -> ObjectId:
+    return value if isinstance(value, ObjectId) else ObjectId(str(value))
+
+
+class SlotRosterService:
+    """Reads and maintenance of the per-(program, slot) member rosters (SlotRoster)"""
+
+    def is_built(self, program: str) -> bool:
+        """True once rebuild() has added the program's activations that predate the roster"""
+        return SlotRosterState._get_collection().find_one(
+            {'program': program, 'built_at': {'$ne': None}}, {'_id': 1}
+        ) is not None
+
+    def count(self, program: str, slot_no: int) -> int:
+        """Number of users who completed the slot"""
+        return SlotRoster._get_collection().count_documents({'program': program, 'slot_no': slot_no})
+
+    def is_member(self, program: str, slot_no: int, user_id) -> bool:
+        return SlotRoster._get_collection().find_one(
+            {'program': program, 'slot_no': slot_no, 'user_id': _oid(user_id)}, {'_id': 1}
+        ) is not None
+
+    def iter_user_ids(self, program: str, slot_no: int, batch_size: int = ROSTER_BATCH_SIZE) -> Iterator[str]:
+        """Members of the slot as str ids in user_id order, read in keyset batches"""
+        collection = SlotRoster._get_collection()
+        query = {'program': program, 'slot_no': slot_no}
+        while True:
+            batch = list(collection.find(query, {'user_id': 1, '_id': 0}).sort('user_id', 1).limit(batch_size))
+            for row in batch:
+                yield str(row['user_id'])
+            if len(batch) < batch_size:
+                return
+            query['user_id'] = {'$gt': batch[-1]['user_id']}
+
+    def user_ids(self, program: str, slot_no: int) -> List[str]:
+        """Members of the slot as a sorted list of str ids"""
+        return list(self.iter_user_ids(program, slot_no))
+
+    def joined_on(self, program: str, slot_no: int, day: datetime, user_ids: Optional[Iterable] = None) -> List[ObjectId]:
+        """Members who first completed the slot on `day` (UTC), optionally only among user_ids"""
+        query = {'program': program, 'slot_no': slot_no, 'joined_day': SlotRoster.day_of(day)}
+        if user_ids is not None:
+            query['user_id'] = {'$in': [_oid(u) for u in user_ids]}
+        return [row['user_id'] for row in
+                SlotRoster._get_collection().find(query, {'user_id': 1, '_id': 0}).sort('user_id', 1)]
+
+    def joined_all_programs_on(self, day: datetime) -> List[ObjectId]:
+        """Users who joined binary, matrix and global (slot 1 of each) on the same day"""
+        candidates = self.joined_on('global', 1, day)
+        for program in ('matrix', 'binary'):
+            if not candidates:
+                break
+            candidates = self.joined_on(program, 1, day, candidates)
+        return candidates
+
+    def rebuild(self, program: Optional[str] = None) -> int:
+        """
+        Add every completed activation to the rosters and mark each program's roster built;
+        returns the number of rows created or moved earlier. Activations completed meanwhile
+        are recorded by their save(), so the roster is complete when the marker is set.
+        """
+        added = 0
+        for prog in ([program] if program else PROGRAMS):
+            started = datetime.utcnow()
+            for (user_id, slot_no), joined_at in self._scan(prog).items():
+                added += SlotRoster.record(user_id, prog, slot_no, joined_at)
+            SlotRosterState._get_collection().update_one(
+                {'program': prog},
+                {'$set': {'built_at': started, 'updated_at': datetime.utcnow()}},
+                upsert=True,
+            )
+        return added
+
+    def recompute(self, program: str, user_ids: Iterable) -> int:
+        """Replace the users' roster rows with what their remaining completed activations give"""
+        user_oids = [_oid(u) for u in user_ids]
+        SlotRoster._get_collection().delete_many({'program': program, 'user_id': {'$in': user_oids}})
+        return sum(SlotRoster.record(user_id, program, slot_no, joined_at)
+                   for (user_id, slot_no), joined_at in self._scan(program, user_oids).items())
+
+    def _scan(self, program: str, user_oids: Optional[List[ObjectId]] = None) -> dict:
+        """Earliest completed activation per (user, slot) from SlotActivation (and MatrixActivation for matrix)"""
+        sources = [(SlotActivation, {'program': program}, '$created_at')]
+        if program == 'matrix':
+            from ..matrix.model import MatrixActivation
+            sources.append((MatrixActivation, {}, '$completed_at'))
+
+        earliest = {}
+        for document_cls, extra, fallback_time in sources:
+            match = dict(extra, status='completed')
+            if user_oids is not None:
+                match['user_id'] = {'$in': user_oids}
+            pipeline = [
+                {'$match': match},
+                {'$group': {
+                    '_id': {'user_id': '$user_id', 'slot_no': '$slot_no'},
+                    'joined_at': {'$min': {'$ifNull': ['$activated_at', fallback_time]}},
+                }},
+            ]
+            for row in document_cls._get_collection().aggregate(pipeline):
+                key = (row['_id']['user_id'], row['_id']['slot_no'])
+                joined_at = row.get('joined_at')
+                if key not in earliest or (joined_at and (earliest[key] is None or joined_at < earliest[key])):
+                    earliest[key] = joined_at
+        return earliest
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Add activations that predate the slot rosters and mark them built")
+    parser.add_argument('--program', choices=PROGRAMS)
+    args = parser.parse_args(argv)
+
+    from core.db import connect_to_db
+    connect_to_db()
+
+    print(f"[SLOT_ROSTER] rebuild added {SlotRosterService().rebuild(args.program)} roster rows")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterable, List, Optional
 from bson import ObjectId
 from datetime import datetime, timedelta
+from itertools import islice
 from decimal import Decimal
 from .model import TripleEntryReward, SparkCycle, SparkBonusDistribution, TripleEntryPayment
 from ..user.model import User
@@ -39,24 +40,33 @@ class SparkService:
     @staticmethod
     def compute_triple_entry_eligibles(target_date: datetime) -> Dict[str, Any]:
         """Find users who joined all three programs (binary, matrix, global) on the same calendar day.
-        Assumption: We infer join by checking the first active slot activation timestamps embedded in user.
-        Fallback: use User.created_at for baseline if slot timestamps are missing.
+        A program's join day is the day its slot 1 was first completed, read from the slot
+        rosters (SlotRoster.joined_day), so the cost follows that day's joins rather than
+        the size of the user and activation collections.
+        Until the rosters are built (SlotRosterService.rebuild): users created that day with
+        all three joined flags set.
         """
         try:
-            # Normalize to date boundaries UTC
-            day_start = datetime(target_date.year, target_date.month, target_date.day)
-            day_end = day_start + timedelta(days=1)
+            from modules.slot.roster_service import SlotRosterService
 
-            # Query users who have joined flags set for all three programs
-            users = User.objects(
-                binary_joined=True,
-                matrix_joined=True,
-                global_joined=True,
-                created_at__gte=day_start,
-                created_at__lt=day_end
-            ).only('id')
+            roster = SlotRosterService()
+            if all(roster.is_built(program) for program in ('binary', 'matrix', 'global')):
+                eligible_ids: List[ObjectId] = roster.joined_all_programs_on(target_date)
+            else:
+                # Normalize to date boundaries UTC
+                day_start = datetime(target_date.year, target_date.month, target_date.day)
+                day_end = day_start + timedelta(days=1)
+
+                # Query users who have joined flags set for all three programs
+                users = User.objects(
+                    binary_joined=True,
+                    matrix_joined=True,
+                    global_joined=True,
+                    created_at__gte=day_start,
+                    created_at__lt=day_end
+                ).only('id')
 
-            eligible_ids: List[ObjectId] = [u.id for u in users]
+                eligible_ids = [u.id for u in users]
 
             # Create/update a TER record for that cycle (use yyyymmdd as cycle_no)
             cycle_no = int(target_date.strftime('%Y%m%d'))
@@ -85,28 +95,9 @@ class SparkService:
         """Persist triple entry contribution into dedicated BonusFund buckets."""
         if amount <= 0:
             return
-        from modules.income.bonus_fund import BonusFund
-
-        triple_entry_fund = BonusFund.objects(
-            fund_type='triple_entry',
-            program=program,
-            status='active'
-        ).first()
-
-        if not triple_entry_fund:
-            triple_entry_fund = BonusFund(
-                fund_type='triple_entry',
-                program=program,
-                total_collected=Decimal('0'),
-                total_distributed=Decimal('0'),
-                current_balance=Decimal('0'),
-                status='active'
-            )
+        from modules.income.bonus_fund_counter import bonus_fund_counter
 
-        triple_entry_fund.total_collected += amount
-        triple_entry_fund.current_balance += amount
-        triple_entry_fund.updated_at = datetime.utcnow()
-        triple_entry_fund.save()
+        bonus_fund_counter.add('triple_entry', program, collected=amount, balance=amount)
 
     def contribute_to_spark_fund(self, amount: Decimal, program: str, slot_number: int = None, user_id: str = None, currency: str | None = None) -> Dict[str, Any]:
         """
@@ -118,7 +109,7 @@ class SparkService:
         - Matrix activations contribute 8% to Spark Bonus
         """
         try:
-            from modules.income.bonus_fund import BonusFund
+            from modules.income.bonus_fund_counter import bonus_fund_counter
             
             # Validate program
             if program not in ['binary', 'matrix']:
@@ -130,30 +121,13 @@ class SparkService:
             top_leader_share = (spark_contribution * Decimal('0.02')).quantize(Decimal('0.00000001'))
             spark_distribution_share = spark_contribution - triple_entry_share - top_leader_share
             
-            # Get or create BonusFund for this program
-            spark_fund = BonusFund.objects(
-                fund_type='spark_bonus',
-                program=program,
-                status='active'
-            ).first()
-            
-            if not spark_fund:
-                # Create new fund if doesn't exist
-                spark_fund = BonusFund(
-                    fund_type='spark_bonus',
-                    program=program,
-                    total_collected=Decimal('0'),
-                    total_distributed=Decimal('0'),
-                    current_balance=Decimal('0'),
-                    status='active'
-                )
-            
-            # Update fund balances
-            spark_fund.total_collected += spark_contribution
-            spark_fund.current_balance += spark_distribution_share
-            spark_fund.total_distributed = (spark_fund.total_distributed or Decimal('0')) + triple_entry_share + top_leader_share
-            spark_fund.updated_at = datetime.utcnow()
-            spark_fund.save()
+            # Update fund balances ($inc on a shard; see modules/income/bonus_fund_counter.py)
+            bonus_fund_counter.add(
+                'spark_bonus', program,
+                collected=spark_contribution,
+                balance=spark_distribution_share,
+                distributed=triple_entry_share + top_leader_share,
+            )
 
             # Record triple entry contribution (per program => currency)
             self._record_triple_entry_share(program, triple_entry_share)
@@ -190,7 +164,6 @@ class SparkService:
                 "triple_entry_share": float(triple_entry_share),
                 "top_leaders_gift_share": float(top_leader_share),
                 "spark_bonus_net": float(spark_distribution_share),
-                "new_balance": float(spark_fund.current_balance),
                 "message": f"Contributed ${float(spark_contribution)} (8%) to {program} Spark Bonus fund"
             }
         except Exception as e:
@@ -230,31 +203,14 @@ class SparkService:
                 }
             elif contributed > 0:
                 try:
-                    from modules.income.bonus_fund import BonusFund
+                    from modules.income.bonus_fund_counter import bonus_fund_counter
 
-                    spark_fund = BonusFund.objects(
-                        fund_type="spark_bonus",
-                        program=program_value if program_value in ("binary", "matrix") else "matrix",
-                        status="active",
-                    ).first()
-                    if not spark_fund:
-                        spark_fund = BonusFund(
-                            fund_type="spark_bonus",
-                            program=program_value if program_value in ("binary", "matrix") else "matrix",
-                            total_collected=Decimal("0"),
-                            total_distributed=Decimal("0"),
-                            current_balance=Decimal("0"),
-                            status="active",
-                        )
-
-                    spark_fund.total_collected += contributed
-                    spark_fund.current_balance += contributed
-                    spark_fund.updated_at = datetime.utcnow()
-                    spark_fund.save()
+                    fund_program = program_value if program_value in ("binary", "matrix") else "matrix"
+                    bonus_fund_counter.add("spark_bonus", fund_program, collected=contributed, balance=contributed)
 
                     spark_details = {
                         "success": True,
-                        "program": spark_fund.program,
+                        "program": fund_program,
                         "spark_distribution_share": float(contributed),
                         "top_leaders_gift_share": 0.0,
                         "triple_entry_share": 0.0,
@@ -295,24 +251,11 @@ class SparkService:
         Calculates actual accumulated fund from database transactions
         """
         try:
-            from modules.income.bonus_fund import BonusFund
-            
-            # Get Spark Bonus funds from database (collected from activations)
-            spark_binary = BonusFund.objects(
-                fund_type='spark_bonus',
-                program='binary',
-                status='active'
-            ).first()
-            
-            spark_matrix = BonusFund.objects(
-                fund_type='spark_bonus',
-                program='matrix',
-                status='active'
-            ).first()
+            from modules.income.bonus_fund_counter import bonus_fund_counter
             
-            # Calculate total available fund
-            binary_balance = float(spark_binary.current_balance) if spark_binary else 0.0
-            matrix_balance = float(spark_matrix.current_balance) if spark_matrix else 0.0
+            # Spark Bonus balances (collected from activations), including unfolded shards
+            binary_balance = float(bonus_fund_counter.balance('spark_bonus', 'binary'))
+            matrix_balance = float(bonus_fund_counter.balance('spark_bonus', 'matrix'))
             total_fund = binary_balance + matrix_balance
             
             return {
@@ -441,8 +384,7 @@ class SparkService:
                 
                 if not already_claimed:
                     # Get eligible users count for this slot
-                    eligible_users = self.get_slot_eligible_user_ids(slot_no)
-                    eligible_count = len(eligible_users)
+                    eligible_count = self.count_slot_eligible_users(slot_no)
                     
                     if eligible_count > 0:
                         # Calculate per-user share
@@ -479,16 +421,10 @@ class SparkService:
         total_global_usdt = 0.0
         total_global_bnb = 0.0
         try:
-            from modules.income.bonus_fund import BonusFund
-            # Get USDT fund (from matrix program)
-            usdt_fund = BonusFund.objects(fund_type='spark_bonus', program='matrix').first()
-            if usdt_fund:
-                total_global_usdt = float(usdt_fund.current_balance or 0.0)
-            
-            # Get BNB fund (from binary program)
-            bnb_fund = BonusFund.objects(fund_type='spark_bonus', program='binary').first()
-            if bnb_fund:
-                total_global_bnb = float(bnb_fund.current_balance or 0.0)
+            from modules.income.bonus_fund_counter import bonus_fund_counter
+            # USDT fund (from matrix program), BNB fund (from binary program)
+            total_global_usdt = float(bonus_fund_counter.balance('spark_bonus', 'matrix'))
+            total_global_bnb = float(bonus_fund_counter.balance('spark_bonus', 'binary'))
         except Exception as e:
             print(f"Error fetching spark bonus global funds: {e}")
         
@@ -521,22 +457,56 @@ class SparkService:
         }
 
     # ------------------ Claim Processing ------------------
+    @staticmethod
+    def _matrix_roster():
+        """The matrix slot rosters once built (SlotRosterService.rebuild), else None"""
+        from modules.slot.roster_service import SlotRosterService
+        roster = SlotRosterService()
+        return roster if roster.is_built('matrix') else None
+
     def get_slot_eligible_user_ids(self, slot_no: int) -> List[str]:
-        """Return user ids eligible for Spark Bonus for a given Matrix slot.
-        Eligibility = any of:
+        """Return user ids eligible for Spark Bonus for a given Matrix slot (sorted).
+        Eligibility = membership of the matrix slot roster (a completed SlotActivation or
+        MatrixActivation of the slot). Until the roster is built, any of:
           - SlotActivation(program='matrix', slot_no, status='completed')
           - MatrixActivation(slot_no)
         """
         try:
+            roster = self._matrix_roster()
+            if roster:
+                return roster.user_ids('matrix', slot_no)
             from modules.slot.model import SlotActivation
             from modules.matrix.model import MatrixActivation as _MA
-            from bson import ObjectId
             ids1 = [str(a.user_id) for a in SlotActivation.objects(program='matrix', slot_no=slot_no, status='completed').only('user_id')]
             ids2 = [str(a.user_id) for a in _MA.objects(slot_no=slot_no).only('user_id')]
             return sorted(list(set(ids1 + ids2)))
         except Exception:
             return []
 
+    def count_slot_eligible_users(self, slot_no: int) -> int:
+        """Number of users eligible for Spark Bonus for a given Matrix slot"""
+        try:
+            roster = self._matrix_roster()
+            return roster.count('matrix', slot_no) if roster else len(self.get_slot_eligible_user_ids(slot_no))
+        except Exception:
+            return 0
+
+    def is_slot_eligible_user(self, slot_no: int, user_id: str) -> bool:
+        try:
+            roster = self._matrix_roster()
+            if roster:
+                return roster.is_member('matrix', slot_no, user_id)
+            return str(user_id) in set(self.get_slot_eligible_user_ids(slot_no))
+        except Exception:
+            return False
+
+    def iter_slot_eligible_user_ids(self, slot_no: int) -> Iterable[str]:
+        """Eligible user ids of a Matrix slot, streamed from the roster once it is built"""
+        roster = self._matrix_roster()
+        if roster:
+            return roster.iter_user_ids('matrix', slot_no)
+        return iter(self.get_slot_eligible_user_ids(slot_no))
+
     def claim_spark_bonus(self, slot_no: int, currency: str = 'USDT', claimer_user_id: str | None = None) -> Dict[str, Any]:
         """Distribute the allocated fund for a slot equally among eligible users and credit wallets.
         - currency: 'USDT' or 'BNB'
@@ -558,13 +528,13 @@ class SparkService:
             if alloc_usdt <= 0:
                 return {"success": False, "error": "No allocated fund for this slot"}
 
-            # Get eligible users
-            user_ids = self.get_slot_eligible_user_ids(slot_no)
-            if not user_ids:
+            # Count eligible users
+            eligible_count = self.count_slot_eligible_users(slot_no)
+            if not eligible_count:
                 return {"success": False, "error": "No eligible users for this slot"}
 
             # If claimer is provided, enforce they are eligible
-            if claimer_user_id and claimer_user_id not in user_ids:
+            if claimer_user_id and not self.is_slot_eligible_user(slot_no, claimer_user_id):
                 return {"success": False, "error": "Claimer is not eligible for this slot"}
 
             # Rolling 30-day claim limit: maximum 2 claims per slot per currency
@@ -599,7 +569,7 @@ class SparkService:
 
             from decimal import Decimal as _D
             # Full slot allocation divided by the number of eligible users
-            per_user_usdt = (_D(str(alloc_usdt)) / _D(str(len(user_ids)))).quantize(_D('0.00000001'))
+            per_user_usdt = (_D(str(alloc_usdt)) / _D(str(eligible_count))).quantize(_D('0.00000001'))
 
             # Convert if needed
             import os
@@ -616,7 +586,8 @@ class SparkService:
             from modules.spark.model import SparkBonusDistribution, SparkSlotClaimLedger
             ws = WalletService()
             credited = []
-            for uid in user_ids:
+            # At most eligible_count shares: members who join mid-claim never push it past the allocation
+            for uid in islice(self.iter_slot_eligible_user_ids(slot_no), eligible_count):
                 r = ws.credit_main_wallet(uid, per_user_amount, currency, 'spark_bonus_distribution', f'SPARK-{slot_no}-{currency}')
                 # Save history
                 try:
@@ -641,7 +612,7 @@ class SparkService:
 
             # Write one ledger row reducing the visible allocated amount for this slot
             try:
-                SparkSlotClaimLedger(slot_number=int(slot_no), currency=currency, amount=per_user_amount * len(user_ids)).save()
+                SparkSlotClaimLedger(slot_number=int(slot_no), currency=currency, amount=per_user_amount * len(credited)).save()
             except Exception:
                 pass
 
@@ -649,9 +620,9 @@ class SparkService:
                 "success": True,
                 "slot_no": slot_no,
                 "currency": currency,
-                "eligible_users": len(user_ids),
+                "eligible_users": eligible_count,
                 "per_user_amount": float(per_user_amount),
-                "total_distributed": float(per_user_amount) * len(user_ids),
+                "total_distributed": float(per_user_amount) * len(credited),
                 "details": credited,
             }
         except Exception as e:
@@ -730,30 +701,21 @@ class SparkService:
         are split proportionally across 'matrix' and 'global'.
         """
         try:
-            from modules.income.bonus_fund import BonusFund
+            from modules.income.bonus_fund_counter import bonus_fund_counter
 
             if amount <= 0:
                 return {"success": True, "message": "No deduction necessary"}
 
             currency = currency.upper()
             updates: List[str] = []
+            now = datetime.utcnow()
 
             if currency == 'BNB':
-                fund = BonusFund.objects(
-                    fund_type='triple_entry',
-                    program='binary',
-                    status='active'
-                ).first()
-                available = Decimal(str(fund.current_balance or 0)) if fund else Decimal('0')
-                if available <= 0:
+                # Reserved atomically: concurrent payouts cannot take more than the fund holds
+                deduction = bonus_fund_counter.reserve('triple_entry', 'binary', amount, distributed_at=now)
+                if deduction <= 0:
                     return {"success": False, "error": "Triple Entry BNB fund unavailable"}
 
-                deduction = min(amount, available)
-                fund.current_balance = available - deduction
-                fund.total_distributed = (fund.total_distributed or Decimal('0')) + deduction
-                fund.last_distribution = datetime.utcnow()
-                fund.updated_at = datetime.utcnow()
-                fund.save()
                 updates.append(f"binary:{float(deduction)} BNB")
 
                 return {
@@ -764,21 +726,15 @@ class SparkService:
                 }
 
             # USDT deductions span matrix/global funds
-            funds = BonusFund.objects(
-                fund_type='triple_entry',
-                program__in=['matrix', 'global'],
-                status='active'
-            )
             balances: Dict[str, Decimal] = {
-                f.program: Decimal(str(f.current_balance or 0)) for f in funds
+                program: bonus_fund_counter.balance('triple_entry', program) for program in ('matrix', 'global')
             }
             total_usdt = sum(balances.values())
             if total_usdt <= 0:
                 return {"success": False, "error": "Triple Entry USDT fund unavailable"}
 
             remaining = amount
-            for fund in funds:
-                balance = Decimal(str(fund.current_balance or 0))
+            for program, balance in balances.items():
                 if balance <= 0 or remaining <= 0:
                     continue
                 proportion = (balance / total_usdt) if total_usdt > 0 else Decimal('0')
@@ -787,13 +743,11 @@ class SparkService:
                     deduction = remaining
                 if deduction > balance:
                     deduction = balance
-                fund.current_balance = balance - deduction
-                fund.total_distributed = (fund.total_distributed or Decimal('0')) + deduction
-                fund.last_distribution = datetime.utcnow()
-                fund.updated_at = datetime.utcnow()
-                fund.save()
+                deduction = bonus_fund_counter.reserve('triple_entry', program, deduction, distributed_at=now)
+                if deduction <= 0:
+                    continue
                 remaining -= deduction
-                updates.append(f"{fund.program}:{float(deduction)} USDT")
+                updates.append(f"{program}:{float(deduction)} USDT")
 
             if remaining > Decimal('0'):
                 updates.append(f"unallocated:{float(remaining)} USDT")
@@ -816,17 +770,11 @@ class SparkService:
         - global (USDT) -> 5% of Global program contributions
         """
         try:
-            from modules.income.bonus_fund import BonusFund
-
-            triple_funds = BonusFund.objects(
-                fund_type='triple_entry',
-                status='active'
-            )
+            from modules.income.bonus_fund_counter import bonus_fund_counter
 
-            totals_by_program: Dict[str, Decimal] = {}
-            for fund in triple_funds:
-                amt = Decimal(str(fund.current_balance or 0))
-                totals_by_program[fund.program] = totals_by_program.get(fund.program, Decimal('0')) + amt
+            totals_by_program: Dict[str, Decimal] = {
+                program: bonus_fund_counter.balance('triple_entry', program) for program in ('binary', 'matrix', 'global')
+            }
 
             total_bnb = totals_by_program.get('binary', Decimal('0'))
             total_usdt = Decimal('0')
@@ -16,11 +16,16 @@ class SpilloverQueue(Document):
     processed_at = DateTimeField()
     failure_reason = StringField()
 
+    # Worker lease (core/queue_consumer.py)
+    lease_owner = StringField()
+    lease_expires_at = DateTimeField()
+    next_attempt_at = DateTimeField()
+
     created_at = DateTimeField(default=datetime.utcnow)
 
     meta = {
         'collection': 'spillover_queue',
-        'indexes': ['user_id', 'original_parent_id', 'status']
+        'indexes': ['user_id', 'original_parent_id', 'status', ('status', 'lease_expires_at')]
     }
 
 
@@ -41,7 +46,11 @@ class SpilloverPlacement(Document):
 
     meta = {
         'collection': 'spillover_placement',
-        'indexes': ['user_id', 'spillover_parent_id', 'spillover_level', 'processed_at']
+        'indexes': [
+            'user_id', 'spillover_parent_id', 'spillover_level', 'processed_at',
+            # One placement per queue item, however often the item is delivered
+            {'fields': ['queue_id'], 'unique': True, 'sparse': True},
+        ]
     }
 
 
@@ -102,8 +102,8 @@ async def get_settings(current_user: dict = Depends(authentication_service.verif
     try:
         settings = SpilloverSettings.objects().first()
         if not settings:
+            # Defaults only; the record is created by the matching POST, never by a GET
             settings = SpilloverSettings()
-            settings.save()
         return success_response({
             "enabled": settings.enabled,
             "bfs_search_limit": settings.bfs_search_limit,
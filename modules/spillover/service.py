@@ -2,6 +2,7 @@ from typing import Dict, Any, Optional
 from bson import ObjectId
 from datetime import datetime
 
+from core.queue_consumer import QueueConsumer, record_once
 from .model import SpilloverQueue, SpilloverPlacement, SpilloverSettings, SpilloverLog
 from ..tree.model import TreePlacement
 
@@ -23,36 +24,34 @@ class SpilloverService:
         self._log(item.user_id, 'queued', 'Spillover queued', related_queue_id=item.id)
         return {"queue_id": str(item.id), "status": item.status}
 
+    def queue_consumer(self, concurrency: int = 1, settings: Optional[SpilloverSettings] = None, **kwargs) -> QueueConsumer:
+        """Lease-based consumer for the spillover queue (safe to run from several workers)"""
+        settings = settings or SpilloverSettings.objects().first() or SpilloverSettings()
+        return QueueConsumer(
+            'spillover', SpilloverQueue, lambda item: self._attempt_place(item, settings),
+            max_attempts=settings.max_queue_attempts, concurrency=concurrency,
+            on_failure=lambda item, e, parked: self._log(item.user_id, 'failed', f'Spillover failed: {e}', related_queue_id=item.id),
+            on_complete=self._record_placement,
+            **kwargs
+        )
+
     def process_queue_batch(self, batch_size: int = 200) -> Dict[str, Any]:
         settings = SpilloverSettings.objects().first() or SpilloverSettings()
         batch_size = min(batch_size, settings.queue_batch_size)
-        pending = SpilloverQueue.objects(status='queued').order_by('created_at').limit(batch_size)
-        processed, failed = 0, 0
-        for item in pending:
-            try:
-                self._attempt_place(item, settings)
-                processed += 1
-            except Exception as e:
-                failed += 1
-                item.status = 'failed'
-                item.failure_reason = str(e)
-                item.last_attempt_at = datetime.utcnow()
-                item.attempts += 1
-                item.save()
-                self._log(item.user_id, 'failed', f'Spillover failed: {e}', related_queue_id=item.id)
-        return {"processed": processed, "failed": failed}
-
-    def _attempt_place(self, item: SpilloverQueue, settings: SpilloverSettings) -> None:
-        item.status = 'processing'
-        item.last_attempt_at = datetime.utcnow()
-        item.attempts += 1
-        item.save()
+        result = self.queue_consumer(settings=settings).run_once(limit=batch_size)
+        return {"processed": result["completed"], "failed": result["retried"] + result["parked"]}
+
+    def _attempt_place(self, item: SpilloverQueue, settings: SpilloverSettings) -> tuple:
+        # Status, attempts and lease are managed by the queue consumer; the placement
+        # is recorded by _record_placement before this worker's lease settles the item
 
         # BFS search for nearest vacancy starting from intended_parent
         vacancy = self._find_nearest_vacancy(item.intended_parent_id, settings)
         if vacancy is None:
             raise ValueError('No vacancy found for spillover')
+        return vacancy
 
+    def _record_placement(self, item: SpilloverQueue, vacancy: tuple) -> None:
         parent_id, position, level = vacancy
 
         # Place record (actual binary placement update occurs in TreePlacement integration)
@@ -66,12 +65,9 @@ class SpilloverService:
             trigger='auto',
             processed_at=datetime.utcnow()
         )
-        placement.save()
-
-        item.status = 'completed'
-        item.processed_at = datetime.utcnow()
-        item.save()
-        self._log(item.user_id, 'placed', 'Spillover placed', related_queue_id=item.id, related_placement_id=placement.id)
+        # Keyed by the queue item: a redelivered item does not place the user twice
+        if record_once(placement):
+            self._log(item.user_id, 'placed', 'Spillover placed', related_queue_id=item.id, related_placement_id=placement.id)
 
     def _find_nearest_vacancy(self, start_parent_id: ObjectId, settings: SpilloverSettings) -> Optional[tuple]:
         # Breadth-first search of the binary tree to find the nearest available left/right
@@ -418,9 +418,8 @@ async def get_top_leader_gift_fund(current_user: dict = Depends(authentication_s
     try:
         fund = TopLeaderGiftFund.objects(is_active=True).first()
         if not fund:
-            # Create default fund
+            # Defaults only; the record is created by the matching POST, never by a GET
             fund = TopLeaderGiftFund()
-            fund.save()
         
         return success_response(
             data={
@@ -664,9 +663,8 @@ async def get_top_leader_gift_settings(current_user: dict = Depends(authenticati
     try:
         settings = TopLeaderGiftSettings.objects(is_active=True).first()
         if not settings:
-            # Create default settings
+            # Defaults only; the record is created by the matching POST, never by a GET
             settings = TopLeaderGiftSettings()
-            settings.save()
         
         return success_response(
             data={
@@ -1174,8 +1172,8 @@ async def get_fund_overview_new(
         
         fund = TopLeadersGiftFund.objects(is_active=True).first()
         if not fund:
+            # Defaults only; the Spark distribution creates the fund record, never a GET
             fund = TopLeadersGiftFund()
-            fund.save()
         
         # Build response with both currencies
         funds = {
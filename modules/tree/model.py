@@ -51,6 +51,9 @@ class TreePlacement(Document):
     activation_date = DateTimeField()
     # Global-first-user marker (used by GlobalSerialPlacementService)
     is_first_user = BooleanField(default=False)
+    # Set by TreeService.place_user_in_tree: the placement owns its (upline, position) seat,
+    # and only one active placement may hold a seat (unique index below)
+    claims_position = BooleanField(default=False)
     
     # Timestamps
     created_at = DateTimeField(default=datetime.utcnow)
@@ -68,7 +71,9 @@ class TreePlacement(Document):
             'is_upline_reserve',
             'is_active',
             'left_child_id',
-            'right_child_id'
+            'right_child_id',
+            {'fields': ['program', 'slot_no', 'upline_id', 'position'], 'unique': True,
+             'partialFilterExpression': {'is_active': True, 'claims_position': True}},
         ]
     }
 
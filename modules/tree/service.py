@@ -1,7 +1,12 @@
+import random
+import time
 from typing import List, Dict, Any, Optional
 from bson import ObjectId
 from datetime import datetime
+from mongoengine.errors import NotUniqueError
+from core.config import PLACEMENT_MAX_ATTEMPTS, PLACEMENT_RETRY_DELAY
 from ..tree.model import TreePlacement
+from .subtree_service import SubtreeService, DEFAULT_MAX_DEPTH
 from ..slot.model import SlotCatalog
 from ..recycle.model import RecycleQueue, RecyclePlacement
 from ..user.model import User
@@ -69,46 +74,7 @@ class TreeService:
             # Matrix: 3 positions (left, middle, right)
             positions = ['left', 'right'] if program == 'binary' else ['left', 'middle', 'right']
             
-            # Check referrer's direct positions first
-            available_position = None
-            for pos in positions:
-                child = TreePlacement.objects(
-                program=program,
-                    upline_id=referrer_id,
-                    position=pos,
-                slot_no=slot_no,
-                is_active=True
-                ).first()
-                
-                if not child:
-                    available_position = pos
-                    break
-            
-            # Direct placement under referrer if space available
-            if available_position:
-                user_level = (referrer_level or 1) + 1
-                placement = TreePlacement(
-                    user_id=user_id,
-                    program=program,
-                    parent_id=referrer_id,
-                    upline_id=referrer_id,
-                    position=available_position,
-                    level=user_level,
-                    slot_no=slot_no,
-                    # Matrix-specific: mark Level 2 middle position as upline-reserve
-                    is_upline_reserve=(
-                        program == 'matrix'
-                        and user_level == 2
-                        and available_position == 'middle'
-                    ),
-                    is_active=True,
-                    created_at=datetime.utcnow()
-                )
-                placement.save()
-                print(f"Created {program} tree placement: User {user_id} at Level {user_level}, Position {available_position} under {referrer_id}")
-                return True
-            
-            # All direct positions filled - use level-wise BFS for spillover
+            # Level-wise BFS: the referrer's direct positions first, then spillover
             # This implements the correct matrix logic:
             # Level 1: [1, 4, 5] - check 1's index0, then 4's index0, then 5's index0
             #          if all filled, check 1's index1, then 4's index1, then 5's index1
@@ -116,38 +82,25 @@ class TreeService:
             
             def find_level_wise_position(referrer_oid, referrer_level):
                 """
-                Level-wise BFS: Check all children's position 0, then all's position 1, then all's position 2
-                Only then move to next level
+                Level-wise BFS: Check all nodes' position 0, then all's position 1, then all's position 2
+                Only then move to next level (one TreePlacement query per level)
                 """
-                # Start with referrer's direct children (level = referrer_level + 1)
-                current_level_nodes = []
-                for pos in positions:
-                    child = TreePlacement.objects(
+                current_level_nodes = [referrer_oid]
+                node_level = referrer_level
+                while current_level_nodes:
+                    children = {}
+                    for child in TreePlacement.objects(
                         program=program,
-                        upline_id=referrer_oid,
-                        position=pos,
+                        upline_id__in=current_level_nodes,
                         slot_no=slot_no,
                         is_active=True
-                    ).first()
-                    if child:
-                        current_level_nodes.append((child.user_id, referrer_level + 1))
-                
-                while current_level_nodes:
-                    # For each position index (0=left, 1=middle, 2=right)
-                    for pos_idx in range(len(positions)):
-                        pos = positions[pos_idx]
-                        
-                        # Check this position for ALL nodes at current level
-                        for node_user_id, node_level in current_level_nodes:
-                            existing = TreePlacement.objects(
-                                program=program,
-                                upline_id=node_user_id,
-                                position=pos,
-                                slot_no=slot_no,
-                                is_active=True
-                            ).first()
-                            
-                            if not existing:
+                    ).only('user_id', 'upline_id', 'position'):
+                        children.setdefault((child.upline_id, child.position), child.user_id)
+                    
+                    # For each position index (0=left, 1=middle, 2=right), check ALL nodes at current level
+                    for pos in positions:
+                        for node_user_id in current_level_nodes:
+                            if (node_user_id, pos) not in children:
                                 # Found available slot!
                                 return {
                                     'upline_id': node_user_id,
@@ -155,37 +108,25 @@ class TreeService:
                                     'level': node_level + 1
                                 }
                     
-                    # All positions at current level are filled
-                    # Get next level children from all current level nodes
-                    next_level_nodes = []
-                    for node_user_id, node_level in current_level_nodes:
-                        for pos in positions:
-                            child = TreePlacement.objects(
-                                program=program,
-                                upline_id=node_user_id,
-                                position=pos,
-                                slot_no=slot_no,
-                                is_active=True
-                            ).first()
-                            if child:
-                                next_level_nodes.append((child.user_id, node_level + 1))
-                    
-                    if not next_level_nodes:
-                        return None  # No more nodes
-                    
-                    current_level_nodes = next_level_nodes
+                    # All positions at current level are filled: descend to their children
+                    current_level_nodes = [children[(node_user_id, pos)] for node_user_id in current_level_nodes for pos in positions]
+                    node_level += 1
                 
                 return None
             
-            placement_info = find_level_wise_position(referrer_id, referrer_level or 1)
-            
-            if placement_info:
-                # Matrix-specific upline reserve: Level 2 middle child
-                is_upline_reserve = (
-                    program == 'matrix'
-                    and placement_info.get('level') == 2
-                    and placement_info.get('position') == 'middle'
-                )
+            # A concurrent join may claim the position found between the check and the insert;
+            # the unique active-position index rejects the second insert and the search reruns
+            for attempt in range(PLACEMENT_MAX_ATTEMPTS):
+                if attempt:
+                    # Jittered backoff so racing joins stop colliding on the same seat
+                    time.sleep(random.uniform(0, PLACEMENT_RETRY_DELAY * min(attempt, 8)))
+                placement_info = find_level_wise_position(referrer_id, referrer_level or 1)
+                
+                if not placement_info:
+                    print(f"No available position found in tree (shouldn't happen)")
+                    return False
+                
+                is_spillover = placement_info['upline_id'] != referrer_id
                 placement = TreePlacement(
                     user_id=user_id,
                     program=program,
@@ -194,17 +135,27 @@ class TreeService:
                     position=placement_info['position'],
                     level=placement_info['level'],
                     slot_no=slot_no,
-                    is_spillover=True,
-                    spillover_from=referrer_id,
-                    is_upline_reserve=is_upline_reserve,
+                    is_spillover=is_spillover,
+                    spillover_from=referrer_id if is_spillover else None,
+                    # Matrix-specific: mark Level 2 middle position as upline-reserve
+                    is_upline_reserve=(
+                        program == 'matrix'
+                        and placement_info['level'] == 2
+                        and placement_info['position'] == 'middle'
+                    ),
                     is_active=True,
+                    claims_position=True,
                     created_at=datetime.utcnow()
                 )
-                placement.save()
-                print(f"Created {program} SPILLOVER placement: User {user_id} at Level {placement_info['level']}, Position {placement_info['position']} under {placement_info['upline_id']} (referred by {referrer_id})")
+                if not self._claim_position(placement):
+                    continue
+                if is_spillover:
+                    print(f"Created {program} SPILLOVER placement: User {user_id} at Level {placement_info['level']}, Position {placement_info['position']} under {placement_info['upline_id']} (referred by {referrer_id})")
+                else:
+                    print(f"Created {program} tree placement: User {user_id} at Level {placement_info['level']}, Position {placement_info['position']} under {referrer_id}")
                 return True
             
-            print(f"No available position found in tree (shouldn't happen)")
+            print(f"Could not claim a {program} position for {user_id} after {PLACEMENT_MAX_ATTEMPTS} attempts")
             return False
             
         except Exception as e:
@@ -213,6 +164,38 @@ class TreeService:
             traceback.print_exc()
             return False
     
+    @staticmethod
+    def ensure_root_placement(user_id: ObjectId, program: str) -> TreePlacement:
+        """
+        Slot-1 placement of a referrer, created as a level-0 root when they have none
+        (joins call this before placing the new user under the referrer)
+        """
+        placement = TreePlacement.objects(user_id=user_id, program=program, slot_no=1, is_active=True).first()
+        if not placement:
+            placement = TreePlacement(
+                user_id=user_id,
+                program=program,
+                parent_id=user_id,
+                upline_id=user_id,
+                position='root',
+                level=0,
+                slot_no=1,
+                is_active=True,
+                created_at=datetime.utcnow()
+            )
+            placement.save()
+            print(f"Created {program} root TreePlacement for referrer {user_id}")
+        return placement
+    
+    @staticmethod
+    def _claim_position(placement: TreePlacement) -> bool:
+        """Insert a seat-owning placement; False when a concurrent placement took the seat first"""
+        try:
+            placement.save(force_insert=True)
+            return True
+        except NotUniqueError:
+            return False
+    
     @staticmethod
     async def create_tree_placement(
         user_id: str,
@@ -675,15 +658,25 @@ class TreeService:
             )
 
     @staticmethod
-    async def get_subtree(user_id: str, program: str = 'binary') -> ResponseModel:
+    async def get_subtree(user_id: str, program: str = 'binary', max_depth: int = DEFAULT_MAX_DEPTH) -> ResponseModel:
         """
         Return all descendants under a given user for a specific program.
+        Descendants are read one level per query (SubtreeService) and walked in memory,
+        down to max_depth levels; a deeper subtree is truncated and a warning logged.
         """
         try:
             root_id = ObjectId(user_id)
 
-            # Fetch direct children first
-            children = TreePlacement.objects(parent_id=root_id, program=program, is_active=True)
+            children_map = SubtreeService.fetch_children_map(
+                root_id,
+                program=program,
+                max_depth=max_depth,
+                link_field='parent_id',
+                filters={'is_active': True},
+                order_by=None,
+                warn_truncated=True,
+            )
+            children = children_map.get(str(root_id), [])
             if not children:
                 return ResponseModel(success=True, message="No descendants found for this user", data=[])
 
@@ -708,8 +701,7 @@ class TreeService:
 
             while queue:
                 current = queue.pop(0)
-                descendants = TreePlacement.objects(parent_id=current, program=program, is_active=True)
-                for p in descendants:
+                for p in children_map.get(str(current), []):
                     if str(p.user_id) in visited:
                         continue
                     nodes.append(_node_info(p))
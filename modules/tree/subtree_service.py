@@ -0,0 +1,212 @@
+"""
+Subtree Fetch Service
+Level-batched TreePlacement reads shared by the nested tree renderers
+(binary duel tree, dream matrix tree, team structure counts, tree subtree API).
+
+Every renderer used to query children node by node (and position by position).
+Here a whole tree level is read with a single `<link>__in` query, so a subtree of
+depth D costs at most D TreePlacement queries; nesting is assembled in memory.
+"""
+
+import logging
+from typing import Dict, Any, List, Optional, Callable, Iterable
+from collections import Counter
+from bson import ObjectId
+
+from .model import TreePlacement
+from ..user.model import User
+
+logger = logging.getLogger("SubtreeService")
+
+# Default walk depth for subtree reads; deeper levels are left out (with a warning)
+DEFAULT_MAX_DEPTH = 50
+
+
+class ChildrenMap(dict):
+    """{str(link_id): [child placements]}; truncated is set by a warn_truncated walk cut at max_depth"""
+    truncated = False
+
+
+class SubtreeService:
+    """Batched subtree primitives for (program, slot) trees"""
+
+    DEFAULT_FIELDS = ('user_id', 'parent_id', 'upline_id', 'position', 'level', 'slot_no', 'created_at')
+
+    @staticmethod
+    def fetch_children_map(
+        root_id: ObjectId,
+        program: str,
+        max_depth: int,
+        link_field: str = 'upline_id',
+        filters: Optional[Dict[str, Any]] = None,
+        expand: Optional[Callable[[ObjectId, List[TreePlacement]], List[TreePlacement]]] = None,
+        order_by: Optional[str] = 'created_at',
+        fields: Iterable[str] = DEFAULT_FIELDS,
+        exclude_self: bool = False,
+        warn_truncated: bool = False,
+    ) -> ChildrenMap:
+        """
+        Read the subtree under root_id down to max_depth levels.
+
+        Returns {str(link_id): [child placements in query order]} for every user
+        whose children were fetched. One query per level; `expand(link_id, children)`
+        may narrow which children are descended into (e.g. first left/right only).
+        With exclude_self, placements linking a user to themselves are dropped.
+        Renderers cap max_depth on purpose; with warn_truncated, a walk that still
+        has placements below max_depth logs a warning and sets children_map.truncated.
+        """
+        children_map = ChildrenMap()
+        frontier = [root_id]
+        fetched = set()
+        depth = 0
+        while frontier and depth < max_depth:
+            frontier_keys = [str(f) for f in frontier]
+            fetched.update(frontier_keys)
+            query = {'program': program, f'{link_field}__in': frontier}
+            query.update(filters or {})
+            qs = TreePlacement.objects(**query).only(*fields)
+            if order_by:
+                qs = qs.order_by(order_by)
+
+            level_map: Dict[str, List[TreePlacement]] = {k: [] for k in frontier_keys}
+            for p in qs:
+                link_key = str(getattr(p, link_field))
+                if link_key not in level_map or (exclude_self and str(p.user_id) == link_key):
+                    continue
+                level_map[link_key].append(p)
+
+            next_frontier = []
+            for link_key in frontier_keys:
+                children = level_map[link_key]
+                children_map[link_key] = children
+                to_expand = expand(link_key, children) if expand else children
+                for child in to_expand:
+                    child_key = str(child.user_id)
+                    if child_key not in fetched:
+                        fetched.add(child_key)
+                        next_frontier.append(child.user_id)
+            frontier = next_frontier
+            depth += 1
+        if warn_truncated and frontier and SubtreeService._has_children(frontier, program, link_field, filters):
+            children_map.truncated = True
+            logger.warning("Subtree of %s (%s) truncated at %d levels", root_id, program, max_depth)
+        return children_map
+
+    @staticmethod
+    def first_by_position(children: List[TreePlacement], positions: Iterable[str]) -> List[TreePlacement]:
+        """Pick the first child per position, returned in the given position order"""
+        by_position: Dict[str, TreePlacement] = {}
+        for ch in children:
+            pos = getattr(ch, 'position', None)
+            if pos not in by_position:
+                by_position[pos] = ch
+        return [by_position[pos] for pos in positions if pos in by_position]
+
+    @staticmethod
+    def build_nested(
+        root_id: ObjectId,
+        children_map: Dict[str, List[TreePlacement]],
+        max_levels: int,
+        positions: Iterable[str],
+        make_node: Callable[[ObjectId, int, str, Optional[ObjectId]], Dict[str, Any]],
+    ) -> (Dict[str, Any], int, int):
+        """
+        Assemble the directDownline structure from a children map.
+        make_node(user_oid, level, position, tree_parent_oid) returns the node dict
+        (without id). Node ids are assigned in pre-order, matching the recursive renderers.
+        Returns (root_node, max_depth, total_count).
+        """
+        positions = list(positions)
+        node_id_counter = [0]
+        max_depth = [0]
+
+        def build(user_oid, level: int, position: str, tree_parent_oid=None) -> Optional[Dict[str, Any]]:
+            if level >= max_levels:
+                return None
+            node = {"id": node_id_counter[0]}
+            node_id_counter[0] += 1
+            node.update(make_node(user_oid, level, position, tree_parent_oid))
+            max_depth[0] = max(max_depth[0], level)
+
+            if level < max_levels - 1:
+                children = SubtreeService.first_by_position(children_map.get(str(user_oid), []), positions)
+                direct_downline = []
+                for ch in children:
+                    child_node = build(ch.user_id, level + 1, ch.position, tree_parent_oid=user_oid)
+                    if child_node:
+                        direct_downline.append(child_node)
+                if direct_downline:
+                    node["directDownline"] = direct_downline
+            return node
+
+        root_node = build(root_id, 0, "root")
+        return root_node, max_depth[0], node_id_counter[0]
+
+    @staticmethod
+    def count_descendants(
+        root_id: ObjectId,
+        program: str,
+        max_depth: int = DEFAULT_MAX_DEPTH,
+        link_field: str = 'upline_id',
+        filters: Optional[Dict[str, Any]] = None,
+        strict: bool = False,
+    ) -> int:
+        """
+        Count placements below root_id, one query per level.
+        Counts tree paths (a user placed twice is counted, with their subtree, twice),
+        which is what the recursive per-node counters returned.
+
+        At most max_depth levels are counted. When placements exist below that
+        depth the total is incomplete: a warning is logged, or ValueError is
+        raised with strict=True.
+        """
+        total = 0
+        frontier = Counter({root_id: 1})
+        depth = 0
+        while frontier and depth < max_depth:
+            query = {'program': program, f'{link_field}__in': list(frontier.keys())}
+            query.update(filters or {})
+            next_frontier: Counter = Counter()
+            for p in TreePlacement.objects(**query).only('user_id', link_field):
+                multiplicity = frontier.get(getattr(p, link_field), 0)
+                total += multiplicity
+                next_frontier[p.user_id] += multiplicity
+            frontier = next_frontier
+            depth += 1
+        if frontier and SubtreeService._has_children(list(frontier.keys()), program, link_field, filters):
+            message = f"Descendant count of {root_id} ({program}) truncated at {max_depth} levels"
+            if strict:
+                raise ValueError(message)
+            logger.warning(message)
+        return total
+
+    @staticmethod
+    def _has_children(
+        link_ids: List[ObjectId],
+        program: str,
+        link_field: str,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """Whether any placement links to one of link_ids (one query)"""
+        query = {'program': program, f'{link_field}__in': link_ids}
+        query.update(filters or {})
+        return TreePlacement.objects(**query).only('id').first() is not None
+
+    @staticmethod
+    def load_users(user_ids: Iterable[ObjectId], *fields: str) -> Dict[str, User]:
+        """Fetch users for a set of ids with one query, keyed by str(id)"""
+        ids = list({str(u): u for u in user_ids if u}.values())
+        if not ids:
+            return {}
+        qs = User.objects(id__in=ids)
+        if fields:
+            qs = qs.only(*fields)
+        return {str(u.id): u for u in qs}
+
+    @staticmethod
+    def collect_user_ids(root_id: ObjectId, children_map: Dict[str, List[TreePlacement]]) -> List[ObjectId]:
+        """All user ids referenced by a children map (root included)"""
+        ids = [root_id]
+        for children in children_map.values():
+            ids.extend(ch.user_id for ch in children)
+        return ids
@@ -231,6 +231,7 @@ async def get_my_community(
     slot_number: Optional[int] = Query(None, description="Slot number filter"),
     page: int = Query(1, description="Page number"),
     limit: int = Query(10, description="Items per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
     current_user: dict = Depends(authentication_service.verify_authentication)
 ):
     """Get community members (referred users) for a user"""
@@ -243,7 +244,8 @@ async def get_my_community(
             program_type=program_type,
             slot_number=slot_number,
             page=page,
-            limit=limit
+            limit=limit,
+            cursor=cursor
         )
         
         if result["success"]:
@@ -564,12 +566,10 @@ async def get_leadership_stipend_income(
 
         ls = LeadershipStipend.objects(user_id=ObjectId(user_id)).first()
         
-        # If LeadershipStipend exists but tiers are empty, initialize them
+        # Empty tiers are filled in memory only; GETs never write the stipend record
         if ls and (not ls.tiers or len(ls.tiers) == 0):
             from modules.leadership_stipend.router import _initialize_leadership_stipend_tiers
             ls.tiers = _initialize_leadership_stipend_tiers()
-            ls.save()
-            print(f"✅ Auto-initialized Leadership Stipend tiers for user {user_id}")
         
         # Preload payments first and compute per-slot totals
         from modules.leadership_stipend.model import LeadershipStipendPayment as _LSP
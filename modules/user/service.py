@@ -19,6 +19,10 @@ from modules.rank.service import RankService
 from modules.blockchain.model import BlockchainEvent
 from datetime import datetime
 from modules.tree.model import TreePlacement
+from core.pagination import paginate_ids
+
+# Deepest downline level read by get_my_community; deeper members are left out (reported as truncated)
+COMMUNITY_MAX_DEPTH = 100
 
 
 class UserService:
@@ -257,7 +261,7 @@ class UserService:
                 "error": f"Failed to get user details: {str(e)}"
             }
     
-    def get_my_community(self, user_id: str, program_type: str = "binary", slot_number: Optional[int] = None, page: int = 1, limit: int = 10) -> Dict[str, Any]:
+    def get_my_community(self, user_id: str, program_type: str = "binary", slot_number: Optional[int] = None, page: int = 1, limit: int = 10, cursor: Optional[str] = None) -> Dict[str, Any]:
         """
         Get ALL community members (all downline users, all levels) for a user
         Slot-wise filtering: Only users from specified slot tree
@@ -266,6 +270,9 @@ class UserService:
         Slot validation logic:
         - If slot_number is provided: only return data if slot_number <= user's max active slot
         - If slot_number is None: use user's max active slot from slot_activation collection
+
+        Pagination: page/limit, or `cursor` (the previous page's next_cursor) to continue
+        right after the last member returned.
         """
         try:
             from modules.tree.model import TreePlacement
@@ -282,33 +289,13 @@ class UserService:
             
             user_oid = ObjectId(user_id)
             
-            # Get user's max active slot from slot_activation collection
-            max_active_slot = 0
-            
-            # Check SlotActivation collection
-            slot_activations = SlotActivation.objects(
-                user_id=user_oid,
-                program=program_type,
-                status='completed'
-            ).order_by('-slot_no')
-            
-            if slot_activations.count() > 0:
-                max_active_slot = slot_activations.first().slot_no
-            
-            # For matrix program, also check MatrixActivation collection
-            if program_type == "matrix":
-                from modules.matrix.model import MatrixActivation
-                matrix_activations = MatrixActivation.objects(
-                    user_id=user_oid,
-                    status='completed'
-                ).order_by('-slot_no')
-                
-                if matrix_activations.count() > 0:
-                    matrix_max_slot = matrix_activations.first().slot_no
-                    max_active_slot = max(max_active_slot, matrix_max_slot)
+            from modules.slot.max_slot_service import MaxSlotService
+            max_slot_service = MaxSlotService()
             
             # If slot_number is not provided, use max active slot
+            # (SlotActivation and, for matrix, MatrixActivation)
             if slot_number is None:
+                max_active_slot = max_slot_service.get_max_slot(user_oid, program_type).get("slot_no", 0)
                 if max_active_slot == 0:
                     # User has no active slots, return empty data
                     return {
@@ -330,7 +317,17 @@ class UserService:
                 # the root user to be in that specific slot tree.
                 pass
             
-            # Use BFS traversal to get ALL downline users (all levels) in this program tree
+            # Use BFS traversal to get ALL downline users (all levels) in this program tree.
+            # Children are read one tree level per query; the BFS itself runs in memory.
+            from modules.tree.subtree_service import SubtreeService
+            children_map = SubtreeService.fetch_children_map(
+                user_oid,
+                program=program_type,
+                max_depth=COMMUNITY_MAX_DEPTH,
+                filters={"is_active": True},
+                fields=('user_id', 'upline_id', 'created_at'),
+                warn_truncated=True,
+            )
             unique_user_ids = []
             queue = [user_oid]  # Start from root user
             visited = set()
@@ -342,16 +339,8 @@ class UserService:
             while queue:
                 current_upline_id = queue.pop(0)
                 
-                # Get all children of current user in this program tree (ignore slot filter here)
-                children_query = {
-                    "upline_id": current_upline_id,
-                    "program": program_type,
-                    "is_active": True
-                }
-                
-                children = TreePlacement.objects(**children_query).order_by('created_at')
-                
-                for child_placement in children:
+                # Children of current user in this program tree (ignore slot filter here)
+                for child_placement in children_map.get(str(current_upline_id), []):
                     child_user_id_str = str(child_placement.user_id)
                     
                     # Avoid duplicates and avoid cycles
@@ -366,62 +355,28 @@ class UserService:
             # NOTE: Do not exclude users who later upgraded to higher slots.
             # Presence in this slot's TreePlacement is sufficient for inclusion.
             # (Previously we filtered by highest active slot == requested slot, which hid users after upgrades.)
-            # First, get all users with placement in this slot
-            users_with_placement = []
-            for user_id_obj in unique_user_ids:
-                placement = TreePlacement.objects(
-                    user_id=user_id_obj,
+            # One query for all downline users, keeping BFS order
+            placed_in_slot = {
+                str(p.user_id) for p in TreePlacement.objects(
+                    user_id__in=unique_user_ids,
                     program=program_type,
                     slot_no=slot_number,
                     is_active=True
-                ).first()
-                if placement:
-                    users_with_placement.append(user_id_obj)
-            # Compute highest active slot per user (program-specific) and include ONLY users
-            # whose highest active slot equals the requested slot_number (show only at highest slot)
-            user_max_slots_map = {}
-            
-            # Get max slots from SlotActivation for all users at once (program-specific)
-            all_slot_activations = SlotActivation.objects(
-                user_id__in=users_with_placement,
-                program=program_type,
-                status='completed'
+                ).only('user_id')
+            } if unique_user_ids else set()
+            users_with_placement = [u for u in unique_user_ids if str(u) in placed_in_slot]
+            # Include ONLY users whose highest active slot equals the requested slot_number
+            # (show only at highest slot) - an indexed filter on UserMaxSlot
+            users_with_slot_placement = max_slot_service.users_at_slot(
+                users_with_placement, program_type, slot_number
             )
-            for activation in all_slot_activations:
-                user_id_str = str(activation.user_id)
-                current_max = user_max_slots_map.get(user_id_str, 0)
-                if activation.slot_no > current_max:
-                    user_max_slots_map[user_id_str] = activation.slot_no
-            
-            # For matrix program, also check MatrixActivation and take the max
-            if program_type == "matrix":
-                from modules.matrix.model import MatrixActivation
-                all_matrix_activations = MatrixActivation.objects(
-                    user_id__in=users_with_placement,
-                    status='completed'
-                )
-                for activation in all_matrix_activations:
-                    user_id_str = str(activation.user_id)
-                    current_max = user_max_slots_map.get(user_id_str, 0)
-                    if activation.slot_no > current_max:
-                        user_max_slots_map[user_id_str] = activation.slot_no
-            
-            # Final filter: show users only on their highest active slot view
-            users_with_slot_placement = []
-            for user_id_obj in users_with_placement:
-                user_id_str = str(user_id_obj)
-                user_max_slot = user_max_slots_map.get(user_id_str, 0)
-                if user_max_slot == slot_number:
-                    users_with_slot_placement.append(user_id_obj)
             
             print(f"[MY-COMMUNITY] After highest-slot filter: {len(users_with_slot_placement)} users")
             
-            # Get total count (only users with placement in this slot)
-            total_count = len(users_with_slot_placement)
-            
-            # Apply pagination to filtered user IDs
-            skip = (page - 1) * limit
-            paginated_user_ids = users_with_slot_placement[skip:skip + limit]
+            # Apply pagination to filtered user IDs (total = users with placement in this slot)
+            result_page = paginate_ids(users_with_slot_placement, limit, cursor=cursor, page=page)
+            total_count = result_page.total
+            paginated_user_ids = result_page.items
             
             # Get User details for paginated IDs
             referred_users = User.objects(id__in=paginated_user_ids)
@@ -480,6 +435,22 @@ class UserService:
             for rank in ranks:
                 rank_cache[rank.rank_number] = rank.rank_name
             
+            # Inviter refer codes and slot-specific direct partner counts for the page, in one query each
+            inviter_ids = list({m.refered_by for m in referred_users if getattr(m, 'refered_by', None)})
+            inviter_code_map = {
+                str(u.id): getattr(u, 'refer_code', None)
+                for u in User.objects(id__in=inviter_ids).only('refer_code')
+            } if inviter_ids else {}
+            direct_partners_map = {}
+            if paginated_user_ids:
+                for row in TreePlacement.objects(
+                    parent_id__in=paginated_user_ids,
+                    program=program_type,
+                    slot_no=slot_number,
+                    is_active=True
+                ).aggregate([{"$group": {"_id": "$parent_id", "count": {"$sum": 1}}}]):
+                    direct_partners_map[str(row["_id"])] = row["count"]
+            
             # Format response - all users in paginated_user_ids already have slot placement
             community_members = []
             for user_id_obj in paginated_user_ids:
@@ -487,23 +458,11 @@ class UserService:
                 if member:
                     user_id_str = str(user_id_obj)
                     
-                    # Fetch inviter's refer_code (who referred this member)
-                    inviter_code = None
-                    try:
-                        if getattr(member, 'refered_by', None):
-                            inviter = User.objects(id=member.refered_by).only('refer_code').first()
-                            inviter_code = getattr(inviter, 'refer_code', None) if inviter else None
-                    except Exception:
-                        inviter_code = None
+                    # Inviter's refer_code (who referred this member)
+                    inviter_code = inviter_code_map.get(str(member.refered_by)) if getattr(member, 'refered_by', None) else None
                     
-                    # Count direct partners for this member (only in this slot)
-                    # Only count partners who have placement in this slot
-                    direct_partners_in_slot = TreePlacement.objects(
-                        parent_id=member.id,
-                        program=program_type,
-                        slot_no=slot_number,
-                        is_active=True
-                    ).count()
+                    # Direct partners for this member (only partners with placement in this slot)
+                    direct_partners_in_slot = direct_partners_map.get(user_id_str, 0)
                     
                     # Get user's actual rank (calculated based on binary + matrix slots)
                     # Rank rule: User MUST join BOTH Binary AND Matrix
@@ -573,11 +532,15 @@ class UserService:
                 "success": True,
                 "data": {
                     "community_members": community_members,
+                    # True when the downline goes deeper than COMMUNITY_MAX_DEPTH (counts are then partial)
+                    "truncated": children_map.truncated,
                     "pagination": {
-                        "page": page,
-                        "limit": limit,
+                        "page": result_page.page,
+                        "limit": result_page.limit,
                         "total_count": total_count,
-                        "total_pages": (total_count + limit - 1) // limit
+                        "total_pages": (total_count + result_page.limit - 1) // result_page.limit,
+                        "next_cursor": result_page.next_cursor,
+                        "has_more": result_page.has_more
                     }
                 }
             }
@@ -1010,30 +973,8 @@ def create_temp_user_service(payload: Dict[str, Any]) -> Tuple[Optional[Dict[str
             # Create binary tree placement for the new user
             tree_service = TreeService()
             
-            # First, ensure referrer has TreePlacement record for binary
-            referrer_placement = TreePlacement.objects(
-                user_id=ObjectId(upline_id),
-                program='binary',
-                slot_no=1,
-                is_active=True
-            ).first()
-            
-            if not referrer_placement:
-                print(f"⚠️ Referrer {upline_id} doesn't have Binary TreePlacement record, creating one...")
-                # Create TreePlacement for referrer (assuming they are root level)
-                referrer_placement = TreePlacement(
-                    user_id=ObjectId(upline_id),
-                    program='binary',
-                    parent_id=ObjectId(upline_id),
-                    upline_id=ObjectId(upline_id),
-                    position='root',
-                    level=0,
-                    slot_no=1,
-                    is_active=True,
-                    created_at=datetime.utcnow()
-                )
-                referrer_placement.save()
-                print(f"✅ Created Binary TreePlacement for referrer {upline_id}")
+            # First, ensure referrer has TreePlacement record for binary (root level if missing)
+            tree_service.ensure_root_placement(ObjectId(upline_id), 'binary')
             
             # Place user in binary tree for BOTH slots before activation
             # Slot 1 placement
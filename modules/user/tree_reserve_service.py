@@ -9,7 +9,8 @@ from decimal import Decimal
 from datetime import datetime
 from bson import ObjectId
 
-from ..wallet.model import ReserveLedger, UserWallet
+from ..wallet.model import UserWallet
+from ..wallet.reserve_account_service import ReserveAccountService
 from ..slot.model import SlotCatalog, SlotActivation
 from ..user.model import User
 from ..tree.model import TreePlacement
@@ -70,23 +71,9 @@ class TreeUplineReserveService:
         """
         try:
             print(f"[RESERVE_DEBUG] add_to_reserve_fund called: user={tree_upline_id}, program={program}, slot={slot_no}, amount={amount}")
-            # Get current reserve balance
-            current_balance = self.get_reserve_balance(tree_upline_id, program, slot_no)
-            new_balance = current_balance + amount
-            print(f"[RESERVE_DEBUG] Balance: current={current_balance}, new={new_balance}")
-            
-            # Create reserve ledger entry
-            reserve_entry = ReserveLedger(
-                user_id=ObjectId(tree_upline_id),
-                program=program,
-                slot_no=slot_no,
-                amount=amount,
-                direction='credit',
-                source='income',
-                balance_after=new_balance,
-                tx_hash=tx_hash
-            )
-            reserve_entry.save()
+            # Credit the reserve account and append the ledger entry
+            new_balance = ReserveAccountService().credit(tree_upline_id, program, slot_no, amount, 'income', tx_hash=tx_hash)
+            print(f"[RESERVE_DEBUG] Balance: new={new_balance}")
             
             # Update or create user wallet reserve balance
             self._update_reserve_wallet(tree_upline_id, program, new_balance)
@@ -106,17 +93,7 @@ class TreeUplineReserveService:
     def get_reserve_balance(self, user_id: str, program: str, slot_no: int) -> Decimal:
         """Get current reserve balance for a user's next slot"""
         try:
-            # Get the most recent balance from reserve ledger
-            latest_entry = ReserveLedger.objects(
-                user_id=ObjectId(user_id),
-                program=program,
-                slot_no=slot_no
-            ).order_by('-created_at').first()
-            
-            if latest_entry:
-                return latest_entry.balance_after
-            
-            return Decimal('0')
+            return ReserveAccountService().get_balance(user_id, program, slot_no)
             
         except Exception as e:
             print(f"Error getting reserve balance: {e}")
@@ -226,7 +203,15 @@ class TreeUplineReserveService:
             if not catalog:
                 print(f"[RESERVE_DEBUG] Catalog not found for {program} slot {slot_no}")
                 return False
-            
+
+            # Claim the reserve atomically so concurrent credits activate the slot only once
+            reserve_accounts = ReserveAccountService()
+            claim = reserve_accounts.try_claim(user_id, program, slot_no - 1, slot_cost,
+                                               source='auto_activation', tx_hash=f"RESERVE-AUTO-{user_id}-S{slot_no}")
+            if not claim:
+                print(f"[RESERVE_DEBUG] Reserve for {program} slot {slot_no} already claimed or insufficient")
+                return False
+
             # Create slot activation
             activation = SlotActivation(
                 user_id=ObjectId(user_id),
@@ -243,11 +228,16 @@ class TreeUplineReserveService:
                 activated_at=datetime.utcnow(),
                 completed_at=datetime.utcnow()
             )
-            activation.save()
-            
-            # Deduct from reserve fund
-            remaining_reserve = available_reserve - slot_cost
-            self._deduct_reserve_fund(user_id, program, slot_no - 1, slot_cost, f"RESERVE-AUTO-{user_id}-S{slot_no}")
+            try:
+                activation.save()
+            except Exception:
+                reserve_accounts.release_claim(user_id, program, slot_no - 1, slot_cost,
+                                               source='auto_activation', tx_hash=f"RESERVE-AUTO-{user_id}-S{slot_no}-RELEASE")
+                raise
+
+            # Reserve fund was deducted by the claim
+            remaining_reserve = claim["balance_after"]
+            self._update_reserve_wallet(user_id, program, remaining_reserve)
             
             # Update user's slot information (binary-specific structure)
             self._update_user_slot_info(user_id, catalog, slot_cost)
@@ -433,21 +423,7 @@ class TreeUplineReserveService:
     def _deduct_reserve_fund(self, user_id: str, program: str, slot_no: int, amount: Decimal, tx_hash: str):
         """Deduct amount from reserve fund"""
         try:
-            current_balance = self.get_reserve_balance(user_id, program, slot_no)
-            new_balance = current_balance - amount
-            
-            # Create reserve ledger entry for deduction
-            reserve_entry = ReserveLedger(
-                user_id=ObjectId(user_id),
-                program=program,
-                slot_no=slot_no,
-                amount=amount,
-                direction='debit',
-                source='auto_activation',
-                balance_after=new_balance,
-                tx_hash=tx_hash
-            )
-            reserve_entry.save()
+            new_balance = ReserveAccountService().debit(user_id, program, slot_no, amount, 'auto_activation', tx_hash=tx_hash)
             
             # Update reserve wallet
             self._update_reserve_wallet(user_id, program, new_balance)
@@ -584,20 +560,11 @@ class TreeUplineReserveService:
             current_balance = self.get_reserve_balance(user_id, program, slot_no)
             
             if current_balance > 0:
-                # Create ledger entry for clearing
-                ReserveLedger(
-                    user_id=ObjectId(user_id),
-                    program=program,
-                    slot_no=slot_no,
-                    amount=current_balance,
-                    direction='debit',
-                    source='transfer_to_mother',
-                    balance_after=Decimal('0'),
-                    tx_hash=tx_hash
-                ).save()
-                
+                # Debit the whole balance ('transfer_to_mother' is not a ReserveLedger source choice)
+                new_balance = ReserveAccountService().debit(user_id, program, slot_no, current_balance, 'transfer', tx_hash=tx_hash)
+
                 # Update wallet
-                self._update_reserve_wallet(user_id, program, Decimal('0'))
+                self._update_reserve_wallet(user_id, program, new_balance)
                 
         except Exception as e:
             print(f"Error clearing reserve fund: {e}")
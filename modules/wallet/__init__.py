@@ -1,3 +1,3 @@
-from .model import UserWallet, ReserveLedger, WalletLedger
+from .model import UserWallet, ReserveLedger, ReserveAccount, WalletLedger
 from .service import WalletService
 from .router import router
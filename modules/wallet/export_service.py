@@ -0,0 +1,161 @@
+"""
+Ledger Export Service
+Streams WalletLedger, IncomeEvent and MissedProfit history as CSV or NDJSON.
+
+Rows are read with one server-side cursor (batch_size documents per round trip) in
+(created_at, _id) order and written out as they arrive, so memory stays flat no
+matter how many rows an export covers. Every row carries a `cursor` token; passing
+the last one received as `after` resumes the export right after that row, which
+lets clients split multi-million-row ranges (max_rows) or continue a dropped
+download without re-reading what they already have. Ledger and income exports read
+archived months from the archive tier first, then the live rows (see
+ledger_archive_service.py), so exports cover the whole history.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterator, Optional
+
+from bson import ObjectId
+
+from core.pagination import decode_cursor, encode_cursor
+
+from .ledger_archive_service import ARCHIVE_SOURCES, LedgerArchiveService
+from .model import WalletLedger
+from ..income.model import IncomeEvent
+from ..missed_profit.model import MissedProfit
+
+# dataset -> (document, exported fields, filterable fields)
+EXPORTS = {
+    'wallet_ledger': (
+        WalletLedger,
+        ('user_id', 'type', 'amount', 'currency', 'reason', 'balance_after', 'tx_hash', 'created_at'),
+        ('currency', 'type', 'reason'),
+    ),
+    'income_event': (
+        IncomeEvent,
+        ('user_id', 'source_user_id', 'program', 'slot_no', 'income_type', 'amount', 'percentage',
+         'status', 'tx_hash', 'created_at'),
+        ('program', 'income_type', 'status'),
+    ),
+    'missed_profit': (
+        MissedProfit,
+        ('user_id', 'upline_user_id', 'missed_profit_type', 'missed_profit_amount', 'currency',
+         'primary_reason', 'program_type', 'user_level', 'upgrade_slot_level', 'is_distributed', 'created_at'),
+        ('currency', 'program_type', 'missed_profit_type'),
+    ),
+}
+
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def _format_value(value: Any) -> Any:
+    if isinstance(value, (ObjectId, Decimal)):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, 'to_decimal'):  # Decimal128
+        return str(value.to_decimal())
+    return value
+
+
+class LedgerExportService:
+    """Constant-memory exports of ledger and income history"""
+
+    def __init__(self, batch_size: int = 1000):
+        self.batch_size = batch_size
+
+    def build_filter(self, dataset: str, user_id: Optional[str] = None, start: Optional[datetime] = None,
+                     end: Optional[datetime] = None, after: Optional[str] = None,
+                     **filters) -> Dict[str, Any]:
+        """Mongo filter for one export range; raises ValueError for unknown datasets, filters or cursors"""
+        if dataset not in EXPORTS:
+            raise ValueError(f"Unknown export dataset: {dataset}")
+        _, _, allowed = EXPORTS[dataset]
+        unknown = set(k for k, v in filters.items() if v is not None) - set(allowed)
+        if unknown:
+            raise ValueError(f"Unsupported filter(s) for {dataset}: {', '.join(sorted(unknown))}")
+
+        query: Dict[str, Any] = {k: v for k, v in filters.items() if v is not None}
+        if user_id:
+            if not ObjectId.is_valid(str(user_id)):
+                raise ValueError("Invalid user_id")
+            query['user_id'] = ObjectId(str(user_id))
+        created_range = {}
+        if start:
+            created_range['$gte'] = start
+        if end:
+            created_range['$lt'] = end
+        if created_range:
+            query['created_at'] = created_range
+
+        if after:
+            created_at, doc_id = decode_cursor(after)
+            if created_at is None:
+                resume = {'$or': [{'created_at': None, '_id': {'$gt': doc_id}}, {'created_at': {'$ne': None}}]}
+            else:
+                resume = {'$or': [{'created_at': {'$gt': created_at}},
+                                  {'created_at': created_at, '_id': {'$gt': doc_id}}]}
+            query = {'$and': [query, resume]} if query else resume
+        return query
+
+    def iter_rows(self, dataset: str, max_rows: Optional[int] = None, **kwargs) -> Iterator[Dict[str, Any]]:
+        """Yield export rows (formatted values plus their resume cursor) in (created_at, _id) order"""
+        query = self.build_filter(dataset, **kwargs)
+        document_cls, fields, _ = EXPORTS[dataset]
+        if dataset in ARCHIVE_SOURCES:
+            tiers = LedgerArchiveService().tiers(dataset, query)
+        else:
+            tiers = [(document_cls._get_collection(), query)]
+
+        remaining = max_rows or None
+        for collection, tier_query in tiers:
+            if remaining is not None and remaining <= 0:
+                return
+            cursor = collection.find(
+                tier_query,
+                projection={field: 1 for field in fields},
+                sort=[('created_at', 1), ('_id', 1)],
+                batch_size=self.batch_size,
+                limit=remaining or 0,
+            )
+            try:
+                for doc in cursor:
+                    row = {field: _format_value(doc.get(field)) for field in fields}
+                    row['cursor'] = encode_cursor(doc.get('created_at'), doc['_id'])
+                    if remaining is not None:
+                        remaining -= 1
+                    yield row
+            finally:
+                cursor.close()
+
+    def stream(self, dataset: str, fmt: str = 'csv', **kwargs) -> Iterator[str]:
+        """Encoded export chunks (one chunk per batch of rows)"""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        _, fields, _ = EXPORTS[dataset]
+        columns = list(fields) + ['cursor']
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns) if fmt == 'csv' else None
+        if writer:
+            writer.writeheader()
+
+        pending = 0
+        for row in self.iter_rows(dataset, **kwargs):
+            if writer:
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(row, separators=(',', ':')))
+                buffer.write('\n')
+            pending += 1
+            if pending >= self.batch_size:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+        tail = buffer.getvalue()
+        if tail:
+            yield tail
@@ -0,0 +1,403 @@
+"""
+Ledger Archive Service
+Time-partitioned storage for wallet_ledger and income_event.
+
+The live collections only keep the hot months. Older months are archived one
+calendar month at a time:
+
+1. the month's rows are copied to `<collection>_archive` (kept for audit / exports),
+2. per-user monthly totals are recomputed from the archive into LedgerMonthlySummary,
+3. the source watermark (LedgerArchiveState.archived_until) moves past the month,
+4. with --prune only, the month's rows are deleted from the live collection.
+
+Every step is idempotent, so an interrupted run is finished by running it again.
+Tier-aware readers split every read at the watermark: `totals()` combines the
+summaries of archived months with an aggregation over the hot rows, `tiers()` gives
+the (collection, filter) pairs that cover a raw query once (exports) and
+`paginate()` continues a newest-first history page into the archive. The
+watermark moves only after the summaries are complete, so no row is counted twice
+or skipped while a month is being archived. Archived months are summarized per
+whole month: date bounds inside an archived month round to the month. Amounts are
+summed as Decimal128.
+
+Pruning is opt-in because many readers (program dashboards, statistics and the
+history screens outside the wallet module) still query the live collections
+directly and would silently lose the archived months. Without --prune the months
+are copied and summarized and the watermark moves, which the tier-aware readers
+handle the same way.
+
+Run from the command line (defaults keep HOT_MONTHS months live):
+    python -m modules.wallet.ledger_archive_service archive [--before 2026-01] [--source wallet_ledger] [--dry-run] [--prune]
+    python -m modules.wallet.ledger_archive_service restore [--since 2025-06] [--source wallet_ledger]
+"""
+
+import argparse
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from core.pagination import KeysetPage, clamp_limit, count_cache, encode_cursor, keyset_filter, paginate
+
+from .model import LedgerArchiveState, LedgerMonthlySummary, WalletLedger
+from ..income.model import IncomeEvent
+
+HOT_MONTHS = 3
+
+# source -> (live document, summary dimensions)
+ARCHIVE_SOURCES = {
+    'wallet_ledger': (WalletLedger, ('currency', 'type', 'reason')),
+    'income_event': (IncomeEvent, ('program', 'income_type', 'status')),
+}
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def _insert_ignoring_duplicates(collection, docs: List[Dict[str, Any]]):
+    if not docs:
+        return
+    try:
+        collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        # Rows copied by an earlier, interrupted run are already there
+        if any(err.get('code') != 11000 for err in e.details.get('writeErrors', [])):
+            raise
+
+
+def _decimal(value) -> Decimal:
+    if hasattr(value, 'to_decimal'):  # Decimal128
+        return value.to_decimal()
+    return Decimal(str(value or 0))
+
+
+class LedgerArchiveService:
+    """Archive old ledger months into monthly summaries and read across both tiers"""
+
+    def __init__(self, batch_size: int = 1000, hot_months: int = HOT_MONTHS):
+        self.batch_size = batch_size
+        self.hot_months = hot_months
+
+    # ------------------------------------------------------------------ storage
+
+    def _source(self, source: str) -> Tuple[Any, Tuple[str, ...]]:
+        if source not in ARCHIVE_SOURCES:
+            raise ValueError(f"Unknown ledger source: {source}")
+        return ARCHIVE_SOURCES[source]
+
+    def live_collection(self, source: str):
+        return self._source(source)[0]._get_collection()
+
+    def _archive(self, source: str):
+        document_cls, _ = self._source(source)
+        return document_cls._get_db()[f"{document_cls._get_collection_name()}_archive"]
+
+    def archive_collection(self, source: str):
+        collection = self._archive(source)
+        collection.create_index([('user_id', ASCENDING), ('created_at', ASCENDING)])
+        collection.create_index([('created_at', ASCENDING), ('_id', ASCENDING)])
+        return collection
+
+    def watermark(self, source: str) -> Optional[datetime]:
+        state = LedgerArchiveState._get_collection().find_one({'source': source})
+        return state.get('archived_until') if state else None
+
+    def default_cutoff(self, now: Optional[datetime] = None) -> datetime:
+        return add_months(month_start(now or datetime.utcnow()), -self.hot_months)
+
+    # ------------------------------------------------------------------ archival
+
+    def pending_months(self, source: str, before: datetime) -> List[Tuple[datetime, int]]:
+        """(month, live row count) for every month before `before` that still has live rows"""
+        live = self.live_collection(source)
+        rows = live.aggregate([
+            {'$match': {'created_at': {'$lt': month_start(before)}}},
+            {'$group': {'_id': {'y': {'$year': '$created_at'}, 'm': {'$month': '$created_at'}}, 'rows': {'$sum': 1}}},
+        ])
+        return sorted((datetime(r['_id']['y'], r['_id']['m'], 1), r['rows']) for r in rows)
+
+    def archive_before(self, before: Optional[datetime] = None, source: Optional[str] = None,
+                       dry_run: bool = False, prune: bool = False) -> Dict[str, Any]:
+        """
+        Archive every live month older than `before` (default: keep hot_months live), oldest first.
+        Live rows are only deleted with prune=True; months already behind the watermark are
+        revisited only then (to finish an interrupted prune).
+        """
+        before = month_start(before or self.default_cutoff())
+        report = {}
+        for name in ([source] if source else ARCHIVE_SOURCES):
+            months = self.pending_months(name, before)
+            watermark = self.watermark(name)
+            if not prune and watermark:
+                months = [(month, count) for month, count in months if month >= watermark]
+            report[name] = {
+                "months": [m.strftime('%Y-%m') for m, _ in months],
+                "rows": sum(count for _, count in months),
+            }
+            if dry_run:
+                continue
+            for month, _ in months:
+                self.archive_month(name, month, prune=prune)
+            report[name]["archived_until"] = self.watermark(name)
+        return report
+
+    def archive_month(self, source: str, month: datetime, prune: bool = False) -> int:
+        """Copy one calendar month to the archive tier (deleting it from live with prune); returns the row count"""
+        _, dimensions = self._source(source)
+        start, end = month_start(month), add_months(month_start(month), 1)
+        live, archive = self.live_collection(source), self.archive_collection(source)
+        month_filter = {'created_at': {'$gte': start, '$lt': end}}
+
+        moved_ids = []
+        batch = []
+        for doc in live.find(month_filter, sort=[('_id', ASCENDING)], batch_size=self.batch_size):
+            batch.append(doc)
+            if len(batch) >= self.batch_size:
+                _insert_ignoring_duplicates(archive, batch)
+                moved_ids.extend(d['_id'] for d in batch)
+                batch = []
+        _insert_ignoring_duplicates(archive, batch)
+        moved_ids.extend(d['_id'] for d in batch)
+
+        self._summarize_month(source, dimensions, archive, start, end)
+        LedgerArchiveState._get_collection().find_one_and_update(
+            {'source': source},
+            {'$max': {'archived_until': end}, '$set': {'updated_at': datetime.utcnow()}},
+            upsert=True, return_document=ReturnDocument.AFTER,
+        )
+        if not prune:
+            return len(moved_ids)
+        for i in range(0, len(moved_ids), self.batch_size):
+            live.delete_many({'_id': {'$in': moved_ids[i:i + self.batch_size]}})
+        return len(moved_ids)
+
+    def _summarize_month(self, source: str, dimensions: Tuple[str, ...], archive, start: datetime, end: datetime):
+        """Recompute the month's per-user summaries from the archived rows (idempotent)"""
+        group_id = {'user_id': '$user_id'}
+        group_id.update({dim: f'${dim}' for dim in dimensions})
+        rows = archive.aggregate([
+            {'$match': {'created_at': {'$gte': start, '$lt': end}}},
+            {'$group': {
+                '_id': group_id,
+                'count': {'$sum': 1},
+                'amount_total': {'$sum': {'$toDecimal': '$amount'}},
+                'first_at': {'$min': '$created_at'},
+                'last_at': {'$max': '$created_at'},
+            }},
+        ])
+        now = datetime.utcnow()
+        operations = []
+        for row in rows:
+            key = row['_id']
+            group = {dim: key.get(dim) for dim in dimensions}
+            operations.append(UpdateOne(
+                {'source': source, 'user_id': key['user_id'], 'month': start, 'group': group},
+                {'$set': {'count': row['count'], 'amount_total': row['amount_total'] or Decimal('0'),
+                          'first_at': row['first_at'], 'last_at': row['last_at'], 'updated_at': now}},
+                upsert=True,
+            ))
+            if len(operations) >= self.batch_size:
+                LedgerMonthlySummary._get_collection().bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            LedgerMonthlySummary._get_collection().bulk_write(operations, ordered=False)
+
+    def restore(self, since: Optional[datetime] = None, source: Optional[str] = None) -> Dict[str, int]:
+        """Move archived months from `since` on (default: all) back to the live collection"""
+        restored = {}
+        for name in ([source] if source else ARCHIVE_SOURCES):
+            live, archive = self.live_collection(name), self.archive_collection(name)
+            archived_filter = {'created_at': {'$gte': month_start(since)}} if since else {}
+            batch, count = [], 0
+            for doc in archive.find(archived_filter, batch_size=self.batch_size):
+                batch.append(doc)
+                if len(batch) >= self.batch_size:
+                    _insert_ignoring_duplicates(live, batch)
+                    count += len(batch)
+                    batch = []
+            _insert_ignoring_duplicates(live, batch)
+            count += len(batch)
+
+            # Only lower the watermark once the rows are live again
+            watermark = self.watermark(name)
+            new_watermark = month_start(since) if since else None
+            if watermark and (new_watermark is None or new_watermark < watermark):
+                LedgerArchiveState._get_collection().update_one(
+                    {'source': name}, {'$set': {'archived_until': new_watermark, 'updated_at': datetime.utcnow()}}
+                )
+            summary_filter = {'source': name}
+            if since:
+                summary_filter['month'] = {'$gte': month_start(since)}
+            LedgerMonthlySummary._get_collection().delete_many(summary_filter)
+            archive.delete_many(archived_filter)
+            restored[name] = count
+        return restored
+
+    # ------------------------------------------------------------------ reads
+
+    def totals(self, source: str, user_id, start: Optional[datetime] = None, end: Optional[datetime] = None,
+               match: Optional[Dict[str, Any]] = None,
+               group_by: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Count and amount of a user's rows per `group_by` dimensions across both tiers.
+
+        `match` filters on summary dimensions (e.g. {'type': 'credit'}); group_by
+        defaults to all dimensions of the source. Returns one dict per group with
+        the dimension values plus "count" and "amount" (Decimal).
+        """
+        _, dimensions = self._source(source)
+        match = match or {}
+        group_by = tuple(group_by) if group_by is not None else dimensions
+        unknown = (set(match) | set(group_by)) - set(dimensions)
+        if unknown:
+            raise ValueError(f"Unsupported dimension(s) for {source}: {', '.join(sorted(unknown))}")
+
+        watermark = self.watermark(source)
+        merged: Dict[Tuple, Dict[str, Any]] = {}
+
+        def add(key_values: Dict[str, Any], count: int, amount):
+            key = tuple(key_values.get(dim) for dim in group_by)
+            entry = merged.setdefault(key, dict(zip(group_by, key), count=0, amount=Decimal('0')))
+            entry['count'] += count
+            entry['amount'] += _decimal(amount)
+
+        if watermark and (start is None or start < watermark):
+            month_range = {'$lt': watermark if end is None else min(watermark, end)}
+            if start:
+                month_range['$gte'] = month_start(start)
+            summary_match = {'source': source, 'user_id': user_id, 'month': month_range}
+            summary_match.update({f'group.{dim}': value for dim, value in match.items()})
+            for row in LedgerMonthlySummary._get_collection().aggregate([
+                {'$match': summary_match},
+                {'$group': {'_id': {dim: f'$group.{dim}' for dim in group_by},
+                            'count': {'$sum': '$count'}, 'amount': {'$sum': {'$toDecimal': '$amount_total'}}}},
+            ]):
+                add(row['_id'], row['count'], row['amount'])
+
+        if end is None or watermark is None or end > watermark:
+            hot_match: Dict[str, Any] = {'user_id': user_id}
+            hot_match.update(match)
+            created_range = {}
+            lower = max(start, watermark) if (start and watermark) else (start or watermark)
+            if lower:
+                created_range['$gte'] = lower
+            if end:
+                created_range['$lt'] = end
+            if created_range:
+                hot_match['created_at'] = created_range
+            for row in self.live_collection(source).aggregate([
+                {'$match': hot_match},
+                {'$group': {'_id': {dim: f'${dim}' for dim in group_by},
+                            'count': {'$sum': 1}, 'amount': {'$sum': {'$toDecimal': '$amount'}}}},
+            ]):
+                add(row['_id'], row['count'], row['amount'])
+
+        return list(merged.values())
+
+    def tiers(self, source: str, query: Dict[str, Any]) -> List[Tuple[Any, Dict[str, Any]]]:
+        """
+        (collection, filter) pairs that together match every row of `query` exactly once,
+        oldest tier first: archived rows before the watermark, live rows from it on.
+        """
+        watermark = self.watermark(source)
+        live = self.live_collection(source)
+        if not watermark:
+            return [(live, query)]
+        archived = {'created_at': {'$lt': watermark}}
+        hot = {'created_at': {'$not': {'$lt': watermark}}}
+        return [
+            (self._archive(source), {'$and': [query, archived]} if query else archived),
+            (live, {'$and': [query, hot]} if query else hot),
+        ]
+
+    def paginate(self, source: str, queryset, limit: Optional[int] = None, cursor: Optional[str] = None,
+                 page: Optional[int] = None, include_total: bool = False) -> KeysetPage:
+        """
+        core.pagination.paginate (newest first) over a live queryset, continued into the
+        archive tier once the hot rows run out. Archived rows come back as documents of
+        the queryset's class, and cursors work across the boundary.
+        """
+        watermark = self.watermark(source)
+        if not watermark:
+            return paginate(queryset, limit, cursor=cursor, page=page, include_total=include_total)
+
+        limit = clamp_limit(limit)
+        live = queryset.filter(__raw__={'created_at': {'$not': {'$lt': watermark}}})
+        archive = self._archive(source)
+        archived_query = {'$and': [queryset._query, {'created_at': {'$lt': watermark}}]}
+        total = count_cache.count(live) + archive.count_documents(archived_query) if include_total else None
+
+        ordered = live.order_by('-created_at', '-id')
+        archive_skip = 0
+        if cursor:
+            after = keyset_filter(cursor)
+            ordered = ordered.filter(__raw__=after)
+            archived_query['$and'].append(after)
+            page = None
+        else:
+            page = max(1, int(page or 1))
+            offset = (page - 1) * limit
+            if offset:
+                ordered = ordered.skip(offset)
+
+        rows = list(ordered.limit(limit + 1))
+        if len(rows) <= limit:
+            if not rows and not cursor and page > 1:
+                archive_skip = max(0, (page - 1) * limit - live.count())
+            document_cls = queryset._document
+            rows += [document_cls._from_son(doc) for doc in archive.find(
+                archived_query, sort=[('created_at', -1), ('_id', -1)],
+                skip=archive_skip, limit=limit + 1 - len(rows),
+            )]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+        return KeysetPage(rows, limit, next_cursor=next_cursor, page=page, total=total)
+
+
+def _parse_month(value: str) -> datetime:
+    return datetime.strptime(value, '%Y-%m')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive old wallet_ledger / income_event months")
+    sub = parser.add_subparsers(dest='command', required=True)
+    archive = sub.add_parser('archive', help="Move months before --before into the archive tier")
+    archive.add_argument('--before', type=_parse_month, help="First month to keep live (YYYY-MM)")
+    archive.add_argument('--hot-months', type=int, default=HOT_MONTHS)
+    archive.add_argument('--dry-run', action='store_true')
+    archive.add_argument('--prune', action='store_true',
+                         help="Also delete the archived months from the live collections (only once every "
+                              "reader of those months is tier-aware)")
+    restore = sub.add_parser('restore', help="Move archived months back to the live collections")
+    restore.add_argument('--since', type=_parse_month, help="First month to restore (YYYY-MM); default all")
+    for command in (archive, restore):
+        command.add_argument('--source', choices=sorted(ARCHIVE_SOURCES))
+        command.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    from core.db import connect_to_db
+    connect_to_db()
+
+    if args.command == 'archive':
+        service = LedgerArchiveService(batch_size=args.batch_size, hot_months=args.hot_months)
+        report = service.archive_before(args.before, source=args.source, dry_run=args.dry_run,
+                                        prune=args.prune)
+    else:
+        report = LedgerArchiveService(batch_size=args.batch_size).restore(args.since, source=args.source)
+    for name, result in report.items():
+        print(f"[LEDGER_ARCHIVE] {name}: {result}")
+
+
+if __name__ == '__main__':
+    main()
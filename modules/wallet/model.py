@@ -1,4 +1,4 @@
-from mongoengine import Document, StringField, ObjectIdField, DecimalField, DateTimeField, IntField, BooleanField
+from mongoengine import Document, StringField, ObjectIdField, DecimalField, DateTimeField, IntField, BooleanField, LongField, DictField, Decimal128Field
 from datetime import datetime
 from decimal import Decimal
 
@@ -34,11 +34,45 @@ class ReserveLedger(Document):
     source = StringField(choices=['tree_upline_reserve', 'income', 'manual', 'transfer', 'auto_activation', 'middle_3_earnings', 'auto_upgrade'], required=True)
     balance_after = DecimalField(precision=8, default=0)  # Optional for auto upgrade
     tx_hash = StringField()  # Optional for auto upgrade
+    # Entry number within the ReserveAccount (ReserveAccountService journal); unset on older rows
+    seq = IntField()
+    claim = BooleanField(default=False)  # The debit that spent the slot's auto upgrade threshold
     created_at = DateTimeField(default=datetime.utcnow)
     
     meta = {
         'collection': 'reserve_ledger',
-        'indexes': [('user_id', 'program'), 'tx_hash', ('program', 'slot_no'), ('user_id', 'program', 'slot_no')]
+        'indexes': [
+            ('user_id', 'program'), 'tx_hash', ('program', 'slot_no'), ('user_id', 'program', 'slot_no'),
+            {'fields': ['user_id', 'program', 'slot_no', 'seq'], 'unique': True,
+             'partialFilterExpression': {'seq': {'$exists': True}}},
+        ]
+    }
+
+class ReserveAccount(Document):
+    """Running reserve balance per (user, program, slot); ReserveLedger rows are its journal"""
+    user_id = ObjectIdField(required=True)
+    program = StringField(choices=['binary', 'matrix', 'global'], required=True)
+    slot_no = IntField(required=True)
+
+    # Amounts in 1e-8 units (DecimalField precision) so concurrent $inc stays exact
+    balance_units = LongField(default=0)
+    credited_units = LongField(default=0)
+    debited_units = LongField(default=0)
+    entries = IntField(default=0)
+
+    # Set by the single credit/claim that spends the balance on this slot's auto upgrade
+    auto_upgraded = BooleanField(default=False)
+    auto_upgraded_at = DateTimeField()
+
+    created_at = DateTimeField(default=datetime.utcnow)
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'reserve_account',
+        'indexes': [
+            {'fields': ['user_id', 'program', 'slot_no'], 'unique': True},
+            ('program', 'slot_no'),
+        ]
     }
 
 class WalletLedger(Document):
@@ -57,6 +91,39 @@ class WalletLedger(Document):
         'indexes': [
             ('user_id', 'created_at'), 
             ('user_id', 'type'),  # For earning statistics aggregation
-            'tx_hash'
+            'tx_hash',
+            # Keyset order of the streaming exports (export_service.py)
+            ('user_id', 'created_at', '_id'),
+            ('created_at', '_id')
+        ]
+    }
+
+class LedgerMonthlySummary(Document):
+    """Per-user monthly totals of wallet_ledger / income_event rows moved to the archive"""
+    source = StringField(choices=['wallet_ledger', 'income_event'], required=True)
+    user_id = ObjectIdField(required=True)
+    month = DateTimeField(required=True)  # First instant of the month (UTC)
+    group = DictField(required=True)  # e.g. {'currency': 'BNB', 'type': 'credit', 'reason': 'binary_joining_commission'}
+    count = IntField(default=0)
+    amount_total = Decimal128Field(default=0)
+    first_at = DateTimeField()
+    last_at = DateTimeField()
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'ledger_monthly_summary',
+        'indexes': [
+            {'fields': ['source', 'user_id', 'month', 'group'], 'unique': True},
+            ('source', 'month'),
         ]
     }
+
+class LedgerArchiveState(Document):
+    """Archive watermark: rows of `source` created before archived_until live in the archive"""
+    source = StringField(choices=['wallet_ledger', 'income_event'], required=True, unique=True)
+    archived_until = DateTimeField()
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'ledger_archive_state'
+    }
@@ -0,0 +1,317 @@
+"""
+Reserve Account Service
+Running reserve balances per (user, program, slot).
+
+Every reserve movement goes through here. The ReserveLedger row is journaled
+first under the account's next entry number (unique per account), then the
+ReserveAccount balance is moved with one $inc conditional on that entry number,
+so a crash between the two writes is rolled forward by the next writer instead
+of drifting the balance. Balance checks read the account document (O(1)) instead
+of summing ledger rows.
+
+Auto upgrades spend a reserve through try_claim(): the debit is journaled only
+while the balance covers the slot cost and the account has not been claimed yet,
+and entry numbers serialize writers, so exactly one caller wins even when several
+credits cross the threshold at the same time.
+
+Usage (reconcile accounts against the ledger):
+    python -m modules.wallet.reserve_account_service [--program binary] [--fix]
+"""
+
+import argparse
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Any, Optional, Tuple
+
+from bson import ObjectId
+from mongoengine.errors import NotUniqueError
+from pymongo.errors import DuplicateKeyError
+
+from .model import ReserveAccount, ReserveLedger
+
+UNITS_PER_AMOUNT = Decimal(10 ** 8)
+AMOUNT_QUANTUM = Decimal('0.00000001')
+# Renumbering retries when concurrent writers race for an account's next entry
+JOURNAL_MAX_ATTEMPTS = 50
+
+
+def to_units(amount) -> int:
+    """Decimal amount -> integer 1e-8 units"""
+    return int((Decimal(str(amount or 0)) * UNITS_PER_AMOUNT).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def from_units(units: int) -> Decimal:
+    """Integer 1e-8 units -> Decimal amount"""
+    return (Decimal(int(units or 0)) / UNITS_PER_AMOUNT).quantize(AMOUNT_QUANTUM)
+
+
+class ReserveAccountService:
+    """Atomic reserve balances with ReserveLedger journaling"""
+
+    @staticmethod
+    def _key(user_id, program: str, slot_no: int) -> Dict[str, Any]:
+        return {'user_id': ObjectId(str(user_id)), 'program': program, 'slot_no': int(slot_no)}
+
+    def _collection(self):
+        return ReserveAccount._get_collection()
+
+    def _ledger_totals(self, key: Dict[str, Any]) -> Tuple[int, int, int]:
+        """(credited, debited, rows) for one account from its ledger rows"""
+        credited = debited = rows = 0
+        for row in ReserveLedger.objects(**key).only('amount', 'direction').as_pymongo():
+            units = to_units(row.get('amount'))
+            if row.get('direction') == 'debit':
+                debited += units
+            else:
+                credited += units
+            rows += 1
+        return credited, debited, rows
+
+    def _ensure_account(self, key: Dict[str, Any]) -> Dict[str, Any]:
+        """Fetch the account, opening it from existing ledger rows the first time it is used"""
+        account = self._collection().find_one(key)
+        if account:
+            return account
+        credited, debited, rows = self._ledger_totals(key)
+        now = datetime.utcnow()
+        try:
+            self._collection().update_one(key, {'$setOnInsert': {
+                'balance_units': credited - debited, 'credited_units': credited, 'debited_units': debited,
+                'entries': rows, 'auto_upgraded': False, 'created_at': now, 'updated_at': now,
+            }}, upsert=True)
+        except DuplicateKeyError:
+            pass  # Opened concurrently by another writer
+        return self._collection().find_one(key)
+
+    def get_account(self, user_id, program: str, slot_no: int) -> Dict[str, Any]:
+        return self._ensure_account(self._key(user_id, program, slot_no))
+
+    def get_balance(self, user_id, program: str, slot_no: int) -> Decimal:
+        """Current reserve balance for (user, program, slot)"""
+        return from_units(self.get_account(user_id, program, slot_no).get('balance_units'))
+
+    def get_open_balances(self, user_ids, program: str) -> Dict[Tuple[ObjectId, int], Decimal]:
+        """
+        Positive balances not yet spent on an auto upgrade, keyed by (user_id, slot_no),
+        for many users at once. Ledger keys without an account are opened first.
+        """
+        user_ids = [ObjectId(str(u)) for u in user_ids]
+        if not user_ids:
+            return {}
+        match = {'user_id': {'$in': user_ids}, 'program': program}
+        opened = {(a['user_id'], a['slot_no']) for a in self._collection().find(match, {'user_id': 1, 'slot_no': 1})}
+        legacy = ReserveLedger._get_collection().aggregate([
+            {'$match': match},
+            {'$group': {'_id': {'user_id': '$user_id', 'slot_no': '$slot_no'}}},
+        ])
+        for row in legacy:
+            if (row['_id']['user_id'], row['_id']['slot_no']) not in opened:
+                self._ensure_account(self._key(row['_id']['user_id'], program, row['_id']['slot_no']))
+
+        accounts = self._collection().find(
+            dict(match, balance_units={'$gt': 0}, auto_upgraded={'$ne': True}),
+            {'user_id': 1, 'slot_no': 1, 'balance_units': 1},
+        )
+        return {(a['user_id'], a['slot_no']): from_units(a['balance_units']) for a in accounts}
+
+    def _journal(self, key: Dict[str, Any], direction: str, units: int, source: str, tx_hash: Optional[str],
+                 created_at: Optional[datetime], claim: bool = False) -> Optional[Tuple[int, Decimal]]:
+        """
+        Journal one movement, then apply it to the account.
+
+        The ReserveLedger row is written first, numbered seq = entries + 1 of the
+        account it was computed from; the unique (account, seq) index lets only one
+        writer hold each entry number. The account $inc is then conditional on
+        entries == seq - 1, so a row is applied exactly once: if its writer stops
+        between the two writes, the next writer for the account finds the row on
+        that seq and applies it (_roll_forward) before journaling its own.
+
+        Returns (units moved, balance after), or None for a claim the balance does
+        not cover (or a slot already upgraded).
+        """
+        created_at = created_at or datetime.utcnow()
+        for _ in range(JOURNAL_MAX_ATTEMPTS):
+            account = self._ensure_account(key)
+            if claim and (account.get('balance_units', 0) < units or account.get('auto_upgraded')):
+                return None
+            seq = account.get('entries', 0) + 1
+            signed = units if direction == 'credit' else -units
+            balance_after = from_units(account.get('balance_units', 0) + signed)
+            entry = ReserveLedger(
+                user_id=key['user_id'], program=key['program'], slot_no=key['slot_no'], amount=from_units(units),
+                direction=direction, source=source, balance_after=balance_after, tx_hash=tx_hash,
+                seq=seq, claim=claim, created_at=created_at
+            )
+            # Reject bad rows before anything is written
+            entry.validate()
+            try:
+                entry.save(force_insert=True)
+            except NotUniqueError:
+                # Another writer holds this entry number; make sure it is applied, then renumber
+                self._roll_forward(key, seq)
+                continue
+            self._apply(key, seq, direction, units, claim)
+            return units, balance_after
+        raise RuntimeError(f"Could not journal reserve {direction} for {key} after {JOURNAL_MAX_ATTEMPTS} attempts")
+
+    def _apply(self, key: Dict[str, Any], seq: int, direction: str, units: int, claim: bool = False) -> bool:
+        """Apply journal entry `seq` to the account unless it already is; True when this call applied it"""
+        now = datetime.utcnow()
+        update = {
+            '$inc': {
+                'balance_units': units if direction == 'credit' else -units,
+                'credited_units' if direction == 'credit' else 'debited_units': units,
+                'entries': 1,
+            },
+            '$set': {'updated_at': now},
+        }
+        if claim:
+            update['$set'].update({'auto_upgraded': True, 'auto_upgraded_at': now})
+        return self._collection().update_one(dict(key, entries=seq - 1), update).modified_count == 1
+
+    def _roll_forward(self, key: Dict[str, Any], seq: int) -> bool:
+        """Apply the journal row numbered `seq` if its writer stopped before updating the account"""
+        row = ReserveLedger._get_collection().find_one(dict(key, seq=seq), {'amount': 1, 'direction': 1, 'claim': 1})
+        if not row:
+            return False
+        return self._apply(key, seq, row.get('direction'), to_units(row.get('amount')), bool(row.get('claim')))
+
+    def _post(self, direction: str, user_id, program: str, slot_no: int, amount, source: str,
+              tx_hash: Optional[str] = None, created_at: Optional[datetime] = None) -> Decimal:
+        _, balance_after = self._journal(self._key(user_id, program, slot_no), direction, to_units(amount),
+                                         source, tx_hash, created_at)
+        return balance_after
+
+    def credit(self, user_id, program: str, slot_no: int, amount, source: str,
+               tx_hash: Optional[str] = None, created_at: Optional[datetime] = None) -> Decimal:
+        """Add to the reserve; returns the balance after this credit"""
+        return self._post('credit', user_id, program, slot_no, amount, source, tx_hash, created_at)
+
+    def debit(self, user_id, program: str, slot_no: int, amount, source: str,
+              tx_hash: Optional[str] = None, created_at: Optional[datetime] = None) -> Decimal:
+        """Take from the reserve; returns the balance after this debit"""
+        return self._post('debit', user_id, program, slot_no, amount, source, tx_hash, created_at)
+
+    def try_claim(self, user_id, program: str, slot_no: int, cost, source: str = 'auto_upgrade',
+                  tx_hash: Optional[str] = None) -> Optional[Dict[str, Decimal]]:
+        """
+        Atomically spend `cost` from the reserve for the slot's auto upgrade.
+        Returns {"balance_before", "balance_after"} for the single winning caller,
+        None when the balance is short or the upgrade was already claimed.
+        """
+        cost_units = to_units(cost)
+        if cost_units <= 0:
+            return None
+        journaled = self._journal(self._key(user_id, program, slot_no), 'debit', cost_units, source, tx_hash,
+                                  None, claim=True)
+        if not journaled:
+            return None
+        _, balance_after = journaled
+        return {"balance_before": balance_after + from_units(cost_units), "balance_after": balance_after}
+
+    def release_claim(self, user_id, program: str, slot_no: int, cost, source: str = 'auto_upgrade',
+                      tx_hash: Optional[str] = None) -> Decimal:
+        """Undo a claim whose activation failed: refund the cost and re-arm the threshold"""
+        balance = self.credit(user_id, program, slot_no, cost, source, tx_hash)
+        self._collection().update_one(self._key(user_id, program, slot_no),
+                                      {'$set': {'auto_upgraded': False, 'auto_upgraded_at': None}})
+        return balance
+
+    def mark_upgraded(self, user_id, program: str, slot_no: int):
+        """Record that the slot is already active so the threshold never fires for it"""
+        key = self._key(user_id, program, slot_no)
+        self._ensure_account(key)
+        self._collection().update_one(key, {'$set': {'auto_upgraded': True, 'updated_at': datetime.utcnow()}})
+
+    def reconcile(self, user_id=None, program: Optional[str] = None, fix: bool = False) -> Dict[str, Any]:
+        """
+        Compare every account with the sum of its ledger rows.
+        Reports mismatched accounts, ledger keys without an account and accounts
+        without ledger rows; with fix=True the accounts are reset to the ledger totals.
+        """
+        try:
+            match: Dict[str, Any] = {}
+            if user_id:
+                match['user_id'] = ObjectId(str(user_id))
+            if program:
+                match['program'] = program
+
+            ledger: Dict[Tuple, Dict[str, int]] = {}
+            for row in ReserveLedger.objects(**match).only('user_id', 'program', 'slot_no', 'amount', 'direction').as_pymongo():
+                k = (row['user_id'], row['program'], row['slot_no'])
+                totals = ledger.setdefault(k, {'credited': 0, 'debited': 0, 'entries': 0})
+                totals['debited' if row.get('direction') == 'debit' else 'credited'] += to_units(row.get('amount'))
+                totals['entries'] += 1
+
+            accounts = {
+                (a['user_id'], a['program'], a['slot_no']): a
+                for a in self._collection().find(match)
+            }
+
+            mismatched, missing, orphaned = [], [], []
+            for k in sorted(set(ledger) | set(accounts), key=lambda x: (str(x[0]), x[1], x[2])):
+                expected = ledger.get(k, {'credited': 0, 'debited': 0, 'entries': 0})
+                account = accounts.get(k)
+                expected_balance = expected['credited'] - expected['debited']
+                row = {
+                    "user_id": str(k[0]), "program": k[1], "slot_no": k[2],
+                    "ledger_balance": float(from_units(expected_balance)),
+                }
+                if account is None:
+                    missing.append(row)
+                elif k not in ledger and account.get('balance_units', 0) != 0:
+                    orphaned.append(dict(row, account_balance=float(from_units(account.get('balance_units')))))
+                elif account.get('balance_units', 0) != expected_balance:
+                    mismatched.append(dict(row, account_balance=float(from_units(account.get('balance_units')))))
+                else:
+                    continue
+
+                if fix:
+                    self._collection().update_one(
+                        {'user_id': k[0], 'program': k[1], 'slot_no': k[2]},
+                        {
+                            '$set': {
+                                'balance_units': expected_balance, 'credited_units': expected['credited'],
+                                'debited_units': expected['debited'], 'entries': expected['entries'],
+                                'updated_at': datetime.utcnow(),
+                            },
+                            '$setOnInsert': {'auto_upgraded': False, 'created_at': datetime.utcnow()},
+                        },
+                        upsert=True,
+                    )
+
+            return {
+                "success": True,
+                "checked": len(set(ledger) | set(accounts)),
+                "mismatched": mismatched,
+                "missing_accounts": missing,
+                "orphaned_accounts": orphaned,
+                "fixed": (len(mismatched) + len(missing) + len(orphaned)) if fix else 0,
+            }
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify reserve accounts against the reserve ledger")
+    parser.add_argument('--user-id')
+    parser.add_argument('--program', choices=['binary', 'matrix', 'global'])
+    parser.add_argument('--fix', action='store_true', help="Reset drifted accounts to the ledger totals")
+    args = parser.parse_args()
+
+    from core.db import connect_to_db
+    connect_to_db()
+    result = ReserveAccountService().reconcile(args.user_id, args.program, fix=args.fix)
+    if not result.get("success"):
+        print(f"[RESERVE_RECONCILE] Error: {result.get('error')}")
+        return
+    print(
+        f"[RESERVE_RECONCILE] checked={result['checked']} mismatched={len(result['mismatched'])} "
+        f"missing={len(result['missing_accounts'])} orphaned={len(result['orphaned_accounts'])} fixed={result['fixed']}"
+    )
+    for row in result['mismatched'] + result['missing_accounts'] + result['orphaned_accounts']:
+        print(f"  {row}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
+from datetime import datetime
 
 from auth.service import authentication_service
 from utils.response import success_response, error_response
 from .service import WalletService
+from .export_service import LedgerExportService, EXPORT_FORMATS
 from ..newcomer_support.service import NewcomerSupportService
 from ..mentorship.service import MentorshipService
 from ..spark.service import SparkService
@@ -171,6 +174,8 @@ async def get_duel_tree_earnings(
     currency: str = 'BNB', 
     page: int = 1, 
     limit: int = 50,
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    include_total: bool = Query(True, description="Include the (cached) total count"),
     current_user: dict = Depends(authentication_service.verify_authentication)
 ):
     try:
@@ -186,7 +191,8 @@ async def get_duel_tree_earnings(
             raise HTTPException(status_code=401, detail="User ID not found in authentication")
         
         service = WalletService()
-        result = service.get_duel_tree_earnings(user_id=user_id, currency=currency, page=page, limit=limit)
+        result = service.get_duel_tree_earnings(user_id=user_id, currency=currency, page=page, limit=limit,
+                                                cursor=cursor, include_total=include_total)
         if result.get("success"):
             return success_response(result["data"], "Duel tree earnings fetched successfully")
         else:
@@ -202,6 +208,8 @@ async def get_binary_partner_incentive(
     currency: str = 'BNB', 
     page: int = 1, 
     limit: int = 50,
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    include_total: bool = Query(True, description="Include the (cached) total count"),
     current_user: dict = Depends(authentication_service.verify_authentication)
 ):
     try:
@@ -217,7 +225,8 @@ async def get_binary_partner_incentive(
             raise HTTPException(status_code=401, detail="User ID not found in authentication")
         
         service = WalletService()
-        result = service.get_binary_partner_incentive(user_id=user_id, currency=currency, page=page, limit=limit)
+        result = service.get_binary_partner_incentive(user_id=user_id, currency=currency, page=page, limit=limit,
+                                                      cursor=cursor, include_total=include_total)
         if result.get("success"):
             return success_response(result["data"], "Binary partner incentive fetched successfully")
         else:
@@ -365,6 +374,9 @@ async def get_phase_1_income(
     currency: str = Query("USDT", description="Currency type"),
     page: int = Query(1, description="Page number"),
     limit: int = Query(10, description="Items per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of a slot's previous page"),
+    slot_no: Optional[int] = Query(None, description="Only this slot (use with cursor)"),
+    include_total: bool = Query(True, description="Include the (cached) total count"),
     current_user: dict = Depends(authentication_service.verify_authentication)
 ):
     """Get Global Program Phase-1 income data for authenticated user"""
@@ -381,7 +393,8 @@ async def get_phase_1_income(
             raise HTTPException(status_code=401, detail="User ID not found in authentication")
         
         service = WalletService()
-        result = service.get_phase_1_income(user_id=user_id, currency=currency, page=page, limit=limit)
+        result = service.get_phase_1_income(user_id=user_id, currency=currency, page=page, limit=limit,
+                                            cursor=cursor, slot_no=slot_no, include_total=include_total)
 
         if result["success"]:
             return success_response(result["data"], "Phase-1 income data fetched successfully")
@@ -525,74 +538,13 @@ async def get_leadership_stipend_income(
         from decimal import Decimal
 
         ls = LeadershipStipend.objects(user_id=ObjectId(user_id)).first()
-        
-        # If LeadershipStipend doesn't exist, create it with initialized tiers
+        service = LeadershipStipendService()
+        # Read-only view: a missing record or missing tiers are filled in memory. The record is
+        # created and kept current on slot activation (join_leadership_stipend_program / check_eligibility).
         if not ls:
-            try:
-                from modules.leadership_stipend.router import _initialize_leadership_stipend_tiers
-                from datetime import datetime
-                ls = LeadershipStipend(
-                    user_id=ObjectId(user_id),
-                    joined_at=datetime.utcnow(),
-                    is_active=True,
-                    tiers=_initialize_leadership_stipend_tiers()
-                )
-                ls.save()
-                print(f"✅ Auto-created Leadership Stipend record for user {user_id} with {len(ls.tiers)} tiers")
-            except Exception as e:
-                print(f"Error creating Leadership Stipend record for user {user_id}: {e}")
-                import traceback
-                traceback.print_exc()
-        
-        # If LeadershipStipend exists but tiers are empty, initialize them
-        if ls:
-            # Check if tiers need initialization (None, empty list, or length 0)
-            tiers_needs_init = False
-            try:
-                if ls.tiers is None:
-                    tiers_needs_init = True
-                    print(f"⚠️ User {user_id} has None tiers")
-                elif not hasattr(ls.tiers, '__len__'):
-                    tiers_needs_init = True
-                    print(f"⚠️ User {user_id} tiers has no len attribute")
-                elif len(ls.tiers) == 0:
-                    tiers_needs_init = True
-                    print(f"⚠️ User {user_id} has empty tiers list")
-            except Exception as e:
-                tiers_needs_init = True
-                print(f"⚠️ Error checking tiers for user {user_id}: {e}")
-            
-            if tiers_needs_init:
-                try:
-                    from modules.leadership_stipend.router import _initialize_leadership_stipend_tiers
-                    ls.tiers = _initialize_leadership_stipend_tiers()
-                    ls.save()
-                    # Force reload to ensure tiers are persisted
-                    ls.reload()
-                    # Verify tiers were saved
-                    if ls.tiers and len(ls.tiers) > 0:
-                        print(f"✅ Auto-initialized Leadership Stipend tiers for user {user_id}, count: {len(ls.tiers)}")
-                    else:
-                        print(f"⚠️ Tiers still empty after save for user {user_id}, attempting manual reload...")
-                        # Try fetching fresh from DB
-                        ls = LeadershipStipend.objects(user_id=ObjectId(user_id)).first()
-                        if ls and ls.tiers and len(ls.tiers) > 0:
-                            print(f"✅ Tiers found after manual reload: {len(ls.tiers)}")
-                except Exception as e:
-                    print(f"Error initializing tiers for user {user_id}: {e}")
-                    import traceback
-                    traceback.print_exc()
-            else:
-                print(f"✅ User {user_id} already has {len(ls.tiers) if ls.tiers else 0} tiers")
-            
-            try:
-                service = LeadershipStipendService()
-                ls = service._ensure_all_tiers(ls)
-                service.check_eligibility(user_id, force_check=True)
-                ls = LeadershipStipend.objects(user_id=ObjectId(user_id)).first() or ls
-            except Exception:
-                pass
-        
+            ls = LeadershipStipend(user_id=ObjectId(user_id), is_active=True, tiers=[])
+        ls = service._ensure_all_tiers(ls, persist=False)
+
         # Preload payments first and compute per-slot totals
         from modules.leadership_stipend.model import LeadershipStipendPayment as _LSP
         pay_q = {"user_id": ObjectId(user_id)}
@@ -634,55 +586,20 @@ async def get_leadership_stipend_income(
             global_slot_paid[gp.slot_number] = global_slot_paid.get(gp.slot_number, 0.0) + amt
 
         # Get total Leadership Stipend fund amounts from BonusFund (calculate before checking ls)
-        from modules.income.bonus_fund import BonusFund
+        from modules.income.bonus_fund_counter import bonus_fund_counter
         total_global_bnb = 0.0
         total_global_usdt = 0.0
         
         # Get BNB fund (from binary program)
-        bnb_fund = BonusFund.objects(fund_type='leadership_stipend', program='binary').first()
-        if bnb_fund:
-            total_global_bnb = float(bnb_fund.current_balance or 0.0)
+        total_global_bnb = float(bonus_fund_counter.balance('leadership_stipend', 'binary'))
         
         # Get USDT fund (from matrix program)
-        usdt_fund = BonusFund.objects(fund_type='leadership_stipend', program='matrix').first()
-        if usdt_fund:
-            total_global_usdt = float(usdt_fund.current_balance or 0.0)
-        
-        if not ls:
-            # If user not in stipend yet, still return payments summary with global totals
-            return success_response({
-                "user_id": user_id,
-                "summary": {
-                    "current_tier": 0,
-                    "current_tier_name": "",
-                    "current_daily_return": 0,
-                    "is_eligible": False,
-                    "is_active": False,
-                    "total_earned": 0,
-                    "total_paid": 0,
-                    "pending_amount": 0,
-                    "total_global_bnb": total_global_bnb,  # Total Leadership Stipend fund in BNB
-                    "total_global_usdt": total_global_usdt,  # Total Leadership Stipend fund in USDT
-                },
-                "tiers": [],
-                "payments": payments,
-            }, "Leadership Stipend income fetched")
+        total_global_usdt = float(bonus_fund_counter.balance('leadership_stipend', 'matrix'))
         
         # Build tier summaries
         tiers = []
         day_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
         
-        # Ensure ls exists and has tiers before iterating
-        if not ls:
-            # This shouldn't happen if auto-create worked, but handle gracefully
-            print(f"⚠️ Warning: ls is None for user {user_id} after initialization attempt")
-        elif not ls.tiers or len(ls.tiers) == 0:
-            print(f"⚠️ Warning: User {user_id} has LeadershipStipend but tiers are still empty after initialization")
-            # Try one more time to fetch from DB
-            ls = LeadershipStipend.objects(user_id=ObjectId(user_id)).first()
-            if ls and ls.tiers and len(ls.tiers) > 0:
-                print(f"✅ Tiers found after final DB fetch: {len(ls.tiers)}")
-        
         distribution_percentages = {
             10: 0.30,
             11: 0.20,
@@ -707,8 +624,7 @@ async def get_leadership_stipend_income(
             except Exception:
                 continue
 
-        tiers_to_iterate = ls.tiers if ls and ls.tiers else []
-        for t in tiers_to_iterate:
+        for t in ls.tiers:
             if t.slot_number < 10 or t.slot_number > 17:
                 continue
             if slot and t.slot_number != int(slot):
@@ -821,6 +737,8 @@ async def get_user_miss_profit_history(
     currency: str = Query("USDT", description="Currency type (USDT, BNB)"),
     page: int = Query(1, description="Page number"),
     limit: int = Query(50, description="Items per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    include_total: bool = Query(True, description="Include the (cached) total count"),
     current_user: dict = Depends(_auth_dependency)
 ):
     """Get user's miss profit history with currency filtering"""
@@ -831,7 +749,8 @@ async def get_user_miss_profit_history(
             raise HTTPException(status_code=403, detail="Unauthorized to view this user's miss profit history")
 
         service = WalletService()
-        result = service.get_user_miss_profit_history(user_id, currency, page, limit)
+        result = service.get_user_miss_profit_history(user_id, currency, page, limit,
+                                                      cursor=cursor, include_total=include_total)
 
         if result["success"]:
             return success_response(result["data"], "User miss profit history fetched successfully")
@@ -844,3 +763,59 @@ async def get_user_miss_profit_history(
         return error_response(str(e))
 
 
+EXPORT_ROLES = ("admin", "finance")
+
+
+@router.get("/export/{dataset}")
+async def export_history(
+    dataset: str,
+    format: str = Query("csv", description="csv or ndjson"),
+    user_id: Optional[str] = Query(None, description="Limit to one user (admin/finance may omit)"),
+    start: Optional[datetime] = Query(None, description="created_at >= start"),
+    end: Optional[datetime] = Query(None, description="created_at < end"),
+    after: Optional[str] = Query(None, description="Resume after this row cursor"),
+    max_rows: Optional[int] = Query(None, ge=1, description="Stop after this many rows"),
+    batch_size: int = Query(1000, ge=100, le=10000),
+    currency: Optional[str] = None,
+    program: Optional[str] = None,
+    income_type: Optional[str] = None,
+    current_user: dict = Depends(_auth_dependency)
+):
+    """Stream wallet_ledger, income_event or missed_profit rows as CSV / NDJSON.
+
+    Rows come in (created_at, _id) order with a `cursor` column; pass the last cursor
+    received as `after` to continue an interrupted or max_rows-limited export.
+    """
+    try:
+        requester_id = _extract_requester_id(current_user)
+        requester_role = current_user.get("role") if isinstance(current_user, dict) else None
+        if requester_role not in EXPORT_ROLES:
+            if requester_id and user_id and requester_id != user_id:
+                raise HTTPException(status_code=403, detail="Unauthorized to export this user's history")
+            user_id = user_id or requester_id
+            if not user_id:
+                raise HTTPException(status_code=403, detail="Exports of all users require an admin or finance role")
+
+        if format not in EXPORT_FORMATS:
+            raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+        filters = {"currency": currency, "program": program, "income_type": income_type}
+        if dataset == 'missed_profit':
+            filters["program_type"] = filters.pop("program")
+        options = dict(user_id=user_id, start=start, end=end, after=after, **filters)
+
+        service = LedgerExportService(batch_size=batch_size)
+        try:
+            service.build_filter(dataset, **options)  # validate before the response starts
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        filename = f"{dataset}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{format}"
+        return StreamingResponse(
+            service.stream(dataset, format, max_rows=max_rows, **options),
+            media_type=EXPORT_FORMATS[format],
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        return error_response(str(e))
@@ -2,9 +2,12 @@ from decimal import Decimal
 from datetime import datetime
 from bson import ObjectId
 from .model import UserWallet, WalletLedger, ReserveLedger
+from .ledger_archive_service import LedgerArchiveService
 from ..slot.model import SlotActivation
 import re
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from core.pagination import paginate
 
 
 class WalletService:
@@ -166,18 +169,17 @@ class WalletService:
         }
 
     def reconcile_main_from_ledger(self, user_id: str) -> dict:
-        """Rebuild main wallet balances per currency from wallet ledger (credits - debits)."""
-        entries = WalletLedger.objects(user_id=ObjectId(user_id)).only('amount', 'currency', 'type')
+        """Rebuild main wallet balances per currency from wallet ledger (credits - debits), archived months included."""
+        rows = LedgerArchiveService().totals('wallet_ledger', ObjectId(user_id), group_by=('currency', 'type'))
         totals = {"USDT": Decimal('0'), "BNB": Decimal('0')}
-        for e in entries:
-            curr = (str(getattr(e, 'currency', '')).upper() or 'USDT')
+        for row in rows:
+            curr = (str(row['currency'] or '').upper() or 'USDT')
             if curr not in totals:
                 continue
-            amt = Decimal(str(getattr(e, 'amount', 0) or 0))
-            if getattr(e, 'type', '') == 'credit':
-                totals[curr] += amt
-            elif getattr(e, 'type', '') == 'debit':
-                totals[curr] -= amt
+            if row['type'] == 'credit':
+                totals[curr] += row['amount']
+            elif row['type'] == 'debit':
+                totals[curr] -= row['amount']
 
         # Upsert UserWallet for each currency under wallet_type 'main'
         for curr, total in totals.items():
@@ -233,19 +235,18 @@ class WalletService:
             
             query_start = time.time()
             
-            # Fetch ALL credit entries for this user in ONE query (faster than multiple regex queries)
-            all_credits = WalletLedger.objects(
-                user_id=user_oid,
-                type='credit'
-            ).only('amount', 'currency', 'reason')
+            # Credit totals per (currency, reason): archived monthly summaries + hot ledger rows
+            credit_totals = LedgerArchiveService().totals(
+                'wallet_ledger', user_oid, match={'type': 'credit'}, group_by=('currency', 'reason')
+            )
             
-            print(f"Fetched {all_credits.count()} credit entries")
+            print(f"Fetched {sum(row['count'] for row in credit_totals)} credit entries")
             
-            # Calculate earnings in Python (faster than MongoDB regex)
-            for entry in all_credits:
-                reason = str(entry.reason or '').lower()
-                currency = str(entry.currency or 'USDT').upper()
-                amount = Decimal(str(entry.amount or 0))
+            # Categorize the (few) reason groups in Python (faster than MongoDB regex)
+            for row in credit_totals:
+                reason = str(row['reason'] or '').lower()
+                currency = str(row['currency'] or 'USDT').upper()
+                amount = Decimal(str(row['amount'] or 0))
                 
                 # Ensure currency key exists
                 if currency not in binary_earnings:
@@ -269,45 +270,10 @@ class WalletService:
             # Get highest activated slots - optimized with only() to fetch minimal data
             slot_start = time.time()
             
-            # Binary slot (from SlotActivation)
-            binary_slot_data = SlotActivation.objects(
-                user_id=user_oid, program='binary', status='completed'
-            ).only('slot_no', 'slot_name', 'activated_at', 'created_at').order_by('-slot_no').first()
-            
-            binary_slot = {}
-            if binary_slot_data:
-                binary_slot = {
-                    "slot_no": binary_slot_data.slot_no,
-                    "slot_name": binary_slot_data.slot_name,
-                    "activated_at": binary_slot_data.activated_at or binary_slot_data.created_at
-                }
-            
-            # Matrix slot (from MatrixActivation)
-            from ..matrix.model import MatrixActivation
-            matrix_slot_data = MatrixActivation.objects(
-                user_id=user_oid, status='completed'
-            ).only('slot_no', 'slot_name', 'activated_at', 'completed_at').order_by('-slot_no').first()
-            
-            matrix_slot = {}
-            if matrix_slot_data:
-                matrix_slot = {
-                    "slot_no": matrix_slot_data.slot_no,
-                    "slot_name": matrix_slot_data.slot_name,
-                    "activated_at": matrix_slot_data.activated_at or matrix_slot_data.completed_at
-                }
-            
-            # Global slot (from SlotActivation)
-            global_slot_data = SlotActivation.objects(
-                user_id=user_oid, program='global', status='completed'
-            ).only('slot_no', 'slot_name', 'activated_at', 'created_at').order_by('-slot_no').first()
-            
-            global_slot = {}
-            if global_slot_data:
-                global_slot = {
-                    "slot_no": global_slot_data.slot_no,
-                    "slot_name": global_slot_data.slot_name,
-                    "activated_at": global_slot_data.activated_at or global_slot_data.created_at
-                }
+            # Highest slot per program from the denormalized UserMaxSlot rows
+            binary_slot = self._get_highest_activated_slot(user_oid, 'binary')
+            matrix_slot = self._get_highest_matrix_slot(user_oid)
+            global_slot = self._get_highest_activated_slot(user_oid, 'global')
             
             slot_end = time.time()
             print(f"Slot queries time: {slot_end - slot_start:.3f}s")
@@ -356,44 +322,19 @@ class WalletService:
             return {"success": False, "error": str(e)}
     
     def _get_highest_activated_slot(self, user_oid: ObjectId, program: str) -> Dict[str, Any]:
-        """Get the highest activated slot for binary/global programs (uses SlotActivation)"""
+        """Get the highest activated slot for binary/global programs (UserMaxSlot)"""
         try:
-            slot_activation = SlotActivation.objects(
-                user_id=user_oid,
-                program=program,
-                status='completed'
-            ).order_by('-slot_no').first()
-            
-            if slot_activation:
-                return {
-                    "slot_no": slot_activation.slot_no,
-                    "slot_name": slot_activation.slot_name,
-                    "activated_at": slot_activation.activated_at or slot_activation.created_at
-                }
-            return {}
+            from ..slot.max_slot_service import MaxSlotService
+            return MaxSlotService().get_max_slot(user_oid, program)
         except Exception as e:
             print(f"Error getting highest slot for {program}: {e}")
             return {}
     
     def _get_highest_matrix_slot(self, user_oid: ObjectId) -> Dict[str, Any]:
-        """Get the highest activated slot for matrix program (uses MatrixActivation)"""
+        """Get the highest activated slot for matrix program (UserMaxSlot; covers SlotActivation and MatrixActivation)"""
         try:
-            # Import here to avoid circular dependency
-            from ..matrix.model import MatrixActivation
-            
-            # Matrix uses MatrixActivation collection
-            matrix_activation = MatrixActivation.objects(
-                user_id=user_oid,
-                status='completed'
-            ).order_by('-slot_no').first()
-            
-            if matrix_activation:
-                return {
-                    "slot_no": matrix_activation.slot_no,
-                    "slot_name": matrix_activation.slot_name,
-                    "activated_at": matrix_activation.activated_at or matrix_activation.completed_at
-                }
-            return {}
+            from ..slot.max_slot_service import MaxSlotService
+            return MaxSlotService().get_max_slot(user_oid, 'matrix')
         except Exception as e:
             print(f"Error getting highest matrix slot: {e}")
             return {}
@@ -722,7 +663,8 @@ class WalletService:
         except Exception as e:
             return {"success": False, "error": str(e)}
 
-    def get_duel_tree_earnings(self, user_id: str, currency: str = "BNB", page: int = 1, limit: int = 50) -> Dict[str, Any]:
+    def get_duel_tree_earnings(self, user_id: str, currency: str = "BNB", page: int = 1, limit: int = 50,
+                               cursor: Optional[str] = None, include_total: bool = True) -> Dict[str, Any]:
         """
         Return a paginated list of Duel Tree earnings for a specific user.
         
@@ -735,6 +677,8 @@ class WalletService:
         Previously this endpoint only included reason == "binary_slot1_full".
         Sorted by earning time (desc).
         Columns: uid, time, upline uid, partner count, rank, amount, reason.
+        Pass the returned next_cursor as `cursor` for the following page (keyset);
+        page/limit still works for older clients.
         """
         try:
             from ..user.model import User, PartnerGraph
@@ -757,17 +701,11 @@ class WalletService:
                 Q(reason__startswith="binary_upgrade_")
             )
             query = base_filter & reason_filter
-            
-            # Count total entries
-            total = WalletLedger.objects(query).count()
-            
-            # Paginate
-            page = max(1, int(page or 1))
-            limit = max(1, min(100, int(limit or 50)))
-            skip = (page - 1) * limit
-            
-            # Get paginated entries, sorted by created_at desc
-            entries = WalletLedger.objects(query).order_by('-created_at').skip(skip).limit(limit)
+
+            # Newest first, keyset-paged on (created_at, _id)
+            result_page = LedgerArchiveService().paginate('wallet_ledger', WalletLedger.objects(query), limit,
+                                                          cursor=cursor, page=page, include_total=include_total)
+            entries = result_page.items
 
             # Get user info
             user = User.objects(id=user_oid).first()
@@ -878,16 +816,19 @@ class WalletService:
             return {
                 "success": True,
                 "data": {
-                    "page": page,
-                    "limit": limit,
-                    "total": total,
+                    "page": result_page.page,
+                    "limit": result_page.limit,
+                    "total": result_page.total,
+                    "next_cursor": result_page.next_cursor,
+                    "has_more": result_page.has_more,
                     "items": rows
                 }
             }
         except Exception as e:
             return {"success": False, "error": str(e)}
 
-    def get_binary_partner_incentive(self, user_id: str, currency: str = "BNB", page: int = 1, limit: int = 50) -> Dict[str, Any]:
+    def get_binary_partner_incentive(self, user_id: str, currency: str = "BNB", page: int = 1, limit: int = 50,
+                                     cursor: Optional[str] = None, include_total: bool = True) -> Dict[str, Any]:
         """
         Return a paginated list of Binary Partner Incentive earnings for a specific user.
         
@@ -896,6 +837,7 @@ class WalletService:
         - These payouts are recorded in `WalletLedger` with reason == "binary_level_payout"
         
         Columns: uid (receiver), upline_uid, amount, time, reason, tx_hash.
+        Keyset-paged like get_duel_tree_earnings (cursor / next_cursor).
         """
         try:
             from ..user.model import User
@@ -913,17 +855,11 @@ class WalletService:
             base_filter = Q(user_id=user_oid) & Q(type="credit") & Q(currency=currency.upper())
             reason_filter = Q(reason="binary_level_payout")
             query = base_filter & reason_filter
-            
-            # Count total entries
-            total = WalletLedger.objects(query).count()
-            
-            # Pagination
-            page = max(1, int(page or 1))
-            limit = max(1, min(100, int(limit or 50)))
-            skip = (page - 1) * limit
-            
-            # Get paginated entries, sorted by created_at desc
-            entries = WalletLedger.objects(query).order_by('-created_at').skip(skip).limit(limit)
+
+            # Newest first, keyset-paged on (created_at, _id)
+            result_page = LedgerArchiveService().paginate('wallet_ledger', WalletLedger.objects(query), limit,
+                                                          cursor=cursor, page=page, include_total=include_total)
+            entries = result_page.items
 
 			# Build user lookup for all ledger entries (receiver)
             def _normalize_object_id(value):
@@ -1073,9 +1009,11 @@ class WalletService:
             return {
                 "success": True,
                 "data": {
-                    "page": page,
-                    "limit": limit,
-                    "total": total,
+                    "page": result_page.page,
+                    "limit": result_page.limit,
+                    "total": result_page.total,
+                    "next_cursor": result_page.next_cursor,
+                    "has_more": result_page.has_more,
                     "items": rows
                 }
             }
@@ -1383,11 +1321,9 @@ class WalletService:
             # Get total Newcomer Growth Support fund amount from BonusFund
             total_global_usdt = 0.0
             try:
-                from ..income.bonus_fund import BonusFund
+                from ..income.bonus_fund_counter import bonus_fund_counter
                 # Get USDT fund (from matrix program - newcomer support is part of matrix)
-                usdt_fund = BonusFund.objects(fund_type='newcomer_support', program='matrix').first()
-                if usdt_fund:
-                    total_global_usdt = float(usdt_fund.current_balance or 0.0)
+                total_global_usdt = float(bonus_fund_counter.balance('newcomer_support', 'matrix'))
             except Exception as e:
                 print(f"Error fetching newcomer support fund: {e}")
 
@@ -1483,9 +1419,20 @@ class WalletService:
         except Exception as e:
             return {"success": False, "error": str(e)}
 
-    def get_phase_1_income(self, user_id: str, currency: str = "USDT", page: int = 1, limit: int = 10) -> Dict[str, Any]:
-        """Get Global Program Phase-1 income data for a specific user, grouped by slot"""
+    def get_phase_1_income(self, user_id: str, currency: str = "USDT", page: int = 1, limit: int = 10,
+                           cursor: Optional[str] = None, slot_no: Optional[int] = None,
+                           include_total: bool = True) -> Dict[str, Any]:
+        """
+        Get Global Program Phase-1 income data for a specific user, grouped by slot.
+
+        Each slot is keyset-paged on its own; continue one slot by passing its
+        next_cursor as `cursor` together with its `slot_no`. A cursor without
+        slot_no is rejected, since it belongs to a single slot's history.
+        """
         try:
+            if cursor and slot_no is None:
+                return {"success": False, "error": "cursor requires slot_no (each slot is paged separately)"}
+
             from ..user.model import User
             from ..tree.model import TreePlacement
             from bson import ObjectId
@@ -1508,6 +1455,8 @@ class WalletService:
                 phase='PHASE-1',
                 is_active=True
             ).order_by('slot_no')
+            if slot_no is not None:
+                user_placements = user_placements.filter(slot_no=slot_no)
             
             # Build slot-wise income data
             slots_data = []
@@ -1521,15 +1470,12 @@ class WalletService:
                     type="credit",
                     currency=currency.upper(),
                     reason__regex=f"^global_phase_1.*slot_{slot_no}"
-                ).order_by('-created_at')
-                
-                total_entries = phase_1_entries.count()
+                )
                 
-                # Pagination for this slot
-                page = max(1, int(page or 1))
-                limit = max(1, min(100, int(limit or 50)))
-                skip = (page - 1) * limit
-                page_entries = phase_1_entries.skip(skip).limit(limit)
+                # Newest first, keyset-paged on (created_at, _id)
+                slot_page = LedgerArchiveService().paginate('wallet_ledger', phase_1_entries, limit, cursor=cursor,
+                                                            page=page, include_total=include_total)
+                page_entries = slot_page.items
                 
                 # Get upline info
                 ref = getattr(user, 'refered_by', None)
@@ -1557,9 +1503,11 @@ class WalletService:
                 
                 slots_data.append({
                     "slot_no": slot_no,
-                    "total_records": total_entries,
-                    "page": page,
-                    "limit": limit,
+                    "total_records": slot_page.total,
+                    "page": slot_page.page,
+                    "limit": slot_page.limit,
+                    "next_cursor": slot_page.next_cursor,
+                    "has_more": slot_page.has_more,
                     "items": items
                 })
             
@@ -1736,8 +1684,9 @@ class WalletService:
             
         except Exception as e:
             return {"success": False, "error": str(e)}
-    def get_user_miss_profit_history(self, user_id: str, currency: str = "USDT", page: int = 1, limit: int = 50) -> Dict[str, Any]:
-        """Get user's miss profit history with currency filtering"""
+    def get_user_miss_profit_history(self, user_id: str, currency: str = "USDT", page: int = 1, limit: int = 50,
+                                     cursor: Optional[str] = None, include_total: bool = True) -> Dict[str, Any]:
+        """Get user's miss profit history with currency filtering (keyset-paged, newest first)"""
         try:
             from ..missed_profit.model import MissedProfit
             from ..user.model import User
@@ -1755,9 +1704,8 @@ class WalletService:
                 currency=currency,
                 is_active=True
             )
-            missed_profits = currency_queryset.order_by('-created_at')
-            
-            total_entries = missed_profits.count()
+            result_page = paginate(currency_queryset, limit, cursor=cursor, page=page, include_total=include_total)
+            total_entries = result_page.total
             currency_total_amount = float(currency_queryset.sum('missed_profit_amount') or 0.0)
             currency_undistributed_count = currency_queryset.filter(is_distributed=False).count()
             currency_recovery_pending = currency_queryset.filter(recovery_status="pending").count()
@@ -1768,12 +1716,7 @@ class WalletService:
                 "USDT": float(MissedProfit.objects(user_id=user_oid, currency='USDT', is_active=True).sum('missed_profit_amount') or 0.0)
             }
             
-            # Pagination
-            page = max(1, int(page or 1))
-            limit = max(1, min(100, int(limit or 50)))
-            start = (page - 1) * limit
-            end = start + limit
-            page_entries = missed_profits[start:end]
+            page_entries = result_page.items
             
             # Pre-fetch all users (missed user + source partner) to optimize performance
             user_ids = set()
@@ -1789,6 +1732,8 @@ class WalletService:
             }
             
             # Format data for frontend (matching the screenshot structure)
+            from ..slot.max_slot_service import MaxSlotService
+            max_slots = None
             items = []
             for i, entry in enumerate(page_entries):
                 # Format date exactly like image (DD Mon YYYY (HH:MM))
@@ -1819,30 +1764,15 @@ class WalletService:
                 # - Rank number = min(active_binary_slot, active_matrix_slot)
                 rank_number = 0
                 try:
-                    from modules.slot.model import SlotActivation
-                    from modules.matrix.model import MatrixActivation
-                    # Fetch highest active slots
-                    binary_max = 0
-                    matrix_max = 0
                     if missed_user:
                         # Check joined flags if available; fallback to activations
                         binary_joined = getattr(missed_user, 'binary_joined', False)
                         matrix_joined = getattr(missed_user, 'matrix_joined', False)
-                        # Highest binary slot
-                        b_act = SlotActivation.objects(
-                            user_id=entry.user_id,
-                            program='binary',
-                            status='completed'
-                        ).order_by('-slot_no').first()
-                        if b_act:
-                            binary_max = int(getattr(b_act, 'slot_no', 0) or 0)
-                        # Highest matrix slot
-                        m_act = MatrixActivation.objects(
-                            user_id=entry.user_id,
-                            status='completed'
-                        ).order_by('-slot_no').first()
-                        if m_act:
-                            matrix_max = int(getattr(m_act, 'slot_no', 0) or 0)
+                        # Highest active slots (all entries belong to user_oid, read once)
+                        if max_slots is None:
+                            max_slots = MaxSlotService().get_max_slots(user_oid)
+                        binary_max = max_slots['binary']
+                        matrix_max = max_slots['matrix']
                         if binary_joined and matrix_joined and binary_max > 0 and matrix_max > 0:
                             rank_number = min(binary_max, matrix_max)
                         else:
@@ -1878,9 +1808,11 @@ class WalletService:
             return {
                 "success": True,
                 "data": {
-                    "page": page,
-                    "limit": limit,
+                    "page": result_page.page,
+                    "limit": result_page.limit,
                     "total": total_entries,
+                    "next_cursor": result_page.next_cursor,
+                    "has_more": result_page.has_more,
                     "currency": currency,
                     "items": items,
                     "summary": {
@@ -1906,28 +1838,22 @@ class WalletService:
     def get_global_miss_profit_summary(self) -> Dict[str, Any]:
         """Aggregate missed profit totals across all users by currency."""
         try:
-            from ..missed_profit.model import MissedProfit
-            base_queryset = MissedProfit.objects(is_active=True)
-            totals: Dict[str, Dict[str, float | int]] = {}
-            for currency in ['BNB', 'USDT']:
-                qs = base_queryset.filter(currency=currency)
-                totals[currency] = {
-                    "amount": float(qs.sum('missed_profit_amount') or 0.0),
-                    "count": qs.count(),
-                    "undistributed_count": qs.filter(is_distributed=False).count(),
-                    "recovery_pending_count": qs.filter(recovery_status='pending').count()
+            from ..missed_profit.service import aggregate_missed_profit_totals
+            totals = aggregate_missed_profit_totals({'is_active': True})
+
+            def _summary(bucket: Dict[str, Any]) -> Dict[str, float | int]:
+                return {
+                    "amount": float(bucket["amount"]),
+                    "count": bucket["count"],
+                    "undistributed_count": bucket["undistributed_count"],
+                    "recovery_pending_count": bucket["recovery_pending_count"]
                 }
-            overall = {
-                "amount": float(base_queryset.sum('missed_profit_amount') or 0.0),
-                "count": base_queryset.count(),
-                "undistributed_count": base_queryset.filter(is_distributed=False).count(),
-                "recovery_pending_count": base_queryset.filter(recovery_status='pending').count()
-            }
+
             return {
                 "success": True,
                 "data": {
-                    "totals": totals,
-                    "overall": overall
+                    "totals": {currency: _summary(totals['currency'][currency]) for currency in ['BNB', 'USDT']},
+                    "overall": _summary(totals['overall'])
                 }
             }
         except Exception as e:
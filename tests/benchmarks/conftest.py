@@ -0,0 +1,77 @@
+"""
+Fixtures for the end-to-end benchmark suite.
+
+Benchmarks run against a real local mongod (never the configured cluster):
+    BENCH_MONGO_URI      default mongodb://localhost:27017/bitgpt_bench
+    BENCH_NETWORK_SIZE   10k (default), 100k, 1m or an explicit user count
+    BENCH_SEED           generator seed, default 42
+The suite is skipped when the mongod is not reachable. Every benchmark starts
+from the same generated network: the working database is restored from its
+snapshot before each test.
+"""
+
+import os
+from urllib.parse import urlparse
+
+import pytest
+from mongoengine import connect, disconnect
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from tests.benchmarks.network_generator import (
+    DEFAULT_URI, NETWORK_SIZES, load_network, restore_network, ensure_model_indexes,
+)
+
+LOCAL_HOSTS = {'localhost', '127.0.0.1', '::1'}
+
+
+def _bench_uri() -> str:
+    uri = os.getenv('BENCH_MONGO_URI', DEFAULT_URI)
+    if urlparse(uri).hostname not in LOCAL_HOSTS:
+        pytest.skip(f"Refusing to benchmark against non-local MongoDB: {uri}")
+    return uri
+
+
+def _network_size() -> int:
+    value = os.getenv('BENCH_NETWORK_SIZE', '10k').lower()
+    return NETWORK_SIZES.get(value) or int(value)
+
+
+@pytest.fixture(scope='session')
+def bench_network():
+    """Load (or reuse) the synthetic network snapshot and point mongoengine at the working copy."""
+    uri = _bench_uri()
+    try:
+        MongoClient(uri, serverSelectionTimeoutMS=1000).admin.command('ping')
+    except PyMongoError as e:
+        pytest.skip(f"Local mongod not available at {uri}: {e}")
+
+    summary = load_network(uri, _network_size(), int(os.getenv('BENCH_SEED', '42')))
+    disconnect()
+    connect(host=uri)
+    ensure_model_indexes()
+    yield dict(summary, uri=uri)
+    disconnect()
+    try:
+        from core.config import MONGO_URI
+        connect(host=MONGO_URI)
+    except Exception:
+        pass
+
+
+@pytest.fixture
+def fresh_network(bench_network):
+    """Undo the previous benchmark's writes, so each test measures the generated tree."""
+    restore_seconds = restore_network(bench_network['uri'])
+    return dict(bench_network, restore_seconds=restore_seconds)
+
+
+@pytest.fixture
+def record_network(benchmark, fresh_network):
+    """Tag every benchmark result with the network it ran against (shows up in the saved JSON)."""
+    benchmark.extra_info.update({
+        'network_size': fresh_network['size'],
+        'seed': fresh_network['seed'],
+        'generator_version': fresh_network['version'],
+        'restore_seconds': round(fresh_network['restore_seconds'], 2),
+    })
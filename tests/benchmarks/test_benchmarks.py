@@ -0,0 +1,187 @@
+"""
+End-to-end service benchmarks on a synthetic network (see network_generator.py).
+
+Run against a local mongod and save a baseline:
+    BENCH_NETWORK_SIZE=100k python -m pytest tests/benchmarks -m performance \
+        --benchmark-json=tests/benchmarks/baselines/100k.json
+Compare a later run with that baseline:
+    python -m pytest tests/benchmarks --benchmark-compare=tests/benchmarks/baselines/100k.json
+"""
+
+import contextlib
+import io
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import pytest
+from bson import ObjectId
+
+import modules.matrix  # noqa: F401  (loads matrix before dream_matrix to avoid the import cycle)
+from modules.user.service import UserService, create_user_service
+from modules.binary.service import BinaryService
+from modules.fund_distribution.service import FundDistributionService
+from modules.auto_upgrade.service import AutoUpgradeService
+from modules.income.bonus_fund import BonusFund, BonusFundShard
+from modules.income.bonus_fund_counter import BonusFundCounter
+from modules.wallet.ledger_archive_service import LedgerArchiveService
+from modules.wallet.service import WalletService
+from modules.slot.model import SlotActivation
+from modules.user.model import User
+from tests.benchmarks.network_generator import BINARY_PRICES, ROOT_REFER_CODE
+
+pytestmark = [pytest.mark.performance, pytest.mark.slow, pytest.mark.usefixtures('record_network')]
+
+ROUNDS = 20
+_join_seq = itertools.count()
+
+
+def _quiet(fn, *args, **kwargs):
+    """Services print progress; keep it out of the timings' terminal output."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def _sample_user_ids(limit: int, skip: int = 1):
+    """Users spread across the network (skipping the root), in generation order."""
+    return [str(u.id) for u in User.objects(uid__ne='ROOT').only('id').order_by('created_at').skip(skip).limit(limit)]
+
+
+@pytest.fixture(scope='module')
+def root_id(bench_network):
+    return str(User.objects(refer_code=ROOT_REFER_CODE).only('id').first().id)
+
+
+def test_join(benchmark, bench_network):
+    sponsors = itertools.cycle([ROOT_REFER_CODE] + [u.refer_code for u in User.objects(uid__ne='ROOT').only('refer_code').limit(50)])
+
+    def setup():
+        n = next(_join_seq)
+        payload = {
+            'email': f"bench-join-{n}@example.com", 'name': f"Bench Join {n}", 'password': 'secret',
+            'refered_by': next(sponsors), 'wallet_address': f"0xbenchjoin{ObjectId()}",
+            'binary_payment_tx': f"bench-join-tx-{ObjectId()}",
+        }
+        return (create_user_service, payload), {}
+
+    result, error = benchmark.pedantic(_quiet, setup=setup, rounds=ROUNDS, iterations=1)
+    assert error is None, error
+
+
+def test_binary_upgrade(benchmark, bench_network):
+    # Users holding exactly slots 1-2: each round upgrades a different one to slot 3
+    upgraded = set(SlotActivation.objects(program='binary', slot_no=3).distinct('user_id')[:10000])
+    candidates = iter([
+        str(a.user_id) for a in SlotActivation.objects(program='binary', slot_no=2).only('user_id').limit(10000)
+        if a.user_id not in upgraded
+    ])
+
+    def setup():
+        return (BinaryService().upgrade_binary_slot, next(candidates), 3, f"bench-upgrade-{ObjectId()}",
+                Decimal(BINARY_PRICES[2])), {}
+
+    result = benchmark.pedantic(_quiet, setup=setup, rounds=ROUNDS, iterations=1)
+    assert result.get('success'), result
+
+
+def test_binary_fund_distribution(benchmark, bench_network):
+    users = itertools.cycle(_sample_user_ids(ROUNDS))
+
+    def setup():
+        user_id = next(users)
+        return (FundDistributionService().distribute_binary_funds, user_id, Decimal(BINARY_PRICES[3]), 4), {
+            'tx_hash': f"bench-dist-{ObjectId()}", 'currency': 'BNB',
+        }
+
+    result = benchmark.pedantic(_quiet, setup=setup, rounds=ROUNDS, iterations=1)
+    assert result.get('success'), result
+
+
+CONTENDED_WRITERS = 32
+INCREMENTS_PER_WRITER = 25
+
+
+def _single_document_increment(amount: Decimal):
+    """The pre-sharding update: read the one fund document, add, save"""
+    fund = BonusFund.objects(fund_type='royal_captain', program='global', status='active').first()
+    if not fund:
+        fund = BonusFund(fund_type='royal_captain', program='global')
+    fund.total_collected += amount
+    fund.current_balance += amount
+    fund.save()
+
+
+@pytest.mark.parametrize('mode', ['single_document', 'sharded'])
+def test_contended_fund_increments(benchmark, bench_network, mode):
+    """CONTENDED_WRITERS threads crediting one fund at once, as concurrent activations do."""
+    counter = BonusFundCounter()
+    amount = Decimal('0.01')
+    if mode == 'sharded':
+        def increment():
+            counter.add('royal_captain', 'global', collected=amount, balance=amount)
+    else:
+        def increment():
+            _single_document_increment(amount)
+
+    def setup():
+        BonusFund.objects(fund_type='royal_captain', program='global').delete()
+        BonusFundShard.objects(fund_type='royal_captain', program='global').delete()
+        return (), {}
+
+    def run():
+        with ThreadPoolExecutor(CONTENDED_WRITERS) as pool:
+            list(pool.map(lambda _: [increment() for _ in range(INCREMENTS_PER_WRITER)], range(CONTENDED_WRITERS)))
+
+    benchmark.pedantic(run, setup=setup, rounds=5, iterations=1)
+    expected = amount * CONTENDED_WRITERS * INCREMENTS_PER_WRITER
+    recorded = counter.balance('royal_captain', 'global')
+    benchmark.extra_info.update({'increments': CONTENDED_WRITERS * INCREMENTS_PER_WRITER,
+                                 'lost_amount': str(expected - recorded)})
+    if mode == 'sharded':
+        assert recorded == expected
+
+
+def test_cascade_auto_upgrade(benchmark, bench_network):
+    # Newest members have the longest upline chains
+    users = itertools.cycle([str(u.id) for u in User.objects().only('id').order_by('-created_at').limit(ROUNDS)])
+
+    def setup():
+        return (AutoUpgradeService().check_cascade_auto_upgrade_up_to_17_levels, next(users)), {}
+
+    result = benchmark.pedantic(_quiet, setup=setup, rounds=ROUNDS, iterations=1)
+    assert result is not None
+
+
+def test_my_community(benchmark, root_id):
+    result = benchmark.pedantic(_quiet, args=(UserService().get_my_community, root_id, 'binary', 1, 1, 50),
+                                rounds=ROUNDS, iterations=1)
+    assert result['success'], result
+
+
+def test_earning_statistics(benchmark, root_id):
+    result = benchmark.pedantic(_quiet, args=(WalletService().get_earning_statistics, root_id),
+                                rounds=ROUNDS, iterations=1)
+    assert result['success'], result
+
+
+@pytest.fixture
+def archived_ledger(bench_network):
+    """Archive every generated ledger month (all older than the hot window), restore afterwards."""
+    service = LedgerArchiveService(batch_size=10_000)
+    service.archive_before(source='wallet_ledger')
+    yield service
+    service.restore(source='wallet_ledger')
+
+
+def test_earning_statistics_archived(benchmark, root_id, archived_ledger):
+    """Same read as test_earning_statistics once the ledger months are compacted into summaries."""
+    benchmark.extra_info['archived_until'] = str(archived_ledger.watermark('wallet_ledger'))
+    result = benchmark.pedantic(_quiet, args=(WalletService().get_earning_statistics, root_id),
+                                rounds=ROUNDS, iterations=1)
+    assert result['success'], result
+
+
+def test_duel_tree_earnings(benchmark, root_id):
+    result = benchmark.pedantic(_quiet, args=(BinaryService().get_duel_tree_earnings, root_id),
+                                rounds=ROUNDS, iterations=1)
+    assert result['success'], result
@@ -0,0 +1,57 @@
+"""
+Unit tests for the synthetic network generator (network_generator.py).
+
+Checks the generated documents only (determinism per seed, tree arity and slot
+consistency, activations and ledgers); no database is involved, so these run in
+the default suite without a local mongod.
+"""
+
+import unittest
+from collections import Counter
+
+from tests.benchmarks.network_generator import NetworkGenerator
+
+
+class TestNetworkGenerator(unittest.TestCase):
+
+    SIZE = 500
+
+    def _docs(self, seed=42):
+        docs = {}
+        for collection, doc in NetworkGenerator(self.SIZE, seed).generate():
+            docs.setdefault(collection, []).append(doc)
+        return docs
+
+    def test_deterministic_for_seed(self):
+        self.assertEqual(self._docs(7), self._docs(7))
+        self.assertNotEqual(self._docs(7)['users'], self._docs(8)['users'])
+
+    def test_tree_shapes(self):
+        docs = self._docs()
+        self.assertEqual(len(docs['users']), self.SIZE)
+        arity = {'binary': 2, 'matrix': 3, 'global': 4}
+        children = Counter()
+        slots = {(p['user_id'], p['program'], p['slot_no']) for p in docs['tree_placement']}
+        for p in docs['tree_placement']:
+            if p['upline_id'] is None:
+                continue
+            key = (p['upline_id'], p['program'], p['slot_no'])
+            children[key] += 1
+            self.assertLessEqual(children[key], arity[p['program']])
+            # A slot placement only exists where the upline holds that slot too
+            self.assertIn(key, slots)
+        roots = [p for p in docs['tree_placement'] if p['upline_id'] is None]
+        self.assertEqual({p['user_id'] for p in roots}, {docs['users'][0]['_id']})
+
+    def test_activations_and_ledgers(self):
+        docs = self._docs()
+        tx_hashes = [a['tx_hash'] for a in docs['slot_activation']]
+        self.assertEqual(len(tx_hashes), len(set(tx_hashes)))
+        self.assertEqual(len(docs['user_wallets']), 2 * self.SIZE)
+        self.assertTrue(docs['income_event'] and docs['wallet_ledger'] and docs['reserve_ledger'])
+        self.assertEqual(len(docs['matrix_activations']),
+                         sum(1 for a in docs['slot_activation'] if a['program'] == 'matrix'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+"""
+Micro-benchmark of the Matrix placement kernel (modules/matrix/geometry.py).
+
+Fills empty trees through the occupancy bitmap until a million placements are made;
+no database is involved, so it runs without the synthetic network:
+    python -m pytest tests/benchmarks/test_placement_kernel.py -m performance
+"""
+
+import pytest
+
+from modules.matrix import geometry
+
+pytestmark = [pytest.mark.performance, pytest.mark.matrix]
+
+PLACEMENTS = 1_000_000
+
+
+def _fill_trees(placements: int) -> int:
+    next_free, bit = geometry.next_free_position, geometry.position_bit
+    placed = 0
+    while placed < placements:
+        mask = 0
+        while placed < placements and (free := next_free(mask)) is not None:
+            mask |= bit(*free)
+            placed += 1
+    return placed
+
+
+def test_million_placements(benchmark):
+    benchmark.extra_info['placements'] = PLACEMENTS
+    placed = benchmark.pedantic(_fill_trees, args=(PLACEMENTS,), rounds=3, iterations=1)
+    assert placed == PLACEMENTS
+
+
+def test_occupancy_mask_of_full_tree(benchmark):
+    nodes = [{'level': level, 'position': position, 'user_id': index}
+             for index, (level, position) in enumerate(geometry.WAVE_ORDER)]
+    assert benchmark(geometry.occupancy_mask, nodes) == geometry.FULL_MASK
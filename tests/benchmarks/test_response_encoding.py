@@ -0,0 +1,83 @@
+"""
+Micro-benchmark of API response encoding (utils/response.py).
+
+Compares the orjson fast path of create_response with the jsonable_encoder pass it replaced
+on payloads shaped like the largest responses (my-community page, nested tree, earnings
+list, leaderboard); no database is involved:
+    python -m pytest tests/benchmarks/test_response_encoding.py -m performance
+"""
+
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from utils.response import CUSTOM_ENCODERS, success_response
+
+pytestmark = [pytest.mark.performance]
+
+_START = datetime(2025, 1, 1)
+
+
+def _money(rng: random.Random) -> Decimal:
+    return Decimal(rng.randint(0, 10_000_000)) / Decimal(10_000)
+
+
+def _member(rng: random.Random, index: int) -> dict:
+    return {
+        "_id": ObjectId(), "uid": f"user{index}", "name": f"Member {index}", "refer_code": f"RC{index}",
+        "wallet_address": f"0x{rng.getrandbits(160):040x}", "joined_at": _START + timedelta(seconds=rng.randint(0, 10**7)),
+        "current_slot": rng.randint(1, 17), "total_earnings": _money(rng), "is_active": rng.random() < 0.9,
+        "programs": {"binary": True, "matrix": rng.random() < 0.6, "global": rng.random() < 0.3},
+    }
+
+
+def _tree(rng: random.Random, depth: int, index: int = 1) -> dict:
+    node = {"id": str(ObjectId()), "user_id": ObjectId(), "level": depth, "position": "left" if index % 2 else "right",
+            "slot_no": rng.randint(1, 17), "earnings": _money(rng), "placed_at": _START, "children": []}
+    if depth < 9:
+        node["children"] = [_tree(rng, depth + 1, 2 * index), _tree(rng, depth + 1, 2 * index + 1)]
+    return node
+
+
+def _payloads():
+    rng = random.Random(42)
+    return {
+        "my_community": {"members": [_member(rng, i) for i in range(500)], "total": 500, "page": 1},
+        "tree": _tree(rng, 1),
+        "earnings": [
+            {"_id": ObjectId(), "user_id": ObjectId(), "program": rng.choice(("binary", "matrix", "global")),
+             "slot_no": rng.randint(1, 17), "amount": _money(rng), "currency": "USDT", "tx_hash": f"0x{i:064x}",
+             "created_at": _START + timedelta(minutes=i)}
+            for i in range(1000)
+        ],
+        "leaderboard": [
+            {"rank": i + 1, "user_id": ObjectId(), "name": f"Leader {i}", "partners": rng.randint(0, 5000),
+             "team_volume": _money(rng), "earnings": {"binary": _money(rng), "matrix": _money(rng)}}
+            for i in range(200)
+        ],
+    }
+
+
+PAYLOADS = _payloads()
+
+
+def _jsonable_encoder_body(data) -> bytes:
+    """The create_response encoding before the fast path"""
+    content = {"status": "Ok", "message": "Ok", "data": data, "status_code": 200, "success": True}
+    return JSONResponse(content=jsonable_encoder(content, custom_encoder=CUSTOM_ENCODERS)).body
+
+
+@pytest.mark.parametrize("payload", sorted(PAYLOADS))
+def test_fast_path(benchmark, payload):
+    body = benchmark(lambda: success_response(data=PAYLOADS[payload]).body)
+    assert body == _jsonable_encoder_body(PAYLOADS[payload])
+
+
+@pytest.mark.parametrize("payload", sorted(PAYLOADS))
+def test_jsonable_encoder_path(benchmark, payload):
+    benchmark(_jsonable_encoder_body, PAYLOADS[payload])
@@ -0,0 +1,224 @@
+"""
+Tests for scheduled, resumable batch jobs (core/batch_jobs.py, modules/batch_job)
+
+Test Coverage:
+- Candidates are processed in chunks on a worker pool; the run stores counts, not results
+- Handler failures and exceptions are counted with a capped error sample
+- One live run per job; an abandoned run resumes after its last completed wave
+- Scheduling by interval, the batch_process_* / newcomer delegations and the /jobs status API
+- The /jobs API (listing, run status and starting a run) requires an admin
+"""
+
+import importlib
+import threading
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core.batch_jobs import BatchJob, BatchJobRunner, list_candidates, query_candidates
+from tests.mock_db import MockDBTestCase
+import modules.matrix  # noqa: F401  (loads matrix before dream_matrix to avoid the import cycle)
+from modules.batch_job import service as batch_job_service
+from modules.batch_job.model import BatchJobRun
+from modules.batch_job.router import router as batch_job_router
+from auth.service import authentication_service
+from modules.newcomer_growth_support.service import NewcomerGrowthSupportService
+from modules.user.model import User
+
+global_service = importlib.import_module('modules.global.service')
+
+
+def _insert_user(global_joined=True):
+    key = ObjectId()
+    return User._get_collection().insert_one({
+        'uid': f'u{key}', 'refer_code': f'r{key}', 'wallet_address': f'0x{key}', 'global_joined': global_joined,
+    }).inserted_id
+
+
+class TestBatchJobRunner(MockDBTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.seen = []
+        self.lock = threading.Lock()
+
+    def _handler(self, value):
+        with self.lock:
+            self.seen.append(value)
+        if value % 10 == 0:
+            raise ValueError(f"bad {value}")
+        if value % 7 == 0:
+            return {"success": False, "error": "not eligible"}
+        return {"success": True, "amount": "0.5"}
+
+    def _runner(self, values=range(1, 51), **job_kwargs):
+        job_kwargs.setdefault('chunk_size', 4)
+        job_kwargs.setdefault('concurrency', 3)
+        job = BatchJob('numbers', list_candidates(values), self._handler, sum_fields=('amount',), **job_kwargs)
+        return BatchJobRunner(BatchJobRun, [job], worker_id='worker-a', max_errors=3)
+
+    def test_chunks_run_in_parallel_and_store_counts(self):
+        result = self._runner().run('numbers')
+
+        self.assertTrue(result['success'])
+        self.assertEqual(sorted(self.seen), list(range(1, 51)))
+        run = result['run']
+        self.assertEqual(run['status'], 'completed')
+        self.assertEqual(run['total_checked'], 50)
+        self.assertEqual(run['failed_count'], 5 + 7)  # multiples of 10, multiples of 7
+        self.assertEqual(run['processed_count'], 38)
+        self.assertEqual(run['chunks_completed'], 13)
+        self.assertEqual(run['totals'], {'amount': 19.0})
+        self.assertEqual(len(run['errors']), 3)
+        self.assertNotIn('results', run)
+
+        stored = BatchJobRun.objects.get(id=run['run_id'])
+        self.assertEqual(stored.cursor, 50)
+        self.assertIsNone(stored.active_job)
+        self.assertIsNone(stored.lease_owner)
+
+    def test_one_live_run_per_job(self):
+        runner = self._runner()
+        self.assertIsNotNone(runner.start('numbers'))
+        self.assertIsNone(runner.start('numbers'))
+
+        result = runner.run('numbers')
+        self.assertFalse(result['success'])
+        self.assertIn('already running', result['error'])
+        self.assertEqual(self.seen, [])
+
+    def test_abandoned_run_resumes_after_cursor(self):
+        BatchJobRun._get_collection().insert_one({
+            'job_name': 'numbers', 'active_job': 'numbers', 'status': 'running', 'trigger': 'schedule',
+            'cursor': 40, 'processed_count': 30, 'failed_count': 10, 'total_checked': 40, 'pending_processed': 2,
+            'lease_owner': 'crashed:1', 'lease_expires_at': datetime.utcnow() - timedelta(seconds=1),
+            'created_at': datetime.utcnow(),
+        })
+
+        result = self._runner().run('numbers')
+
+        self.assertEqual(sorted(self.seen), list(range(41, 51)))
+        run = result['run']
+        self.assertEqual(run['status'], 'completed')
+        self.assertEqual(run['resumed_count'], 1)
+        self.assertEqual(run['total_checked'], 50)
+        self.assertEqual(run['processed_count'], 30 + 7)  # 42, 49 and 50 fail
+        self.assertEqual(BatchJobRun.objects.count(), 1)
+
+    def test_due_follows_interval_and_abandoned_runs(self):
+        runner = self._runner(interval_seconds=3600)
+        self.assertEqual(runner.due(), ['numbers'])
+        runner.run('numbers')
+        self.assertEqual(runner.due(), [])
+        self.assertEqual(runner.due(datetime.utcnow() + timedelta(hours=2)), ['numbers'])
+
+        token, run = runner.start('numbers')
+        BatchJobRun._get_collection().update_one(
+            {'_id': run['_id']}, {'$set': {'lease_expires_at': datetime.utcnow() - timedelta(seconds=1)}}
+        )
+        self.assertEqual(runner.due(), ['numbers'])
+
+    def test_query_candidates_pages_by_id(self):
+        ids = [_insert_user(flag) for flag in (True, False, True, True)]
+        fetch = query_candidates(User, {'global_joined': True})
+
+        first = fetch(None, 2)
+        self.assertEqual([key for key, _ in first], [ids[0], ids[2]])
+        self.assertEqual(fetch(first[-1][0], 2), [(ids[3], str(ids[3]))])
+
+
+class TestBatchJobIntegrations(MockDBTestCase):
+
+    def setUp(self):
+        super().setUp()
+        batch_job_service._runner = None
+
+    def tearDown(self):
+        batch_job_service._runner = None
+        super().tearDown()
+
+    def test_batch_process_returns_counts_only(self):
+        users = [_insert_user() for _ in range(5)]
+        _insert_user(global_joined=False)
+        outcome = {str(users[1]): {"success": False, "error": "Insufficient direct partners"}}
+
+        with patch.object(global_service.GlobalService, 'check_and_process_president_reward',
+                          side_effect=lambda self, user_id: outcome.get(user_id, {"success": True}),
+                          autospec=True):
+            result = global_service.GlobalService().batch_process_president_rewards()
+
+        self.assertTrue(result['success'])
+        self.assertEqual((result['processed_count'], result['failed_count'], result['total_checked']), (4, 1, 5))
+        self.assertNotIn('results', result)
+        self.assertEqual(BatchJobRun.objects.get(id=result['run_id']).job_name, 'global_president_rewards')
+
+    def test_newcomer_monthly_distribution_sums_totals(self):
+        from modules.income.model import IncomeEvent
+        uplines = [ObjectId(), ObjectId()]
+        for upline in uplines + uplines[:1]:
+            IncomeEvent._get_collection().insert_one({
+                'user_id': upline, 'income_type': 'newcomer_growth_upline_fund', 'status': 'pending_distribution',
+                'distribution_date': datetime.utcnow() - timedelta(days=1),
+            })
+
+        with patch.object(NewcomerGrowthSupportService, 'process_monthly_distribution',
+                          return_value={"success": True, "total_distributed": 12.5}) as process:
+            result = NewcomerGrowthSupportService().trigger_monthly_distribution_for_all()
+
+        self.assertEqual(sorted(call.args[0] for call in process.call_args_list), sorted(map(str, uplines)))
+        self.assertEqual(result['processed_uplines'], 2)
+        self.assertEqual(result['total_uplines_with_pending_funds'], 2)
+        self.assertEqual(str(result['total_distributed']), '25.0')
+
+    def test_job_names_follow_the_job_list(self):
+        self.assertEqual(batch_job_service.JOB_NAMES, tuple(job.name for job in batch_job_service.build_jobs()))
+        self.assertIn('slot_roster_rebuild', batch_job_service.JOB_NAMES)
+
+    def test_status_api(self):
+        app = FastAPI()
+        app.include_router(batch_job_router)
+        client = TestClient(app)
+        with patch.object(NewcomerGrowthSupportService, 'process_monthly_distribution'):
+            run_id = batch_job_service.run_job('newcomer_growth_monthly_distribution')['run_id']
+
+        self.assertEqual(client.get(f'/jobs/runs/{run_id}').status_code, 401)
+        self.assertEqual(client.get('/jobs/').status_code, 401)
+        current_user = {"_id": str(ObjectId()), "role": "user"}
+        app.dependency_overrides[authentication_service.verify_authentication] = lambda: current_user
+        self.assertEqual(client.get(f'/jobs/runs/{run_id}').status_code, 403)
+        self.assertEqual(client.get('/jobs/').status_code, 403)
+
+        current_user["role"] = "admin"
+        response = client.get(f'/jobs/runs/{run_id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['status'], 'completed')
+        self.assertEqual(client.get(f'/jobs/runs/{ObjectId()}').status_code, 404)
+
+        listed = client.get('/jobs/?job_name=newcomer_growth_monthly_distribution').json()['data']['runs']
+        self.assertEqual([r['run_id'] for r in listed], [run_id])
+
+    def test_run_endpoint_requires_an_admin(self):
+        app = FastAPI()
+        app.include_router(batch_job_router)
+        client = TestClient(app)
+        self.assertEqual(client.post('/jobs/newcomer_growth_monthly_distribution/run').status_code, 401)
+
+        current_user = {"_id": str(ObjectId()), "role": "user"}
+        app.dependency_overrides[authentication_service.verify_authentication] = lambda: current_user
+        with patch('modules.batch_job.router.start_job',
+                   return_value={"success": True, "run": {"run_id": "r1"}}) as start_job:
+            self.assertEqual(client.post('/jobs/newcomer_growth_monthly_distribution/run').status_code, 403)
+            start_job.assert_not_called()
+
+            current_user["role"] = "admin"
+            self.assertEqual(client.post('/jobs/unknown/run').status_code, 404)
+            self.assertEqual(client.post('/jobs/newcomer_growth_monthly_distribution/run').status_code, 202)
+        start_job.assert_called_once_with('newcomer_growth_monthly_distribution', trigger='api')
+
+
+if __name__ == '__main__':
+    unittest.main()
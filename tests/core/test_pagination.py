@@ -0,0 +1,176 @@
+"""
+Tests for keyset (cursor) pagination (core/pagination.py)
+
+Test Coverage:
+- Following next_cursor visits every row once, newest first, ties broken on _id
+- page/limit compatibility mode and has_more without a count
+- Optional totals served from the per-filter count cache
+- Cursor validation, in-memory id lists and the wallet / jackpot list endpoints
+- Per-slot cursors of the Phase-1 income history
+"""
+
+import unittest
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from bson import ObjectId
+
+from core.pagination import CountCache, decode_cursor, encode_cursor, paginate, paginate_ids
+from tests.mock_db import MockDBTestCase
+import modules.matrix  # noqa: F401  (loads matrix before dream_matrix to avoid the import cycle)
+from modules.jackpot.model import JackpotUserEntry
+from modules.jackpot.service import JackpotService
+from modules.missed_profit.model import MissedProfit
+from modules.tree.model import TreePlacement
+from modules.user.model import User
+from modules.wallet.model import WalletLedger
+from modules.wallet.service import WalletService
+
+
+class TestKeysetPagination(MockDBTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user_id = ObjectId()
+        self.base = datetime(2026, 1, 1)
+        # Pairs of rows share a timestamp so the cursor has to break ties on _id
+        self.rows = []
+        for i in range(7):
+            row = WalletLedger(user_id=self.user_id, amount=Decimal(i + 1), type='credit', reason='bonus',
+                               balance_after=Decimal(i + 1), tx_hash=f'tx-{i}',
+                               created_at=self.base + timedelta(hours=i // 2))
+            row.save()
+            self.rows.append(row)
+        self.newest_first = sorted(self.rows, key=lambda r: (r.created_at, r.id), reverse=True)
+
+    def _queryset(self):
+        return WalletLedger.objects(user_id=self.user_id)
+
+    def test_following_cursors_visits_every_row_once(self):
+        seen, cursor, pages = [], None, 0
+        while True:
+            page = paginate(self._queryset(), 3, cursor=cursor)
+            seen.extend(r.tx_hash for r in page.items)
+            pages += 1
+            if not page.has_more:
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(seen, [r.tx_hash for r in self.newest_first])
+
+    def test_cursor_page_is_one_query_without_total(self):
+        first = paginate(self._queryset(), 2)
+        with self.assertQueryBudget(1, collection='wallet_ledger'):
+            second = paginate(self._queryset(), 2, cursor=first.next_cursor)
+
+        self.assertIsNone(second.total)
+        self.assertIsNone(second.page)
+        self.assertEqual([r.id for r in second.items], [r.id for r in self.newest_first[2:4]])
+
+    def test_page_mode_matches_offsets(self):
+        page = paginate(self._queryset(), 3, page=3)
+
+        self.assertEqual([r.id for r in page.items], [self.newest_first[6].id])
+        self.assertFalse(page.has_more)
+        self.assertEqual(page.meta(), {"limit": 3, "next_cursor": None, "has_more": False, "page": 3})
+
+    def test_totals_are_optional_and_cached(self):
+        counter = CountCache(ttl_seconds=60)
+        self.assertEqual(paginate(self._queryset(), 2, include_total=True, counter=counter).total, 7)
+
+        WalletLedger(user_id=self.user_id, amount=Decimal('1'), type='credit', reason='bonus',
+                     balance_after=Decimal('1'), tx_hash='tx-late').save()
+        with self.assertQueryBudget(1, collection='wallet_ledger'):
+            page = paginate(self._queryset(), 2, include_total=True, counter=counter)
+        self.assertEqual(page.total, 7)
+        self.assertEqual(page.meta()['total_pages'], 4)
+
+        counter.clear()
+        self.assertEqual(paginate(self._queryset(), 2, include_total=True, counter=counter).total, 8)
+
+    def test_cursor_round_trip_and_validation(self):
+        doc_id = ObjectId()
+        self.assertEqual(decode_cursor(encode_cursor(self.base, doc_id)), (self.base, doc_id))
+        self.assertEqual(decode_cursor(encode_cursor(None, doc_id)), (None, doc_id))
+        with self.assertRaises(ValueError):
+            paginate(self._queryset(), 2, cursor='not-a-cursor')
+
+    def test_paginate_ids_continues_after_last_id(self):
+        ids = [ObjectId() for _ in range(5)]
+
+        first = paginate_ids(ids, 2)
+        second = paginate_ids(ids, 2, cursor=first.next_cursor)
+        last = paginate_ids(ids, 2, cursor=second.next_cursor)
+
+        self.assertEqual(first.items + second.items + last.items, ids)
+        self.assertEqual(first.total, 5)
+        self.assertFalse(last.has_more)
+        with self.assertRaises(ValueError):
+            paginate_ids(ids, 2, cursor=encode_cursor(None, ObjectId()))
+
+
+class TestPaginatedEndpoints(MockDBTestCase):
+
+    def test_miss_profit_history_follows_cursor(self):
+        user_id = ObjectId()
+        for i in range(5):
+            MissedProfit(user_id=user_id, upline_user_id=ObjectId(), missed_profit_type='commission',
+                         missed_profit_amount=float(i + 1), currency='USDT', primary_reason='account_inactivity',
+                         reason_description='inactive', user_level=1, upgrade_slot_level=1, program_type='matrix',
+                         created_at=datetime(2026, 1, 1) + timedelta(minutes=i)).save()
+        service = WalletService()
+
+        first = service.get_user_miss_profit_history(str(user_id), 'USDT', limit=3)['data']
+        second = service.get_user_miss_profit_history(str(user_id), 'USDT', limit=3, cursor=first['next_cursor'],
+                                                      include_total=False)['data']
+
+        self.assertEqual(first['total'], 5)
+        self.assertEqual(first['page'], 1)
+        self.assertTrue(first['has_more'])
+        self.assertEqual([item['miss_usdt'] for item in first['items'] + second['items']], [5.0, 4.0, 3.0, 2.0, 1.0])
+        self.assertIsNone(second['total'])
+        self.assertFalse(second['has_more'])
+
+    def test_phase_1_income_cursor_is_per_slot(self):
+        user = User(uid='P1', refer_code='RCP1', wallet_address='0xp1', name='P1').save()
+        for slot in (1, 2):
+            TreePlacement(user_id=user.id, program='global', parent_id=user.id, position='left', level=1,
+                          slot_no=slot, phase='PHASE-1', is_active=True).save()
+            for i in range(3):
+                WalletLedger(user_id=user.id, amount=Decimal(slot * 10 + i), currency='USDT', type='credit',
+                             reason=f'global_phase_1_income_slot_{slot}', balance_after=Decimal(0),
+                             tx_hash=f'tx-{slot}-{i}', created_at=datetime(2026, 1, 1) + timedelta(minutes=i)).save()
+        service = WalletService()
+
+        first = service.get_phase_1_income(str(user.id), limit=2)['data']['slots']
+        cursor = first[1]['next_cursor']
+        rejected = service.get_phase_1_income(str(user.id), limit=2, cursor=cursor)
+        second = service.get_phase_1_income(str(user.id), limit=2, cursor=cursor, slot_no=2)['data']['slots']
+
+        self.assertFalse(rejected['success'])
+        self.assertIn('slot_no', rejected['error'])
+        self.assertEqual([s['slot_no'] for s in second], [2])
+        self.assertEqual([item['amount'] for item in first[1]['items'] + second[0]['items']], [22.0, 21.0, 20.0])
+        self.assertFalse(second[0]['has_more'])
+
+    def test_jackpot_entry_history_pages_by_cursor(self):
+        user_id = ObjectId()
+        for week in range(3):
+            start = datetime(2026, 1, 5) + timedelta(weeks=week)
+            JackpotUserEntry(user_id=user_id, week_start_date=start, week_end_date=start + timedelta(days=6),
+                             created_at=start).save()
+        service = JackpotService()
+
+        first = service.get_user_entry_history(str(user_id), limit=2)
+        second = service.get_user_entry_history(str(user_id), limit=2, cursor=first['next_cursor'])
+
+        self.assertTrue(first['success'])
+        self.assertTrue(first['has_more'])
+        self.assertTrue(second['success'])
+        self.assertFalse(second['has_more'])
+        self.assertIsNone(second['next_cursor'])
+
+
+if __name__ == '__main__':
+    unittest.main()
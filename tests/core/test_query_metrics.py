@@ -0,0 +1,207 @@
+"""
+Tests for MongoDB command accounting (core/query_metrics.py)
+
+Test Coverage:
+- CommandListener event handling (collections, documents, ignored commands)
+- Request middleware headers and per-route totals
+- Query budgets on join, upgrade and dashboard paths (N+1 regressions fail here)
+"""
+
+import contextlib
+import io
+import unittest
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core import query_metrics
+from core.query_metrics import CommandMetricsListener, QueryMetricsMiddleware, metrics_registry, track_queries
+from tests.mock_db import MockDBTestCase
+import modules.matrix  # noqa: F401  (loads matrix before dream_matrix to avoid the import cycle)
+from modules.binary.service import BinaryService
+from modules.slot.model import SlotCatalog, SlotActivation
+from modules.tree.model import TreePlacement
+from modules.user.model import User
+from modules.user.service import UserService, create_root_user_service, create_user_service
+
+
+def _event(command_name, command=None, reply=None, request_id=1):
+    return SimpleNamespace(
+        command_name=command_name, command=command or {}, reply=reply,
+        connection_id=('localhost', 27017), request_id=request_id, duration_micros=1500,
+    )
+
+
+class TestCommandMetricsListener(unittest.TestCase):
+    """Test cases for the pymongo listener."""
+
+    def setUp(self):
+        self.listener = CommandMetricsListener()
+
+    def test_counts_commands_documents_and_time_per_collection(self):
+        with track_queries() as stats:
+            self.listener.started(_event('find', {'find': 'users'}, request_id=1))
+            self.listener.succeeded(_event('find', reply={'cursor': {'firstBatch': [{}, {}, {}]}}, request_id=1))
+            self.listener.started(_event('getMore', {'getMore': 1, 'collection': 'users'}, request_id=2))
+            self.listener.succeeded(_event('getMore', reply={'cursor': {'nextBatch': [{}]}}, request_id=2))
+            self.listener.started(_event('findAndModify', {'findAndModify': 'user_wallets'}, request_id=3))
+            self.listener.failed(_event('findAndModify', request_id=3))
+
+        self.assertEqual(stats.commands, 3)
+        self.assertEqual(stats.documents, 4)
+        self.assertAlmostEqual(stats.duration_ms, 4.5)
+        self.assertEqual(stats.by_collection['users']['commands'], 2)
+        self.assertEqual(stats.by_collection['user_wallets']['documents'], 0)
+        self.assertEqual(stats.by_command, {'find': 1, 'getMore': 1, 'findAndModify': 1})
+
+    def test_ignores_handshake_commands(self):
+        with track_queries() as stats:
+            self.listener.started(_event('hello', {'hello': 1}))
+            self.listener.succeeded(_event('hello', reply={'ok': 1}))
+        self.assertEqual(stats.commands, 0)
+
+    def test_nested_scopes_roll_up(self):
+        with track_queries() as outer:
+            query_metrics.record_command('users', 'find')
+            with track_queries() as inner:
+                query_metrics.record_command('tree_placement', 'find', documents=2)
+        self.assertEqual((inner.commands, outer.commands), (1, 2))
+        self.assertEqual(outer.documents, 2)
+
+
+class TestQueryMetricsMiddleware(MockDBTestCase):
+    """Test cases for X-DB-* headers and /metrics totals."""
+
+    def setUp(self):
+        super().setUp()
+        metrics_registry.reset()
+        app = FastAPI()
+        app.add_middleware(QueryMetricsMiddleware)
+
+        @app.get("/users/{uid}")
+        def get_user(uid: str):
+            user = User.objects(uid=uid).first()
+            return {"found": bool(user)}
+
+        self.client = TestClient(app)
+
+    def test_headers_and_route_totals(self):
+        User(uid='U1', refer_code='RCU1', wallet_address='0xU1', name='U1').save()
+        response = self.client.get("/users/U1")
+        self.assertEqual(response.json(), {"found": True})
+        self.assertEqual(response.headers['X-DB-Commands'], '1')
+        self.assertEqual(response.headers['X-DB-Documents'], '1')
+        self.assertIn('X-DB-Time-Ms', response.headers)
+
+        self.client.get("/users/U2")
+        route = metrics_registry.snapshot()['routes']['GET /users/{uid}']
+        self.assertEqual(route['requests'], 2)
+        self.assertEqual(route['commands'], 2)
+        self.assertEqual(route['max_commands'], 1)
+
+    def test_metrics_endpoint_requires_an_admin(self):
+        import main
+        client = TestClient(main.app)
+        self.assertEqual(client.get("/metrics").status_code, 401)
+
+        user = {"_id": "u1", "role": "user"}
+        main.app.dependency_overrides[main.current_user] = lambda: user
+        self.addCleanup(main.app.dependency_overrides.clear)
+        self.assertEqual(client.get("/metrics").status_code, 403)
+        user["role"] = "admin"
+        response = client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('routes', response.json())
+
+
+class TestQueryBudgets(MockDBTestCase):
+    """Command budgets for key endpoints. Raise a budget only with a reason."""
+
+    JOIN_BUDGET = 260
+    UPGRADE_BUDGET = 160
+    MY_COMMUNITY_BUDGET = 20
+    DUEL_TREE_BUDGET = 12
+
+    def setUp(self):
+        super().setUp()
+        prices = ['0.0022', '0.0044', '0.0088', '0.0176', '0.0352']
+        for slot_no, price in enumerate(prices, 1):
+            SlotCatalog(program='binary', slot_no=slot_no, name=f"Slot {slot_no}", price=Decimal(price),
+                        level=slot_no - 1, currency='BNB', is_active=True).save()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result, error = create_root_user_service(
+                {'uid': 'ROOT', 'refer_code': 'ROOT001', 'wallet_address': '0xroot', 'name': 'root'}
+            )
+        self.assertIsNone(error)
+        self.root_id = result['_id']
+
+    def _join(self, n):
+        with contextlib.redirect_stdout(io.StringIO()):
+            result, error = create_user_service({
+                'email': f"u{n}@example.com", 'name': f"u{n}", 'password': 'secret',
+                'refered_by': 'ROOT001', 'wallet_address': f"0x{n}", 'binary_payment_tx': f"tx{n}",
+            })
+        self.assertIsNone(error)
+        return result['_id']
+
+    def _flat_network(self, size):
+        """Binary placements + slot-1 activations without running the join pipeline."""
+        TreePlacement.objects(position__ne='root').delete()
+        SlotActivation.objects().delete()
+        User.objects(uid__ne='ROOT').delete()
+        t0 = datetime(2025, 1, 1)
+        frontier = [ObjectId(self.root_id)]
+        created = 0
+        while created < size:
+            parent = frontier.pop(0)
+            for pos in ('left', 'right'):
+                if created >= size:
+                    break
+                child = User(uid=f"N{created}", refer_code=f"RCN{created}", wallet_address=f"0xN{created}",
+                             name=f"N{created}", refered_by=ObjectId(self.root_id)).save()
+                TreePlacement(user_id=child.id, program='binary', parent_id=ObjectId(self.root_id), upline_id=parent,
+                              position=pos, level=1, slot_no=1, created_at=t0 + timedelta(seconds=created)).save()
+                SlotActivation(user_id=child.id, program='binary', slot_no=1, slot_name='Slot 1',
+                               activation_type='initial', upgrade_source='wallet', amount_paid=Decimal('0.0022'),
+                               currency='BNB', tx_hash=f"txN{created}", status='completed').save()
+                frontier.append(child.id)
+                created += 1
+
+    def test_join_budget(self):
+        for n in range(4):
+            with self.assertQueryBudget(self.JOIN_BUDGET):
+                self._join(n)
+
+    def test_upgrade_budget(self):
+        user_id = self._join(0)
+        self._join(1)
+        UserService().add_test_balance(user_id)
+        with self.assertQueryBudget(self.UPGRADE_BUDGET):
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = BinaryService().upgrade_binary_slot(user_id, 3, 'tx-upgrade', Decimal('0.0088'))
+        self.assertTrue(result.get('success'), result)
+
+    def test_my_community_is_independent_of_downline_size(self):
+        counts = []
+        for size in (6, 40):
+            self._flat_network(size)
+            with self.assertQueryBudget(self.MY_COMMUNITY_BUDGET) as stats:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = UserService().get_my_community(self.root_id, 'binary', 1, limit=100)
+            self.assertTrue(result['success'])
+            counts.append((stats.commands - stats.by_collection.get('tree_placement', {}).get('commands', 0),
+                           len(result['data']['community_members'])))
+        # Only the per-level tree reads may grow with depth; nothing may grow per member
+        self.assertEqual(counts[0][0], counts[1][0])
+        self.assertEqual([c[1] for c in counts], [6, 40])
+
+    def test_duel_tree_dashboard_budget(self):
+        self._flat_network(30)
+        with self.assertQueryBudget(self.DUEL_TREE_BUDGET):
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = BinaryService().get_duel_tree_earnings(self.root_id)
+        self.assertTrue(result['success'])
@@ -0,0 +1,269 @@
+"""
+Tests for lease-based queue consumption (core/queue_consumer.py)
+
+Test Coverage:
+- Claims are exclusive between workers and follow the queue order
+- Expired leases are reclaimed; the stale worker's result is discarded
+- Failures back off before the retry and are parked after the attempt limit
+- Heartbeat renewal, per-queue metrics and the spillover / recycle / auto upgrade integrations
+- Handler side effects (placement rows, upgrade logs) are written before the settle, once per item
+- A failing on_complete hook retries the item instead of completing it
+"""
+
+import contextlib
+import io
+import unittest
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from core.queue_consumer import QueueConsumer, QueueWorker
+from tests.mock_db import MockDBTestCase
+import modules.matrix  # noqa: F401  (loads matrix before dream_matrix to avoid the import cycle)
+from modules.auto_upgrade.model import AutoUpgradeQueue, AutoUpgradeLog
+from modules.auto_upgrade.service import AutoUpgradeService
+from modules.recycle.model import RecycleQueue
+from modules.recycle.service import RecycleService
+from modules.spillover.model import SpilloverQueue, SpilloverPlacement, SpilloverSettings
+from modules.spillover.service import SpilloverService
+
+
+class TestQueueConsumer(MockDBTestCase):
+
+    def _enqueue(self, count=1, **fields):
+        items = []
+        for i in range(count):
+            item = SpilloverQueue(
+                user_id=ObjectId(), original_parent_id=ObjectId(), intended_parent_id=ObjectId(),
+                spillover_reason='parent_full', created_at=datetime.utcnow() + timedelta(milliseconds=i), **fields
+            )
+            item.save()
+            items.append(item)
+        return items
+
+    def _consumer(self, handler=lambda item: None, **kwargs):
+        kwargs.setdefault('worker_id', 'worker-a')
+        return QueueConsumer('spillover', SpilloverQueue, handler, **kwargs)
+
+    def test_claims_are_exclusive_and_ordered(self):
+        items = self._enqueue(3)
+        first, second = self._consumer(worker_id='worker-a'), self._consumer(worker_id='worker-b')
+
+        claims = [first.claim(), second.claim(), first.claim(), second.claim()]
+
+        self.assertEqual([c[1]['_id'] for c in claims[:3]], [i.id for i in items])
+        self.assertIsNone(claims[3])
+        stored = SpilloverQueue.objects.get(id=items[1].id)
+        self.assertEqual(stored.status, 'processing')
+        self.assertEqual(stored.attempts, 1)
+        self.assertTrue(stored.lease_owner.startswith('worker-b:'))
+
+    def test_expired_lease_is_reclaimed_and_stale_result_dropped(self):
+        item = self._enqueue()[0]
+        stale, fresh = self._consumer(worker_id='stale'), self._consumer(worker_id='fresh')
+        stale_token, stale_doc = stale.claim()
+        SpilloverQueue._get_collection().update_one(
+            {'_id': item.id}, {'$set': {'lease_expires_at': datetime.utcnow() - timedelta(seconds=1)}}
+        )
+
+        fresh_claim = fresh.claim()
+        self.assertIsNotNone(fresh_claim)
+        self.assertEqual(fresh_claim[1]['attempts'], 2)
+
+        self.assertEqual(stale.process(stale_token, stale_doc), 'lease_lost')
+        self.assertEqual(fresh.process(*fresh_claim), 'completed')
+        stored = SpilloverQueue.objects.get(id=item.id)
+        self.assertEqual(stored.status, 'completed')
+        self.assertIsNotNone(stored.processed_at)
+        self.assertIsNone(stored.lease_owner)
+        self.assertEqual(stale.snapshot()['lease_lost'], 1)
+
+    def test_on_complete_runs_only_for_the_settling_lease(self):
+        item = self._enqueue()[0]
+        completed = []
+        stale = self._consumer(lambda i: 'stale', worker_id='stale', on_complete=lambda i, r: completed.append(r))
+        fresh = self._consumer(lambda i: 'fresh', worker_id='fresh', on_complete=lambda i, r: completed.append(r))
+        stale_claim = stale.claim()
+        SpilloverQueue._get_collection().update_one(
+            {'_id': item.id}, {'$set': {'lease_expires_at': datetime.utcnow() - timedelta(seconds=1)}}
+        )
+
+        self.assertEqual(fresh.process(*fresh.claim()), 'completed')
+        self.assertEqual(stale.process(*stale_claim), 'lease_lost')
+        self.assertEqual(completed, ['fresh'])
+
+    def test_failing_hook_retries_the_item(self):
+        item = self._enqueue()[0]
+
+        def hook(_, result):
+            raise RuntimeError("placement write failed")
+
+        consumer = self._consumer(on_complete=hook, backoff_seconds=30)
+
+        self.assertEqual(consumer.run_once()["retried"], 1)
+        stored = SpilloverQueue.objects.get(id=item.id)
+        self.assertEqual((stored.status, stored.failure_reason), ('queued', 'placement write failed'))
+        self.assertIsNone(stored.processed_at)
+
+    def test_claim_by_id_leases_only_that_item(self):
+        items = self._enqueue(2)
+        consumer = self._consumer()
+        token, doc = consumer.claim(items[1].id)
+        self.assertEqual(doc['_id'], items[1].id)
+        self.assertIsNone(consumer.claim(items[1].id))
+        self.assertEqual(SpilloverQueue.objects.get(id=items[0].id).status, 'queued')
+
+    def test_failure_backs_off_then_parks(self):
+        item = self._enqueue()[0]
+        failures = []
+
+        def handler(_):
+            raise ValueError("no position")
+
+        consumer = self._consumer(handler, max_attempts=2, backoff_seconds=30,
+                                  on_failure=lambda i, e, parked: failures.append(parked))
+
+        self.assertEqual(consumer.run_once(), {"claimed": 1, "completed": 0, "retried": 1, "parked": 0, "lease_lost": 0})
+        stored = SpilloverQueue.objects.get(id=item.id)
+        self.assertEqual(stored.status, 'queued')
+        self.assertEqual(stored.failure_reason, 'no position')
+        self.assertGreater(stored.next_attempt_at, datetime.utcnow() + timedelta(seconds=20))
+
+        # Not claimable again until the backoff elapses
+        self.assertIsNone(consumer.claim())
+        SpilloverQueue._get_collection().update_one(
+            {'_id': item.id}, {'$set': {'next_attempt_at': datetime.utcnow() - timedelta(seconds=1)}}
+        )
+        self.assertEqual(consumer.run_once()["parked"], 1)
+        stored = SpilloverQueue.objects.get(id=item.id)
+        self.assertEqual(stored.status, 'failed')
+        self.assertEqual(stored.attempts, 2)
+        self.assertEqual(failures, [False, True])
+
+    def test_renew_leases_extends_in_flight_items(self):
+        item = self._enqueue()[0]
+        consumer = self._consumer(lease_seconds=600)
+        token, doc = consumer.claim()
+        consumer._leases[token] = doc['_id']
+        SpilloverQueue._get_collection().update_one(
+            {'_id': item.id}, {'$set': {'lease_expires_at': datetime.utcnow() + timedelta(seconds=1)}}
+        )
+
+        self.assertEqual(consumer.renew_leases(), 1)
+        stored = SpilloverQueue.objects.get(id=item.id)
+        self.assertGreater(stored.lease_expires_at, datetime.utcnow() + timedelta(seconds=500))
+
+    def test_run_once_respects_limit_and_concurrency(self):
+        self._enqueue(5)
+        seen = []
+        consumer = self._consumer(lambda item: seen.append(item.id), concurrency=3)
+
+        self.assertEqual(consumer.run_once(limit=4)["completed"], 4)
+        self.assertEqual(len(set(seen)), 4)
+        self.assertEqual(SpilloverQueue.objects(status='queued').count(), 1)
+
+    def test_worker_reports_per_queue_metrics(self):
+        self._enqueue(2)
+        RecycleQueue(user_id=ObjectId(), parent_id=ObjectId(), slot_no=1, matrix_level=1,
+                     recycle_reason='matrix_completion').save()
+        worker = QueueWorker([
+            self._consumer(),
+            QueueConsumer('recycle', RecycleQueue, lambda item: None, worker_id='worker-a'),
+        ])
+
+        counts = worker.run_once()
+
+        self.assertEqual(counts['spillover']['completed'], 2)
+        self.assertEqual(counts['recycle']['completed'], 1)
+        self.assertEqual(worker.metrics()['spillover']['in_flight'], 0)
+
+
+class TestQueueServiceIntegration(MockDBTestCase):
+
+    def test_recycle_batch_keeps_result_shape(self):
+        RecycleQueue(user_id=ObjectId(), parent_id=ObjectId(), slot_no=1, matrix_level=1,
+                     recycle_reason='matrix_completion').save()
+        service = RecycleService()
+        service._attempt_place = lambda item: (_ for _ in ()).throw(ValueError("tree full"))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = service.process_queue_batch()
+
+        self.assertEqual(result, {"processed": 0, "failed": 1})
+        stored = RecycleQueue.objects.first()
+        self.assertEqual(stored.status, 'queued')
+        self.assertEqual(stored.attempts, 1)
+        self.assertIsNotNone(stored.next_attempt_at)
+
+    def test_spillover_placement_is_recorded_once_after_lease_loss(self):
+        item = SpilloverQueue(user_id=ObjectId(), original_parent_id=ObjectId(), intended_parent_id=ObjectId(),
+                              spillover_reason='parent_full')
+        item.save()
+        service = SpilloverService()
+        service._find_nearest_vacancy = lambda parent_id, settings: (parent_id, 'left', 1)
+        stale = service.queue_consumer(settings=SpilloverSettings(), worker_id='stale')
+        fresh = service.queue_consumer(settings=SpilloverSettings(), worker_id='fresh')
+        stale_claim = stale.claim()
+        SpilloverQueue._get_collection().update_one(
+            {'_id': item.id}, {'$set': {'lease_expires_at': datetime.utcnow() - timedelta(seconds=1)}}
+        )
+
+        self.assertEqual(fresh.process(*fresh.claim()), 'completed')
+        self.assertEqual(stale.process(*stale_claim), 'lease_lost')
+        self.assertEqual(SpilloverPlacement.objects(queue_id=item.id).count(), 1)
+        self.assertEqual(SpilloverQueue.objects.get(id=item.id).status, 'completed')
+
+    def test_redelivered_spillover_item_is_placed_once(self):
+        item = SpilloverQueue(user_id=ObjectId(), original_parent_id=ObjectId(), intended_parent_id=ObjectId(),
+                              spillover_reason='parent_full')
+        item.save()
+        service = SpilloverService()
+        service._find_nearest_vacancy = lambda parent_id, settings: (parent_id, 'left', 1)
+        crashed = service.queue_consumer(settings=SpilloverSettings(), worker_id='crashed')
+        token, doc = crashed.claim()
+        # The worker wrote the placement and died before settling the item
+        crashed.on_complete(SpilloverQueue._from_son(doc), (item.intended_parent_id, 'left', 1))
+        SpilloverQueue._get_collection().update_one(
+            {'_id': item.id}, {'$set': {'lease_expires_at': datetime.utcnow() - timedelta(seconds=1)}}
+        )
+
+        retry = service.queue_consumer(settings=SpilloverSettings(), worker_id='retry')
+        self.assertEqual(retry.run_once()["completed"], 1)
+        self.assertEqual(SpilloverPlacement.objects(queue_id=item.id).count(), 1)
+        self.assertEqual(SpilloverQueue.objects.get(id=item.id).status, 'completed')
+
+    def test_inline_auto_upgrade_is_settled_once(self):
+        entry = AutoUpgradeQueue(
+            user_id=ObjectId(), program='binary', current_slot_no=1, target_slot_no=2,
+            upgrade_cost=0.0044, currency='BNB', earnings_available=0.005
+        )
+        entry.save()
+        service = AutoUpgradeService()
+
+        self.assertEqual(service._process_queued_entry(entry), 'completed')
+        self.assertEqual(service._process_queued_entry(entry), 'claimed_elsewhere')
+        self.assertEqual(service.process_auto_upgrade_queue()['processed_count'], 0)
+        stored = AutoUpgradeQueue.objects.get(id=entry.id)
+        self.assertEqual((stored.status, stored.retry_count, float(stored.earnings_used)), ('completed', 1, 0.0044))
+        self.assertEqual(AutoUpgradeLog.objects(user_id=entry.user_id).count(), 1)
+
+    def test_auto_upgrade_entries_park_after_max_retries(self):
+        entry = AutoUpgradeQueue(
+            user_id=ObjectId(), program='binary', current_slot_no=1, target_slot_no=2,
+            upgrade_cost=0.0044, currency='BNB', earnings_available=0.0044, max_retries=1
+        )
+        entry.save()
+        service = AutoUpgradeService()
+        service._process_upgrade_queue_entry = lambda e: {"success": False, "error": "insufficient reserve"}
+
+        result = service.process_auto_upgrade_queue()
+
+        self.assertEqual(result['failed_count'], 1)
+        stored = AutoUpgradeQueue.objects.get(id=entry.id)
+        self.assertEqual(stored.status, 'failed')
+        self.assertEqual(stored.retry_count, 1)
+        self.assertEqual(stored.error_message, 'insufficient reserve')
+
+
+if __name__ == '__main__':
+    unittest.main()
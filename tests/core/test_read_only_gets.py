@@ -0,0 +1,147 @@
+"""
+Tests that status / tree / leaderboard GETs never write
+
+Test Coverage:
+- assertNoWrites() harness (writes are reported per collection)
+- Global tree view reads only; counts are materialized by the placement write path
+- Rank leaderboard computed read-only, stored by refresh_rank_leaderboard (scheduled job)
+- Fund / settings / stipend GET endpoints return defaults without creating documents
+"""
+
+import asyncio
+import importlib
+import json
+import unittest
+
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from tests.mock_db import MockDBTestCase
+import modules.matrix  # noqa: F401  (loads matrix before dream_matrix to avoid the import cycle)
+from auth.service import authentication_service
+from modules.leadership_stipend.model import LeadershipStipend, LeadershipStipendFund, LeadershipStipendSettings
+from modules.leadership_stipend.router import router as leadership_stipend_router
+from modules.rank.model import RankLeaderboard, UserRank
+from modules.rank.router import get_rank_leaderboard as rank_leaderboard_endpoint
+from modules.rank.service import RankService
+from modules.recycle.model import RecycleSettings
+from modules.recycle.router import router as recycle_router
+from modules.wallet.router import router as wallet_router
+
+global_model = importlib.import_module('modules.global.model')
+global_service = importlib.import_module('modules.global.service')
+
+
+class TestNoWritesHarness(MockDBTestCase):
+
+    def test_reports_writes_per_collection(self):
+        with self.assertRaises(AssertionError) as ctx:
+            with self.assertNoWrites():
+                RankLeaderboard.objects(period='daily').first()
+                UserRank(user_id=ObjectId()).save()
+        self.assertIn('user_rank', str(ctx.exception))
+
+        with self.assertNoWrites() as stats:
+            list(UserRank.objects())
+        self.assertEqual(stats.writes, {})
+
+
+class TestGlobalTreeReadOnly(MockDBTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.root = ObjectId()
+        global_model.GlobalTreeStructure(user_id=self.root, phase='PHASE-1', slot_number=1, level=2,
+                                         position=3).save()
+        for position in (1, 2):
+            global_model.GlobalTeamMember(user_id=ObjectId(), parent_user_id=self.root, phase='PHASE-1',
+                                          slot_number=1, position_in_phase=position, level_in_tree=1).save()
+
+    def test_tree_view_does_not_write(self):
+        with self.assertNoWrites():
+            result = global_service.GlobalService().get_global_tree(str(self.root), 'phase-1')
+
+        self.assertTrue(result['success'])
+        self.assertEqual([u['type'] for u in result['usersData']], ['active', 'active', 'empty', 'empty'])
+        self.assertEqual(result['tree_structure'], {"level": 2, "position": 3, "children_count": 2, "is_active": True})
+        self.assertFalse(result['is_complete'])
+
+    def test_missing_tree_record_is_not_created(self):
+        with self.assertNoWrites():
+            result = global_service.GlobalService().get_global_tree(str(ObjectId()), 'phase-2')
+
+        self.assertEqual(result['tree_structure']['level'], 0)
+        self.assertEqual(len(result['usersData']), 8)
+        self.assertEqual(global_model.GlobalTreeStructure.objects.count(), 1)
+
+    def test_write_path_materializes_counts(self):
+        for position in (3, 4):
+            global_model.GlobalTeamMember(user_id=ObjectId(), parent_user_id=self.root, phase='PHASE-1',
+                                          slot_number=1, position_in_phase=position, level_in_tree=1).save()
+
+        self.assertEqual(global_model.GlobalTreeStructure.refresh_counts(self.root, 'PHASE-1'), 4)
+        record = global_model.GlobalTreeStructure.objects(user_id=self.root, phase='PHASE-1').first()
+        self.assertEqual(record.children_count, 4)
+        self.assertTrue(record.is_complete)
+
+
+class TestRankLeaderboardReadOnly(MockDBTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for rank_number in (3, 7):
+            UserRank(user_id=ObjectId(), current_rank_number=rank_number, current_rank_name=f'Rank {rank_number}').save()
+
+    def test_leaderboard_is_computed_without_writes(self):
+        with self.assertNoWrites():
+            result = RankService().get_rank_leaderboard('weekly')
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['total_participants'], 2)
+        self.assertEqual(RankLeaderboard.objects.count(), 0)
+
+    def test_refresh_stores_what_the_endpoint_serves(self):
+        self.assertTrue(RankService().refresh_rank_leaderboard('daily')['success'])
+
+        # Called directly: GET /rank/leaderboard is shadowed by /rank/{rank_number} in the route table
+        with self.assertNoWrites():
+            response = asyncio.run(rank_leaderboard_endpoint(period='daily'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.body)['data']['total_participants'], 2)
+        self.assertEqual(RankLeaderboard.objects(period='daily').count(), 1)
+
+
+class TestStatusEndpointsReadOnly(MockDBTestCase):
+
+    def setUp(self):
+        super().setUp()
+        app = FastAPI()
+        for router in (leadership_stipend_router, recycle_router, wallet_router):
+            app.include_router(router)
+        app.dependency_overrides[authentication_service.verify_authentication] = lambda: {"user_id": str(ObjectId())}
+        self.client = TestClient(app)
+
+    def test_fund_and_settings_defaults_are_not_stored(self):
+        with self.assertNoWrites():
+            responses = [self.client.get(path) for path in
+                         ('/leadership-stipend/fund', '/leadership-stipend/settings', '/recycle/settings')]
+
+        self.assertEqual([r.status_code for r in responses], [200, 200, 200])
+        self.assertEqual(LeadershipStipendFund.objects.count(), 0)
+        self.assertEqual(LeadershipStipendSettings.objects.count(), 0)
+        self.assertEqual(RecycleSettings.objects.count(), 0)
+
+    def test_stipend_income_fills_tiers_in_memory(self):
+        user_id = str(ObjectId())
+        with self.assertNoWrites():
+            response = self.client.get(f'/wallet/income/leadership-stipend?user_id={user_id}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['data']['tiers'])
+        self.assertEqual(LeadershipStipend.objects.count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+"""
+Tests for the cold-start path (core/bootstrap.py, core/lazy_routers.py, main.py)
+
+Test Coverage:
+- First boot seeds the slot catalog, distribution config, bonus funds, ranks and settings
+- An unchanged seed costs one read; a changed seed updates managed fields and keeps the rest
+- A seed that fails part-way is applied again on the next boot
+- Routers are included on the first request under their prefix; the schema loads them all
+- Importing main imports no router module; its time stays within the startup budget (performance)
+"""
+
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core import bootstrap
+from core.bootstrap import ensure_bootstrap_data
+from auth.service import authentication_service
+from core.lazy_routers import LazyRouterMiddleware, LazyRouters
+from tests.mock_db import MockDBTestCase
+from modules.blockchain.model import SystemConfig
+from modules.income.bonus_fund import BonusFund
+from modules.rank.model import Rank, RankSettings
+from modules.slot.model import SlotCatalog
+from modules.top_leader_gift.model import TopLeaderGiftSettings
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Importing main in a fresh interpreter (about 250 ms here; 800 ms with the routers imported eagerly)
+STARTUP_BUDGET_MS = 600
+
+
+class TestBootstrapData(MockDBTestCase):
+
+    def _seed(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return ensure_bootstrap_data()
+
+    def test_first_boot_seeds_everything(self):
+        result = self._seed()
+
+        self.assertTrue(result['success'], result)
+        self.assertTrue(result['seeded'])
+        self.assertEqual(SlotCatalog.objects.count(), 17 + 15 + 16)
+        starter = SlotCatalog.objects.get(program='matrix', slot_no=1)
+        self.assertEqual((starter.name, starter.price, starter.currency, starter.level), ('STARTER', Decimal('11'), 'USDT', 1))
+        self.assertEqual(SlotCatalog.objects.get(program='global', slot_no=2).phase, 'PHASE-2')
+        self.assertIsNone(SlotCatalog.objects.get(program='binary', slot_no=1).phase)
+        self.assertEqual(SystemConfig.objects.get(config_key='matrix_distribution_level').config_value, '60')
+        self.assertEqual(SystemConfig.objects.get(config_key='bootstrap_fingerprint').config_value, result['fingerprint'])
+        self.assertEqual(BonusFund.objects(status='active').count(), 27)
+        self.assertEqual(Rank.objects.count(), 15)
+        self.assertEqual(RankSettings.objects.count(), 1)
+        self.assertEqual(TopLeaderGiftSettings.objects.count(), 1)
+
+    def test_unchanged_seed_is_one_read(self):
+        self._seed()
+        with self.assertQueryBudget(1):
+            result = self._seed()
+        self.assertEqual((result['success'], result['seeded']), (True, False))
+
+    def test_changed_seed_updates_managed_fields_only(self):
+        created = datetime(2024, 1, 1)
+        SlotCatalog(program='matrix', slot_no=2, name='OLD', price=Decimal('30'), currency='USDT', level=2,
+                    member_count=39, created_at=created).save()
+        self._seed()
+        BonusFund.objects(fund_type='spark_bonus', program='matrix').update_one(set__current_balance=Decimal('5'))
+
+        matrix_slots = [(2, 'BRONZE', '35', 2) if slot[0] == 2 else slot for slot in bootstrap.MATRIX_SLOTS]
+        with patch.object(bootstrap, 'MATRIX_SLOTS', matrix_slots):
+            result = self._seed()
+            self.assertTrue(result['seeded'])
+            self.assertEqual(result['slot_catalog'], 1)
+            self.assertFalse(self._seed()['seeded'])
+
+        bronze = SlotCatalog.objects.get(program='matrix', slot_no=2)
+        self.assertEqual((bronze.name, bronze.price, bronze.member_count, bronze.created_at), ('BRONZE', Decimal('35'), 39, created))
+        self.assertEqual(SlotCatalog.objects(program='matrix', slot_no=2).count(), 1)
+        self.assertEqual(BonusFund.objects.get(fund_type='spark_bonus', program='matrix').current_balance, Decimal('5'))
+        self.assertEqual(BonusFund.objects.count(), 27)
+
+    def test_failed_seed_is_applied_again(self):
+        with patch.object(bootstrap, '_seed_settings', side_effect=RuntimeError('settings unavailable')):
+            result = self._seed()
+        self.assertEqual(result, {'success': False, 'error': 'settings unavailable'})
+        self.assertFalse(SystemConfig.objects(config_key='bootstrap_fingerprint').first())
+
+        self.assertTrue(self._seed()['seeded'])
+        self.assertEqual(RankSettings.objects.count(), 1)
+
+
+class TestLazyRouters(MockDBTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.app = FastAPI()
+        self.routers = LazyRouters(self.app)
+        self.routers.add('/jobs', 'modules.batch_job.router')
+        self.routers.add('/matrix', 'modules.matrix.router')
+        self.app.add_middleware(LazyRouterMiddleware, routers=self.routers)
+        self.app.dependency_overrides[authentication_service.verify_authentication] = lambda: {"role": "admin"}
+        self.client = TestClient(self.app)
+
+    def test_router_included_on_first_request_under_prefix(self):
+        self.assertEqual(self.client.get('/unknown').status_code, 404)
+        self.assertEqual(self.routers.pending, ['modules.batch_job.router', 'modules.matrix.router'])
+
+        response = self.client.get('/jobs/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'], {'runs': []})
+        self.assertEqual(self.routers.pending, ['modules.matrix.router'])
+        self.assertEqual(self.routers.load('/jobs/runs'), 0)
+
+    def test_schema_loads_every_router(self):
+        self.client.get('/jobs/')
+        paths = self.client.get('/openapi.json').json()['paths']
+        self.assertEqual(self.routers.pending, [])
+        self.assertIn('/jobs/', paths)
+        self.assertTrue(any(path.startswith('/matrix/') for path in paths))
+
+
+class TestColdStart(unittest.TestCase):
+
+    def _import_main(self):
+        """Import main in a fresh interpreter; returns its import time and router state"""
+        script = textwrap.dedent("""
+            import json, sys, time
+            import mongomock
+            from mongoengine import connect
+            connect('bitgpt_cold_start', host='mongodb://localhost', mongo_client_class=mongomock.MongoClient)
+            start = time.perf_counter()
+            import main
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            print(json.dumps({
+                'import_ms': elapsed_ms,
+                'pending': len(main.routers.pending),
+                'routers_imported': sorted(name for name in sys.modules if name.endswith('.router')),
+            }))
+        """)
+        with tempfile.TemporaryDirectory() as workdir:
+            # main creates ./uploads; keep it out of the checkout
+            output = subprocess.run([sys.executable, '-c', script], cwd=workdir, capture_output=True, text=True,
+                                    timeout=120, env={**os.environ, 'PYTHONPATH': PROJECT_ROOT})
+        self.assertEqual(output.returncode, 0, output.stderr)
+        return json.loads(output.stdout.strip().splitlines()[-1])
+
+    def test_import_main_defers_routers(self):
+        result = self._import_main()
+        self.assertEqual(result['routers_imported'], [])
+        self.assertEqual(result['pending'], 25)
+
+    @pytest.mark.performance
+    def test_import_main_within_budget(self):
+        self.assertLess(self._import_main()['import_ms'], STARTUP_BUDGET_MS)
@@ -0,0 +1,212 @@
+"""
+In-memory MongoDB test support
+
+Swaps the default mongoengine connection for a mongomock client for the duration
+of a TestCase, so service code can run real queries without a live cluster.
+mongomock does not publish pymongo command events, so collection calls are fed
+into core.query_metrics here; assertQueryBudget() / assertNoWrites() then work as they would
+against mongod.
+"""
+
+import functools
+import threading
+import time
+import unittest
+from contextlib import contextmanager
+from unittest.mock import patch, Mock
+
+import mongomock
+from mongomock.collection import (
+    Collection as _MockCollection, Cursor as _MockCursor, BulkOperationBuilder as _MockBulkBuilder,
+)
+from mongoengine import Document, connect, disconnect
+from mongoengine.base import _document_registry
+
+from core import query_metrics
+
+# Collection methods that correspond to one server command each
+_COUNTED_METHODS = {
+    'find': 'find', 'aggregate': 'aggregate', 'count_documents': 'aggregate',
+    'estimated_document_count': 'count', 'distinct': 'distinct',
+    'insert_one': 'insert', 'insert_many': 'insert', 'bulk_write': 'bulkWrite',
+    'update_one': 'update', 'update_many': 'update', 'replace_one': 'update',
+    'delete_one': 'delete', 'delete_many': 'delete',
+    'find_one_and_update': 'findAndModify', 'find_one_and_replace': 'findAndModify',
+    'find_one_and_delete': 'findAndModify',
+}
+_WRITE_METHODS = [name for name, command in _COUNTED_METHODS.items()
+                  if command in ('insert', 'bulkWrite', 'update', 'delete', 'findAndModify')]
+_call_depth = threading.local()
+_instrumented = False
+
+
+def _count_command(method, command_name):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        depth = getattr(_call_depth, 'value', 0)
+        _call_depth.value = depth + 1
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            _call_depth.value = depth
+            # Only the outermost call is a round trip (mongomock implements some methods via others)
+            if depth == 0:
+                query_metrics.record_command(self.name, command_name, (time.perf_counter() - start) * 1000.0)
+    return wrapper
+
+
+def _count_documents(method):
+    @functools.wraps(method)
+    def wrapper(self):
+        doc = method(self)
+        query_metrics.record_command(self.collection.name, None, documents=1)
+        return doc
+    return wrapper
+
+
+def _count_indexed_document(method):
+    @functools.wraps(method)
+    def wrapper(self, index):
+        result = method(self, index)
+        if isinstance(index, int):
+            query_metrics.record_command(self.collection.name, None, documents=1)
+        return result
+    return wrapper
+
+
+def _drop_sort(method):
+    # pymongo >= 4.11 passes `sort` to bulk update/replace builders; mongomock predates it
+    @functools.wraps(method)
+    def wrapper(self, *args, sort=None, **kwargs):
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+def instrument_mongomock():
+    """Route mongomock collection calls into core.query_metrics (idempotent)."""
+    global _instrumented
+    if _instrumented:
+        return
+    _MockBulkBuilder.add_update = _drop_sort(_MockBulkBuilder.add_update)
+    _MockBulkBuilder.add_replace = _drop_sort(_MockBulkBuilder.add_replace)
+    for name, command_name in _COUNTED_METHODS.items():
+        setattr(_MockCollection, name, _count_command(getattr(_MockCollection, name), command_name))
+    _MockCursor.__next__ = _count_documents(_MockCursor.__next__)
+    _MockCursor.__getitem__ = _count_indexed_document(_MockCursor.__getitem__)
+    _instrumented = True
+
+
+def _reset_cached_collections():
+    """Drop mongoengine's per-class collection cache so documents rebind to the current connection."""
+    # Walk subclasses rather than the registry: modules imported both as `modules.*` and
+    # `backend.*` register two classes under one name and only the last one is in the registry.
+    pending = list(Document.__subclasses__()) + list(_document_registry.values())
+    seen = set()
+    while pending:
+        doc_cls = pending.pop()
+        if doc_cls in seen:
+            continue
+        seen.add(doc_cls)
+        if hasattr(doc_cls, '_collection'):
+            doc_cls._collection = None
+        pending.extend(doc_cls.__subclasses__())
+
+
+class MockDBTestCase(unittest.TestCase):
+    """TestCase running against a fresh mongomock database per test."""
+
+    db_name = 'bitgpt_test'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        instrument_mongomock()
+        disconnect()
+        _reset_cached_collections()
+        connect(cls.db_name, host='mongodb://localhost', mongo_client_class=mongomock.MongoClient)
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect()
+        _reset_cached_collections()
+        try:
+            # Restore the connection conftest.py configures for the rest of the suite
+            from core.config import MONGO_URI
+            connect(host=MONGO_URI)
+        except Exception:
+            pass
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        from mongoengine.connection import get_db
+        db = get_db()
+        for name in db.list_collection_names():
+            db.drop_collection(name)
+        # Dropping also drops the indexes; let each Document re-ensure them (unique keys included)
+        _reset_cached_collections()
+
+    def count_queries(self, document_cls):
+        """
+        Patch `document_cls.objects` with a counting wrapper.
+        Returns the Mock; its call_count is the number of queries issued through the manager.
+        """
+        original = document_cls.objects
+        counter = Mock(side_effect=lambda *args, **kwargs: original(*args, **kwargs))
+        patcher = patch.object(document_cls, 'objects', counter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return counter
+
+    @contextmanager
+    def atomic_writes(self):
+        """
+        Make every mongomock write one atomic step, as a single-document write is on mongod
+        (mongomock matches filters and checks unique indexes before writing, without a lock).
+        For tests that race writers on several threads.
+        """
+        lock = threading.RLock()
+
+        def guarded(method):
+            @functools.wraps(method)
+            def wrapper(self, *args, **kwargs):
+                with lock:
+                    return method(self, *args, **kwargs)
+            return wrapper
+
+        patchers = [patch.object(_MockCollection, name, guarded(getattr(_MockCollection, name))) for name in _WRITE_METHODS]
+        for patcher in patchers:
+            patcher.start()
+        try:
+            yield
+        finally:
+            for patcher in patchers:
+                patcher.stop()
+
+    @contextmanager
+    def assertQueryBudget(self, max_commands: int, collection: str = None):
+        """
+        Fail if the block issues more than max_commands database commands
+        (optionally only counting one collection). Yields the QueryStats.
+        """
+        with query_metrics.track_queries() as stats:
+            yield stats
+        if collection:
+            used = stats.by_collection.get(collection, {}).get("commands", 0)
+        else:
+            used = stats.commands
+        if used > max_commands:
+            self.fail(
+                f"Query budget exceeded: {used} commands > {max_commands}"
+                f"{' on ' + collection if collection else ''}; per collection: "
+                f"{ {k: v['commands'] for k, v in stats.by_collection.items()} }"
+            )
+
+    @contextmanager
+    def assertNoWrites(self):
+        """Fail if the block inserts, updates or deletes anything (e.g. a GET handler). Yields the QueryStats."""
+        with query_metrics.track_queries() as stats:
+            yield stats
+        if stats.writes:
+            self.fail(f"Unexpected writes: {stats.writes}")
@@ -0,0 +1,106 @@
+"""
+Unit Tests for the targeted cascade auto-upgrade check
+
+The targeted check only evaluates (upline, slot) pairs whose open reserve covers
+the slot cost; on a generated network it must trigger exactly the upgrades the
+brute-force 17 x 16 check triggers.
+"""
+
+import contextlib
+import io
+from collections import defaultdict
+from decimal import Decimal
+
+from mongoengine.connection import get_db
+
+from tests.mock_db import MockDBTestCase
+import modules.matrix  # noqa: F401  (loads matrix before dream_matrix to avoid the import cycle)
+from modules.auto_upgrade.service import AutoUpgradeService
+from modules.slot.model import SlotActivation
+from modules.wallet.model import ReserveLedger
+from modules.wallet.reserve_account_service import ReserveAccountService
+from tests.benchmarks.network_generator import NetworkGenerator
+
+
+class TestTargetedCascadeCheck(MockDBTestCase):
+
+    NETWORK_SIZE = 120
+
+    def setUp(self):
+        super().setUp()
+        docs = defaultdict(list)
+        for collection, doc in NetworkGenerator(self.NETWORK_SIZE, seed=7).generate():
+            docs[collection].append(doc)
+        self.docs = docs
+
+        # Deepest binary member and its upline chain
+        slot1 = {d['user_id']: d for d in docs['tree_placement'] if d['program'] == 'binary' and d['slot_no'] == 1}
+
+        def chain(user_id):
+            uplines = []
+            while slot1[user_id].get('upline_id'):
+                user_id = slot1[user_id]['upline_id']
+                uplines.append(user_id)
+            return uplines
+
+        self.new_user = max(slot1, key=lambda u: len(chain(u)))
+        self.uplines = chain(self.new_user)
+        active = defaultdict(set)
+        for a in docs['slot_activation']:
+            if a['program'] == 'binary':
+                active[a['user_id']].add(a['slot_no'])
+        self.next_slot = {u: max(active[u] or {0}) + 1 for u in self.uplines}
+
+    def _load(self):
+        db = get_db()
+        for name in db.list_collection_names():
+            db.drop_collection(name)
+        # mongomock ignores partialFilterExpression when indexing existing rows; index first
+        ReserveLedger.ensure_indexes()
+        for collection, docs in self.docs.items():
+            db[collection].insert_many([dict(d) for d in docs])
+
+        service = AutoUpgradeService()
+        accounts = ReserveAccountService()
+        # Two uplines reach their next slot cost, one falls short
+        for level, share in ((2, Decimal('1')), (4, Decimal('1')), (3, Decimal('0.5'))):
+            upline = self.uplines[level - 1]
+            slot_no = self.next_slot[upline]
+            accounts.credit(upline, 'binary', slot_no, service._get_binary_slot_cost(slot_no) * share,
+                            'tree_upline_reserve')
+
+    def _run(self, method):
+        self._load()
+        with self.assertQueryBudget(100_000) as stats, contextlib.redirect_stdout(io.StringIO()):
+            result = getattr(AutoUpgradeService(), method)(str(self.new_user))
+        self.assertTrue(result['success'], result)
+        activations = sorted(
+            (str(a.user_id), a.slot_no) for a in SlotActivation.objects(program='binary', upgrade_source='reserve')
+        )
+        return result, activations, stats
+
+    def test_matches_brute_force_triggers(self):
+        targeted, targeted_activations, _ = self._run('check_cascade_auto_upgrade_up_to_17_levels')
+        brute, brute_activations, _ = self._run('_check_cascade_auto_upgrade_brute_force')
+
+        triggered = [(t['upline_id'], t['slot_no']) for t in targeted['auto_upgrades_triggered']]
+        self.assertEqual(triggered, [(t['upline_id'], t['slot_no']) for t in brute['auto_upgrades_triggered']])
+        self.assertGreaterEqual(len(triggered), 2)
+        self.assertEqual(targeted_activations, brute_activations)
+
+    def test_only_fundable_pairs_are_evaluated(self):
+        targeted, _, targeted_stats = self._run('check_cascade_auto_upgrade_up_to_17_levels')
+        _, _, brute_stats = self._run('_check_cascade_auto_upgrade_brute_force')
+
+        self.assertEqual(targeted['pairs_evaluated'] + targeted['pairs_skipped'], 16 * len(self.uplines))
+        self.assertLessEqual(targeted['pairs_evaluated'], len(targeted['auto_upgrades_triggered']) + 2)
+        self.assertLess(targeted_stats.commands * 3, brute_stats.commands)
+
+    def test_missing_placement_is_reported(self):
+        result = AutoUpgradeService().check_cascade_auto_upgrade_up_to_17_levels('0' * 24)
+        self.assertFalse(result['success'])
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
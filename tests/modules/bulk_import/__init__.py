@@ -0,0 +1 @@
+# Bulk import module tests package initialization
@@ -0,0 +1,211 @@
+"""
+Bulk import tests for modules/bulk_import/service.py
+
+Covers:
+- The in-memory plan of a small network equals what the per-user placement services build
+- Written users, placements, activations, max-slot rows and sponsor counters
+- Row rejection (missing fields, sponsor after its referral, duplicate wallet)
+- Existing matrix trees: nodes appended with a version guard; a stale tree aborts the import before any write
+- A failing batch stops the write and reports the rows written before it
+- Matrix joins from the recycle cut-over onwards are deferred to the join service
+- CSV and NDJSON input
+"""
+
+import contextlib
+import io
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+from bson import ObjectId
+
+from tests.mock_db import MockDBTestCase
+import modules.matrix  # noqa: F401  (loads matrix before dream_matrix to avoid the import cycle)
+from modules.bulk_import.service import BulkImportService, read_rows
+from modules.matrix import geometry
+from modules.matrix.model import MatrixNode, MatrixTree
+from modules.matrix.service import MatrixService
+from modules.slot.model import SlotActivation, SlotRoster, UserMaxSlot
+from modules.tree.model import TreePlacement
+from modules.user.model import PartnerGraph, User
+
+# Integrations that run after a per-user matrix placement; not under test here
+PLACEMENT_HOOKS = (
+    '_track_mentorship_relationships_automatic', '_check_and_process_automatic_recycle',
+    '_check_and_process_dream_matrix_eligibility', 'check_and_process_automatic_upgrade',
+    'trigger_rank_update_automatic', 'trigger_global_integration_automatic', 'trigger_jackpot_integration_automatic',
+    'trigger_ngs_integration_automatic', 'trigger_mentorship_bonus_integration_automatic', '_log_matrix_placement',
+)
+
+
+def _row(n, sponsor, matrix=True):
+    row = {'wallet_address': f'0xbulk{n}', 'refered_by': sponsor, 'name': f'Bulk {n}', 'refer_code': f'BULK{n}'}
+    if matrix:
+        row['matrix_payment_tx'] = f'0xtx{n}'
+    return row
+
+
+def _network(size):
+    """Every user sponsors up to three of the next ones; one in four joins Binary only"""
+    return [_row(n, 'ROOT' if n < 3 else f'BULK{n // 3 - 1}', matrix=n % 4 != 3) for n in range(size)]
+
+
+class TestBulkImport(MockDBTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.root = User._get_collection().insert_one({
+            'uid': 'root', 'refer_code': 'ROOT', 'wallet_address': '0xroot', 'name': 'Root', 'refered_by': None,
+        }).inserted_id
+        self.service = BulkImportService(batch_size=7)
+        for hook in PLACEMENT_HOOKS:
+            patcher = patch.object(MatrixService, hook)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _quiet(self):
+        return contextlib.redirect_stdout(io.StringIO())
+
+    def test_plan_matches_per_user_path(self):
+        with self._quiet():
+            verification = self.service.verify(_network(30))
+
+        self.assertEqual(verification['mismatches'], [])
+        self.assertTrue(verification['success'])
+        # 30 users x 2 binary slots + matrix placements + roots, and the matrix trees
+        self.assertGreater(verification['compared'], 60)
+        # The scratch database is gone and the test database untouched
+        self.assertEqual(User.objects.count(), 1)
+        self.assertEqual(TreePlacement.objects.count(), 0)
+
+    def test_import_writes_network(self):
+        rows = _network(12)
+        with self._quiet():
+            result = self.service.import_rows(rows, verify_sample=6)
+
+        self.assertTrue(result['success'], result)
+        self.assertTrue(result['verification']['success'])
+        self.assertEqual(result['plan']['rejected'], 0)
+        self.assertEqual(User.objects.count(), 13)
+        self.assertEqual(TreePlacement.objects(program='binary', slot_no=1, level__gt=0).count(), 12)
+        self.assertEqual(TreePlacement.objects(program='binary', slot_no=2).count(), 12)
+        matrix_users = sum(1 for row in rows if 'matrix_payment_tx' in row)
+        self.assertEqual(SlotActivation.objects(program='matrix').count(), matrix_users)
+        self.assertEqual(SlotActivation.objects(program='binary').count(), 24)
+        self.assertEqual(UserMaxSlot.objects(program='binary', max_slot=2).count(), 12)
+        self.assertEqual(SlotRoster.objects(program='binary', slot_no=2).count(), 12)
+        self.assertEqual(SlotRoster.objects(program='matrix', slot_no=1).count(), matrix_users)
+
+        root = User.objects.get(id=self.root)
+        self.assertEqual(root.partners_count, 3)
+        graph = PartnerGraph.objects.get(user_id=self.root)
+        self.assertEqual(len(graph.directs), 3)
+        self.assertEqual(graph.directs_count_by_program['binary'], 3)
+        first = User.objects.get(refer_code='BULK0')
+        self.assertEqual((first.partners_count, first.binary_joined, first.matrix_joined), (3, True, True))
+        self.assertEqual(PartnerGraph.objects.get(user_id=first.id).directs_count_by_program['matrix'], 2)
+
+        seats = {(p.upline_id, p.position) for p in TreePlacement.objects(program='binary', slot_no=1, level__gt=0)}
+        self.assertEqual(len(seats), 12)
+
+    def test_rows_are_rejected(self):
+        rows = [
+            _row(0, 'ROOT'),
+            {'wallet_address': '0xnoname', 'refered_by': 'ROOT'},
+            _row(1, 'BULK2'),
+            _row(2, 'BULK0'),
+            {**_row(3, 'ROOT'), 'wallet_address': '0xbulk0'},
+            {**_row(4, 'ROOT'), 'wallet_address': '0xroot'},
+        ]
+        with self._quiet():
+            plan = self.service.plan(rows)
+
+        self.assertEqual([r['row'] for r in plan.rejected], [2, 3, 5, 6])
+        self.assertIn('name', plan.rejected[0]['error'])
+        self.assertIn("'BULK2' not found", plan.rejected[1]['error'])
+        self.assertEqual(plan.summary()['users'], 2)
+
+    def test_existing_tree_receives_nodes(self):
+        MatrixTree(user_id=self.root, current_slot=1).save()
+        with self._quiet():
+            plan = self.service.plan([_row(n, 'ROOT') for n in range(4)])
+            written = self.service.write(plan)
+
+        self.assertEqual((written['matrix_trees_updated'], written['through_row']), (1, 4))
+        self.assertNotIn('error', written)
+        tree = MatrixTree.objects.get(user_id=self.root)
+        self.assertEqual(sorted((n.level, n.position) for n in tree.nodes), sorted(geometry.WAVE_ORDER[:4]))
+        self.assertEqual((tree.version, tree.total_members, tree.level_1_members, tree.level_2_members), (4, 4, 3, 1))
+        self.assertEqual(MatrixTree.objects.count(), 5)
+
+        # A tree that changed after it was read aborts the import before anything is written
+        counts = {cls: cls.objects.count() for cls in (User, PartnerGraph, TreePlacement, SlotActivation, SlotRoster)}
+        plan = self.service.plan
+
+        def plan_then_join(rows):
+            planned = plan(rows)
+            MatrixTree.objects(user_id=self.root).update_one(inc__version=1)
+            return planned
+
+        with self._quiet(), patch.object(self.service, 'plan', plan_then_join):
+            result = self.service.import_rows([_row(n, 'ROOT') for n in range(4, 6)])
+        written = result['written']
+        self.assertEqual(written['stale_trees'], [str(self.root)])
+        self.assertEqual((written['rows'], written['through_row']), (0, None))
+        self.assertIn('nothing was written', result['error'])
+        self.assertFalse(result['success'])
+        self.assertNotIn('deferred', result)
+        self.assertEqual({cls: cls.objects.count() for cls in counts}, counts)
+        self.assertEqual(len(MatrixTree.objects.get(user_id=self.root).nodes), 4)
+
+    def test_failed_batch_reports_the_written_prefix(self):
+        rows = _network(20)
+        insert_many = type(TreePlacement._get_collection()).insert_many
+
+        def failing_insert(collection, docs, *args, **kwargs):
+            # Placements of the second batch (rows 8-14) fail once its users are in
+            if collection.name == 'tree_placement' and User.objects(refer_code='BULK7').count():
+                raise RuntimeError("write concern timeout")
+            return insert_many(collection, docs, *args, **kwargs)
+
+        with self._quiet(), patch.object(type(TreePlacement._get_collection()), 'insert_many', failing_insert):
+            result = self.service.import_rows(rows)
+
+        self.assertFalse(result['success'])
+        written = result['written']
+        self.assertEqual((written['rows'], written['through_row'], written['failed_rows']), (7, 7, [8, 14]))
+        self.assertIn('write concern timeout', result['error'])
+        self.assertNotIn('deferred', result)
+        # Rows 1-7 are complete: their placements, activations and sponsor counters are all written
+        written_users = User.objects(refer_code__in=[f'BULK{n}' for n in range(7)])
+        self.assertEqual(TreePlacement.objects(user_id__in=[u.id for u in written_users], program='binary').count(), 14)
+        self.assertEqual(User.objects.get(id=self.root).partners_count, 3)
+        self.assertEqual(User.objects(refer_code='BULK15').count(), 0)
+
+    def test_matrix_joins_after_recycle_are_deferred(self):
+        nodes = [MatrixNode(level=level, position=position, user_id=ObjectId(), slot_no=1)
+                 for level, position in geometry.WAVE_ORDER[:37]]
+        MatrixTree(user_id=self.root, current_slot=1, nodes=nodes, total_members=37, version=37).save()
+        with self._quiet():
+            plan = self.service.plan([_row(0, 'ROOT'), _row(1, 'ROOT'), _row(2, 'BULK0'), _row(3, 'ROOT', matrix=False)])
+
+        self.assertEqual([entry['matrix'] for entry in plan.entries], ['placed', 'deferred', 'deferred', None])
+        self.assertEqual(plan.matrix_cutover_row, 2)
+        summary = plan.summary()
+        self.assertEqual((summary['matrix_placed'], summary['matrix_deferred'], summary['users']), (1, 2, 4))
+        # Deferred joins still get their Binary placements
+        self.assertEqual(sum(1 for p in plan.placements if p['program'] == 'binary' and p['level'] > 0), 8)
+
+    def test_read_rows_csv_and_ndjson(self):
+        rows = [_row(0, 'ROOT'), _row(1, 'BULK0', matrix=False)]
+        with tempfile.TemporaryDirectory() as folder:
+            ndjson_path, csv_path = os.path.join(folder, 'net.ndjson'), os.path.join(folder, 'net.csv')
+            with open(ndjson_path, 'w') as handle:
+                handle.write('\n'.join(json.dumps(row) for row in rows) + '\n\n')
+            with open(csv_path, 'w') as handle:
+                handle.write('wallet_address,refered_by,name,refer_code,matrix_payment_tx\n')
+                handle.write('0xbulk0,ROOT,Bulk 0,BULK0,0xtx0\n0xbulk1,BULK0,Bulk 1,BULK1,\n')
+
+            self.assertEqual(list(read_rows(ndjson_path)), rows)
+            self.assertEqual(list(read_rows(csv_path)), rows)
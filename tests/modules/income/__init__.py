@@ -0,0 +1 @@
+# Income module tests package initialization
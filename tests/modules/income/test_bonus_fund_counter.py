@@ -0,0 +1,177 @@
+"""
+Unit Tests for sharded BonusFund balances (BonusFundCounter)
+
+Test Coverage:
+- Increments spread over shards without reading the fund; totals sum base + shards
+- Per-fund shard count, including shards left above a lowered count
+- fold() moves shard amounts into BonusFund without changing totals
+- A fold interrupted after either step is finished once by the next fold()
+- Distribution and Spark paths write shards; Triple Entry payouts see unfolded shards
+- reserve() never pays out more than the fund holds, under concurrency or when paused
+"""
+
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest.mock import patch
+
+from bson import ObjectId
+
+from tests.mock_db import MockDBTestCase
+import modules.matrix  # noqa: F401  (loads matrix before dream_matrix to avoid the import cycle)
+from modules.fund_distribution.service import FundDistributionService
+from modules.income.bonus_fund import BonusFund, BonusFundShard
+from modules.income.bonus_fund_counter import BonusFundCounter
+from modules.spark.service import SparkService
+
+
+class TestBonusFundCounter(MockDBTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.counter = BonusFundCounter()
+        BonusFund(fund_type='royal_captain', program='matrix', total_collected=Decimal('10'),
+                  current_balance=Decimal('10')).save()
+
+    def test_increments_are_writes_only_and_sum_up(self):
+        self.counter.shard_count('royal_captain', 'matrix')
+        with self.assertQueryBudget(1):
+            self.counter.add('royal_captain', 'matrix', collected=Decimal('1.5'), balance=Decimal('1.5'))
+        for _ in range(39):
+            self.counter.add('royal_captain', 'matrix', collected=Decimal('1.5'), balance=Decimal('1.5'))
+
+        totals = self.counter.totals('royal_captain', 'matrix')
+        self.assertEqual(totals['total_collected'], Decimal('70'))
+        self.assertEqual(totals['current_balance'], Decimal('70'))
+        self.assertEqual(totals['total_distributed'], Decimal('0'))
+        self.assertGreater(BonusFundShard.objects(fund_type='royal_captain').count(), 1)
+        self.assertEqual(BonusFund.objects.first().current_balance, Decimal('10'))
+
+    def test_shard_count_is_per_fund(self):
+        self.counter.set_shard_count('royal_captain', 'matrix', 1)
+        for _ in range(5):
+            self.counter.add('royal_captain', 'matrix', balance=Decimal('1'))
+        self.counter.add('jackpot_entry', 'matrix', balance=Decimal('1'))
+
+        self.assertEqual(BonusFundShard.objects(fund_type='royal_captain').distinct('shard'), [0])
+        self.assertEqual(self.counter.shard_count('jackpot_entry', 'matrix'), 8)
+
+    def test_fold_keeps_totals_and_empties_shards(self):
+        for _ in range(10):
+            self.counter.add('royal_captain', 'matrix', collected=Decimal('2'), balance=Decimal('2'))
+        self.counter.add('royal_captain', 'matrix', balance=Decimal('-5'), distributed=Decimal('5'))
+        self.counter.add('shareholders', 'global', collected=Decimal('3'), balance=Decimal('3'))
+        before = self.counter.totals('royal_captain', 'matrix')
+
+        self.assertGreater(self.counter.fold(), 0)
+
+        self.assertEqual(self.counter.totals('royal_captain', 'matrix'), before)
+        fund = BonusFund.objects(fund_type='royal_captain').first()
+        self.assertEqual(fund.current_balance, Decimal('25'))
+        self.assertEqual(fund.total_distributed, Decimal('5'))
+        self.assertEqual(self.counter.balance('shareholders', 'global'), Decimal('3'))
+        self.assertEqual(self.counter.fold(), 0)
+
+    def test_fold_interrupted_before_the_fund_credit_is_finished_once(self):
+        self.counter.set_shard_count('royal_captain', 'matrix', 1)
+        self.counter.add('royal_captain', 'matrix', collected=Decimal('4'), balance=Decimal('4'))
+        with patch.object(BonusFundCounter, '_credit_fold', side_effect=RuntimeError("crashed")):
+            with self.assertRaises(RuntimeError):
+                self.counter.fold()
+        # Parked on the shard: not counted anywhere until the next fold
+        self.assertEqual(self.counter.balance('royal_captain', 'matrix'), Decimal('10'))
+        self.counter.add('royal_captain', 'matrix', balance=Decimal('1'))
+
+        self.counter.fold()
+        self.counter.fold()
+
+        fund = BonusFund.objects(fund_type='royal_captain').first()
+        self.assertEqual((fund.current_balance, fund.total_collected), (Decimal('15'), Decimal('14')))
+        self.assertEqual(self.counter.balance('royal_captain', 'matrix'), Decimal('15'))
+        self.assertFalse(BonusFundShard.objects(pending_fold__ne=None).count())
+
+    def test_fold_interrupted_after_the_fund_credit_is_not_counted_twice(self):
+        self.counter.add('royal_captain', 'matrix', balance=Decimal('4'))
+        collection_cls = type(BonusFundShard._get_collection())
+        update_one = collection_cls.update_one
+
+        def crash_on_clear(collection, query, update, *args, **kwargs):
+            if '$unset' in update:
+                raise RuntimeError("crashed")
+            return update_one(collection, query, update, *args, **kwargs)
+
+        with patch.object(collection_cls, 'update_one', crash_on_clear):
+            with self.assertRaises(RuntimeError):
+                self.counter.fold()
+        self.assertEqual(BonusFundShard.objects(pending_fold__ne=None).count(), 1)
+
+        self.counter.fold()
+
+        self.assertEqual(BonusFund.objects(fund_type='royal_captain').first().current_balance, Decimal('14'))
+        self.assertEqual(self.counter.balance('royal_captain', 'matrix'), Decimal('14'))
+        self.assertFalse(BonusFundShard.objects(pending_fold__ne=None).count())
+
+    def test_lowered_shard_count_strands_nothing(self):
+        self.counter.set_shard_count('royal_captain', 'matrix', 4)
+        for _ in range(20):
+            self.counter.add('royal_captain', 'matrix', balance=Decimal('1'))
+        self.counter.set_shard_count('royal_captain', 'matrix', 1)
+
+        self.assertEqual(self.counter.balance('royal_captain', 'matrix'), Decimal('30'))
+        self.counter.fold()
+        self.assertEqual(BonusFund.objects(fund_type='royal_captain').first().current_balance, Decimal('30'))
+
+    def test_concurrent_reserves_never_overdraw(self):
+        self.counter.add('royal_captain', 'matrix', collected=Decimal('2'), balance=Decimal('2'))
+        start = threading.Barrier(20)
+
+        def payout(_):
+            start.wait()
+            return self.counter.reserve('royal_captain', 'matrix', Decimal('1'))
+
+        with self.atomic_writes(), ThreadPoolExecutor(max_workers=20) as pool:
+            taken = list(pool.map(payout, range(20)))
+
+        self.assertEqual(sum(taken), Decimal('12'))
+        totals = self.counter.totals('royal_captain', 'matrix')
+        self.assertEqual((totals['current_balance'], totals['total_distributed']), (Decimal('0'), Decimal('12')))
+
+    def test_paused_fund_reads_empty_and_pays_nothing(self):
+        BonusFund.objects(fund_type='royal_captain').update_one(set__status='paused')
+
+        self.assertEqual(self.counter.balance('royal_captain', 'matrix'), Decimal('0'))
+        self.assertEqual(self.counter.reserve('royal_captain', 'matrix', Decimal('1')), Decimal('0'))
+
+        BonusFund.objects(fund_type='royal_captain').update_one(set__status='active')
+        self.assertEqual(self.counter.balance('royal_captain', 'matrix'), Decimal('10'))
+
+
+class TestFundWriters(MockDBTestCase):
+
+    def test_income_event_increments_fund_shard(self):
+        FundDistributionService()._create_income_event(
+            str(ObjectId()), str(ObjectId()), 'binary', 1, 'royal_captain', Decimal('0.004'), Decimal('4'),
+            'tx-rc-1', 'royal captain share', currency='BNB'
+        )
+
+        self.assertEqual(BonusFund.objects.count(), 0)
+        self.assertEqual(BonusFundCounter().balance('royal_captain', 'binary'), Decimal('0.004'))
+
+    def test_spark_contribution_and_triple_entry_payout(self):
+        spark = SparkService()
+        self.assertTrue(spark.contribute_to_spark_fund(Decimal('100'), 'matrix')['success'])
+
+        counter = BonusFundCounter()
+        self.assertEqual(counter.balance('spark_bonus', 'matrix'), Decimal('6.4'))
+        self.assertEqual(counter.balance('triple_entry', 'matrix'), Decimal('1.44'))
+
+        result = spark._deduct_from_triple_entry_fund(Decimal('1'), 'USDT')
+        self.assertTrue(result['success'])
+        totals = counter.totals('triple_entry', 'matrix')
+        self.assertEqual(totals['current_balance'], Decimal('0.44'))
+        self.assertEqual(totals['total_distributed'], Decimal('1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,316 @@
+"""
+Unit Tests for BlockchainIndexer against a local JSON-RPC stub
+
+The stub serves recorded contract logs over HTTP, rejects eth_getLogs ranges
+wider than a provider limit (forcing adaptive splitting) and records how many
+requests were in flight at once.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from eth_abi import encode
+
+from tests.mock_db import MockDBTestCase
+from modules.blockchain.model import BlockchainEvent, SystemConfig
+from modules.indexer.model import IndexerCheckpoint
+from modules.indexer.events import EVENT_TOPICS, decode_logs
+from modules.indexer.service import BlockchainIndexer, _is_range_limit_error, _is_rate_limit_error
+
+CONTRACT = '0x' + '11' * 20
+
+
+def _address(n):
+    return '0x' + f"{n:040x}"
+
+
+def _topic_address(n):
+    return '0x' + f"{n:064x}"
+
+
+def recorded_logs(first_block, last_block, every=25, tx_salt=0):
+    """Registered + SlotPurchased logs every `every` blocks (two logs per transaction)"""
+    logs = []
+    for block in range(first_block, last_block + 1, every):
+        tx = '0x' + f"{block + tx_salt:064x}"
+        block_hash = '0x' + f"{block + (2 if tx_salt else 1) * 10**9:064x}"
+        user, referrer = block, block + 1
+        logs.append({
+            'address': CONTRACT, 'blockNumber': hex(block), 'blockHash': block_hash, 'transactionHash': tx,
+            'transactionIndex': '0x0', 'logIndex': '0x0', 'removed': False,
+            'topics': ['0x' + EVENT_TOPICS['Registered'], _topic_address(user)],
+            'data': '0x' + encode(['address', 'bytes32'], [_address(referrer), b'code'.ljust(32, b'\0')]).hex(),
+        })
+        logs.append({
+            'address': CONTRACT, 'blockNumber': hex(block), 'blockHash': block_hash, 'transactionHash': tx,
+            'transactionIndex': '0x0', 'logIndex': '0x1', 'removed': False,
+            'topics': ['0x' + EVENT_TOPICS['SlotPurchased'], _topic_address(user)],
+            'data': '0x' + encode(['uint8', 'uint256'], [1, 2 * 10**15]).hex(),
+        })
+    return logs
+
+
+class StubRPC:
+    """Minimal JSON-RPC server: eth_blockNumber, eth_getLogs (with a range limit)"""
+
+    def __init__(self, head, logs, max_range=500, latency=0.005):
+        self.head = head
+        self.logs = logs
+        self.max_range = max_range
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.get_logs_calls = 0
+        self.rejected = 0
+        self.fork = {}  # block number -> replacement hash after a simulated reorg
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                body = json.dumps(stub.handle(request)).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def handle(self, request):
+        reply = {'jsonrpc': '2.0', 'id': request['id']}
+        method = request['method']
+        if method == 'eth_blockNumber':
+            reply['result'] = hex(self.head)
+        elif method == 'eth_chainId':
+            reply['result'] = hex(204)
+        elif method == 'eth_getBlockByNumber':
+            number = int(request['params'][0], 16)
+            reply['result'] = {
+                'number': hex(number), 'hash': self.block_hash(number), 'parentHash': self.block_hash(number - 1),
+                'timestamp': hex(1700000000 + number), 'transactions': [],
+            }
+        elif method == 'eth_getLogs':
+            with self.lock:
+                self.get_logs_calls += 1
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                time.sleep(self.latency)
+                params = request['params'][0]
+                start, end = int(params['fromBlock'], 16), int(params['toBlock'], 16)
+                if end - start + 1 > self.max_range:
+                    with self.lock:
+                        self.rejected += 1
+                    reply['error'] = {'code': -32005, 'message': f"query exceeds max block range {self.max_range}"}
+                else:
+                    reply['result'] = [log for log in self.logs if start <= int(log['blockNumber'], 16) <= end]
+            finally:
+                with self.lock:
+                    self.in_flight -= 1
+        else:
+            reply['error'] = {'code': -32601, 'message': f"method not found: {method}"}
+        return reply
+
+    def block_hash(self, number):
+        return self.fork.get(number) or '0x' + f"{number + 10**9:064x}"
+
+    def reorg(self, from_block, logs):
+        """Replace every block from from_block on with new hashes and the given logs"""
+        for number in range(from_block, self.head + 1):
+            self.fork[number] = '0x' + f"{number + 2 * 10**9:064x}"
+        self.logs = [log for log in self.logs if int(log['blockNumber'], 16) < from_block] + logs
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestDecodeLogs(MockDBTestCase):
+
+    def test_batch_decode(self):
+        events = decode_logs(recorded_logs(100, 100))
+        self.assertEqual([e['event'] for e in events], ['Registered', 'SlotPurchased'])
+        registered, purchased = events
+        self.assertEqual(registered['user'], _address(100))
+        self.assertEqual(registered['args']['referrer'], _address(101))
+        self.assertEqual((purchased['args']['slot'], purchased['args']['amount']), (1, str(2 * 10**15)))
+        self.assertEqual((purchased['block_number'], purchased['log_index']), (100, 1))
+
+    def test_unknown_topics_are_skipped(self):
+        log = dict(recorded_logs(5, 5)[0], topics=['0x' + 'ab' * 32])
+        self.assertEqual(decode_logs([log]), [])
+
+
+class TestProviderErrors(MockDBTestCase):
+
+    def test_range_limit_messages(self):
+        for message in ('query exceeds max block range 1000', 'query returned more than 10000 results',
+                        'Log response size exceeded', 'block range is too wide'):
+            self.assertTrue(_is_range_limit_error(RuntimeError(message)), message)
+
+    def test_rate_limits_are_not_range_limits(self):
+        too_many = RuntimeError("429, message='Too Many Requests'")
+        too_many.status = 429
+        for error in (too_many, RuntimeError('daily request count exceeded, request rate limited'),
+                      RuntimeError('rate limit exceeded for block range requests')):
+            self.assertTrue(_is_rate_limit_error(error), error)
+            self.assertFalse(_is_range_limit_error(error), error)
+
+
+class TestBlockchainIndexer(MockDBTestCase):
+
+    FIRST_BLOCK = 1001
+    HEAD = 6005  # target block = HEAD - SAFETY_LAG = 6000
+
+    def setUp(self):
+        super().setUp()
+        self.logs = recorded_logs(self.FIRST_BLOCK, 6000)
+        self.stub = StubRPC(self.HEAD, self.logs)
+        self.addCleanup(self.stub.close)
+
+    def _indexer(self, **kwargs):
+        return BlockchainIndexer(rpc_url=self.stub.url, contract_address=CONTRACT, **kwargs)
+
+    def _set_checkpoint(self, block):
+        IndexerCheckpoint.objects(indexer_key='binary_contract').update_one(upsert=True, set__last_block=block)
+
+    def _checkpoint(self):
+        return IndexerCheckpoint.objects(indexer_key='binary_contract').first()
+
+    def test_indexes_all_logs_with_bounded_concurrency(self):
+        indexer = self._indexer(max_in_flight=3)
+        started = time.perf_counter()
+        with self.assertQueryBudget(200, collection='blockchain_event'):
+            stored = asyncio.run(self._run_from(indexer, self.FIRST_BLOCK))
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(stored, len(self.logs))
+        self.assertEqual(BlockchainEvent.objects(event_type='contract_event').count(), len(self.logs))
+        self.assertEqual(self._checkpoint().last_block, 6000)
+        self.assertLessEqual(self.stub.max_in_flight, 3)
+        self.assertGreater(self.stub.max_in_flight, 1)
+        # 2000-block requests were rejected and split down to the provider limit
+        self.assertGreater(indexer.stats['splits'], 0)
+        self.assertLessEqual(indexer.chunk_size, 2000)
+        print(f"indexed {stored} logs in {elapsed:.2f}s ({stored / elapsed:.0f} logs/s, "
+              f"{self.stub.get_logs_calls} eth_getLogs calls, {self.stub.rejected} rejected)")
+
+    async def _run_from(self, indexer, first_block=None):
+        if first_block is not None:
+            self._set_checkpoint(first_block - 1)
+        try:
+            return await indexer.process_blocks()
+        finally:
+            await indexer.w3.provider.disconnect()
+
+    def test_one_bulk_write_per_chunk(self):
+        indexer = self._indexer(chunk_size=500, max_in_flight=2)
+        with self.assertQueryBudget(10_000) as stats:
+            asyncio.run(self._run_from(indexer, self.FIRST_BLOCK))
+        events = stats.by_collection['blockchain_event']['commands']
+        self.assertEqual(events, indexer.stats['chunks'])
+        self.assertEqual(indexer.stats['chunks'], 10)
+
+    def test_rerun_is_idempotent_and_resumes_from_checkpoint(self):
+        indexer = self._indexer(chunk_size=400)
+        asyncio.run(self._run_from(indexer, self.FIRST_BLOCK))
+        self.assertEqual(asyncio.run(self._run_from(indexer)), 0)
+
+        # Replaying an already stored range does not duplicate events
+        asyncio.run(self._run_from(indexer, 5001))
+        self.assertEqual(BlockchainEvent.objects.count(), len(self.logs))
+
+    def test_failed_fetch_keeps_last_stored_checkpoint(self):
+        indexer = self._indexer(chunk_size=500, max_in_flight=1)
+        original = indexer._get_logs
+
+        async def failing(from_block, to_block):
+            if from_block > 3000:
+                raise RuntimeError('connection reset')
+            return await original(from_block, to_block)
+
+        indexer._get_logs = failing
+        with self.assertRaises(RuntimeError):
+            asyncio.run(self._run_from(indexer, self.FIRST_BLOCK))
+        self.assertEqual(self._checkpoint().last_block, 3000)
+        self.assertEqual(BlockchainEvent.objects.count(),
+                         len([log for log in self.logs if int(log['blockNumber'], 16) <= 3000]))
+
+    def test_rate_limited_range_is_retried_not_split(self):
+        indexer = self._indexer(chunk_size=500, max_in_flight=2)
+        original = indexer._get_logs
+        throttled = set()
+
+        async def rate_limited(from_block, to_block):
+            if from_block not in throttled:
+                throttled.add(from_block)
+                raise RuntimeError('rate limit exceeded, too many requests')
+            return await original(from_block, to_block)
+
+        indexer._get_logs = rate_limited
+        with patch('modules.indexer.service.RATE_LIMIT_BACKOFF', 0):
+            stored = asyncio.run(self._run_from(indexer, self.FIRST_BLOCK))
+
+        self.assertEqual(stored, len(self.logs))
+        self.assertEqual(indexer.stats['splits'], 0)
+        self.assertEqual(indexer.stats['rate_limited'], 10)
+        self.assertEqual(indexer.chunk_size, 500)
+
+
+    def test_reorg_rolls_back_only_the_affected_range(self):
+        indexer = self._indexer(chunk_size=500)
+        asyncio.run(self._run_from(indexer, self.FIRST_BLOCK))
+        window = self._checkpoint().recent_blocks
+        self.assertEqual([b['number'] for b in window], list(range(1500, 6001, 500)))
+        kept_before = {e.id for e in BlockchainEvent.objects(block_number__lte=4000)}
+
+        new_logs = recorded_logs(4321, 6000, every=40, tx_salt=10**12)
+        self.stub.reorg(4321, new_logs)
+        stored = asyncio.run(self._run_from(indexer))
+
+        checkpoint = self._checkpoint()
+        self.assertEqual(checkpoint.reorg_count, 1)
+        self.assertEqual(checkpoint.last_reorg['ancestor'], 4000)
+        self.assertEqual(checkpoint.last_block, 6000)
+        self.assertEqual(checkpoint.recent_blocks[-1]['hash'], self.stub.block_hash(6000))
+        # Blocks up to the common ancestor are untouched; the rest now mirrors the new fork
+        self.assertEqual({e.id for e in BlockchainEvent.objects(block_number__lte=4000)}, kept_before)
+        replaced = [e for e in recorded_logs(4001, 4320)] + new_logs
+        self.assertEqual(stored, len(replaced))
+        self.assertEqual(BlockchainEvent.objects(block_number__gt=4000).count(), len(replaced))
+        self.assertEqual(BlockchainEvent.objects.count(), len(self.stub.logs))
+
+    def test_no_reorg_costs_one_hash_lookup(self):
+        indexer = self._indexer(chunk_size=500)
+        asyncio.run(self._run_from(indexer, self.FIRST_BLOCK))
+        self.assertIsNone(asyncio.run(self._check_reorg(indexer)))
+        self.assertEqual(indexer.stats['reorgs'], 0)
+
+    async def _check_reorg(self, indexer):
+        try:
+            return await indexer.check_reorg()
+        finally:
+            await indexer.w3.provider.disconnect()
+
+    def test_legacy_checkpoint_is_picked_up(self):
+        SystemConfig(config_key='indexer_last_block', config_value='5000').save()
+        indexer = self._indexer()
+        asyncio.run(self._run_from(indexer))
+        self.assertEqual(BlockchainEvent.objects(block_number__lte=5000).count(), 0)
+        self.assertEqual(self._checkpoint().last_block, 6000)
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
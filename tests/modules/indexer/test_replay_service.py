@@ -0,0 +1,176 @@
+"""
+Unit Tests for EventReplayService
+
+Stored contract events are replayed into placements, activations and ledgers;
+replays are idempotent, partitioned by wallet with per-wallet order preserved,
+and a reorg rollback reverts the derived writes of the dropped events, including
+the max slot counters and slot rosters the activation save() hooks would have kept.
+"""
+
+from decimal import Decimal
+
+from eth_abi import encode
+from web3 import Web3
+
+from tests.mock_db import MockDBTestCase
+import modules.matrix  # noqa: F401  (loads matrix before dream_matrix to avoid the import cycle)
+from modules.blockchain.model import BlockchainEvent
+from modules.income.model import IncomeEvent
+from modules.indexer.events import EVENT_ARG_NAMES, EVENT_ARG_TYPES, EVENT_TOPICS, decode_logs
+from modules.indexer.replay_service import EventReplayService, WEI
+from modules.indexer.service import BlockchainIndexer
+from modules.slot.model import SlotActivation, SlotCatalog, SlotRoster, UserMaxSlot
+from modules.tree.model import TreePlacement
+from modules.user.model import User
+from modules.wallet.model import WalletLedger
+
+CONTRACT = '0x' + '11' * 20
+
+
+def _wallet(n):
+    return '0x' + f"{n + 0xabc000:040x}"
+
+
+def make_log(name, block, log_index, **args):
+    """Encode a contract log with the first argument indexed (as decode_logs expects)"""
+    types = EVENT_ARG_TYPES[name]
+    values = [args[n] for n in EVENT_ARG_NAMES[name]]
+    return {
+        'address': CONTRACT, 'blockNumber': hex(block), 'blockHash': '0x' + f"{block:064x}",
+        'transactionHash': '0x' + f"{block * 100 + log_index:064x}", 'logIndex': hex(log_index),
+        'topics': ['0x' + EVENT_TOPICS[name], '0x' + encode(types[:1], values[:1]).hex()],
+        'data': '0x' + encode(types[1:], values[1:]).hex(),
+    }
+
+
+class TestEventReplayService(MockDBTestCase):
+
+    USERS = 12
+
+    def setUp(self):
+        super().setUp()
+        for slot_no in (1, 2, 3):
+            SlotCatalog(slot_no=slot_no, name=f"Slot {slot_no} name", price=Decimal('0.0022') * slot_no,
+                        currency='BNB', level=slot_no, program='binary', is_active=True).save()
+        self.users = []
+        for n in range(self.USERS):
+            # Half the wallets are stored checksummed, half lowercase
+            address = Web3.to_checksum_address(_wallet(n)) if n % 2 else _wallet(n)
+            self.users.append(User(uid=f"u{n}", refer_code=f"RC{n}", wallet_address=address, name=f"u{n}").save())
+
+        logs = []
+        block = 100
+        for n in range(1, self.USERS):
+            upline = (n - 1) // 2
+            amount = (n + 1) * 10**15
+            logs.append(make_log('Registered', block, 0, user=_wallet(n), referrer=_wallet(upline), code=b'x' * 32))
+            logs.append(make_log('Placed', block, 1, user=_wallet(n), slot=1, upline=_wallet(upline), is_left=n % 2 == 1))
+            logs.append(make_log('SlotPurchased', block, 2, user=_wallet(n), slot=1, amount=amount))
+            logs.append(make_log('LevelPayout', block, 3, user=_wallet(upline), **{'from': _wallet(n)},
+                                 level=1, slot=1, amount=amount))
+            block += 10
+        # A wallet nobody registered stays pending
+        logs.append(make_log('SlotPurchased', block, 0, user=_wallet(999), slot=1, amount=1))
+        self.logs = logs
+        self.indexer = BlockchainIndexer(rpc_url='http://127.0.0.1:1', contract_address=CONTRACT)
+        self.indexer._store_chunk(decode_logs(logs), block)
+
+    def test_replay_rebuilds_derived_state(self):
+        result = EventReplayService(workers=4, page_size=7).replay()
+        self.assertTrue(result['success'], result)
+        self.assertEqual(result['events'], len(self.logs))
+        self.assertEqual(result['skipped'], 1)
+        self.assertEqual(BlockchainEvent.objects(status='processed').count(), len(self.logs) - 1)
+
+        self.assertEqual(SlotActivation.objects(program='binary').count(), self.USERS - 1)
+        activation = SlotActivation.objects(user_id=self.users[3].id).first()
+        self.assertEqual(activation.slot_name, 'Slot 1 name')
+        self.assertEqual(Decimal(str(activation.amount_paid)), Decimal(4 * 10**15) / WEI)
+
+        placement = TreePlacement.objects(user_id=self.users[4].id, program='binary').first()
+        self.assertEqual(placement.upline_id, self.users[1].id)
+        self.assertEqual(placement.position, 'right')
+        self.assertEqual(User.objects(id=self.users[4].id).first().refered_by, self.users[1].id)
+
+        self.assertEqual(IncomeEvent.objects(income_type='level_payout').count(), self.USERS - 1)
+
+    def test_ledger_balances_follow_chain_order_per_user(self):
+        EventReplayService(workers=3, page_size=5).replay()
+        upline = self.users[0]
+        rows = sorted(WalletLedger.objects(user_id=upline.id), key=lambda r: r.tx_hash)
+        amounts = [Decimal(str(r.amount)) for r in rows]
+        balances = [Decimal(str(r.balance_after)) for r in rows]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(balances, [amounts[0], amounts[0] + amounts[1]])
+
+    def test_replay_is_idempotent(self):
+        service = EventReplayService(workers=4)
+        service.replay()
+        counts = [c.objects.count() for c in (SlotActivation, TreePlacement, IncomeEvent, WalletLedger)]
+        balances = sorted(str(r.balance_after) for r in WalletLedger.objects)
+        result = service.replay()
+        self.assertTrue(result['success'], result)
+        self.assertEqual([c.objects.count() for c in (SlotActivation, TreePlacement, IncomeEvent, WalletLedger)], counts)
+        self.assertEqual(sorted(str(r.balance_after) for r in WalletLedger.objects), balances)
+
+    def test_partitions_run_in_parallel_with_bounded_queries(self):
+        with self.assertQueryBudget(80) as stats:
+            EventReplayService(workers=4, page_size=1000).replay()
+        # One bulk_write per target collection and partition, not one write per event
+        self.assertLessEqual(stats.by_collection['slot_activation']['commands'], 4)
+        self.assertLessEqual(stats.by_collection['income_event']['commands'], 4)
+
+    def test_reorg_rollback_reverts_applied_events(self):
+        EventReplayService(workers=2).replay()
+        ancestor = 100 + 10 * 5  # users 1-6 stay, 7-11 are dropped
+        result = self.indexer._rollback_to(ancestor)
+        self.assertEqual(result['events_reverted'], 4 * 5)
+        self.assertEqual(result['events_removed'], 4 * 5 + 1)
+        for document_cls in (SlotActivation, IncomeEvent, WalletLedger, TreePlacement):
+            self.assertEqual(document_cls.objects.count(), 6, document_cls.__name__)
+        self.assertEqual(BlockchainEvent.objects(block_number__gt=ancestor).count(), 0)
+        referrers = [User.objects.get(id=user.id).refered_by for user in self.users[1:]]
+        self.assertEqual(referrers, [self.users[(n - 1) // 2].id for n in range(1, 7)] + [None] * 5)
+
+    def test_replayed_activations_keep_max_slot_current(self):
+        late_block = 100 + 10 * self.USERS + 50
+        self.indexer._store_chunk(decode_logs([
+            make_log('SlotPurchased', late_block, 0, user=_wallet(3), slot=2, amount=10**15),
+        ]), late_block)
+        EventReplayService(workers=2).replay()
+        self.assertEqual(UserMaxSlot.objects.get(user_id=self.users[3].id, program='binary').max_slot, 2)
+        self.assertEqual(UserMaxSlot.objects.get(user_id=self.users[4].id, program='binary').max_slot, 1)
+
+        # Replaying again neither fails on the existing rows nor changes them
+        self.assertTrue(EventReplayService(workers=2).replay()['success'])
+        self.assertEqual(UserMaxSlot.objects(program='binary').count(), self.USERS - 1)
+
+        # Reverting the upgrade lowers the max slot to what the remaining activations give
+        self.indexer._rollback_to(late_block - 1)
+        self.assertEqual(UserMaxSlot.objects.get(user_id=self.users[3].id, program='binary').max_slot, 1)
+        self.indexer._rollback_to(100)
+        self.assertEqual(UserMaxSlot.objects(user_id=self.users[3].id, program='binary').count(), 0)
+
+    def test_replayed_activations_join_the_slot_roster(self):
+        late_block = 100 + 10 * self.USERS + 50
+        self.indexer._store_chunk(decode_logs([
+            make_log('SlotPurchased', late_block, 0, user=_wallet(3), slot=2, amount=10**15),
+        ]), late_block)
+        EventReplayService(workers=2).replay()
+        EventReplayService(workers=2).replay()
+        self.assertEqual(SlotRoster.objects(program='binary', slot_no=1).count(), self.USERS - 1)
+        joined = SlotRoster.objects.get(program='binary', slot_no=1, user_id=self.users[3].id)
+        first = SlotActivation.objects.get(user_id=self.users[3].id, slot_no=1)
+        self.assertEqual((joined.joined_at, joined.joined_day), (first.activated_at, SlotRoster.day_of(first.activated_at)))
+        self.assertEqual(SlotRoster.objects(program='binary', slot_no=2).count(), 1)
+
+        self.indexer._rollback_to(late_block - 1)
+        self.assertEqual(SlotRoster.objects(program='binary', slot_no=2).count(), 0)
+        self.assertEqual(SlotRoster.objects(program='binary', user_id=self.users[3].id).count(), 1)
+        self.indexer._rollback_to(100 + 10 * 5)
+        self.assertEqual(SlotRoster.objects(program='binary', slot_no=1).count(), 6)
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+Concurrent placement tests for MatrixService._place_user_in_matrix_tree
+
+Covers:
+- Compare-and-swap on MatrixTree.version: a claim against a stale tree is refused
+- Sweepover and recycle placements claim through the same compare-and-swap and record the slot
+- 100 simultaneous joins under one sponsor: no position is taken twice, no node is lost,
+  full trees escalate to the next eligible upline, and every tree fills in wave order
+"""
+
+import contextlib
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest.mock import patch
+
+from bson import ObjectId
+
+from tests.mock_db import MockDBTestCase
+import modules.matrix  # noqa: F401  (loads matrix before dream_matrix to avoid the import cycle)
+from modules.matrix import geometry
+from modules.matrix.model import MatrixNode, MatrixTree
+from modules.matrix.recycle_service import MatrixRecycleService
+from modules.matrix.service import MatrixService
+from modules.matrix.sweepover_service import SweepoverService
+from modules.user.model import User
+
+JOINS = 100
+
+# Integrations that run after a placement; not under test here
+PLACEMENT_HOOKS = (
+    '_track_mentorship_relationships_automatic', '_check_and_process_automatic_recycle',
+    '_check_and_process_dream_matrix_eligibility', 'check_and_process_automatic_upgrade',
+    'trigger_rank_update_automatic', 'trigger_global_integration_automatic', 'trigger_jackpot_integration_automatic',
+    'trigger_ngs_integration_automatic', 'trigger_mentorship_bonus_integration_automatic', '_log_matrix_placement',
+)
+
+
+def _insert_user(refered_by=None):
+    key = ObjectId()
+    return User._get_collection().insert_one({
+        '_id': key, 'uid': f'u{key}', 'refer_code': f'r{key}', 'wallet_address': f'0x{key}', 'refered_by': refered_by,
+    }).inserted_id
+
+
+class TestConcurrentMatrixPlacement(MockDBTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # top <- upline <- sponsor: 3 x 39 positions for the joins to spread over
+        self.top = _insert_user()
+        self.upline = _insert_user(self.top)
+        self.sponsor = _insert_user(self.upline)
+        for owner in (self.top, self.upline, self.sponsor):
+            MatrixTree(user_id=owner, current_slot=1).save()
+        self.service = MatrixService()
+        for hook in PLACEMENT_HOOKS:
+            patcher = patch.object(MatrixService, hook)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_claim_against_stale_tree_is_refused(self):
+        first, stale = MatrixTree.objects.get(user_id=self.sponsor), MatrixTree.objects.get(user_id=self.sponsor)
+        node = lambda: MatrixNode(level=1, position=0, user_id=ObjectId(), slot_no=1)
+
+        self.assertTrue(self.service._claim_matrix_position(first, node()))
+        self.assertFalse(self.service._claim_matrix_position(stale, node()))
+        self.assertEqual((first.version, first.total_members, first.level_1_members), (1, 1, 1))
+
+        stored = MatrixTree.objects.get(user_id=self.sponsor)
+        self.assertEqual((stored.version, len(stored.nodes), stored.total_members), (1, 1, 1))
+
+    def test_recycle_placement_retries_a_lost_claim(self):
+        stale = MatrixTree.objects.get(user_id=self.sponsor)
+        # A concurrent join takes the first free position after the recycle read the tree
+        MatrixTree.objects.get(user_id=self.sponsor).claim_node(MatrixNode(level=1, position=0, user_id=ObjectId(), slot_no=2))
+        recycled = ObjectId()
+
+        result = MatrixRecycleService()._place_user_in_upline_tree(str(recycled), stale, 2)
+
+        self.assertTrue(result['success'], result)
+        self.assertEqual((result['placement_level'], result['placement_position']), (1, 1))
+        stored = MatrixTree.objects.get(user_id=self.sponsor)
+        self.assertEqual((stored.version, stored.total_members, stored.level_1_members), (2, 2, 2))
+        self.assertEqual([(n.user_id, n.slot_no) for n in stored.nodes][-1], (recycled, 2))
+
+    def test_sweepover_placement_claims_with_slot(self):
+        service = SweepoverService()
+        user = ObjectId()
+        with patch.object(service, '_create_matrix_activation'), patch.object(service, '_distribute_level_income'):
+            result = service._place_user_in_tree(str(self.sponsor), str(user), 3, 'tx-sweep', Decimal('10'))
+
+        self.assertTrue(result['success'], result)
+        stored = MatrixTree.objects.get(user_id=self.sponsor)
+        self.assertEqual((stored.version, stored.total_members, stored.level_1_members), (1, 1, 1))
+        self.assertEqual([(n.user_id, n.slot_no) for n in stored.nodes], [(user, 3)])
+
+    def test_simultaneous_joins_under_one_sponsor(self):
+        users = [str(_insert_user(self.sponsor)) for _ in range(JOINS)]
+        start = threading.Barrier(JOINS)
+
+        def join(user_id):
+            start.wait()
+            return self.service._place_user_in_matrix_tree(user_id, str(self.sponsor), None, slot_no=1)
+
+        with contextlib.redirect_stdout(io.StringIO()), self.atomic_writes():
+            with ThreadPoolExecutor(max_workers=JOINS) as pool:
+                results = list(pool.map(join, users))
+
+        self.assertEqual([r for r in results if not r.get('success')], [])
+        trees = {owner: MatrixTree.objects.get(user_id=owner) for owner in (self.sponsor, self.upline, self.top)}
+        self.assertEqual([len(trees[owner].nodes) for owner in (self.sponsor, self.upline, self.top)], [39, 39, 22])
+        self.assertEqual(sorted(str(n.user_id) for tree in trees.values() for n in tree.nodes), sorted(users))
+
+        for tree in trees.values():
+            positions = [(n.level, n.position) for n in tree.nodes]
+            # No position twice, and the taken positions are the start of the wave order
+            self.assertEqual(sorted(positions), sorted(geometry.WAVE_ORDER[:len(positions)]))
+            self.assertEqual(tree.version, len(tree.nodes))
+            self.assertEqual(tree.total_members, len(tree.nodes))
+            self.assertEqual(tree.level_1_members + tree.level_2_members + tree.level_3_members, len(tree.nodes))
@@ -0,0 +1,269 @@
+"""
+Unit Tests for Matrix tree geometry (modules/matrix/geometry.py)
+
+Test Coverage:
+- Index layout, parents, children and ancestors for every one of the 39 positions
+- Wave order identical to the nested sweepover loops the services used
+- Middle positions and sides
+- Three-upline resolution: exhaustive against the node-scanning rules, then through MatrixService
+- Placement kernel: occupancy bitmaps give the same next free position as scanning the wave order
+  (MatrixService per slot, matrix recycle, recycle queue) or the plain level order the sweepover
+  service and MatrixService._get_next_available_position have always used
+"""
+
+import random
+import unittest
+
+from bson import ObjectId
+
+from modules.matrix import geometry
+from tests.mock_db import MockDBTestCase
+import modules.matrix  # noqa: F401  (loads matrix before dream_matrix to avoid the import cycle)
+from modules.matrix.model import MatrixNode, MatrixTree
+from modules.matrix.recycle_service import MatrixRecycleService
+from modules.matrix.service import MatrixService
+from modules.matrix.sweepover_service import SweepoverService
+from modules.recycle.service import RecycleService
+from modules.tree.model import TreePlacement
+from modules.user.model import User
+
+ALL_POSITIONS = [(level, position) for level, width in ((1, 3), (2, 9), (3, 27)) for position in range(width)]
+
+
+def legacy_wave_order():
+    """The per-level sweepover loops of the former _find_bfs_placement_position"""
+    order = [(1, position) for position in range(3)]
+    for level, parents in ((2, 3), (3, 9)):
+        for child_index in range(3):
+            for parent_index in range(parents):
+                order.append((level, parent_index * 3 + child_index))
+    return order
+
+
+def legacy_next_free(occupied, max_level=3):
+    """First position of the wave order not taken, as the former _position_occupied loops found it"""
+    for level, position in legacy_wave_order():
+        if level <= max_level and (level, position) not in occupied:
+            return level, position
+    return None
+
+
+def legacy_level_next_free(occupied, max_level=3):
+    """The former Level 1 / Level 2 / Level 3 loops of the sweepover BFS and _get_next_available_position"""
+    for level, width in ((1, 3), (2, 9), (3, 27))[:max_level]:
+        for position in range(width):
+            if (level, position) not in occupied:
+                return level, position
+    return None
+
+
+def random_nodes(rng, count):
+    taken = rng.sample(ALL_POSITIONS, count)
+    return [MatrixNode(level=level, position=position, user_id=ObjectId()) for level, position in taken]
+
+
+def legacy_tree_uplines(owner, nodes, level, position):
+    """The former find_node_user rules of _resolve_three_tree_uplines (tree part only)"""
+    def find_node_user(lvl, pos):
+        for node in nodes:
+            if node['level'] == lvl and node['position'] == pos:
+                return node['user_id']
+        return None
+
+    if level == 1:
+        return [owner]
+    if level == 2:
+        return [find_node_user(1, position // 3), owner]
+    parent_l2 = position // 3
+    return [find_node_user(2, parent_l2), find_node_user(1, parent_l2 // 3), owner]
+
+
+class TestMatrixGeometry(unittest.TestCase):
+
+    def test_flat_index_layout(self):
+        self.assertEqual([geometry.flat_index(*p) for p in ALL_POSITIONS], list(range(geometry.TREE_SIZE)))
+        for index in range(geometry.TREE_SIZE):
+            self.assertEqual(geometry.flat_index(*geometry.from_flat_index(index)), index)
+        for invalid in ((0, 0), (1, 3), (3, 27), (4, 0), (2, -1)):
+            self.assertFalse(geometry.is_valid(*invalid))
+            with self.assertRaises(ValueError):
+                geometry.flat_index(*invalid)
+        self.assertEqual([geometry.level_capacity(level) for level in range(5)], [0, 3, 9, 27, 0])
+
+    def test_parents_and_children_are_inverse(self):
+        for level, position in ALL_POSITIONS:
+            kids = geometry.children(level, position)
+            self.assertEqual(len(kids), 3 if level < 3 else 0)
+            for index, kid in enumerate(kids):
+                self.assertEqual(geometry.parent(*kid), (level, position))
+                self.assertEqual(geometry.child_index(kid[1]), index)
+            parent = geometry.parent(level, position)
+            if level == 1:
+                self.assertEqual(parent, geometry.OWNER)
+            else:
+                self.assertIn((level, position), geometry.children(*parent))
+        self.assertIsNone(geometry.parent(*geometry.OWNER))
+
+    def test_ancestors_end_at_owner(self):
+        self.assertEqual(geometry.ancestors(3, 26), [(2, 8), (1, 2), (0, 0)])
+        for level, position in ALL_POSITIONS:
+            chain = geometry.ancestors(level, position)
+            self.assertEqual(len(chain), level)
+            self.assertEqual(chain[-1], geometry.OWNER)
+
+    def test_wave_order_matches_sweepover_loops(self):
+        self.assertEqual(list(geometry.WAVE_ORDER), legacy_wave_order())
+        self.assertEqual(sorted(geometry.WAVE_ORDER), sorted(ALL_POSITIONS))
+        self.assertEqual(geometry.wave_order(2), [0, 3, 6, 1, 4, 7, 2, 5, 8])
+
+    def test_middles_and_sides(self):
+        self.assertEqual(geometry.middle_positions(2), [1, 4, 7])
+        self.assertEqual([geometry.middle_child(p) for p in range(3)], [1, 4, 7])
+        self.assertEqual([geometry.side(p) for p in range(6)], ['left', 'middle', 'right'] * 2)
+        self.assertEqual(geometry.SIDE_INDEX['center'], 1)
+
+    def test_tree_uplines_match_node_scan_for_every_position(self):
+        owner = str(ObjectId())
+        full = [{'level': lvl, 'position': pos, 'user_id': str(ObjectId())} for lvl, pos in ALL_POSITIONS]
+        # Every other node missing, so empty ancestors are covered too
+        sparse = full[::2]
+        for nodes in (full, sparse):
+            occupancy = geometry.occupancy_index(nodes)
+            for level, position in ALL_POSITIONS:
+                self.assertEqual(geometry.tree_uplines(owner, occupancy, level, position),
+                                 legacy_tree_uplines(owner, nodes, level, position), (level, position))
+        self.assertEqual(geometry.tree_uplines(owner, {}, 4, 0), [])
+
+
+class TestResolveThreeTreeUplines(MockDBTestCase):
+
+    def _user(self, refered_by=None):
+        key = ObjectId()
+        return User._get_collection().insert_one({
+            '_id': key, 'uid': f'u{key}', 'refer_code': f'r{key}', 'wallet_address': f'0x{key}', 'refered_by': refered_by,
+        }).inserted_id
+
+    def setUp(self):
+        super().setUp()
+        self.grand = self._user()
+        self.parent = self._user(self.grand)
+        self.owner = self._user(self.parent)
+        self.l1 = ObjectId()
+        self.l2 = ObjectId()
+        MatrixTree(user_id=self.owner, nodes=[
+            MatrixNode(level=1, position=2, user_id=self.l1),
+            MatrixNode(level=2, position=7, user_id=self.l2),
+        ]).save()
+        self.service = MatrixService()
+
+    def test_levels_resolve_through_tree_then_referrals(self):
+        owner = str(self.owner)
+        with self.assertQueryBudget(1):
+            level_3 = self.service._resolve_three_tree_uplines(owner, 3, 22)
+        self.assertEqual(level_3, (str(self.l2), str(self.l1), owner))
+        self.assertEqual(self.service._resolve_three_tree_uplines(owner, 2, 7), (str(self.l1), owner, str(self.parent)))
+        self.assertEqual(self.service._resolve_three_tree_uplines(owner, 1, 0), (owner, str(self.parent), str(self.grand)))
+        self.assertEqual(self.service._resolve_three_tree_uplines(owner, 3, 0), (None, None, owner))
+        self.assertEqual(self.service._resolve_three_tree_uplines(owner, 4, 0), (None, None, None))
+
+    def test_referral_chain_may_end_early(self):
+        self.assertEqual(self.service._resolve_three_tree_uplines(str(self.parent), 1, 1),
+                         (None, None, None))  # no tree for parent
+        MatrixTree(user_id=self.grand).save()
+        self.assertEqual(self.service._resolve_three_tree_uplines(str(self.grand), 1, 1), (str(self.grand), None, None))
+
+
+class TestPlacementKernel(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = random.Random(45)
+
+    def test_filling_an_empty_tree_follows_wave_order(self):
+        mask, placed = 0, []
+        while (free := geometry.next_free_position(mask)) is not None:
+            placed.append(free)
+            mask |= geometry.position_bit(*free)
+        self.assertEqual(placed, legacy_wave_order())
+        self.assertEqual(mask, geometry.FULL_MASK)
+
+    def test_random_occupancy_matches_wave_scan(self):
+        for _ in range(2000):
+            occupied = set(self.rng.sample(ALL_POSITIONS, self.rng.randint(0, geometry.TREE_SIZE)))
+            mask = geometry.occupancy_mask({'level': l, 'position': p, 'user_id': 1} for l, p in occupied)
+            for max_level in (1, 2, 3):
+                self.assertEqual(geometry.next_free_position(mask, max_level), legacy_next_free(occupied, max_level))
+
+    def test_level_order_matches_level_scan(self):
+        mask, placed = 0, []
+        while (free := geometry.next_free_position(mask, level_order=True)) is not None:
+            placed.append(free)
+            mask |= geometry.position_bit(*free, level_order=True)
+        self.assertEqual(placed, ALL_POSITIONS)
+        for _ in range(2000):
+            occupied = set(self.rng.sample(ALL_POSITIONS, self.rng.randint(0, geometry.TREE_SIZE)))
+            mask = geometry.occupancy_mask(({'level': l, 'position': p, 'user_id': 1} for l, p in occupied),
+                                           level_order=True)
+            for max_level in (1, 2, 3):
+                self.assertEqual(geometry.next_free_position(mask, max_level, level_order=True),
+                                 legacy_level_next_free(occupied, max_level))
+
+    def test_mask_ignores_invalid_nodes_and_other_slots(self):
+        ours, theirs = ObjectId(), ObjectId()
+        nodes = [
+            {'level': 1, 'position': 0, 'user_id': ours},
+            {'level': 1, 'position': 1, 'user_id': theirs},
+            {'level': 4, 'position': 0, 'user_id': ours},
+            {'level': 2, 'position': 0, 'user_id': None},
+        ]
+        self.assertEqual(geometry.occupancy_mask(nodes), 0b11)
+        self.assertEqual(geometry.occupancy_mask(nodes, user_ids={ours}), 0b1)
+        self.assertEqual(geometry.next_free_position(geometry.occupancy_mask(nodes, user_ids={ours})), (1, 1))
+
+
+class TestPlacementCallers(MockDBTestCase):
+
+    def test_tree_services_keep_their_fill_order(self):
+        rng = random.Random(4545)
+        matrix_service = MatrixService()
+        callers = (
+            (lambda tree: matrix_service._get_next_available_position(tree, 1), legacy_level_next_free),
+            (SweepoverService()._find_bfs_placement_position, legacy_level_next_free),
+            (MatrixRecycleService()._find_bfs_placement_position, legacy_next_free),
+        )
+        for count in list(range(geometry.TREE_SIZE + 1)) * 3:
+            tree = MatrixTree(user_id=ObjectId(), nodes=random_nodes(rng, count))
+            occupied = {(n.level, n.position) for n in tree.nodes}
+            for find, scan in callers:
+                expected = scan(occupied)
+                self.assertEqual(find(tree), {"level": expected[0], "position": expected[1]} if expected else None)
+
+    def test_matrix_service_counts_only_the_slot_nodes(self):
+        tree = MatrixTree(user_id=ObjectId(), nodes=random_nodes(random.Random(7), 20))
+        in_slot = tree.nodes[::2]
+        for node in tree.nodes:
+            TreePlacement(user_id=node.user_id, program='matrix', position='left', level=node.level,
+                          slot_no=2 if node in in_slot else 1, is_active=True).save()
+        expected = legacy_next_free({(n.level, n.position) for n in in_slot})
+
+        with self.assertQueryBudget(1):
+            found = MatrixService()._find_bfs_placement_position(tree, slot_no=2)
+        self.assertEqual((found['level'], found['position']), expected)
+
+    def test_recycle_queue_prefers_side_then_left_to_right(self):
+        service = RecycleService()
+
+        def tree(*positions, inactive=()):
+            return MatrixTree(user_id=ObjectId(), nodes=[
+                MatrixNode(level=1, position=p, user_id=ObjectId(), is_active=p not in inactive) for p in positions
+            ] + [MatrixNode(level=2, position=0, user_id=ObjectId())])
+
+        self.assertEqual(service._find_available_position(tree(), 'center'), 'center')
+        self.assertEqual(service._find_available_position(tree(1), 'center'), 'left')
+        self.assertEqual(service._find_available_position(tree(0, 1), 'right'), 'right')
+        self.assertEqual(service._find_available_position(tree(0, 2), 'right'), 'center')
+        self.assertEqual(service._find_available_position(tree(0, 1, 2, inactive=(1,)), 'left'), 'center')
+        self.assertIsNone(service._find_available_position(tree(0, 1, 2), 'center'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+"""
+Unit Tests for placement-time middle-three tracking (MatrixMiddleThree)
+
+Test Coverage:
+- The auto upgrade check runs exactly when the third middle member lands
+- Replayed placements are counted and credited once; a recycled member placed again is a new member
+- The counter keeps a bounded history of placements
+- Middle-three detection reads the counter instead of the tree
+- Middle-three earnings come from the counter's earnings_units
+- A failed reserve credit leaves the counter unchanged
+"""
+
+import contextlib
+import io
+import unittest
+from decimal import Decimal
+from unittest.mock import patch
+
+from bson import ObjectId
+
+from tests.mock_db import MockDBTestCase
+import modules.matrix  # noqa: F401  (loads matrix before dream_matrix to avoid the import cycle)
+from modules.matrix.middle_3_service import MIDDLE_THREE_HISTORY, MatrixMiddle3Service
+from modules.matrix.model import MatrixMiddleThree
+from modules.matrix.service import MatrixService
+from modules.slot.model import SlotCatalog
+from modules.wallet.reserve_account_service import ReserveAccountService
+
+
+class TestMiddleThreeCounter(MockDBTestCase):
+
+    def setUp(self):
+        super().setUp()
+        SlotCatalog(slot_no=2, name='BRONZE', price=Decimal('33'), currency='USDT', program='matrix', level=2).save()
+        self.service = MatrixMiddle3Service()
+        self.owner = str(ObjectId())
+        self.members = [str(ObjectId()) for _ in range(3)]
+
+    def _collect(self, member, position, amount=Decimal('11'), tx_hash=None):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.service.collect_middle_3_earnings(
+                self.owner, 1, amount, member, tx_hash or f"tx-{member}", skip_validation=True, position=position
+            )
+
+    def test_upgrade_fires_on_third_member_only(self):
+        with patch.object(self.service, '_auto_upgrade_slot', return_value=True) as upgrade:
+            for i, member in enumerate(self.members[:2]):
+                self.assertTrue(self._collect(member, i * 3 + 1)[0])
+            upgrade.assert_not_called()
+
+            self.assertTrue(self._collect(self.members[2], 7)[0])
+
+        upgrade.assert_called_once_with(self.owner, 2, Decimal('33'), Decimal('33'))
+        counter = MatrixMiddleThree.objects.get(user_id=ObjectId(self.owner), slot_no=1)
+        self.assertEqual(counter.members_count, 3)
+        self.assertEqual(counter.earnings_units, 33 * 10 ** 8)
+
+    def test_replayed_member_is_not_credited_twice(self):
+        self.assertTrue(self._collect(self.members[0], 1)[0])
+        success, message = self._collect(self.members[0], 1)
+
+        self.assertFalse(success)
+        self.assertIn('already collected', message)
+        self.assertEqual(ReserveAccountService().get_balance(self.owner, 'matrix', 1), Decimal('11'))
+        self.assertEqual(MatrixMiddleThree.objects.get(user_id=ObjectId(self.owner)).members_count, 1)
+
+    def test_recycled_member_placed_again_is_counted(self):
+        self.assertTrue(self._collect(self.members[0], 1, tx_hash='join')[0])
+        # Recycled, the member lands in the same middle position of the same upline's tree
+        self.assertTrue(self._collect(self.members[0], 1, tx_hash='recycle-1')[0])
+
+        self.assertEqual(ReserveAccountService().get_balance(self.owner, 'matrix', 1), Decimal('22'))
+        self.assertEqual(MatrixMiddleThree.objects.get(user_id=ObjectId(self.owner)).members_count, 2)
+
+    def test_history_is_bounded(self):
+        with patch.object(self.service, '_auto_upgrade_slot', return_value=True), \
+                patch.object(self.service, '_check_next_slot_upgrade', return_value={}):
+            for n in range(MIDDLE_THREE_HISTORY + 4):
+                self._collect(self.members[n % 3], 1, Decimal('1'), tx_hash=f'tx-{n}')
+
+        counter = MatrixMiddleThree.objects.get(user_id=ObjectId(self.owner))
+        self.assertEqual(counter.members_count, MIDDLE_THREE_HISTORY + 4)
+        self.assertEqual(len(counter.members), MIDDLE_THREE_HISTORY)
+        self.assertEqual(counter.placement_keys[-1], f"{self.members[(MIDDLE_THREE_HISTORY + 3) % 3]}:tx-{MIDDLE_THREE_HISTORY + 3}")
+        current = self.service.get_middle_three(self.owner, 1)
+        self.assertEqual([m['tx_hash'] for m in current['members']], [f'tx-{MIDDLE_THREE_HISTORY + 3}'])
+
+    def test_detection_reads_counter_not_tree(self):
+        with patch.object(self.service, '_auto_upgrade_slot', return_value=True):
+            for i, member in enumerate(self.members):
+                self._collect(member, i * 3 + 1)
+
+        matrix_service = MatrixService()
+        matrix_service._middle_3_service = self.service
+        with self.assertQueryBudget(0, collection='matrix_trees'), self.assertQueryBudget(1) as stats:
+            result = matrix_service.detect_middle_three_members(self.owner, 1)
+
+        self.assertTrue(result['is_complete'])
+        self.assertEqual([m['user_id'] for m in result['middle_three_members']], self.members)
+        self.assertEqual([m['position'] for m in result['middle_three_members']], [1, 4, 7])
+        self.assertEqual(list(stats.by_collection), ['matrix_middle_three'])
+
+    def test_earnings_read_from_counter_units(self):
+        amounts = [Decimal('11'), Decimal('11'), Decimal('5.5')]
+        matrix_service = MatrixService()
+        matrix_service._middle_3_service = self.service
+        with patch.object(self.service, '_auto_upgrade_slot', return_value=True):
+            for i, (member, amount) in enumerate(zip(self.members, amounts)):
+                self._collect(member, i * 3 + 1, amount)
+            self.assertEqual(matrix_service.calculate_middle_three_earnings(self.owner, 1)['total_earnings'], 27.5)
+            # A recycled tree's next cycle counts only its own members
+            recycled = [str(ObjectId()) for _ in range(2)]
+            for member in recycled:
+                self._collect(member, 1, Decimal('2'))
+
+        self.assertEqual(self.service.get_middle_three(self.owner, 1)['earnings_units'], 4 * 10 ** 8)
+        counter = MatrixMiddleThree.objects.get(user_id=ObjectId(self.owner), slot_no=1)
+        self.assertEqual(counter.earnings_units, Decimal('31.5') * 10 ** 8)
+
+        self._collect(str(ObjectId()), 7, Decimal('3'))
+        result = matrix_service.calculate_middle_three_earnings(self.owner, 1)
+        self.assertTrue(result['success'], result)
+        self.assertEqual(result['total_earnings'], 7.0)
+        self.assertFalse(result['can_upgrade'])
+
+    def test_failed_credit_rolls_back_counter(self):
+        with patch.object(ReserveAccountService, 'credit', side_effect=RuntimeError("write conflict")):
+            success, _ = self._collect(self.members[0], 1)
+
+        self.assertFalse(success)
+        counter = MatrixMiddleThree.objects.get(user_id=ObjectId(self.owner))
+        self.assertEqual(counter.members_count, 0)
+        self.assertEqual((counter.placement_keys, counter.members), ([], []))
+        self.assertEqual(counter.earnings_units, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+"""
+Unit Tests for compact Matrix recycle snapshots
+
+Test Coverage:
+- A recycle is stored as one record with 39 fixed-width occupant ids
+- Recycle numbers follow the latest recycle per (user, slot); a number taken concurrently is retried
+- History pages return summaries only, latest first
+- Specific recycle trees unpack compact snapshots (with placed_at) and legacy node rows
+"""
+
+import contextlib
+import io
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from bson import ObjectId
+
+from tests.mock_db import MockDBTestCase
+import modules.matrix  # noqa: F401  (loads matrix before dream_matrix to avoid the import cycle)
+from modules.matrix.model import MatrixNode, MatrixRecycleInstance, MatrixRecycleNode
+from modules.matrix.recycle_service import MatrixRecycleService, RECYCLE_TREE_SIZE
+from modules.matrix.service import MatrixService
+
+
+def full_tree_nodes():
+    nodes = []
+    for level, width in ((1, 3), (2, 9), (3, 27)):
+        for position in range(width):
+            nodes.append(MatrixNode(level=level, position=position, user_id=ObjectId(),
+                                    placed_at=datetime(2025, 1, 1) + timedelta(minutes=len(nodes))))
+    return nodes
+
+
+class TestRecycleSnapshots(MockDBTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.service = MatrixRecycleService()
+        self.user_id = str(ObjectId())
+
+    def test_snapshot_is_one_compact_insert(self):
+        nodes = full_tree_nodes()
+
+        with self.assertQueryBudget(2) as stats:
+            instance = self.service.save_recycle_snapshot(self.user_id, 1, nodes)
+
+        self.assertEqual(stats.by_collection['matrix_recycle_instances']['commands'], 2)
+        self.assertEqual(MatrixRecycleNode.objects.count(), 0)
+        stored = MatrixRecycleInstance._get_collection().find_one({'_id': instance.id})
+        self.assertEqual(len(stored['occupants']), RECYCLE_TREE_SIZE)
+        self.assertEqual(stored['occupants'], [n.user_id for n in nodes])
+        self.assertEqual((stored['level_1_members'], stored['level_2_members'], stored['level_3_members']), (3, 9, 27))
+        self.assertEqual(stored['total_members'], 39)
+
+    def test_recycle_numbers_increase_per_slot(self):
+        numbers = [self.service.save_recycle_snapshot(self.user_id, 1, full_tree_nodes()).recycle_no for _ in range(3)]
+        other_slot = self.service.save_recycle_snapshot(self.user_id, 2, full_tree_nodes()).recycle_no
+
+        self.assertEqual(numbers, [1, 2, 3])
+        self.assertEqual(other_slot, 1)
+
+    def test_recycle_number_taken_concurrently_is_retried(self):
+        self.service.save_recycle_snapshot(self.user_id, 1, full_tree_nodes())
+        next_number = self.service._get_next_recycle_number
+        # The first read races with a concurrent recycle that already stored number 1
+        stale = iter([1])
+        with patch.object(self.service, '_get_next_recycle_number',
+                          side_effect=lambda *args: next(stale, None) or next_number(*args)):
+            instance = self.service.save_recycle_snapshot(self.user_id, 1, full_tree_nodes())
+
+        self.assertEqual(instance.recycle_no, 2)
+        self.assertEqual(sorted(MatrixRecycleInstance.objects.distinct('recycle_no')), [1, 2])
+
+    def test_history_pages_summaries_latest_first(self):
+        for _ in range(5):
+            self.service.save_recycle_snapshot(self.user_id, 1, full_tree_nodes())
+
+        result = self.service.get_recycle_history(self.user_id, 1, page=2, limit=2)
+
+        self.assertTrue(result['success'])
+        data = result['data']
+        self.assertEqual(data['total_recycles'], 5)
+        self.assertEqual([r['recycle_no'] for r in data['recycles']], [3, 2])
+        self.assertNotIn('occupants', data['recycles'][0])
+        self.assertEqual(data['recycles'][0]['total_members'], 39)
+
+    def test_recycle_tree_unpacks_compact_snapshot(self):
+        nodes = full_tree_nodes()[:5]  # 3 on level 1, 2 on level 2
+        self.service.save_recycle_snapshot(self.user_id, 1, nodes)
+
+        tree = self.service.get_recycle_tree(self.user_id, 1, 1)['data']
+
+        self.assertEqual(tree['total_members'], 5)
+        self.assertEqual([(n['level'], n['position']) for n in tree['nodes']], [(1, 0), (1, 1), (1, 2), (2, 0), (2, 1)])
+        self.assertEqual([n['occupant_user_id'] for n in tree['nodes']], [str(n.user_id) for n in nodes])
+        self.assertEqual([n['placed_at'] for n in tree['nodes']], [n.placed_at for n in nodes])
+
+    def test_recycle_tree_reads_legacy_node_rows(self):
+        instance = MatrixRecycleInstance(user_id=ObjectId(self.user_id), slot_number=1, recycle_no=1,
+                                         is_complete=True, total_members=1)
+        instance.save()
+        occupant = ObjectId()
+        MatrixRecycleNode(instance_id=instance.id, user_id=ObjectId(self.user_id), slot_number=1, recycle_no=1,
+                          level=1, position=0, occupant_user_id=occupant, placed_at=datetime.utcnow()).save()
+
+        tree = self.service.get_recycle_tree(self.user_id, 1, 1)['data']
+
+        self.assertEqual(len(tree['nodes']), 1)
+        self.assertEqual(tree['nodes'][0]['occupant_user_id'], str(occupant))
+        self.assertEqual(self.service.save_recycle_snapshot(self.user_id, 1, []).recycle_no, 2)
+
+    def test_matrix_service_snapshot_view(self):
+        self.service.save_recycle_snapshot(self.user_id, 1, full_tree_nodes())
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            tree = MatrixService().get_recycle_tree(self.user_id, 1, 1)
+            history = MatrixService().get_recycle_history(self.user_id, 1)
+
+        self.assertTrue(tree['is_snapshot'])
+        self.assertEqual(len(tree['nodes']), 39)
+        self.assertEqual(tree['total_recycles'], 1)
+        self.assertEqual([r['recycle_no'] for r in history], [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1 @@
+# Missed Profit module tests package initialization
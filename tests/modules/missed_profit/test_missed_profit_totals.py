@@ -0,0 +1,99 @@
+"""
+Unit Tests for server-side missed profit totals
+
+Test Coverage:
+- aggregate_missed_profit_totals: one $facet aggregation, exact decimal sums, zero buckets
+- accumulate_missed_profits claims rows with one update_many scoped by the accumulation id
+- Statistics and the wallet global summary use the same aggregation
+"""
+
+import unittest
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from bson import ObjectId
+
+from tests.mock_db import MockDBTestCase
+import modules.matrix  # noqa: F401  (loads matrix before dream_matrix to avoid the import cycle)
+from modules.missed_profit.model import MissedProfit, MissedProfitAccumulation, MissedProfitStatistics
+from modules.missed_profit.service import MissedProfitService, aggregate_missed_profit_totals
+from modules.wallet.service import WalletService
+
+
+def _missed_profit(amount, currency='BNB', reason='account_inactivity', program='binary', created_at=None, **fields):
+    row = MissedProfit(
+        user_id=ObjectId(), upline_user_id=ObjectId(), missed_profit_type='commission',
+        missed_profit_amount=amount, currency=currency, primary_reason=reason, reason_description='test',
+        user_level=1, upgrade_slot_level=2, program_type=program, **fields
+    )
+    if created_at:
+        row.created_at = created_at
+    return row.save()
+
+
+class TestMissedProfitTotals(MockDBTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.start = datetime.utcnow() - timedelta(days=1)
+        self.end = datetime.utcnow() + timedelta(minutes=1)
+        # A second back: stored dates are millisecond-truncated, so a row written in the same
+        # millisecond as the service's utcnow() would fall outside '$lt now'
+        created_at = datetime.utcnow() - timedelta(seconds=1)
+        for _ in range(10):
+            _missed_profit(0.1, created_at=created_at)
+        _missed_profit(0.2, currency='USDT', reason='level_advancement', program='matrix', is_distributed=True,
+                       created_at=created_at)
+        _missed_profit(5.0, created_at=self.start - timedelta(days=2))
+
+    def test_facets_sum_exactly_in_one_query(self):
+        with self.assertQueryBudget(1):
+            totals = aggregate_missed_profit_totals({'created_at': {'$gte': self.start}})
+
+        self.assertEqual(totals['overall']['count'], 11)
+        self.assertEqual(totals['overall']['amount'], Decimal('1.2'))
+        self.assertEqual(totals['overall']['distributed_amount'], Decimal('0.2'))
+        self.assertEqual(totals['overall']['undistributed_count'], 10)
+        self.assertEqual(totals['currency']['BNB']['amount'], Decimal('1.0'))
+        self.assertEqual(totals['primary_reason']['level_advancement']['count'], 1)
+        self.assertEqual(totals['program_type']['global'], {
+            'count': 0, 'amount': Decimal('0'), 'distributed_amount': Decimal('0'),
+            'undistributed_count': 0, 'recovery_pending_count': 0,
+        })
+
+    def test_accumulation_claims_rows_with_one_update(self):
+        with self.assertQueryBudget(2, collection='missed_profit'):
+            result = MissedProfitService().accumulate_missed_profits('daily', self.start, self.end)
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['processed_missed_profits'], 11)
+        self.assertEqual(result['total_missed_profits'], Decimal('1.2'))
+        self.assertEqual(result['total_missed_profits_usdt'], Decimal('0.2'))
+        self.assertEqual(result['program_breakdown']['matrix'], {'count': 1, 'amount': Decimal('0.2')})
+        self.assertEqual(MissedProfit.objects(accumulation_id=ObjectId(result['accumulation_id'])).count(), 11)
+
+        accumulation = MissedProfitAccumulation.objects.get(id=result['accumulation_id'])
+        self.assertTrue(accumulation.is_processed)
+        self.assertEqual(accumulation.total_missed_profits, 1.2)
+        self.assertEqual(accumulation.account_inactivity_count, 10)
+
+        again = MissedProfitService().accumulate_missed_profits('daily', self.start, self.end)
+        self.assertEqual(again['processed_missed_profits'], 0)
+        self.assertEqual(again['total_missed_profits'], Decimal('0'))
+
+    def test_statistics_and_global_summary(self):
+        result = MissedProfitService().get_missed_profit_statistics('all_time')
+        self.assertTrue(result['success'])
+        self.assertEqual(result['statistics']['total_missed_profits'], 12)
+        self.assertEqual(result['statistics']['total_missed_amount'], Decimal('6.2'))
+        self.assertEqual(MissedProfitStatistics.objects.get(period='all_time').total_distributed_amount, 0.2)
+
+        summary = WalletService().get_global_miss_profit_summary()['data']
+        self.assertEqual(summary['overall']['amount'], 6.2)
+        self.assertEqual(summary['totals']['USDT'], {
+            'amount': 0.2, 'count': 1, 'undistributed_count': 0, 'recovery_pending_count': 1,
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
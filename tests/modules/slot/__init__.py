@@ -0,0 +1 @@
+# Slot module tests package initialization
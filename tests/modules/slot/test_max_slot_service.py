@@ -0,0 +1,104 @@
+"""
+Unit Tests for the denormalized highest slot (UserMaxSlot / MaxSlotService)
+
+Test Coverage:
+- Completed activations raise the stored max slot; lower, pending or repeated ones do not
+- Matrix max covers both SlotActivation and MatrixActivation
+- Users with pre-existing activations are backfilled on first read
+- "Users whose highest slot is N" is one indexed lookup
+"""
+
+import unittest
+from datetime import datetime
+from decimal import Decimal
+
+from bson import ObjectId
+
+from tests.mock_db import MockDBTestCase
+import modules.matrix  # noqa: F401  (loads matrix before dream_matrix to avoid the import cycle)
+from modules.matrix.model import MatrixActivation
+from modules.slot.max_slot_service import MaxSlotService
+from modules.slot.model import SlotActivation, UserMaxSlot
+
+
+class TestMaxSlot(MockDBTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.service = MaxSlotService()
+        self.user_id = ObjectId()
+
+    def _activate(self, slot_no, program='binary', status='completed', user_id=None):
+        activation = SlotActivation(
+            user_id=user_id or self.user_id, program=program, slot_no=slot_no, slot_name=f'SLOT-{slot_no}',
+            activation_type='upgrade', upgrade_source='wallet', amount_paid=Decimal('1'), currency='BNB',
+            tx_hash=f'tx-{ObjectId()}', status=status, activated_at=datetime(2026, 1, slot_no)
+        )
+        activation.save()
+        return activation
+
+    def _activate_matrix(self, slot_no, user_id=None):
+        MatrixActivation(user_id=user_id or self.user_id, slot_no=slot_no, slot_name=f'M-{slot_no}',
+                         amount_paid=Decimal('11'), tx_hash=f'mx-{ObjectId()}', status='completed').save()
+
+    def test_completed_activations_raise_max_slot(self):
+        self._activate(1)
+        self._activate(3)
+        self._activate(2)
+        self._activate(5, status='pending')
+
+        row = UserMaxSlot.objects.get(user_id=self.user_id, program='binary')
+        self.assertEqual((row.max_slot, row.slot_name), (3, 'SLOT-3'))
+        self.assertEqual(self.service.get_max_slot(self.user_id, 'binary')['slot_no'], 3)
+
+    def test_completing_a_pending_activation_updates_the_counter(self):
+        activation = self._activate(4, status='pending')
+        self.assertEqual(UserMaxSlot.objects(user_id=self.user_id).count(), 0)
+
+        activation.status = 'completed'
+        activation.save()
+
+        self.assertEqual(UserMaxSlot.objects.get(user_id=self.user_id, program='binary').max_slot, 4)
+
+    def test_matrix_max_covers_both_activation_collections(self):
+        self._activate(2, program='matrix')
+        self._activate_matrix(4)
+        self._activate_matrix(3)
+
+        with self.assertQueryBudget(1):
+            result = self.service.get_max_slot(self.user_id, 'matrix')
+
+        self.assertEqual(result['slot_no'], 4)
+        self.assertEqual(result['slot_name'], 'M-4')
+
+    def test_legacy_activations_are_backfilled_once(self):
+        self._activate(2)
+        self._activate_matrix(1)
+        UserMaxSlot.objects.delete()
+
+        self.assertEqual(self.service.get_max_slots(self.user_id), {'binary': 2, 'matrix': 1, 'global': 0})
+        self.assertEqual(UserMaxSlot.objects(user_id=self.user_id).count(), 3)
+        with self.assertQueryBudget(1):
+            self.assertEqual(self.service.get_max_slots(self.user_id)['global'], 0)
+
+    def test_users_at_slot_is_an_indexed_filter(self):
+        users = [ObjectId() for _ in range(4)]
+        for user_id, slot_no in zip(users, (2, 3, 2, 1)):
+            for slot in range(1, slot_no + 1):
+                self._activate_matrix(slot, user_id=user_id)
+
+        with self.assertQueryBudget(2, collection='user_max_slot'), self.assertQueryBudget(0, collection='matrix_activations'):
+            at_two = self.service.users_at_slot(users, 'matrix', 2)
+
+        self.assertEqual(at_two, [users[0], users[2]])
+
+    def test_rebuild_recomputes_from_activations(self):
+        self._activate(3)
+        UserMaxSlot.objects.delete()
+
+        self.assertEqual(self.service.rebuild('binary'), 1)
+        self.assertEqual(UserMaxSlot.objects.get(user_id=self.user_id, program='binary').max_slot, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
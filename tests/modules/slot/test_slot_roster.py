@@ -0,0 +1,160 @@
+"""
+Unit Tests for the per-(program, slot) member rosters (SlotRoster / SlotRosterService)
+
+Test Coverage:
+- Completed activations add the user to the slot's roster once, keeping the earliest join
+- Matrix rosters cover both SlotActivation and MatrixActivation
+- Counts, membership and keyset-batched iteration in user_id order
+- Spark slot eligibility and Triple Entry eligibles read the rosters, not the activations, once built
+- Until rebuild() marks a roster built, readers keep using the activation queries
+- Activations that predate the roster are added by rebuild() (also the slot_roster_rebuild batch job)
+"""
+
+import unittest
+from datetime import datetime
+from decimal import Decimal
+
+from bson import ObjectId
+
+from tests.mock_db import MockDBTestCase
+import modules.matrix  # noqa: F401  (loads matrix before dream_matrix to avoid the import cycle)
+from modules.batch_job.service import run_job
+from modules.matrix.model import MatrixActivation
+from modules.slot.model import SlotActivation, SlotRoster, SlotRosterState
+from modules.slot.roster_service import SlotRosterService
+from modules.spark.model import TripleEntryReward
+from modules.spark.service import SparkService
+
+DAY = datetime(2026, 3, 14, 9, 30)
+
+
+class TestSlotRoster(MockDBTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.service = SlotRosterService()
+        self.user_id = ObjectId()
+
+    def _activate(self, slot_no, program='binary', status='completed', user_id=None, activated_at=DAY):
+        activation = SlotActivation(
+            user_id=user_id or self.user_id, program=program, slot_no=slot_no, slot_name=f'SLOT-{slot_no}',
+            activation_type='upgrade', upgrade_source='wallet', amount_paid=Decimal('1'), currency='BNB',
+            tx_hash=f'tx-{ObjectId()}', status=status, activated_at=activated_at
+        )
+        activation.save()
+        return activation
+
+    def _activate_matrix(self, slot_no, user_id=None, activated_at=DAY):
+        MatrixActivation(user_id=user_id or self.user_id, slot_no=slot_no, slot_name=f'M-{slot_no}',
+                         amount_paid=Decimal('11'), tx_hash=f'mx-{ObjectId()}', status='completed',
+                         activated_at=activated_at).save()
+
+    def test_completed_activations_join_the_roster_once(self):
+        self._activate(1, activated_at=datetime(2026, 3, 15))
+        self._activate(1, activated_at=DAY)
+        self._activate(1, activated_at=datetime(2026, 3, 16))
+        pending = self._activate(2, status='pending')
+
+        row = SlotRoster.objects.get(user_id=self.user_id, program='binary', slot_no=1)
+        self.assertEqual((row.joined_at, row.joined_day), (DAY, 20260314))
+        self.assertEqual(self.service.count('binary', 2), 0)
+
+        pending.status = 'completed'
+        pending.save()
+        self.assertTrue(self.service.is_member('binary', 2, str(self.user_id)))
+
+    def test_matrix_roster_covers_both_activation_collections(self):
+        other = ObjectId()
+        self._activate(2, program='matrix')
+        self._activate_matrix(2)
+        self._activate_matrix(2, user_id=other)
+
+        with self.assertQueryBudget(1):
+            self.assertEqual(self.service.count('matrix', 2), 2)
+        self.assertEqual(self.service.user_ids('matrix', 2), sorted([str(self.user_id), str(other)]))
+
+    def test_iteration_is_keyset_batched_in_user_id_order(self):
+        users = [ObjectId() for _ in range(7)]
+        for user_id in reversed(users):
+            self._activate_matrix(1, user_id=user_id)
+
+        with self.assertQueryBudget(4, collection='slot_roster'):
+            streamed = list(self.service.iter_user_ids('matrix', 1, batch_size=2))
+
+        self.assertEqual(streamed, sorted(str(u) for u in users))
+
+    def test_spark_eligibility_reads_the_roster_once_built(self):
+        users = [ObjectId() for _ in range(3)]
+        for user_id in users:
+            self._activate_matrix(3, user_id=user_id)
+        # Activated before the roster existed: only the activation history has it
+        legacy = ObjectId()
+        SlotActivation._get_collection().insert_one({
+            'user_id': legacy, 'program': 'matrix', 'slot_no': 3, 'status': 'completed', 'activated_at': DAY,
+        })
+        users.append(legacy)
+        spark = SparkService()
+
+        self.assertEqual(spark.count_slot_eligible_users(3), 4)
+        self.assertTrue(spark.is_slot_eligible_user(3, str(legacy)))
+
+        self.service.rebuild('matrix')
+        with self.assertQueryBudget(0, collection='slot_activation'), self.assertQueryBudget(0, collection='matrix_activations'):
+            eligible = spark.get_slot_eligible_user_ids(3)
+            count = spark.count_slot_eligible_users(3)
+            member = spark.is_slot_eligible_user(3, str(legacy))
+            streamed = list(spark.iter_slot_eligible_user_ids(3))
+
+        self.assertEqual(eligible, sorted(str(u) for u in users))
+        self.assertEqual((count, member, streamed), (4, True, eligible))
+
+    def test_triple_entry_eligibles_joined_every_program_that_day(self):
+        everyone, late_global, no_matrix = ObjectId(), ObjectId(), ObjectId()
+        for user_id in (everyone, late_global, no_matrix):
+            self._activate(1, program='binary', user_id=user_id)
+        for user_id in (everyone, late_global):
+            self._activate_matrix(1, user_id=user_id)
+        self._activate(1, program='global', user_id=everyone, activated_at=DAY.replace(hour=23))
+        self._activate(1, program='global', user_id=no_matrix)
+        self._activate(1, program='global', user_id=late_global, activated_at=datetime(2026, 3, 15))
+
+        # Rosters not built yet: users created that day with all three flags (none here)
+        self.assertEqual(SparkService.compute_triple_entry_eligibles(DAY)['eligible_users'], [])
+
+        self.service.rebuild()
+        with self.assertQueryBudget(3, collection='slot_roster'), self.assertQueryBudget(0, collection='users'):
+            candidates = self.service.joined_all_programs_on(DAY)
+        self.assertEqual(candidates, [everyone])
+
+        result = SparkService.compute_triple_entry_eligibles(DAY)
+        self.assertTrue(result['success'], result)
+        self.assertEqual(result['eligible_users'], [str(everyone)])
+        self.assertEqual(TripleEntryReward.objects.get(cycle_no=20260314).eligible_users, [everyone])
+
+    def test_rebuild_adds_legacy_activations(self):
+        self._activate(2, activated_at=datetime(2026, 3, 20))
+        self._activate(2, activated_at=DAY)
+        self._activate_matrix(1)
+        SlotRoster.objects.delete()
+
+        self.assertEqual(self.service.rebuild(), 2)
+        self.assertEqual(SlotRoster.objects.get(program='binary', slot_no=2).joined_day, 20260314)
+        self.assertTrue(self.service.is_member('matrix', 1, self.user_id))
+        self.assertEqual(self.service.rebuild(), 0)
+
+    def test_rebuild_batch_job_marks_every_roster_built(self):
+        self._activate(1, program='global')
+        SlotRoster.objects.delete()
+        self.assertFalse(self.service.is_built('global'))
+
+        result = run_job('slot_roster_rebuild')
+
+        self.assertTrue(result['success'], result)
+        self.assertEqual(result['totals'], {'added': 1.0})
+        self.assertEqual(sorted(SlotRosterState.objects.distinct('program')), ['binary', 'global', 'matrix'])
+        self.assertTrue(all(self.service.is_built(program) for program in ('binary', 'matrix', 'global')))
+        self.assertTrue(self.service.is_member('global', 1, self.user_id))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1 @@
+# Tree module tests package initialization
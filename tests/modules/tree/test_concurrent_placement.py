@@ -0,0 +1,98 @@
+"""
+Concurrent placement tests for TreeService.place_user_in_tree
+
+Covers:
+- The unique active-position index (only seat-owning, active placements are unique)
+- A seat taken between the free-position check and the insert: the placement searches again
+- 100 simultaneous joins under one sponsor: every seat is held once and the tree is the
+  breadth-first prefix a sequential run would build
+"""
+
+import contextlib
+import io
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from bson import ObjectId
+from mongoengine.errors import NotUniqueError
+
+from tests.mock_db import MockDBTestCase
+import modules.matrix  # noqa: F401  (loads matrix before dream_matrix to avoid the import cycle)
+from modules.tree.model import TreePlacement
+from modules.tree.service import TreeService
+
+JOINS = 100
+
+
+def _seat(upline_id, position, claims_position=True, is_active=True, program='binary'):
+    return TreePlacement(user_id=ObjectId(), program=program, upline_id=upline_id, position=position, level=2,
+                         slot_no=1, is_active=is_active, claims_position=claims_position)
+
+
+class TestConcurrentTreePlacement(MockDBTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sponsor = ObjectId()
+        TreePlacement(user_id=self.sponsor, program='binary', position='root', level=1, slot_no=1).save()
+        self.service = TreeService()
+
+    def _place(self, user_id):
+        return self.service.place_user_in_tree(user_id, self.sponsor, 'binary', 1)
+
+    def test_active_seat_is_unique(self):
+        _seat(self.sponsor, 'left').save()
+        with self.assertRaises(NotUniqueError):
+            _seat(self.sponsor, 'left').save()
+
+        # Inactive history and placements that do not own their seat are not constrained
+        _seat(self.sponsor, 'left', is_active=False).save()
+        _seat(self.sponsor, 'left', claims_position=False, program='global').save()
+        _seat(self.sponsor, 'left', claims_position=False, program='global').save()
+
+    def test_seat_taken_before_insert_is_searched_again(self):
+        claim = TreeService._claim_position
+        rival = ObjectId()
+
+        def rival_first(placement):
+            # A concurrent join lands on the same seat just before this insert
+            if not TreePlacement.objects(user_id=rival).first():
+                self.assertTrue(claim(TreePlacement(
+                    user_id=rival, program='binary', upline_id=placement.upline_id, position=placement.position,
+                    level=placement.level, slot_no=1, claims_position=True,
+                )))
+            return claim(placement)
+
+        user_id = ObjectId()
+        with contextlib.redirect_stdout(io.StringIO()), \
+                patch.object(TreeService, '_claim_position', side_effect=rival_first) as claims:
+            self.assertTrue(self._place(user_id))
+
+        self.assertEqual(claims.call_count, 2)
+        self.assertEqual(TreePlacement.objects.get(user_id=rival).position, 'left')
+        self.assertEqual(TreePlacement.objects.get(user_id=user_id).position, 'right')
+
+    def test_simultaneous_joins_under_one_sponsor(self):
+        users = [ObjectId() for _ in range(JOINS)]
+        start = threading.Barrier(JOINS)
+
+        def join(user_id):
+            start.wait()
+            return self._place(user_id)
+
+        with contextlib.redirect_stdout(io.StringIO()), self.atomic_writes():
+            with ThreadPoolExecutor(max_workers=JOINS) as pool:
+                results = list(pool.map(join, users))
+
+        self.assertEqual(results, [True] * JOINS)
+        placed = list(TreePlacement.objects(program='binary', claims_position=True, is_active=True))
+        self.assertEqual(sorted(p.user_id for p in placed), sorted(users))
+        seats = Counter((p.upline_id, p.position) for p in placed)
+        self.assertEqual(max(seats.values()), 1)
+
+        # Each join took the first free seat at the time, so levels fill in breadth-first order
+        self.assertTrue({p.upline_id for p in placed} <= set(users) | {self.sponsor})
+        per_level = Counter(p.level for p in placed)
+        self.assertEqual([per_level[level] for level in range(2, 8)], [2, 4, 8, 16, 32, 38])
@@ -0,0 +1,195 @@
+"""
+Unit Tests for SubtreeService and the nested tree renderers built on it
+
+Covers:
+- Binary duel tree (BinaryService._build_nested_binary_tree_limited)
+- Dream matrix tree (DreamMatrixService._build_nested_matrix_tree_limited)
+- Team structure counts (BinaryService._get_slot_team_structure)
+- Tree subtree API (TreeService.get_subtree)
+- My community (UserService.get_my_community) reports a walk cut at its depth cap
+
+Each renderer is compared against the previous per-node implementation, and the
+number of TreePlacement queries is asserted to be bounded by the rendered depth.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from bson import ObjectId
+
+from tests.mock_db import MockDBTestCase
+import modules.matrix  # noqa: F401  (loads matrix before dream_matrix to avoid the import cycle)
+from modules.tree.model import TreePlacement
+from modules.tree.service import TreeService
+from modules.tree.subtree_service import SubtreeService
+from modules.user.model import User
+from modules.user.service import UserService
+from modules.binary.service import BinaryService
+from modules.dream_matrix.service import DreamMatrixService
+
+
+def _legacy_binary_nested(user_oid, max_levels):
+    """Per-node binary renderer as it was before SubtreeService."""
+    counter = [0]
+
+    def display_id(oid):
+        u = User.objects(id=oid).only('uid').first()
+        return str(u.uid) if u and u.uid else str(oid)
+
+    def build(oid, level, position):
+        if level >= max_levels:
+            return None
+        node = {"id": counter[0], "type": "self" if level == 0 else "downLine",
+                "userId": display_id(oid), "level": level, "position": position}
+        counter[0] += 1
+        if level < max_levels - 1:
+            downline = []
+            for pos in ('left', 'right'):
+                ch = TreePlacement.objects(program='binary', upline_id=oid, position=pos).order_by('created_at').first()
+                if ch:
+                    child_node = build(ch.user_id, level + 1, pos)
+                    if child_node:
+                        downline.append(child_node)
+            if downline:
+                node["directDownline"] = downline
+        return node
+
+    return build(user_oid, 0, "root")
+
+
+def _legacy_team_count(oid):
+    total = 0
+    for child in TreePlacement.objects(program='binary', upline_id=oid):
+        total += 1 + _legacy_team_count(child.user_id)
+    return total
+
+
+class TestSubtreeService(MockDBTestCase):
+    """Test cases for level-batched subtree rendering."""
+
+    def setUp(self):
+        super().setUp()
+        self.t0 = datetime(2025, 1, 1)
+        self.users = {}
+        self.root = self._user('ROOT')
+
+    def _user(self, uid, refered_by=None):
+        u = User(uid=uid, refer_code=f"RC{uid}", wallet_address=f"0x{uid}", name=uid, refered_by=refered_by).save()
+        self.users[uid] = u
+        return u
+
+    def _place(self, user, upline, position, program='binary', slot_no=1, minutes=0, level=1, is_active=True):
+        TreePlacement(
+            user_id=user.id, program=program, parent_id=upline.id, upline_id=upline.id,
+            position=position, level=level, slot_no=slot_no, is_active=is_active,
+            created_at=self.t0 + timedelta(minutes=minutes)
+        ).save()
+
+    def _build_binary_network(self, depth=5):
+        """Full binary tree of the given depth plus a few duplicate/late placements."""
+        frontier = [self.root]
+        minute = 0
+        for level in range(1, depth + 1):
+            next_frontier = []
+            for parent in frontier:
+                for pos in ('left', 'right'):
+                    minute += 1
+                    child = self._user(f"{parent.uid}{pos[0].upper()}", refered_by=self.root.id)
+                    self._place(child, parent, pos, minutes=minute, level=level)
+                    next_frontier.append(child)
+            frontier = next_frontier
+        # A later slot-2 placement under the root must not displace the first left child
+        late = self._user('LATE', refered_by=self.root.id)
+        self._place(late, self.root, 'left', slot_no=2, minutes=10_000)
+
+    def test_binary_nested_matches_legacy_renderer(self):
+        self._build_binary_network(depth=4)
+        service = BinaryService.__new__(BinaryService)
+        for max_levels in (1, 2, 3, 5):
+            expected = _legacy_binary_nested(self.root.id, max_levels)
+            root_node, depth, total = service._build_nested_binary_tree_limited(self.root.id, max_levels=max_levels)
+            self.assertEqual(root_node, expected)
+            self.assertEqual(depth, max_levels - 1)
+            self.assertEqual(total, 2 ** max_levels - 1)
+
+    def test_binary_nested_query_count_bounded_by_depth(self):
+        self._build_binary_network(depth=5)
+        service = BinaryService.__new__(BinaryService)
+        placement_queries = self.count_queries(TreePlacement)
+        user_queries = self.count_queries(User)
+        service._build_nested_binary_tree_limited(self.root.id, max_levels=5)
+        self.assertEqual(placement_queries.call_count, 4)
+        self.assertEqual(user_queries.call_count, 1)
+
+    def test_team_structure_count_matches_recursive_count(self):
+        self._build_binary_network(depth=4)
+        # The same user placed again in slot 2 is counted along with their subtree
+        self._place(self.users['ROOTL'], self.users['ROOTR'], 'left', slot_no=2, minutes=20_000, level=2)
+        expected = _legacy_team_count(self.root.id)
+        placement_queries = self.count_queries(TreePlacement)
+        total = SubtreeService.count_descendants(self.root.id, program='binary')
+        self.assertEqual(total, expected)
+        # One query per populated level plus the terminating empty level
+        self.assertLessEqual(placement_queries.call_count, 6)
+
+    def test_dream_matrix_nested_filters_slot_and_self(self):
+        a = self._user('A', refered_by=self.root.id)
+        b = self._user('B', refered_by=self.root.id)
+        c = self._user('C', refered_by=a.id)
+        d = self._user('D', refered_by=a.id)
+        self._place(self.root, self.root, 'left', program='matrix', minutes=0)  # self placement is ignored
+        self._place(b, self.root, 'right', program='matrix', minutes=1)
+        self._place(a, self.root, 'left', program='matrix', minutes=2)
+        self._place(d, self.root, 'middle', program='matrix', slot_no=2, minutes=3)  # other slot
+        self._place(c, a, 'middle', program='matrix', minutes=4, level=2)
+        self._place(d, a, 'left', program='matrix', minutes=5, level=2, is_active=False)  # inactive
+
+        service = DreamMatrixService.__new__(DreamMatrixService)
+        placement_queries = self.count_queries(TreePlacement)
+        root_node, depth, total = service._build_nested_matrix_tree_limited(self.root.id, max_levels=3, slot_no=1)
+
+        self.assertEqual(placement_queries.call_count, 2)
+        self.assertEqual((depth, total), (2, 4))
+        self.assertEqual([n["userId"] for n in root_node["directDownline"]], ['A', 'B'])
+        left = root_node["directDownline"][0]
+        self.assertEqual(left["referrer_refer_code"], 'RCROOT')
+        self.assertEqual(left["parent_id"], str(self.root.id))
+        self.assertEqual([(n["id"], n["userId"], n["position"]) for n in left["directDownline"]], [(2, 'C', 'middle')])
+        self.assertEqual(left["directDownline"][0]["referrer_uid"], 'A')
+        self.assertEqual(root_node["directDownline"][1]["id"], 3)
+
+    def test_get_subtree_walks_parent_links_level_by_level(self):
+        self._build_binary_network(depth=3)
+        placement_queries = self.count_queries(TreePlacement)
+        result = asyncio.run(TreeService.get_subtree(str(self.root.id), program='binary'))
+        self.assertTrue(result.success)
+        self.assertEqual(len(result.data), 15)
+        self.assertEqual(result.data[0]['user_id'], str(self.users['ROOTL'].id))
+        # Three populated levels plus the query that finds the leaves childless
+        self.assertEqual(placement_queries.call_count, 4)
+
+    def test_count_descendants_warns_when_depth_cap_is_hit(self):
+        self._build_binary_network(depth=3)
+        with self.assertLogs("SubtreeService", level="WARNING"):
+            total = SubtreeService.count_descendants(self.root.id, program='binary', max_depth=2)
+        self.assertEqual(total, 2 + 4 + 1)  # two levels plus the late slot-2 placement
+        with self.assertRaises(ValueError):
+            SubtreeService.count_descendants(self.root.id, program='binary', max_depth=2, strict=True)
+        with self.assertNoLogs("SubtreeService", level="WARNING"):
+            SubtreeService.count_descendants(self.root.id, program='binary', max_depth=3)
+
+    def test_my_community_reports_truncation(self):
+        self._build_binary_network(depth=3)
+        service = UserService()
+        self.assertFalse(service.get_my_community(str(self.root.id), 'binary', 1)['data']['truncated'])
+
+        with patch('modules.user.service.COMMUNITY_MAX_DEPTH', 2), self.assertLogs("SubtreeService", level="WARNING"):
+            result = service.get_my_community(str(self.root.id), 'binary', 1)
+        self.assertTrue(result['success'], result)
+        self.assertTrue(result['data']['truncated'])
+
+    def test_get_subtree_warns_when_depth_cap_is_hit(self):
+        self._build_binary_network(depth=3)
+        with self.assertLogs("SubtreeService", level="WARNING"):
+            result = asyncio.run(TreeService.get_subtree(str(self.root.id), program='binary', max_depth=2))
+        self.assertEqual(len(result.data), 7)
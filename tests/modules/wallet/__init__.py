@@ -0,0 +1 @@
+# Wallet module tests package initialization
@@ -0,0 +1,137 @@
+"""
+Unit Tests for streaming ledger / income exports
+
+Test Coverage:
+- CSV and NDJSON rows in (created_at, _id) order from a single cursor
+- Resuming from a row cursor (including rows sharing a timestamp)
+- Date ranges, filters and validation
+- The /wallet/export endpoint (streaming response, access rules)
+"""
+
+import csv
+import io
+import json
+import unittest
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from tests.mock_db import MockDBTestCase
+import modules.matrix  # noqa: F401  (loads matrix before dream_matrix to avoid the import cycle)
+from modules.income.model import IncomeEvent
+from modules.wallet.router import router as wallet_router, _auth_dependency
+from modules.wallet.export_service import LedgerExportService
+from modules.wallet.model import WalletLedger
+
+
+class TestLedgerExport(MockDBTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user_id = ObjectId()
+        self.other_id = ObjectId()
+        self.base = datetime(2026, 1, 1)
+        # Pairs of rows share a timestamp so resuming has to break ties on _id
+        for i in range(10):
+            WalletLedger(
+                user_id=self.user_id, amount=Decimal(i + 1), currency='USDT' if i % 2 else 'BNB', type='credit',
+                reason='binary_dual_tree', balance_after=Decimal(i + 1), tx_hash=f'tx-{i}',
+                created_at=self.base + timedelta(hours=i // 2)
+            ).save()
+        WalletLedger(user_id=self.other_id, amount=Decimal('5'), type='debit', reason='withdrawal',
+                     balance_after=Decimal('0'), tx_hash='tx-other', created_at=self.base).save()
+
+    def _csv(self, **kwargs):
+        body = ''.join(LedgerExportService(batch_size=3).stream('wallet_ledger', 'csv', **kwargs))
+        return list(csv.DictReader(io.StringIO(body)))
+
+    def test_csv_rows_in_order_with_one_query(self):
+        # One find over the ledger (the archive watermark lookup is a separate one-row read)
+        with self.assertQueryBudget(1, collection='wallet_ledger'):
+            rows = self._csv(user_id=str(self.user_id))
+
+        self.assertEqual([r['tx_hash'] for r in rows], [f'tx-{i}' for i in range(10)])
+        self.assertEqual(rows[0]['user_id'], str(self.user_id))
+        self.assertEqual(rows[0]['created_at'], self.base.isoformat())
+        self.assertTrue(all(r['cursor'] for r in rows))
+
+    def test_resume_from_cursor_covers_every_row_once(self):
+        seen, after = [], None
+        while True:
+            chunk = self._csv(user_id=str(self.user_id), after=after, max_rows=3)
+            if not chunk:
+                break
+            seen.extend(r['tx_hash'] for r in chunk)
+            after = chunk[-1]['cursor']
+
+        self.assertEqual(seen, [f'tx-{i}' for i in range(10)])
+
+    def test_date_range_and_filters(self):
+        rows = self._csv(start=self.base + timedelta(hours=1), end=self.base + timedelta(hours=3), currency='USDT')
+
+        self.assertEqual([r['tx_hash'] for r in rows], ['tx-3', 'tx-5'])
+
+    def test_invalid_requests_are_rejected(self):
+        service = LedgerExportService()
+        with self.assertRaises(ValueError):
+            service.build_filter('users')
+        with self.assertRaises(ValueError):
+            service.build_filter('wallet_ledger', income_type='spark_bonus')
+        with self.assertRaises(ValueError):
+            service.build_filter('wallet_ledger', after='not-a-cursor')
+
+    def test_ndjson_income_export(self):
+        IncomeEvent(user_id=self.user_id, source_user_id=self.other_id, program='binary', slot_no=1,
+                    income_type='partner_incentive', amount=Decimal('0.0011'), percentage=Decimal('10'),
+                    tx_hash='inc-1', created_at=self.base).save()
+
+        lines = ''.join(LedgerExportService().stream('income_event', 'ndjson', income_type='partner_incentive'))
+        rows = [json.loads(line) for line in lines.splitlines()]
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['tx_hash'], 'inc-1')
+        self.assertEqual(rows[0]['source_user_id'], str(self.other_id))
+
+
+class TestExportEndpoint(MockDBTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user_id = ObjectId()
+        for i in range(3):
+            WalletLedger(user_id=self.user_id, amount=Decimal('1'), type='credit', reason='bonus',
+                         balance_after=Decimal(i + 1), tx_hash=f'tx-{i}').save()
+        app = FastAPI()
+        app.include_router(wallet_router)
+        self.current_user = {"user_id": str(self.user_id)}
+        app.dependency_overrides[_auth_dependency] = lambda: self.current_user
+        self.client = TestClient(app)
+
+    def test_streams_own_history_as_csv(self):
+        response = self.client.get("/wallet/export/wallet_ledger")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['content-type'].startswith('text/csv'))
+        self.assertIn('attachment', response.headers['content-disposition'])
+        self.assertEqual(len(list(csv.DictReader(io.StringIO(response.text)))), 3)
+
+    def test_access_rules(self):
+        other = str(ObjectId())
+        self.assertEqual(self.client.get(f"/wallet/export/wallet_ledger?user_id={other}").status_code, 403)
+
+        self.current_user = {"user_id": other, "role": "finance"}
+        response = self.client.get("/wallet/export/wallet_ledger?format=ndjson")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.text.splitlines()), 3)
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get("/wallet/export/wallet_ledger?format=xml").status_code, 400)
+        self.assertEqual(self.client.get("/wallet/export/wallet_ledger?after=zzz").status_code, 400)
+        self.assertEqual(self.client.get("/wallet/export/users").status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
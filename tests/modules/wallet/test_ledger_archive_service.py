@@ -0,0 +1,188 @@
+"""
+Unit Tests for ledger partitioning / archival (LedgerArchiveService)
+
+Test Coverage:
+- Old months move to the archive collection and per-user monthly summaries
+- Live rows are only deleted with prune; unpruned months are not archived twice
+- totals() gives the same (Decimal) answer before and after archiving
+- Re-running an interrupted archive is idempotent; restore() reverses it
+- Earning statistics, wallet reconcile, exports and history pages read across both tiers
+"""
+
+import contextlib
+import io
+import unittest
+from datetime import datetime
+from decimal import Decimal
+
+from bson import ObjectId
+
+from tests.mock_db import MockDBTestCase
+import modules.matrix  # noqa: F401  (loads matrix before dream_matrix to avoid the import cycle)
+from modules.income.model import IncomeEvent
+from modules.wallet.export_service import LedgerExportService
+from modules.wallet.ledger_archive_service import LedgerArchiveService
+from modules.wallet.model import LedgerMonthlySummary, UserWallet, WalletLedger
+from modules.wallet.service import WalletService
+
+
+class TestLedgerArchive(MockDBTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user_id = ObjectId()
+        self.other_id = ObjectId()
+        self.service = LedgerArchiveService(batch_size=2)
+        # Jan-Mar 2026: two binary credits and one matrix credit per month, plus a debit
+        for month in (1, 2, 3):
+            for day, (currency, reason, amount) in enumerate(
+                    [('BNB', 'binary_joining_commission', '0.001'), ('BNB', 'binary_level_payout', '0.002'),
+                     ('USDT', 'matrix_partner_incentive', '1.5')], start=1):
+                self._ledger(self.user_id, amount, currency, reason, datetime(2026, month, day))
+            self._ledger(self.user_id, '3', 'USDT', 'withdrawal', datetime(2026, month, 20), type='debit')
+        self._ledger(self.other_id, '9', 'USDT', 'matrix_partner_incentive', datetime(2026, 1, 5))
+
+    def _ledger(self, user_id, amount, currency, reason, created_at, type='credit'):
+        WalletLedger(user_id=user_id, amount=Decimal(amount), currency=currency, type=type, reason=reason,
+                     balance_after=Decimal('0'), tx_hash=f'tx-{ObjectId()}', created_at=created_at).save()
+
+    def _credit_totals(self, **kwargs):
+        rows = self.service.totals('wallet_ledger', self.user_id, match={'type': 'credit'}, group_by=('currency',), **kwargs)
+        return {row['currency']: (row['count'], row['amount']) for row in rows}
+
+    def test_archive_moves_old_months_to_summaries(self):
+        report = self.service.archive_before(datetime(2026, 3, 1), source='wallet_ledger', prune=True)
+
+        self.assertEqual(report['wallet_ledger']['months'], ['2026-01', '2026-02'])
+        self.assertEqual(report['wallet_ledger']['rows'], 9)
+        self.assertEqual(self.service.watermark('wallet_ledger'), datetime(2026, 3, 1))
+        self.assertEqual(WalletLedger.objects.count(), 4)
+        self.assertEqual(self.service.archive_collection('wallet_ledger').count_documents({}), 9)
+
+        summary = LedgerMonthlySummary.objects.get(
+            source='wallet_ledger', user_id=self.user_id, month=datetime(2026, 2, 1),
+            group={'currency': 'USDT', 'type': 'credit', 'reason': 'matrix_partner_incentive'}
+        )
+        self.assertEqual((summary.count, summary.amount_total), (1, Decimal('1.5')))
+        self.assertEqual(LedgerMonthlySummary.objects(user_id=self.user_id).count(), 8)
+
+    def test_totals_match_before_and_after_archiving(self):
+        before = self._credit_totals()
+        self.service.archive_before(datetime(2026, 3, 1), source='wallet_ledger', prune=True)
+
+        with self.assertQueryBudget(3):
+            after = self._credit_totals()
+
+        self.assertEqual(before, {'BNB': (6, Decimal('0.009')), 'USDT': (3, Decimal('4.5'))})
+        self.assertEqual(after, before)
+        # Date bounds: one archived month plus the hot month
+        self.assertEqual(self._credit_totals(start=datetime(2026, 2, 1)), {'BNB': (4, Decimal('0.006')), 'USDT': (2, Decimal('3'))})
+
+    def test_rerunning_an_interrupted_archive_is_idempotent(self):
+        archive = self.service.archive_collection('wallet_ledger')
+        # A previous run copied January but stopped before summarizing / deleting it
+        archive.insert_many(list(WalletLedger._get_collection().find({'created_at': {'$lt': datetime(2026, 2, 1)}})))
+
+        self.service.archive_before(datetime(2026, 2, 1), source='wallet_ledger', prune=True)
+        self.service.archive_before(datetime(2026, 2, 1), source='wallet_ledger', prune=True)
+
+        self.assertEqual(archive.count_documents({}), 5)
+        self.assertEqual(self._credit_totals(), {'BNB': (6, Decimal('0.009')), 'USDT': (3, Decimal('4.5'))})
+
+    def test_archive_keeps_live_rows_unless_pruned(self):
+        first = self.service.archive_before(datetime(2026, 3, 1), source='wallet_ledger')
+        second = self.service.archive_before(datetime(2026, 3, 1), source='wallet_ledger')
+
+        self.assertEqual(first['wallet_ledger']['months'], ['2026-01', '2026-02'])
+        self.assertEqual(second['wallet_ledger']['months'], [])
+        self.assertEqual(WalletLedger.objects.count(), 13)
+        self.assertEqual(self.service.archive_collection('wallet_ledger').count_documents({}), 9)
+        self.assertEqual(self._credit_totals(), {'BNB': (6, Decimal('0.009')), 'USDT': (3, Decimal('4.5'))})
+
+        # A later prune finishes the months that are already behind the watermark
+        pruned = self.service.archive_before(datetime(2026, 3, 1), source='wallet_ledger', prune=True)
+        self.assertEqual(pruned['wallet_ledger']['rows'], 9)
+        self.assertEqual(WalletLedger.objects.count(), 4)
+
+    def test_restore_brings_rows_back(self):
+        self.service.archive_before(datetime(2026, 3, 1), prune=True)
+        restored = self.service.restore(source='wallet_ledger')
+
+        self.assertEqual(restored, {'wallet_ledger': 9})
+        self.assertEqual(WalletLedger.objects.count(), 13)
+        self.assertIsNone(self.service.watermark('wallet_ledger'))
+        self.assertEqual(LedgerMonthlySummary.objects(source='wallet_ledger').count(), 0)
+        self.assertEqual(self._credit_totals(), {'BNB': (6, Decimal('0.009')), 'USDT': (3, Decimal('4.5'))})
+
+    def test_income_events_and_validation(self):
+        IncomeEvent(user_id=self.user_id, source_user_id=self.other_id, program='binary', slot_no=1,
+                    income_type='partner_incentive', amount=Decimal('0.0011'), percentage=Decimal('10'),
+                    tx_hash='inc-1', status='completed', created_at=datetime(2026, 1, 3)).save()
+        self.service.archive_before(datetime(2026, 2, 1), source='income_event', prune=True)
+
+        rows = self.service.totals('income_event', self.user_id, group_by=('income_type',))
+        self.assertEqual([(r['income_type'], r['count']) for r in rows], [('partner_incentive', 1)])
+        with self.assertRaises(ValueError):
+            self.service.totals('income_event', self.user_id, match={'currency': 'BNB'})
+        with self.assertRaises(ValueError):
+            self.service.totals('users', self.user_id)
+
+    def test_earning_statistics_span_both_tiers(self):
+        def earnings():
+            with contextlib.redirect_stdout(io.StringIO()):
+                data = WalletService().get_earning_statistics(str(self.user_id))['data']
+            return data['binary']['total_earnings'], data['matrix']['total_earnings']
+
+        before = earnings()
+        self.service.archive_before(datetime(2026, 3, 1), prune=True)
+
+        self.assertEqual(earnings(), before)
+        self.assertAlmostEqual(before[0]['BNB'], 0.009)
+        self.assertAlmostEqual(before[1]['USDT'], 4.5)
+
+    def test_reconcile_counts_archived_months(self):
+        wallets = WalletService()
+        before = wallets.reconcile_main_from_ledger(str(self.user_id))['balances']
+        self.service.archive_before(datetime(2026, 3, 1), prune=True)
+
+        self.assertEqual(wallets.reconcile_main_from_ledger(str(self.user_id))['balances'], before)
+        self.assertEqual(before, {'USDT': -4.5, 'BNB': 0.009})
+        wallet = UserWallet.objects.get(user_id=self.user_id, wallet_type='main', currency='BNB')
+        self.assertEqual(wallet.balance, Decimal('0.009'))
+
+    def test_export_reads_archived_months_first(self):
+        exports = LedgerExportService(batch_size=2)
+        before = [row['cursor'] for row in exports.iter_rows('wallet_ledger', user_id=str(self.user_id))]
+        self.service.archive_before(datetime(2026, 3, 1), prune=True)
+
+        after = [row['cursor'] for row in exports.iter_rows('wallet_ledger', user_id=str(self.user_id))]
+        self.assertEqual(after, before)
+        self.assertEqual(len(after), 12)
+        # Resuming from an archived row continues into the live tier
+        resumed = list(exports.iter_rows('wallet_ledger', user_id=str(self.user_id), after=before[6], max_rows=3))
+        self.assertEqual([row['cursor'] for row in resumed], before[7:10])
+
+    def test_history_pages_continue_into_the_archive(self):
+        queryset = WalletLedger.objects(user_id=self.user_id, type='credit')
+
+        def walk(**kwargs):
+            ids, cursor = [], None
+            while True:
+                result = self.service.paginate('wallet_ledger', queryset, 4, cursor=cursor, **kwargs)
+                ids += [row.id for row in result.items]
+                if not result.next_cursor:
+                    return ids, result.total
+                cursor = result.next_cursor
+
+        before = walk(include_total=True)
+        self.service.archive_before(datetime(2026, 3, 1), prune=True)
+
+        self.assertEqual(walk(include_total=True), before)
+        self.assertEqual(before[1], 9)
+        pages = [self.service.paginate('wallet_ledger', queryset, 4, page=n).items for n in (1, 2, 3)]
+        self.assertEqual([row.id for page in pages for row in page], before[0])
+        self.assertIsInstance(pages[2][0], WalletLedger)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+"""
+Unit Tests for ReserveAccountService
+
+Reserve balances live on one account document per (user, program, slot): credits
+and debits journal a numbered ReserveLedger row with the exact balance_after and
+$inc the account, a journal row whose account update was lost is rolled forward,
+balance checks never scan the ledger, and the auto-upgrade threshold can be
+claimed only once.
+"""
+
+from decimal import Decimal
+from unittest.mock import patch
+
+from bson import ObjectId
+
+from tests.mock_db import MockDBTestCase
+from modules.wallet.model import ReserveAccount, ReserveLedger
+from modules.wallet.reserve_account_service import ReserveAccountService, from_units
+
+
+class TestReserveAccountService(MockDBTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.service = ReserveAccountService()
+        self.user_id = ObjectId()
+
+    def _ledger(self):
+        return list(ReserveLedger.objects(user_id=self.user_id).order_by('created_at'))
+
+    def test_credits_and_debits_journal_exact_balances(self):
+        self.service.credit(self.user_id, 'binary', 3, Decimal('0.0044'), 'tree_upline_reserve')
+        self.service.credit(self.user_id, 'binary', 3, Decimal('0.0044'), 'tree_upline_reserve')
+        balance = self.service.debit(self.user_id, 'binary', 3, Decimal('0.001'), 'manual')
+
+        self.assertEqual(balance, Decimal('0.0078'))
+        self.assertEqual([Decimal(str(r.balance_after)) for r in self._ledger()],
+                         [Decimal('0.0044'), Decimal('0.0088'), Decimal('0.0078')])
+        account = ReserveAccount.objects(user_id=self.user_id).first()
+        self.assertEqual((account.credited_units, account.debited_units, account.entries), (880000, 100000, 3))
+        self.assertEqual(from_units(account.balance_units), Decimal('0.0078'))
+        self.assertEqual([r.seq for r in self._ledger()], [1, 2, 3])
+
+    def test_invalid_rows_do_not_move_the_balance(self):
+        self.service.credit(self.user_id, 'binary', 2, Decimal('1'), 'income')
+        with self.assertRaises(Exception):
+            self.service.debit(self.user_id, 'binary', 2, Decimal('1'), 'not_a_source')
+        self.assertEqual(self.service.get_balance(self.user_id, 'binary', 2), Decimal('1'))
+        self.assertEqual(len(self._ledger()), 1)
+
+    def test_balance_check_does_not_scan_the_ledger(self):
+        for _ in range(20):
+            self.service.credit(self.user_id, 'matrix', 1, Decimal('11'), 'middle_3_earnings')
+        with self.assertQueryBudget(1) as stats:
+            balance = self.service.get_balance(self.user_id, 'matrix', 1)
+        self.assertEqual(balance, Decimal('220'))
+        self.assertNotIn('reserve_ledger', stats.by_collection)
+
+    def test_existing_ledger_rows_open_the_account(self):
+        for amount, direction in (('5', 'credit'), ('3', 'credit'), ('2', 'debit')):
+            ReserveLedger(user_id=self.user_id, program='binary', slot_no=4, amount=Decimal(amount),
+                          direction=direction, source='income', balance_after=Decimal('0')).save()
+        self.assertEqual(self.service.get_balance(self.user_id, 'binary', 4), Decimal('6'))
+        self.assertEqual(self.service.credit(self.user_id, 'binary', 4, Decimal('1'), 'income'), Decimal('7'))
+        self.assertEqual(ReserveAccount.objects(user_id=self.user_id).first().entries, 4)
+
+    def test_threshold_is_claimed_exactly_once(self):
+        cost = Decimal('0.0088')
+        self.service.credit(self.user_id, 'binary', 3, Decimal('0.0044'), 'tree_upline_reserve')
+        self.assertIsNone(self.service.try_claim(self.user_id, 'binary', 3, cost))
+
+        # Two credits cross the threshold and both callers see a sufficient balance
+        self.service.credit(self.user_id, 'binary', 3, Decimal('0.0044'), 'tree_upline_reserve')
+        self.service.credit(self.user_id, 'binary', 3, Decimal('0.0044'), 'tree_upline_reserve')
+        seen = [self.service.get_balance(self.user_id, 'binary', 3) for _ in range(2)]
+        self.assertTrue(all(balance >= cost for balance in seen))
+
+        claims = [self.service.try_claim(self.user_id, 'binary', 3, cost) for _ in range(2)]
+        self.assertEqual(claims[0], {"balance_before": Decimal('0.0132'), "balance_after": Decimal('0.0044')})
+        self.assertIsNone(claims[1])
+        self.assertEqual(self.service.get_balance(self.user_id, 'binary', 3), Decimal('0.0044'))
+        self.assertEqual(ReserveLedger.objects(user_id=self.user_id, direction='debit').count(), 1)
+
+    def test_release_refunds_and_rearms_the_claim(self):
+        self.service.credit(self.user_id, 'matrix', 1, Decimal('33'), 'middle_3_earnings')
+        self.assertIsNotNone(self.service.try_claim(self.user_id, 'matrix', 1, Decimal('33')))
+        self.service.release_claim(self.user_id, 'matrix', 1, Decimal('33'))
+        self.assertEqual(self.service.get_balance(self.user_id, 'matrix', 1), Decimal('33'))
+        self.assertIsNotNone(self.service.try_claim(self.user_id, 'matrix', 1, Decimal('33')))
+
+    def test_already_upgraded_slot_is_never_claimed(self):
+        self.service.credit(self.user_id, 'binary', 2, Decimal('1'), 'income')
+        self.service.mark_upgraded(self.user_id, 'binary', 2)
+        self.assertIsNone(self.service.try_claim(self.user_id, 'binary', 2, Decimal('0.5')))
+
+    def test_journal_row_without_account_update_is_rolled_forward(self):
+        self.service.credit(self.user_id, 'binary', 2, Decimal('1'), 'income')
+        # A writer journaled entry 2 and stopped before the account $inc
+        with patch.object(ReserveAccountService, '_apply', return_value=True):
+            self.service.credit(self.user_id, 'binary', 2, Decimal('2'), 'income')
+        self.assertEqual(ReserveAccount.objects(user_id=self.user_id).first().entries, 1)
+
+        balance = self.service.debit(self.user_id, 'binary', 2, Decimal('0.5'), 'manual')
+        self.assertEqual(balance, Decimal('2.5'))
+        self.assertEqual([(r.seq, Decimal(str(r.balance_after))) for r in self._ledger()],
+                         [(1, Decimal('1')), (2, Decimal('3')), (3, Decimal('2.5'))])
+        account = ReserveAccount.objects(user_id=self.user_id).first()
+        self.assertEqual((account.balance_units, account.entries), (250000000, 3))
+        report = self.service.reconcile(user_id=self.user_id)
+        self.assertEqual((report['mismatched'], report['missing_accounts']), ([], []))
+
+    def test_interrupted_claim_is_rolled_forward_once(self):
+        self.service.credit(self.user_id, 'matrix', 1, Decimal('33'), 'middle_3_earnings')
+        with patch.object(ReserveAccountService, '_apply', return_value=True):
+            self.assertIsNotNone(self.service.try_claim(self.user_id, 'matrix', 1, Decimal('33')))
+        # The next claim renumbers past the journaled one, which is applied and marks the slot upgraded
+        self.assertIsNone(self.service.try_claim(self.user_id, 'matrix', 1, Decimal('33')))
+        self.assertEqual(self.service.get_balance(self.user_id, 'matrix', 1), Decimal('0'))
+        self.assertTrue(ReserveAccount.objects(user_id=self.user_id).first().auto_upgraded)
+        self.assertEqual(ReserveLedger.objects(user_id=self.user_id, direction='debit').count(), 1)
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        other = ObjectId()
+        self.service.credit(self.user_id, 'binary', 2, Decimal('2'), 'income')
+        self.service.credit(other, 'binary', 2, Decimal('1'), 'income')
+        # Drift: a ledger row written around the service, and a row with no account at all
+        ReserveLedger(user_id=self.user_id, program='binary', slot_no=2, amount=Decimal('0.5'),
+                      direction='debit', source='manual', balance_after=Decimal('0')).save()
+        ReserveLedger(user_id=other, program='binary', slot_no=5, amount=Decimal('4'),
+                      direction='credit', source='income', balance_after=Decimal('0')).save()
+
+        report = self.service.reconcile(program='binary')
+        self.assertTrue(report['success'], report)
+        self.assertEqual(report['checked'], 3)
+        self.assertEqual([(r['user_id'], r['account_balance'], r['ledger_balance']) for r in report['mismatched']],
+                         [(str(self.user_id), 2.0, 1.5)])
+        self.assertEqual([(r['user_id'], r['slot_no']) for r in report['missing_accounts']], [(str(other), 5)])
+
+        fixed = self.service.reconcile(program='binary', fix=True)
+        self.assertEqual(fixed['fixed'], 2)
+        self.assertEqual(self.service.get_balance(self.user_id, 'binary', 2), Decimal('1.5'))
+        self.assertEqual(self.service.get_balance(other, 'binary', 5), Decimal('4'))
+        clean = self.service.reconcile()
+        self.assertEqual((clean['mismatched'], clean['missing_accounts'], clean['orphaned_accounts']), ([], [], []))
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+Tests for the response helpers (utils/response.py)
+
+Test Coverage:
+- The orjson fast path renders the same JSON as the jsonable_encoder encoding it replaced
+- ObjectId, Decimal, datetime, sets, timedelta and int dict keys
+- MongoEngine documents are rendered by field
+- Content orjson rejects falls back to jsonable_encoder
+"""
+
+import json
+import unittest
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from enum import Enum
+from unittest.mock import patch
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from mongoengine import DecimalField, Document, EmbeddedDocument, EmbeddedDocumentField, IntField, StringField
+
+from utils import response
+from utils.response import CUSTOM_ENCODERS, FastJSONResponse, create_response, error_response, success_response
+
+
+class _Status(Enum):
+    ACTIVE = "active"
+
+
+class _Slot(EmbeddedDocument):
+    slot_no = IntField()
+
+
+class _Member(Document):
+    name = StringField()
+    earnings = DecimalField(precision=4)
+    slot = EmbeddedDocumentField(_Slot)
+    meta = {'collection': 'response_test_member'}
+
+
+def _jsonable_encoder_body(content) -> bytes:
+    return JSONResponse(content=jsonable_encoder(content, custom_encoder=CUSTOM_ENCODERS)).body
+
+
+class TestResponseEncoding(unittest.TestCase):
+
+    def test_matches_jsonable_encoder(self):
+        content = {
+            "user_id": ObjectId(),
+            "ids": [ObjectId(), ObjectId()],
+            "amount": Decimal("0.0022"),
+            "total": Decimal("1234567.89"),
+            "joined_at": datetime(2025, 3, 4, 5, 6, 7, 89),
+            "settled_at": datetime(2025, 3, 4, tzinfo=timezone.utc),
+            "day": date(2025, 3, 4),
+            "status": _Status.ACTIVE,
+            "name": "Ünïcode   name",
+            "slots": {1: "Explorer", 2: "Contributor"},
+            "flags": (True, False, None),
+            "nested": [{"level": 1, "amount": Decimal("11"), "children": [{"id": ObjectId()}]}],
+        }
+        self.assertEqual(FastJSONResponse(content=content).body, _jsonable_encoder_body(content))
+
+    def test_default_hook_types(self):
+        content = {"tags": {"a"}, "wait": timedelta(minutes=2)}
+        body = FastJSONResponse(content=content).body
+        self.assertEqual(json.loads(body), json.loads(_jsonable_encoder_body(content)))
+        self.assertEqual(json.loads(body)["wait"], 120.0)
+
+    def test_documents_render_by_field(self):
+        member = _Member(id=ObjectId(), name="A", earnings=Decimal("2.5"), slot=_Slot(slot_no=3))
+        body = json.loads(FastJSONResponse(content={"member": member}).body)
+        self.assertEqual(body["member"], {"id": str(member.id), "name": "A", "earnings": 2.5, "slot": {"slot_no": 3}})
+
+    def test_rejected_content_falls_back(self):
+        key = ObjectId()
+        content = {key: Decimal("1.5"), "huge": 2 ** 70}
+        with patch.object(response, 'jsonable_encoder', wraps=jsonable_encoder) as encoder:
+            body = FastJSONResponse(content=content).body
+        self.assertTrue(encoder.called)
+        self.assertEqual(json.loads(body), {str(key): 1.5, "huge": 2 ** 70})
+
+    def test_helpers(self):
+        user_id = ObjectId()
+        ok = success_response(data={"user_id": user_id, "balance": Decimal("10.5")}, meta={"page": 1})
+        self.assertIsInstance(ok, FastJSONResponse)
+        self.assertEqual(json.loads(ok.body), {
+            "status": "Ok", "message": "Ok", "data": {"user_id": str(user_id), "balance": 10.5},
+            "status_code": 200, "success": True, "meta": {"page": 1},
+        })
+        error = error_response("Not found", status_code=404)
+        self.assertEqual((error.status_code, json.loads(error.body)["success"]), (404, False))
+        self.assertEqual(create_response("Ok", 201, "Created").status_code, 201)
@@ -8,6 +8,64 @@ try:
 except Exception:  # pragma: no cover - fallback if bson missing in some envs
     class ObjectId(str):  # minimal fallback to avoid runtime import error
         pass
+try:
+    # Native encoder for the response fast path; jsonable_encoder is used when it is missing
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover - orjson is optional
+    orjson = None
+try:
+    from mongoengine.base import BaseDocument  # type: ignore
+except Exception:  # pragma: no cover - fallback if mongoengine missing in some envs
+    BaseDocument = None
+
+
+def _encode_decimal(value: Decimal) -> float | str:
+    try:
+        return float(value)
+    except Exception:
+        return str(value)
+
+
+# Encoders for the types JSON lacks:
+# - ObjectId → str
+# - Decimal → float (fallback to str if not convertible)
+CUSTOM_ENCODERS = {
+    ObjectId: str,
+    Decimal: _encode_decimal,
+}
+
+
+def _orjson_default(value: Any) -> Any:
+    """orjson hook for the values it does not serialize natively"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal):
+        return _encode_decimal(value)
+    if BaseDocument is not None and isinstance(value, BaseDocument):
+        # Field values as stored on the instance (references are not dereferenced)
+        return {name: value._data.get(name) for name in value._fields_ordered}
+    # set, timedelta, bytes, pydantic models, ...: as jsonable_encoder encodes them
+    return jsonable_encoder(value, custom_encoder=CUSTOM_ENCODERS)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse serialized natively by orjson, without a jsonable_encoder pass over the payload.
+
+    Renders the same JSON as jsonable_encoder(content, custom_encoder=CUSTOM_ENCODERS) +
+    JSONResponse (floats may use a shorter exponent form, e.g. 1e16 for 1e+16). Content orjson
+    rejects (dict keys that are not str / int / float / bool / None, integers beyond 64 bits,
+    ...) is rendered through jsonable_encoder instead.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            try:
+                return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+            except TypeError:
+                pass
+        return super().render(jsonable_encoder(content, custom_encoder=CUSTOM_ENCODERS))
+
 
 class ResponseModel:
     def __init__(self, success: bool, message: str, data: Any = None):
@@ -24,14 +82,14 @@ def create_response(
 ):
     """
     Utility function to create a standardized JSON response.
-    Uses jsonable_encoder to ensure all values are JSON-serializable.
+    Values are serialized by FastJSONResponse (ObjectId → str, Decimal → float).
     
     :param status: Status of the response (e.g., "Ok", "Error").
     :param status_code: HTTP status code (e.g., 200, 400, 500).
     :param message: Message describing the result.
     :param data: Data to include in the response (can be a dictionary, list, or None).
     :param meta: Additional metadata like pagination info.
-    :return: A JSONResponse object.
+    :return: A FastJSONResponse object.
     """
 
     # Derive a simple boolean success flag expected by some tests
@@ -48,23 +106,7 @@ def create_response(
     if meta:
         response_content["meta"] = meta
 
-    # Use jsonable_encoder with custom encoders to handle bson.ObjectId, Decimal, etc.
-    # - ObjectId → str
-    # - Decimal → float (fallback to str if not finite)
-    def _encode_decimal(value: Decimal) -> float | str:
-        try:
-            return float(value)
-        except Exception:
-            return str(value)
-
-    encoded = jsonable_encoder(
-        response_content,
-        custom_encoder={
-            ObjectId: str,
-            Decimal: _encode_decimal,
-        },
-    )
-    return JSONResponse(content=encoded, status_code=status_code)
+    return FastJSONResponse(content=response_content, status_code=status_code)
 
 
 # Convenience wrappers so routers can call success_response / error_response